@@ -0,0 +1,42 @@
+"""
+Script to add the coping_statement column to the journal_entry table.
+This stores the precomputed dashboard coping statement for each entry.
+"""
+import logging
+from app import app, db
+from sqlalchemy import text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def add_coping_statement_column():
+    """Add the coping_statement column to the journal_entry table if it doesn't exist"""
+    with app.app_context():
+        try:
+            with db.engine.connect() as connection:
+                # Check if column exists
+                result = connection.execute(
+                    text("SELECT column_name FROM information_schema.columns "
+                         "WHERE table_name = 'journal_entry' AND column_name = 'coping_statement';")
+                )
+                column_exists = result.scalar() is not None
+
+                if not column_exists:
+                    logger.info("Adding coping_statement column to journal_entry table...")
+                    connection.execute(
+                        text("ALTER TABLE journal_entry ADD COLUMN coping_statement TEXT;")
+                    )
+                    connection.commit()
+                    logger.info("Added coping_statement column to journal_entry table")
+                else:
+                    logger.info("coping_statement column already exists in journal_entry table")
+
+        except Exception as e:
+            logger.error(f"Error adding coping_statement column: {e}")
+            raise
+
+if __name__ == "__main__":
+    logger.info("Starting migration to add coping_statement column...")
+    add_coping_statement_column()
+    logger.info("Migration completed.")
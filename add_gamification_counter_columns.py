@@ -0,0 +1,43 @@
+"""
+Script to add the badge rule counter columns to the user_gamification table.
+The counters start out NULL and are seeded from each user's journal entries
+and mood logs the first time gamification.record_event() runs for them.
+"""
+import logging
+from app import app, db
+from sqlalchemy import text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COUNTER_COLUMNS = [
+    ('entry_count', 'INTEGER'),
+    ('analyzed_entry_count', 'INTEGER'),
+    ('mood_log_count', 'INTEGER'),
+    ('breathing_count', 'INTEGER'),
+    ('login_streak', 'INTEGER'),
+    ('last_login_date', 'DATE'),
+]
+
+def add_gamification_counter_columns():
+    """Add the counter columns to user_gamification if they don't exist"""
+    with app.app_context():
+        try:
+            with db.engine.connect() as connection:
+                for column_name, column_type in COUNTER_COLUMNS:
+                    logger.info(f"Adding {column_name} column to user_gamification table...")
+                    connection.execute(
+                        text(f"ALTER TABLE user_gamification ADD COLUMN IF NOT EXISTS {column_name} {column_type};")
+                    )
+                connection.commit()
+                logger.info("user_gamification counter columns are in place")
+
+        except Exception as e:
+            logger.error(f"Error adding user_gamification counter columns: {e}")
+            raise
+
+if __name__ == "__main__":
+    logger.info("Starting migration to add user_gamification counter columns...")
+    add_gamification_counter_columns()
+    logger.info("Migration completed.")
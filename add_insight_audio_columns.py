@@ -0,0 +1,41 @@
+"""
+Script to add the pre-generated insight audio columns.
+user.preferred_voice holds the voice chosen in the voice settings, and
+journal_entry.insight_audio_url / closing_audio_url point at the audio
+synthesized for Mira's messages after analysis.
+"""
+import logging
+from app import app, db
+from sqlalchemy import text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+AUDIO_COLUMNS = [
+    ('"user"', 'preferred_voice', 'VARCHAR(16)'),
+    ('journal_entry', 'insight_audio_url', 'VARCHAR(255)'),
+    ('journal_entry', 'closing_audio_url', 'VARCHAR(255)'),
+]
+
+def add_insight_audio_columns():
+    """Add the insight audio columns if they don't exist"""
+    with app.app_context():
+        try:
+            with db.engine.connect() as connection:
+                for table_name, column_name, column_type in AUDIO_COLUMNS:
+                    logger.info(f"Adding {column_name} column to {table_name} table...")
+                    connection.execute(
+                        text(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {column_name} {column_type};")
+                    )
+                connection.commit()
+                logger.info("Insight audio columns are in place")
+
+        except Exception as e:
+            logger.error(f"Error adding insight audio columns: {e}")
+            raise
+
+if __name__ == "__main__":
+    logger.info("Starting migration to add insight audio columns...")
+    add_insight_audio_columns()
+    logger.info("Migration completed.")
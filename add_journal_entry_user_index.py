@@ -0,0 +1,34 @@
+"""
+Script to add the (user_id, created_at) index to the journal_entry table.
+History context and the dashboard read a user's latest entries through it.
+The journal_entry_features table itself is created by db.create_all().
+"""
+import logging
+from app import app, db
+from sqlalchemy import text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def add_journal_entry_user_index():
+    """Add the ix_journal_entry_user_created index if it doesn't exist"""
+    with app.app_context():
+        try:
+            with db.engine.connect() as connection:
+                logger.info("Creating ix_journal_entry_user_created index on journal_entry...")
+                connection.execute(
+                    text("CREATE INDEX IF NOT EXISTS ix_journal_entry_user_created "
+                         "ON journal_entry (user_id, created_at);")
+                )
+                connection.commit()
+                logger.info("ix_journal_entry_user_created index is in place")
+
+        except Exception as e:
+            logger.error(f"Error adding journal_entry user index: {e}")
+            raise
+
+if __name__ == "__main__":
+    logger.info("Starting migration to add journal_entry user index...")
+    add_journal_entry_user_index()
+    logger.info("Migration completed.")
@@ -0,0 +1,45 @@
+"""
+Script to add the reminder bucket columns to the user table.
+The journal reminder scheduler reads users by these minute-of-day buckets
+instead of checking every user's reminder times on each run.
+"""
+import logging
+from app import app, db
+from models import User
+from sqlalchemy import text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def add_reminder_bucket_columns():
+    """Add and backfill morning/evening_reminder_minute on the user table"""
+    with app.app_context():
+        try:
+            with db.engine.connect() as connection:
+                for column_name in ('morning_reminder_minute', 'evening_reminder_minute'):
+                    logger.info(f"Adding {column_name} column to user table...")
+                    connection.execute(
+                        text(f'ALTER TABLE "user" ADD COLUMN IF NOT EXISTS {column_name} INTEGER;')
+                    )
+                    connection.execute(
+                        text(f'CREATE INDEX IF NOT EXISTS ix_user_{column_name} ON "user" ({column_name});')
+                    )
+                connection.commit()
+
+            # Fill the buckets from each user's current preferences
+            users = User.query.all()
+            for user in users:
+                user.refresh_reminder_buckets()
+            db.session.commit()
+            logger.info(f"Backfilled reminder buckets for {len(users)} users")
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error adding reminder bucket columns: {e}")
+            raise
+
+if __name__ == "__main__":
+    logger.info("Starting migration to add reminder bucket columns...")
+    add_reminder_bucket_columns()
+    logger.info("Migration completed.")
@@ -1,8 +1,11 @@
 import uuid
-from datetime import datetime
+import logging
+from datetime import datetime, timedelta
 from flask_login import UserMixin
+from sqlalchemy import event, select
 from werkzeug.security import check_password_hash, generate_password_hash
 from extensions import db
+from models import JournalEntry, CBTRecommendation
 
 class Admin(UserMixin, db.Model):
     """
@@ -88,4 +91,200 @@ class Admin(UserMixin, db.Model):
             print(traceback.format_exc())
         
         print("Admin.get() returning None")
-        return None
\ No newline at end of file
+        return None
+
+class AdminDailyStats(db.Model):
+    """Journal entries written and distinct users writing them, per UTC day."""
+    __tablename__ = "admin_daily_stats"
+    day = db.Column(db.Date, primary_key=True)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+    active_users = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AdminDailyActiveUser(db.Model):
+    """Users who wrote a journal entry on a given UTC day (feeds AdminDailyStats.active_users)."""
+    __tablename__ = "admin_daily_active_user"
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.String, primary_key=True)
+
+
+class AdminPatternStats(db.Model):
+    """Number of CBT recommendations written per thought pattern."""
+    __tablename__ = "admin_pattern_stats"
+    thought_pattern = db.Column(db.String(255), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+
+class AdminRollupState(db.Model):
+    """Single row recording when the admin rollups were last rebuilt from the source tables."""
+    __tablename__ = "admin_rollup_state"
+    id = db.Column(db.Integer, primary_key=True)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+
+
+class JournalFlag(db.Model):
+    """A journal entry an admin flagged as having incorrect AI analysis (at most one per entry)."""
+    __tablename__ = "journal_flag"
+    id = db.Column(db.Integer, primary_key=True)
+    journal_entry_id = db.Column(db.Integer, db.ForeignKey('journal_entry.id', ondelete='CASCADE'),
+                                 nullable=False, unique=True, index=True)
+    reason = db.Column(db.Text, nullable=True)
+    admin_id = db.Column(db.String, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+
+class AdminMessage(db.Model):
+    """A message from an admin to a user, optionally about one of their journal entries."""
+    __tablename__ = "admin_message"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String, nullable=False)
+    journal_entry_id = db.Column(db.Integer, db.ForeignKey('journal_entry.id', ondelete='CASCADE'),
+                                 nullable=True, index=True)
+    message = db.Column(db.Text, nullable=False)
+    admin_id = db.Column(db.String, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_read = db.Column(db.Boolean, default=False)
+
+    # A user's messages are listed in the order they were sent
+    __table_args__ = (
+        db.Index('ix_admin_message_user_created', 'user_id', 'created_at'),
+    )
+
+def _rollup_insert(connection, table):
+    """Dialect insert construct supporting ON CONFLICT, or None if the database has none."""
+    if connection.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif connection.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
+
+
+def _increment_rollup(connection, table, keys, increments):
+    """Add increments to the rollup row identified by keys, creating it if needed."""
+    insert = _rollup_insert(connection, table)
+    if insert is not None:
+        statement = insert.values(**keys, **increments).on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: table.c[name] + value for name, value in increments.items()}
+        )
+        connection.execute(statement)
+        return
+
+    where = [table.c[name] == value for name, value in keys.items()]
+    result = connection.execute(
+        table.update().where(*where).values(
+            **{name: table.c[name] + value for name, value in increments.items()}
+        )
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(**keys, **increments))
+
+
+def _decrement_rollup(connection, table, keys, decrements):
+    """Subtract decrements from an existing rollup row; a missing row is left to the next rebuild."""
+    where = [table.c[name] == value for name, value in keys.items()]
+    connection.execute(
+        table.update().where(*where).values(
+            **{name: table.c[name] - value for name, value in decrements.items()}
+        )
+    )
+
+
+def _record_journal_entry_stats(connection, entry):
+    table = AdminDailyStats.__table__
+    active_table = AdminDailyActiveUser.__table__
+    day = (entry.created_at or datetime.utcnow()).date()
+
+    # Count the user towards the day's active users only on their first entry that day
+    insert = _rollup_insert(connection, active_table)
+    if insert is not None:
+        result = connection.execute(
+            insert.values(day=day, user_id=entry.user_id).on_conflict_do_nothing()
+        )
+        new_active_user = result.rowcount == 1
+    else:
+        exists = connection.execute(
+            active_table.select().where(
+                active_table.c.day == day, active_table.c.user_id == entry.user_id
+            )
+        ).first()
+        if not exists:
+            connection.execute(active_table.insert().values(day=day, user_id=entry.user_id))
+        new_active_user = exists is None
+
+    _increment_rollup(connection, table, {"day": day},
+                      {"entry_count": 1, "active_users": 1 if new_active_user else 0})
+
+
+def _record_recommendation_stats(connection, recommendation):
+    if recommendation.thought_pattern:
+        _increment_rollup(connection, AdminPatternStats.__table__,
+                          {"thought_pattern": recommendation.thought_pattern}, {"count": 1})
+
+
+def _remove_journal_entry_stats(connection, entry):
+    if entry.created_at is None:
+        return
+    entries = JournalEntry.__table__
+    active_table = AdminDailyActiveUser.__table__
+    day = entry.created_at.date()
+    day_start = datetime.combine(day, datetime.min.time())
+
+    # The entry's own row is already gone, so this finds the user's other entries that day
+    still_active = connection.execute(
+        select(entries.c.id).where(
+            entries.c.user_id == entry.user_id,
+            entries.c.created_at >= day_start,
+            entries.c.created_at < day_start + timedelta(days=1)
+        ).limit(1)
+    ).first() is not None
+    if not still_active:
+        connection.execute(
+            active_table.delete().where(
+                active_table.c.day == day, active_table.c.user_id == entry.user_id
+            )
+        )
+
+    _decrement_rollup(connection, AdminDailyStats.__table__, {"day": day},
+                      {"entry_count": 1, "active_users": 0 if still_active else 1})
+
+
+def _remove_recommendation_stats(connection, recommendation):
+    if recommendation.thought_pattern:
+        _decrement_rollup(connection, AdminPatternStats.__table__,
+                          {"thought_pattern": recommendation.thought_pattern}, {"count": 1})
+
+
+def _update_rollups(connection, update, target):
+    # Runs inside the flush, in a savepoint, so a rollup failure can never
+    # lose the journal entry or recommendation being written
+    try:
+        with connection.begin_nested():
+            update(connection, target)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Error updating admin rollups: {e}")
+
+
+@event.listens_for(JournalEntry, "after_insert")
+def _journal_entry_inserted(mapper, connection, target):
+    _update_rollups(connection, _record_journal_entry_stats, target)
+
+
+@event.listens_for(CBTRecommendation, "after_insert")
+def _recommendation_inserted(mapper, connection, target):
+    _update_rollups(connection, _record_recommendation_stats, target)
+
+
+# Bulk query.delete() calls bypass these; delete rows through the session
+# (see journal_routes._delete_recommendations) so the rollups stay in step
+@event.listens_for(JournalEntry, "after_delete")
+def _journal_entry_deleted(mapper, connection, target):
+    _update_rollups(connection, _remove_journal_entry_stats, target)
+
+
+@event.listens_for(CBTRecommendation, "after_delete")
+def _recommendation_deleted(mapper, connection, target):
+    _update_rollups(connection, _remove_recommendation_stats, target)
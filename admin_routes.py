@@ -4,16 +4,19 @@ from functools import wraps
 import os
 import logging
 import traceback
-from admin_models import Admin
+from admin_models import Admin, JournalFlag
 from admin_forms import AdminLoginForm, AdminMessageForm, APIConfigForm, TwilioConfigForm
 from app import login_required, db
 from admin_utils import (
     ensure_data_files_exist, get_admin_stats, export_journal_entries, 
-    export_users, flag_journal_entry, is_entry_flagged, get_flagged_entries,
+    export_users, flag_journal_entry, flag_journal_entries, is_entry_flagged,
+    get_flagged_entry_ids,
     save_admin_message, get_admin_messages, get_config, save_config,
     save_twilio_config, load_twilio_config
 )
 from models import User, JournalEntry, CBTRecommendation
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload, load_only
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -293,26 +296,24 @@ def journals():
     # Check if we should only show flagged entries
     show_flagged = request.args.get('flagged', 'false') == 'true'
 
-    # Get all flagged journal IDs
-    flagged_entries = get_flagged_entries()
-    flagged_ids = [entry.get('journal_id') for entry in flagged_entries]
-
-    # Query journal entries
-    query = JournalEntry.query
+    # Query journal entries, loading each author's username in the same query
+    query = JournalEntry.query.options(
+        joinedload(JournalEntry.author).load_only(User.id, User.username)
+    )
 
     if show_flagged:
-        query = query.filter(JournalEntry.id.in_(flagged_ids))
+        query = query.join(JournalFlag, JournalFlag.journal_entry_id == JournalEntry.id)
 
     entries = query.order_by(JournalEntry.created_at.desc()).paginate(page=page, per_page=per_page)
 
     # Get user info for each entry
-    users = {}
-    for entry in entries.items:
-        if entry.user_id not in users:
-            user = User.query.get(entry.user_id)
-            users[entry.user_id] = user.username if user else "Unknown"
+    users = {
+        entry.user_id: entry.author.username if entry.author else "Unknown"
+        for entry in entries.items
+    }
 
     # Create a dict to track which entries are flagged
+    flagged_ids = get_flagged_entry_ids(entry.id for entry in entries.items)
     is_flagged = {entry.id: entry.id in flagged_ids for entry in entries.items}
 
     return render_template('admin/journals.html', title='Journal Entries', 
@@ -335,8 +336,7 @@ def view_journal(journal_id):
     flagged = is_entry_flagged(journal_id)
 
     # Get admin messages for this entry
-    admin_messages = get_admin_messages()
-    entry_messages = [m for m in admin_messages if m.get('journal_id') == journal_id]
+    entry_messages = get_admin_messages(journal_id=journal_id)
 
     # Admin message form
     form = AdminMessageForm()
@@ -358,6 +358,23 @@ def flag_journal(journal_id):
 
     return redirect(url_for('admin.view_journal', journal_id=journal_id))
 
+@admin_bp.route('/journals/flag', methods=['POST'])
+@admin_required
+def flag_journals():
+    """Flag several journal entries at once"""
+    journal_ids = request.form.getlist('journal_ids', type=int)
+    reason = request.form.get('reason') or 'No reason provided'
+
+    if journal_ids:
+        flagged = flag_journal_entries(journal_ids, reason)
+        flash(f'{flagged} journal entries have been flagged for review.', 'success')
+    else:
+        flash('Select at least one journal entry to flag.', 'warning')
+
+    return redirect(url_for('admin.journals',
+                            page=request.form.get('page', 1, type=int),
+                            flagged=request.form.get('flagged', 'false')))
+
 @admin_bp.route('/journal/<int:journal_id>/message', methods=['POST'])
 @admin_required
 def send_message(journal_id):
@@ -382,10 +399,15 @@ def users():
 
     users = User.query.order_by(User.created_at.desc()).paginate(page=page, per_page=per_page)
 
-    # Get journal count for each user
-    journal_counts = {}
-    for user in users.items:
-        journal_counts[user.id] = JournalEntry.query.filter_by(user_id=user.id).count()
+    # Get journal count for each user on the page in one grouped query
+    journal_counts = {user.id: 0 for user in users.items}
+    if journal_counts:
+        journal_counts.update(
+            db.session.query(JournalEntry.user_id, func.count(JournalEntry.id))
+            .filter(JournalEntry.user_id.in_(list(journal_counts)))
+            .group_by(JournalEntry.user_id)
+            .all()
+        )
 
     return render_template('admin/users.html', title='Users', 
                           users=users, journal_counts=journal_counts)
@@ -396,22 +418,38 @@ def view_user(user_id):
     """View a specific user"""
     user = User.query.get_or_404(user_id)
 
-    # Get user's journal entries
-    entries = JournalEntry.query.filter_by(user_id=user.id).order_by(JournalEntry.created_at.desc()).all()
+    page = request.args.get('page', 1, type=int)
+    per_page = 20
 
-    # Get flagged entries for this user
-    flagged_entries = get_flagged_entries()
-    flagged_ids = [entry.get('journal_id') for entry in flagged_entries]
+    # Get one page of the user's journal entries (without their full text)
+    user_entries = JournalEntry.query.filter_by(user_id=user.id)
+    entries = user_entries.options(
+        load_only(JournalEntry.id, JournalEntry.title, JournalEntry.anxiety_level,
+                  JournalEntry.created_at, JournalEntry.is_analyzed)
+    ).order_by(JournalEntry.created_at.desc()).paginate(page=page, per_page=per_page)
+
+    # First and latest entries for the activity timeline
+    timeline_columns = load_only(JournalEntry.id, JournalEntry.title, JournalEntry.created_at)
+    first_entry = user_entries.options(timeline_columns).order_by(JournalEntry.created_at.asc()).first()
+    if page == 1 and entries.items:
+        latest_entry = entries.items[0]
+    else:
+        latest_entry = user_entries.options(timeline_columns).order_by(JournalEntry.created_at.desc()).first()
 
-    # Create a dict to track which entries are flagged
-    is_flagged = {entry.id: entry.id in flagged_ids for entry in entries}
+    # Flags for the entries on this page, and the user's total number of flagged entries
+    flagged_ids = get_flagged_entry_ids(entry.id for entry in entries.items)
+    is_flagged = {entry.id: entry.id in flagged_ids for entry in entries.items}
+    flagged_count = JournalFlag.query.join(
+        JournalEntry, JournalFlag.journal_entry_id == JournalEntry.id
+    ).filter(JournalEntry.user_id == user.id).count()
 
     # Get admin messages for this user
     admin_messages = get_admin_messages(user_id)
 
     return render_template('admin/user_profile.html', title=user.username,
                           user=user, entries=entries, is_flagged=is_flagged,
-                          messages=admin_messages)
+                          flagged_count=flagged_count, first_entry=first_entry,
+                          latest_entry=latest_entry, messages=admin_messages)
 
 @admin_bp.route('/settings', methods=['GET', 'POST'])
 @admin_required
@@ -488,6 +526,13 @@ def settings():
         'estimated_cost': estimated_cost
     }
 
+    # Response cache hit/miss counters (per worker process)
+    try:
+        from response_cache import get_response_cache_stats
+        api_stats['response_cache'] = get_response_cache_stats()
+    except Exception as e:
+        logger.error(f"Error getting response cache stats: {str(e)}")
+
     # Get SMS notification stats
     sms_users_count = User.query.filter_by(sms_notifications_enabled=True).filter(User.phone_number.isnot(None)).count()
     sms_stats = {
@@ -515,11 +560,20 @@ def settings():
 def scheduler_logs():
     """View scheduler activity logs to help diagnose notification issues"""
     try:
-        from scheduler_logs import get_latest_scheduler_logs
+        from datetime import datetime, timedelta
+        from scheduler_logs import query_scheduler_logs
 
         # Get the latest 50 logs by default, or use the count parameter if provided
         count = request.args.get('count', 50, type=int)
-        logs = get_latest_scheduler_logs(count)
+
+        # Optional filters: exact activity type, failures/successes only, last N hours
+        log_type_filter = request.args.get('type') or None
+        status_filter = request.args.get('status')
+        hours = request.args.get('hours', type=int)
+
+        success = {'success': True, 'failed': False}.get(status_filter)
+        since = datetime.utcnow() - timedelta(hours=hours) if hours else None
+        logs = query_scheduler_logs(activity_type=log_type_filter, success=success, since=since, limit=count)
 
         # Group logs by type for easier analysis
         log_groups = {}
@@ -541,7 +595,10 @@ def scheduler_logs():
             notification_count=notification_count,
             error_count=error_count,
             health_check_count=health_check_count,
-            count=count
+            count=count,
+            log_type_filter=log_type_filter,
+            status_filter=status_filter,
+            hours=hours
         )
     except Exception as e:
         flash(f'Failed to retrieve scheduler logs: {str(e)}', 'danger')
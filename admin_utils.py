@@ -1,7 +1,12 @@
 import json
 import os
 from datetime import datetime, timedelta
+from threading import Lock
+from sqlalchemy import func, select
 from models import User, JournalEntry, CBTRecommendation
+from admin_models import (
+    AdminDailyStats, AdminDailyActiveUser, AdminPatternStats, AdminRollupState, JournalFlag, AdminMessage
+)
 from extensions import db
 from flask_login import current_user
 
@@ -51,6 +56,72 @@ def ensure_data_files_exist():
                 "phone_number": ""
             }, f, indent=2)
 
+def refresh_admin_rollups():
+    """
+    Rebuild the admin statistics rollups from the journal_entry and
+    cbt_recommendation tables. The rollups are otherwise kept up to date as
+    rows are inserted and deleted (see admin_models), so this backfills them
+    and, run nightly by the scheduler, corrects any drift.
+    """
+    entry_day = func.date(JournalEntry.created_at)
+    try:
+        db.session.query(AdminDailyStats).delete(synchronize_session=False)
+        db.session.query(AdminDailyActiveUser).delete(synchronize_session=False)
+        db.session.query(AdminPatternStats).delete(synchronize_session=False)
+
+        db.session.execute(
+            AdminDailyActiveUser.__table__.insert().from_select(
+                ['day', 'user_id'],
+                select(entry_day, JournalEntry.user_id).where(
+                    JournalEntry.created_at.isnot(None)
+                ).distinct()
+            )
+        )
+        db.session.execute(
+            AdminDailyStats.__table__.insert().from_select(
+                ['day', 'entry_count', 'active_users'],
+                select(
+                    entry_day,
+                    func.count(JournalEntry.id),
+                    func.count(JournalEntry.user_id.distinct())
+                ).where(JournalEntry.created_at.isnot(None)).group_by(entry_day)
+            )
+        )
+        db.session.execute(
+            AdminPatternStats.__table__.insert().from_select(
+                ['thought_pattern', 'count'],
+                select(
+                    CBTRecommendation.thought_pattern,
+                    func.count(CBTRecommendation.id)
+                ).where(
+                    CBTRecommendation.thought_pattern.isnot(None)
+                ).group_by(CBTRecommendation.thought_pattern)
+            )
+        )
+        db.session.merge(AdminRollupState(id=1, refreshed_at=datetime.utcnow()))
+        db.session.commit()
+        logger.info("Refreshed admin statistics rollups")
+    except Exception as e:
+        logger.error(f"Error refreshing admin statistics rollups: {e}")
+        db.session.rollback()
+        raise
+
+def ensure_admin_rollups():
+    """
+    Backfill the admin rollups if they have never been built.
+
+    The insert listeners start filling the rollup tables as soon as the code
+    is deployed, so whether they are empty says nothing about the entries
+    written before; the AdminRollupState row is written by a full rebuild.
+    """
+    try:
+        if db.session.get(AdminRollupState, 1) is None:
+            logger.info("Admin statistics rollups have never been built, backfilling them")
+            refresh_admin_rollups()
+    except Exception as e:
+        logger.error(f"Error backfilling admin statistics rollups: {e}")
+        db.session.rollback()
+
 def get_admin_stats():
     """Get statistics for the admin dashboard"""
     try:
@@ -85,86 +156,55 @@ def get_admin_stats():
                 # Hard-coded fallback - consider this an emergency case
                 total_users = 1
         
+        # Backfill the rollup tables the first time they are read
+        ensure_admin_rollups()
+
         # Get journal entries count
         try:
-            logger.debug("Attempting to count journal entries from database")
-            total_journals = JournalEntry.query.count()
-            logger.debug(f"Successfully counted {total_journals} journal entries from database")
+            logger.debug("Summing journal entries from the daily rollup")
+            total_journals = db.session.query(func.sum(AdminDailyStats.entry_count)).scalar() or 0
+            logger.debug(f"Successfully counted {total_journals} journal entries from rollup")
         except Exception as e:
             logger.error(f"Database error counting journals: {e}")
-            # Fallback to journal data file
-            try:
-                with open('data/journals.json', 'r') as f:
-                    journals_data = json.load(f)
-                    total_journals = len(journals_data)
-                    logger.debug(f"Loaded {total_journals} journals from JSON file")
-            except Exception as json_e:
-                logger.error(f"JSON file error counting journals: {json_e}")
-                total_journals = 0
+            db.session.rollback()
+            total_journals = 0
         
-        # Calculate daily active users
+        # Daily active users: distinct users who wrote an entry today (UTC)
         current_date = datetime.utcnow()
-        yesterday = current_date - timedelta(days=1)
         
         try:
-            logger.debug("Calculating daily active users from database")
-            # This query uses distinct() for MySQL/PostgreSQL
-            daily_active = db.session.query(JournalEntry.user_id).distinct().filter(
-                JournalEntry.created_at >= yesterday
-            ).count()
-            logger.debug(f"Found {daily_active} daily active users in database")
+            logger.debug("Reading daily active users from the daily rollup")
+            daily_active = db.session.query(AdminDailyStats.active_users).filter(
+                AdminDailyStats.day == current_date.date()
+            ).scalar() or 0
+            logger.debug(f"Found {daily_active} daily active users in rollup")
         except Exception as e:
-            logger.error(f"Database error calculating daily active users: {e}")
-            # Fallback to journal data file
-            try:
-                with open('data/journals.json', 'r') as f:
-                    journals_data = json.load(f)
-                    active_users = set()
-                    for entry in journals_data:
-                        if 'created_at' in entry and entry['created_at']:
-                            try:
-                                entry_date = datetime.fromisoformat(entry['created_at'].replace('Z', '+00:00'))
-                                if entry_date >= yesterday:
-                                    active_users.add(entry.get('user_id', 0))
-                            except Exception as date_e:
-                                logger.error(f"Error parsing date: {date_e}")
-                    daily_active = len(active_users)
-                    logger.debug(f"Calculated {daily_active} daily active users from JSON file")
-            except Exception as json_e:
-                logger.error(f"JSON file error calculating daily active users: {json_e}")
-                daily_active = 0
+            logger.error(f"Database error reading daily active users: {e}")
+            db.session.rollback()
+            daily_active = 0
         
         # Get journal entries by day (last 7 days)
         seven_days_ago = current_date - timedelta(days=7)
-        entries_by_day = []
+        days = [(seven_days_ago + timedelta(days=i)).date() for i in range(7)]
+        counts_by_day = {}
         
         try:
-            logger.debug("Calculating entries per day from database")
-            for i in range(7):
-                day = seven_days_ago + timedelta(days=i)
-                day_start = datetime(day.year, day.month, day.day, 0, 0, 0)
-                day_end = datetime(day.year, day.month, day.day, 23, 59, 59)
-                
-                count = JournalEntry.query.filter(
-                    JournalEntry.created_at >= day_start,
-                    JournalEntry.created_at <= day_end
-                ).count()
-                
-                entries_by_day.append({
-                    'date': day.strftime('%Y-%m-%d'),
-                    'count': count
-                })
-            logger.debug(f"Successfully calculated entries by day: {entries_by_day}")
+            logger.debug("Reading entries per day from the daily rollup")
+            rows = db.session.query(AdminDailyStats.day, AdminDailyStats.entry_count).filter(
+                AdminDailyStats.day >= days[0],
+                AdminDailyStats.day <= days[-1]
+            ).all()
+            counts_by_day = {day: count for day, count in rows}
         except Exception as e:
-            logger.error(f"Database error calculating entries by day: {e}")
-            # Generate empty entries by day so the chart renders
-            for i in range(7):
-                day = seven_days_ago + timedelta(days=i)
-                entries_by_day.append({
-                    'date': day.strftime('%Y-%m-%d'),
-                    'count': 0
-                })
-            logger.debug(f"Using default entries by day: {entries_by_day}")
+            logger.error(f"Database error reading entries by day: {e}")
+            db.session.rollback()
+        
+        # Days without a rollup row had no entries, so the chart still renders all 7
+        entries_by_day = [
+            {'date': day.strftime('%Y-%m-%d'), 'count': counts_by_day.get(day, 0)}
+            for day in days
+        ]
+        logger.debug(f"Entries by day: {entries_by_day}")
         
         # Count users with notifications enabled
         try:
@@ -182,42 +222,11 @@ def get_admin_stats():
         anxiety_themes = []
         try:
             logger.debug("Calculating anxiety themes from database")
-            # Get recommendations and count theme occurrences
-            themes = {}
-            
-            # Use the standard session with error handling
-            try:
-                # Use the standard existing session
-                recommendations = db.session.query(CBTRecommendation).all()
-                for rec in recommendations:
-                    if rec.thought_pattern:
-                        themes[rec.thought_pattern] = themes.get(rec.thought_pattern, 0) + 1
-                        
-                # If we've made it here, transaction is ok
-                logger.debug(f"Successfully retrieved {len(recommendations)} recommendations")
-            except Exception as query_error:
-                logger.error(f"Error querying recommendations: {query_error}")
-                # Rollback and reattempt with a simpler query
-                db.session.rollback()
-                
-                # Just get the top anxiety patterns directly with SQL
-                try:
-                    sql = """
-                        SELECT thought_pattern, COUNT(*) as count 
-                        FROM cbt_recommendation 
-                        WHERE thought_pattern IS NOT NULL 
-                        GROUP BY thought_pattern 
-                        ORDER BY count DESC 
-                        LIMIT 3
-                    """
-                    results = db.session.execute(sql).fetchall()
-                    for row in results:
-                        themes[row[0]] = row[1]
-                    logger.debug(f"Retrieved themes via direct SQL: {themes}")
-                except Exception as sql_e:
-                    logger.error(f"SQL fallback also failed: {sql_e}")
-                    # Let the outer exception handler set default themes
-                    raise
+            # Top patterns come straight from the per-pattern rollup (indexed on count)
+            top_patterns = db.session.query(
+                AdminPatternStats.thought_pattern, AdminPatternStats.count
+            ).order_by(AdminPatternStats.count.desc()).limit(3).all()
+            themes = {pattern: count for pattern, count in top_patterns}
             
             anxiety_themes = [
                 {'theme': theme, 'count': count}
@@ -351,137 +360,278 @@ def export_users():
     
     return exported_users
 
+def _flag_to_dict(flag):
+    return {
+        'journal_id': flag.journal_entry_id,
+        'reason': flag.reason,
+        'admin_id': flag.admin_id,
+        'created_at': flag.created_at.isoformat() if flag.created_at else None,
+        'updated_at': flag.updated_at.isoformat() if flag.updated_at else None
+    }
+
+def _parse_iso(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+def _message_to_dict(message):
+    return {
+        'id': message.id,
+        'user_id': message.user_id,
+        'journal_id': message.journal_entry_id,
+        'message': message.message,
+        'admin_id': message.admin_id,
+        'created_at': message.created_at.isoformat() if message.created_at else None,
+        'is_read': bool(message.is_read)
+    }
+
+def _load_legacy_list(file_path):
+    try:
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+        return data if isinstance(data, list) else []
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Could not read legacy moderation file {file_path}: {e}")
+        return []
+
+def import_legacy_moderation_data():
+    """
+    Copy flags from flagged.json and messages from admin_messages.json into
+    their tables. Run once by import_moderation_data.py; safe to run again,
+    as flags and messages already in the database are skipped.
+
+    Returns:
+        tuple: Number of flags and messages imported
+    """
+    legacy_flags = _load_legacy_list(FLAGGED_FILE) if os.path.exists(FLAGGED_FILE) else []
+    legacy_messages = _load_legacy_list(ADMIN_MESSAGES_FILE) if os.path.exists(ADMIN_MESSAGES_FILE) else []
+    if not legacy_flags and not legacy_messages:
+        return 0, 0
+
+    # Only link flags and messages to entries that still exist
+    referenced_ids = {item.get('journal_id') for item in legacy_flags + legacy_messages} - {None}
+    existing_ids = {
+        entry_id for (entry_id,) in
+        db.session.query(JournalEntry.id).filter(JournalEntry.id.in_(list(referenced_ids)))
+    } if referenced_ids else set()
+
+    flags_by_entry = {flag.get('journal_id'): flag for flag in legacy_flags}
+    candidate_ids = existing_ids & set(flags_by_entry)
+    flagged_ids = {
+        entry_id for (entry_id,) in
+        db.session.query(JournalFlag.journal_entry_id).filter(JournalFlag.journal_entry_id.in_(list(candidate_ids)))
+    } if candidate_ids else set()
+    flag_ids = candidate_ids - flagged_ids
+    for journal_id in flag_ids:
+        flag = flags_by_entry[journal_id]
+        db.session.add(JournalFlag(
+            journal_entry_id=journal_id,
+            reason=flag.get('reason'),
+            admin_id=flag.get('admin_id'),
+            created_at=_parse_iso(flag.get('created_at')) or datetime.utcnow(),
+            updated_at=_parse_iso(flag.get('updated_at'))
+        ))
+
+    # Messages have no natural key, so one sent to the same user with the same
+    # text at the same time counts as already imported
+    recipients = {str(message['user_id']) for message in legacy_messages if message.get('user_id')}
+    seen = {
+        (user_id, text, created_at) for (user_id, text, created_at) in
+        db.session.query(AdminMessage.user_id, AdminMessage.message, AdminMessage.created_at).filter(
+            AdminMessage.user_id.in_(list(recipients))
+        )
+    } if recipients else set()
+
+    imported_messages = 0
+    for message in legacy_messages:
+        if not message.get('user_id') or not message.get('message'):
+            continue
+        created_at = _parse_iso(message.get('created_at'))
+        key = (str(message['user_id']), message['message'], created_at)
+        if key in seen:
+            continue
+        seen.add(key)
+        db.session.add(AdminMessage(
+            user_id=str(message['user_id']),
+            journal_entry_id=message.get('journal_id') if message.get('journal_id') in existing_ids else None,
+            message=message['message'],
+            admin_id=message.get('admin_id'),
+            created_at=created_at or datetime.utcnow(),
+            is_read=bool(message.get('is_read'))
+        ))
+        imported_messages += 1
+
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error importing legacy moderation data: {e}")
+        raise
+
+    logger.info(f"Imported {len(flag_ids)} legacy flagged entries and {imported_messages} admin messages")
+    return len(flag_ids), imported_messages
+
 def flag_journal_entry(journal_id, reason):
     """Flag a journal entry as having incorrect AI analysis"""
-    # Load existing flagged entries
-    flagged_entries = []
-    if os.path.exists(FLAGGED_FILE):
-        with open(FLAGGED_FILE, 'r') as f:
-            try:
-                flagged_entries = json.load(f)
-            except json.JSONDecodeError:
-                flagged_entries = []
-    
-    # Check if this entry is already flagged
-    for entry in flagged_entries:
-        if entry.get('journal_id') == journal_id:
-            # Update the reason
-            entry['reason'] = reason
-            entry['updated_at'] = datetime.utcnow().isoformat()
-            
-            # Save the updated list
-            with open(FLAGGED_FILE, 'w') as f:
-                json.dump(flagged_entries, f, indent=2)
-            
-            return entry
-    
-    # Add new flagged entry
-    new_flag = {
-        'journal_id': journal_id,
-        'reason': reason,
-        'admin_id': current_user.id,
-        'created_at': datetime.utcnow().isoformat()
-    }
-    
-    flagged_entries.append(new_flag)
-    
-    # Save the updated list
-    with open(FLAGGED_FILE, 'w') as f:
-        json.dump(flagged_entries, f, indent=2)
-    
-    return new_flag
+    flag = JournalFlag.query.filter_by(journal_entry_id=journal_id).first()
+    if flag:
+        # Update the reason
+        flag.reason = reason
+        flag.updated_at = datetime.utcnow()
+    else:
+        # Add new flagged entry
+        flag = JournalFlag(
+            journal_entry_id=journal_id,
+            reason=reason,
+            admin_id=current_user.id,
+            created_at=datetime.utcnow()
+        )
+        db.session.add(flag)
+
+    db.session.commit()
+    return _flag_to_dict(flag)
+
+def flag_journal_entries(journal_ids, reason):
+    """
+    Flag several journal entries at once with the same reason.
+
+    Existing flags get the new reason; entries that don't exist are skipped.
+
+    Returns:
+        int: Number of entries flagged or updated
+    """
+    journal_ids = {int(journal_id) for journal_id in journal_ids}
+    if not journal_ids:
+        return 0
+
+    now = datetime.utcnow()
+    existing_flags = JournalFlag.query.filter(JournalFlag.journal_entry_id.in_(list(journal_ids))).all()
+    for flag in existing_flags:
+        flag.reason = reason
+        flag.updated_at = now
+
+    new_ids = journal_ids - {flag.journal_entry_id for flag in existing_flags}
+    entry_ids = [
+        entry_id for (entry_id,) in
+        db.session.query(JournalEntry.id).filter(JournalEntry.id.in_(list(new_ids)))
+    ] if new_ids else []
+    db.session.bulk_insert_mappings(JournalFlag, [
+        {
+            'journal_entry_id': entry_id,
+            'reason': reason,
+            'admin_id': current_user.id,
+            'created_at': now
+        }
+        for entry_id in entry_ids
+    ])
+
+    db.session.commit()
+    return len(existing_flags) + len(entry_ids)
 
 def is_entry_flagged(journal_id):
     """Check if a journal entry is flagged"""
-    if os.path.exists(FLAGGED_FILE):
-        with open(FLAGGED_FILE, 'r') as f:
-            try:
-                flagged_entries = json.load(f)
-                for entry in flagged_entries:
-                    if entry.get('journal_id') == journal_id:
-                        return True
-            except json.JSONDecodeError:
-                pass
-    
-    return False
+    return db.session.query(JournalFlag.id).filter_by(journal_entry_id=journal_id).first() is not None
+
+def get_flagged_entry_ids(journal_ids):
+    """Get the subset of the given journal entry IDs that are flagged, in one query"""
+    journal_ids = list(journal_ids)
+    if not journal_ids:
+        return set()
+    return {
+        entry_id for (entry_id,) in
+        db.session.query(JournalFlag.journal_entry_id).filter(JournalFlag.journal_entry_id.in_(journal_ids))
+    }
 
 def get_flagged_entries():
     """Get all flagged journal entries"""
-    flagged_entries = []
-    if os.path.exists(FLAGGED_FILE):
-        with open(FLAGGED_FILE, 'r') as f:
-            try:
-                flagged_entries = json.load(f)
-            except json.JSONDecodeError:
-                pass
-    
-    return flagged_entries
+    return [_flag_to_dict(flag) for flag in JournalFlag.query.order_by(JournalFlag.created_at.desc()).all()]
 
 def save_admin_message(user_id, journal_id, message):
     """Save an admin message to a user about a journal entry"""
-    # Load existing messages
-    admin_messages = []
-    if os.path.exists(ADMIN_MESSAGES_FILE):
-        with open(ADMIN_MESSAGES_FILE, 'r') as f:
-            try:
-                admin_messages = json.load(f)
-            except json.JSONDecodeError:
-                admin_messages = []
-    
-    # Add new message
-    new_message = {
-        'id': len(admin_messages) + 1,
-        'user_id': user_id,
-        'journal_id': journal_id,
-        'message': message,
-        'admin_id': current_user.id,
-        'created_at': datetime.utcnow().isoformat(),
-        'is_read': False
-    }
-    
-    admin_messages.append(new_message)
-    
-    # Save the updated list
-    with open(ADMIN_MESSAGES_FILE, 'w') as f:
-        json.dump(admin_messages, f, indent=2)
-    
-    return new_message
+    new_message = AdminMessage(
+        user_id=str(user_id),
+        journal_entry_id=journal_id,
+        message=message,
+        admin_id=current_user.id,
+        created_at=datetime.utcnow(),
+        is_read=False
+    )
+    db.session.add(new_message)
+    db.session.commit()
 
-def get_admin_messages(user_id=None):
-    """Get admin messages, optionally filtered by user_id"""
-    admin_messages = []
-    if os.path.exists(ADMIN_MESSAGES_FILE):
-        with open(ADMIN_MESSAGES_FILE, 'r') as f:
-            try:
-                admin_messages = json.load(f)
-                if user_id:
-                    admin_messages = [m for m in admin_messages if m.get('user_id') == user_id]
-            except json.JSONDecodeError:
-                pass
-    
-    return admin_messages
+    return _message_to_dict(new_message)
 
-def get_config():
-    """Get API configuration"""
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'r') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                pass
-    
-    # Default config
+def get_admin_messages(user_id=None, journal_id=None, page=None, per_page=50):
+    """
+    Get admin messages in the order they were sent, optionally filtered.
+
+    Args:
+        user_id: Only messages sent to this user
+        journal_id: Only messages about this journal entry
+        page: 1-based page number; all matching messages if None
+        per_page: Messages per page
+
+    Returns:
+        list: Message dicts
+    """
+    query = AdminMessage.query
+    if user_id:
+        query = query.filter(AdminMessage.user_id == str(user_id))
+    if journal_id:
+        query = query.filter(AdminMessage.journal_entry_id == journal_id)
+
+    query = query.order_by(AdminMessage.created_at.asc(), AdminMessage.id.asc())
+    if page:
+        query = query.offset((page - 1) * per_page).limit(per_page)
+
+    return [_message_to_dict(message) for message in query.all()]
+
+# Process-wide snapshot of config.json, reloaded when the file's mtime changes
+_config_lock = Lock()
+_config_snapshot = {'mtime': None, 'config': None}
+
+def _default_config():
     return {
         "openai_api_key": "",
         "max_tokens": 800,
         "model": "gpt-4o"
     }
 
+def get_config():
+    """Get API configuration"""
+    try:
+        mtime = os.stat(CONFIG_FILE).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    with _config_lock:
+        if _config_snapshot['config'] is None or _config_snapshot['mtime'] != mtime:
+            config = None
+            if mtime is not None:
+                try:
+                    with open(CONFIG_FILE, 'r') as f:
+                        config = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    pass
+
+            _config_snapshot['config'] = config if isinstance(config, dict) else _default_config()
+            _config_snapshot['mtime'] = mtime
+
+        # Callers may modify their copy before passing it to save_config
+        return dict(_config_snapshot['config'])
+
 def save_config(config):
     """Save API configuration"""
     os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=2)
+    tmp_file = f"{CONFIG_FILE}.tmp"
+    with _config_lock:
+        with open(tmp_file, 'w') as f:
+            json.dump(config, f, indent=2)
+        os.replace(tmp_file, CONFIG_FILE)
+
+        _config_snapshot['config'] = dict(config)
+        _config_snapshot['mtime'] = os.stat(CONFIG_FILE).st_mtime_ns
     
     return config
 
@@ -0,0 +1,645 @@
+"""
+Background analysis queue for journal entries.
+Runs Mira's GPT analysis on a bounded worker pool so journal submissions
+return as soon as the entry is committed. While an analysis runs, its output
+is published to any streaming clients subscribed to the entry.
+"""
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from queue import Queue, Empty
+from threading import BoundedSemaphore, Lock
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Worker pool sizing - kept small so analysis never starves the web workers
+ANALYSIS_MAX_WORKERS = int(os.environ.get("ANALYSIS_MAX_WORKERS", 4))
+# Maximum number of entries waiting for or undergoing analysis in this process
+ANALYSIS_MAX_PENDING = int(os.environ.get("ANALYSIS_MAX_PENDING", 100))
+# Entries younger than this that are still unanalyzed are treated as in progress
+ANALYSIS_TIMEOUT_SECONDS = int(os.environ.get("ANALYSIS_TIMEOUT_SECONDS", 180))
+# After a coping statement fails to generate, the entry isn't retried for this long
+COPING_RETRY_SECONDS = int(os.environ.get("COPING_RETRY_SECONDS", 900))
+
+# Analysis states reported to the polling endpoint
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETE = "complete"
+STATUS_FAILED = "failed"
+STATUS_PENDING = "pending"
+STATUS_NOT_STARTED = "not_started"
+
+_executor = ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS, thread_name_prefix="journal-analysis")
+_pending_slots = BoundedSemaphore(ANALYSIS_MAX_PENDING)
+
+# Per-process status registry: entry_id -> {'status', 'error', 'updated_at'}
+_status: Dict[int, Dict[str, Any]] = {}
+_status_lock = Lock()
+
+# How long finished statuses are kept before being pruned
+_STATUS_RETENTION_SECONDS = 3600
+
+# Entry IDs with a coping statement job queued or running in this process
+_coping_inflight = set()
+
+# Entry ID -> time of its last failed coping statement generation in this process
+_coping_failed_at: Dict[int, float] = {}
+
+# Live output of queued/running analyses in this process, for streaming clients:
+# entry_id -> {'text': [completion text so far], 'subscribers': [Queue]}
+_live: Dict[int, Dict[str, Any]] = {}
+
+# Events delivered to streaming subscribers
+EVENT_DELTA = "delta"
+EVENT_DONE = "done"
+EVENT_FAILED = "failed"
+EVENT_PENDING = "pending"
+
+
+def _set_status(entry_id: int, status: str, error: Optional[str] = None) -> None:
+    """Record the analysis status for an entry and prune stale records."""
+    now = time.time()
+    with _status_lock:
+        _status[entry_id] = {'status': status, 'error': error, 'updated_at': now}
+
+        stale = [
+            key for key, value in _status.items()
+            if value['status'] in (STATUS_COMPLETE, STATUS_FAILED)
+            and now - value['updated_at'] > _STATUS_RETENTION_SECONDS
+        ]
+        for key in stale:
+            del _status[key]
+
+
+def _publish(entry_id: int, event: str, payload: Any = None) -> None:
+    """Send an event to the entry's streaming subscribers, if it has any."""
+    with _status_lock:
+        live = _live.get(entry_id)
+        if live is None:
+            return
+        if event == EVENT_DELTA:
+            live['text'].append(payload)
+        else:
+            # Replayed to subscribers who join while the job finishes up
+            live['final'] = (event, payload)
+        for subscriber in live['subscribers']:
+            subscriber.put((event, payload))
+
+
+def _subscribe(entry_id: int, subscriber: Queue) -> Optional[str]:
+    """
+    Attach a subscriber to a queued or running analysis.
+
+    Returns:
+        The completion text generated so far, or None if no analysis is live
+    """
+    with _status_lock:
+        live = _live.get(entry_id)
+        if live is None:
+            return None
+        live['subscribers'].append(subscriber)
+        if live.get('final'):
+            subscriber.put(live['final'])
+        return "".join(live['text'])
+
+
+def _unsubscribe(entry_id: int, subscriber: Queue) -> None:
+    with _status_lock:
+        live = _live.get(entry_id)
+        if live and subscriber in live['subscribers']:
+            live['subscribers'].remove(subscriber)
+
+
+def format_insight_html(gpt_response: str) -> str:
+    """
+    Format an unstructured GPT response into HTML sections for display.
+
+    Args:
+        gpt_response: Mira's full text response
+
+    Returns:
+        HTML string with one div per paragraph
+    """
+    if not gpt_response:
+        return gpt_response
+
+    paragraphs = gpt_response.split('\n\n')
+    formatted_paragraphs = []
+
+    for i, paragraph in enumerate(paragraphs):
+        if i == 0:
+            # First paragraph is usually the introduction/validation
+            formatted_paragraphs.append(f"<div class='validation-section mb-4'>{paragraph}</div>")
+        elif "pattern" in paragraph.lower() or "distortion" in paragraph.lower():
+            formatted_paragraphs.append(f"<div class='thought-patterns-section mb-4'><h5 class='mb-3'>Thought Patterns</h5>{paragraph}</div>")
+        elif "strateg" in paragraph.lower() or "technique" in paragraph.lower() or "exercise" in paragraph.lower():
+            formatted_paragraphs.append(f"<div class='strategies-section mb-4'><h5 class='mb-3'>Suggested Strategies</h5>{paragraph}</div>")
+        elif "reflect" in paragraph.lower() or "consider" in paragraph.lower() or "ask yourself" in paragraph.lower():
+            formatted_paragraphs.append(f"<div class='reflection-section mb-4'><h5 class='mb-3'>Reflection Prompts</h5>{paragraph}</div>")
+        elif i == len(paragraphs) - 1 and "warmly" in paragraph.lower():
+            formatted_paragraphs.append(f"<div class='closing-section mt-4'>{paragraph}</div>")
+        else:
+            formatted_paragraphs.append(f"<div class='paragraph mb-3'>{paragraph}</div>")
+
+    return "".join(formatted_paragraphs)
+
+
+def apply_analysis_result(entry, analysis_result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Apply a GPT analysis result to a journal entry.
+    Adds CBTRecommendation rows, fills in initial_insight and marks the entry analyzed.
+    The caller is responsible for committing the session.
+
+    Args:
+        entry: JournalEntry model instance
+        analysis_result: Dictionary returned by analyze_journal_with_gpt
+
+    Returns:
+        Dictionary with the normalized gpt_response, cbt_patterns, structured_data
+        and error flags
+    """
+    from app import db
+    from models import CBTRecommendation
+    from recommendation_handler import safe_process_pattern
+
+    # Safety check to make sure analysis_result is a dictionary
+    if not isinstance(analysis_result, dict):
+        logger.error(f"Invalid analysis result type: {type(analysis_result)}")
+        analysis_result = {
+            "gpt_response": "Thank you for sharing your journal entry. I've read through your thoughts.\n\nWarmly,\nCoach Mira",
+            "cbt_patterns": [{
+                "pattern": "Processing Issue",
+                "description": "We encountered a technical issue analyzing your entry.",
+                "recommendation": "Your journal has been saved successfully. The insights will be available soon."
+            }],
+            "structured_data": None
+        }
+
+    gpt_response = analysis_result.get("gpt_response")
+    cbt_patterns = analysis_result.get("cbt_patterns", [])
+    structured_data = analysis_result.get("structured_data", None)
+
+    if not gpt_response:
+        logger.warning("Missing GPT response in analysis result, providing fallback")
+        gpt_response = "Thank you for sharing your journal entry. I've read through your thoughts.\n\nWarmly,\nCoach Mira"
+
+    is_api_error = False
+    is_config_error = False
+
+    for pattern in cbt_patterns:
+        try:
+            pattern_name, recommendation_text = safe_process_pattern(pattern)
+
+            if pattern_name == "API Quota Exceeded":
+                is_api_error = True
+            elif pattern_name == "API Configuration Issue":
+                is_config_error = True
+
+            db.session.add(CBTRecommendation(
+                thought_pattern=pattern_name,
+                recommendation=recommendation_text,
+                journal_entry_id=entry.id
+            ))
+        except Exception as pattern_err:
+            logger.error(f"Error processing pattern for entry {entry.id}: {str(pattern_err)}")
+
+    entry.is_analyzed = True
+    # Audio of a previous insight no longer matches; it is regenerated after the commit
+    entry.insight_audio_url = None
+
+    # Set the conversational fields using structured data if available
+    if structured_data and isinstance(structured_data, dict):
+        if 'insight_text' in structured_data:
+            entry.initial_insight = structured_data.get('insight_text')
+        if 'reflection_prompt' in structured_data:
+            # Include the reflection prompt at the end of the initial insight
+            if entry.initial_insight:
+                entry.initial_insight += f"\n\n{structured_data.get('reflection_prompt')}"
+            else:
+                entry.initial_insight = structured_data.get('reflection_prompt')
+    else:
+        entry.initial_insight = format_insight_html(gpt_response)
+
+    return {
+        "gpt_response": gpt_response,
+        "cbt_patterns": cbt_patterns,
+        "structured_data": structured_data,
+        "is_api_error": is_api_error,
+        "is_config_error": is_config_error
+    }
+
+
+def run_analysis(entry_id: int, user_id: str) -> bool:
+    """
+    Analyze a journal entry and persist the results.
+    Must be called inside an application context.
+
+    Args:
+        entry_id: The journal entry ID
+        user_id: The ID of the user who owns the entry
+
+    Publishes EVENT_DONE to streaming clients once the analysis is saved.
+
+    Returns:
+        True if the entry was analyzed, False if it no longer exists
+    """
+    from app import db
+    from models import JournalEntry
+    from journal_service import analyze_journal_with_gpt, save_journal_entry, save_entry_features
+    from cache_service import invalidate_user_cache
+    from insight_audio import enqueue_entry_audio, KIND_INSIGHT
+    import gamification
+
+    entry = JournalEntry.query.get(entry_id)
+    if not entry or entry.user_id != user_id:
+        logger.warning(f"Journal entry {entry_id} for user {user_id} no longer exists, skipping analysis")
+        return False
+
+    if entry.is_analyzed:
+        logger.debug(f"Journal entry {entry_id} already analyzed, skipping")
+        _publish(entry_id, EVENT_DONE)
+        return True
+
+    # Store the entry's NLP features first so later history context never
+    # has to re-read this entry's text, even if the analysis below fails
+    try:
+        save_entry_features(entry)
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Error saving NLP features for journal entry {entry_id}: {str(e)}")
+        db.session.rollback()
+
+    try:
+        analysis_result = analyze_journal_with_gpt(
+            journal_text=entry.content,
+            anxiety_level=entry.anxiety_level,
+            user_id=user_id,
+            on_delta=lambda text: _publish(entry_id, EVENT_DELTA, text)
+        )
+        applied = apply_analysis_result(entry, analysis_result)
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Error analyzing journal entry {entry_id}: {str(e)}")
+        db.session.rollback()
+
+        # Record the failure in the JSON mirror so the entry view can offer a retry
+        try:
+            save_journal_entry(
+                entry_id=entry.id,
+                user_id=user_id,
+                title=entry.title,
+                content=entry.content,
+                anxiety_level=entry.anxiety_level,
+                created_at=entry.created_at,
+                updated_at=entry.updated_at,
+                is_analyzed=False,
+                gpt_response="Error occurred during analysis.",
+                cbt_patterns=[{
+                    "pattern": "Error analyzing entry",
+                    "description": "We couldn't analyze your journal entry at this time.",
+                    "recommendation": "Please try again later or contact support if the problem persists."
+                }],
+                structured_data=None
+            )
+        except Exception as mirror_error:
+            logger.error(f"Error mirroring failed analysis of journal entry {entry_id}: {str(mirror_error)}")
+        raise
+
+    # The analysis is committed, so a failed mirror write is only logged
+    try:
+        save_journal_entry(
+            entry_id=entry.id,
+            user_id=user_id,
+            title=entry.title,
+            content=entry.content,
+            anxiety_level=entry.anxiety_level,
+            created_at=entry.created_at,
+            updated_at=entry.updated_at,
+            is_analyzed=entry.is_analyzed,
+            gpt_response=applied["gpt_response"],
+            cbt_patterns=applied["cbt_patterns"],
+            structured_data=applied["structured_data"]
+        )
+    except Exception as mirror_error:
+        logger.error(f"Error mirroring analysis of journal entry {entry_id}: {str(mirror_error)}")
+        db.session.rollback()
+
+    # Streaming clients can show the saved insight now; the work below
+    # doesn't change it
+    _publish(entry_id, EVENT_DONE)
+
+    invalidate_user_cache(user_id)
+
+    # Pre-synthesize the insight so playback is a static file fetch
+    enqueue_entry_audio(entry_id, KIND_INSIGHT)
+
+    # Precompute the dashboard coping statement while we're off the request path
+    statement = None
+    try:
+        statement = refresh_coping_statement(entry)
+    except Exception as coping_error:
+        logger.error(f"Error precomputing coping statement for entry {entry_id}: {str(coping_error)}")
+        db.session.rollback()
+    _record_coping_result(entry_id, statement)
+
+    try:
+        gamification.award_xp(
+            user_id=user_id,
+            xp_amount=gamification.XP_REWARDS['analysis'],
+            reason="Received insights on journal entry"
+        )
+        db.session.commit()
+    except Exception as xp_error:
+        logger.error(f"Error awarding analysis XP for entry {entry_id}: {str(xp_error)}")
+        db.session.rollback()
+
+    try:
+        gamification.process_entry_analyzed(user_id)
+        db.session.commit()
+    except Exception as badge_error:
+        logger.error(f"Error processing analysis badges for entry {entry_id}: {str(badge_error)}")
+        db.session.rollback()
+
+    return True
+
+
+def refresh_coping_statement(entry) -> Optional[str]:
+    """
+    Generate and store the dashboard coping statement for a journal entry.
+    Must be called inside an application context.
+
+    Args:
+        entry: JournalEntry model instance
+
+    Returns:
+        The stored coping statement, or None if generation failed
+    """
+    from app import db
+    from openai_service import generate_coping_statement
+
+    # Use the full journal content if available, falling back to the title
+    if entry.content and len(entry.content.strip()) > 10:
+        context = entry.content
+    else:
+        context = entry.title or "anxiety management"
+
+    statement = generate_coping_statement(context)
+
+    # Only store statements that look valid; the fallback is never persisted
+    # so the entry is retried on the next dashboard view
+    if not statement or len(statement.strip()) <= 10 or statement.startswith("Mira suggests: Take a moment to breathe deeply."):
+        return None
+
+    entry.coping_statement = statement
+    db.session.commit()
+    return statement
+
+
+def _record_coping_result(entry_id: int, statement: Optional[str]) -> None:
+    """Remember failed generations so dashboard views don't retry them on every load."""
+    now = time.time()
+    with _status_lock:
+        if statement:
+            _coping_failed_at.pop(entry_id, None)
+            return
+        _coping_failed_at[entry_id] = now
+        expired = [key for key, failed_at in _coping_failed_at.items() if now - failed_at > COPING_RETRY_SECONDS]
+        for key in expired:
+            del _coping_failed_at[key]
+
+
+def _coping_worker(entry_id: int) -> None:
+    """Worker-thread entry point: compute one coping statement inside an app context."""
+    from app import app, db
+    from models import JournalEntry
+
+    try:
+        with app.app_context():
+            try:
+                entry = JournalEntry.query.get(entry_id)
+                if entry and not entry.coping_statement:
+                    _record_coping_result(entry_id, refresh_coping_statement(entry))
+            except Exception as e:
+                db.session.rollback()
+                _record_coping_result(entry_id, None)
+                logger.error(f"Background coping statement failed for journal entry {entry_id}: {str(e)}")
+            finally:
+                db.session.remove()
+    finally:
+        with _status_lock:
+            _coping_inflight.discard(entry_id)
+        _pending_slots.release()
+
+
+def enqueue_coping_statement(entry_id: int) -> bool:
+    """
+    Queue computation of the coping statement for an entry that doesn't have one yet.
+
+    Args:
+        entry_id: The journal entry ID
+
+    Returns:
+        True if a job is queued or already in flight, False if the queue is full
+        or the last attempt failed less than COPING_RETRY_SECONDS ago
+    """
+    with _status_lock:
+        if entry_id in _coping_inflight:
+            return True
+        failed_at = _coping_failed_at.get(entry_id)
+        if failed_at is not None and time.time() - failed_at < COPING_RETRY_SECONDS:
+            return False
+        current = _status.get(entry_id)
+        if current and current['status'] in (STATUS_QUEUED, STATUS_RUNNING):
+            # The analysis job computes the coping statement when it finishes
+            return True
+
+    if not _pending_slots.acquire(blocking=False):
+        return False
+
+    with _status_lock:
+        _coping_inflight.add(entry_id)
+    try:
+        _executor.submit(_coping_worker, entry_id)
+    except Exception as e:
+        with _status_lock:
+            _coping_inflight.discard(entry_id)
+        _pending_slots.release()
+        logger.error(f"Could not submit coping statement job for entry {entry_id}: {str(e)}")
+        return False
+
+    return True
+
+
+def _analysis_worker(entry_id: int, user_id: str) -> None:
+    """Worker-thread entry point: run one analysis inside an app context."""
+    from app import app, db
+
+    try:
+        with app.app_context():
+            _set_status(entry_id, STATUS_RUNNING)
+            try:
+                # run_analysis publishes EVENT_DONE itself, as soon as the insight is saved
+                if run_analysis(entry_id, user_id):
+                    _set_status(entry_id, STATUS_COMPLETE)
+                    logger.info(f"Background analysis completed for journal entry {entry_id}")
+                else:
+                    _set_status(entry_id, STATUS_FAILED, error="Journal entry no longer exists")
+                    _publish(entry_id, EVENT_FAILED)
+                    logger.warning(f"Background analysis skipped missing journal entry {entry_id}")
+            except Exception as e:
+                _set_status(entry_id, STATUS_FAILED, error=str(e))
+                _publish(entry_id, EVENT_FAILED, str(e))
+                logger.error(f"Background analysis failed for journal entry {entry_id}: {str(e)}")
+            finally:
+                db.session.remove()
+    finally:
+        with _status_lock:
+            _live.pop(entry_id, None)
+        _pending_slots.release()
+
+
+def enqueue_analysis(entry_id: int, user_id: str) -> bool:
+    """
+    Queue a journal entry for background analysis.
+
+    Args:
+        entry_id: The journal entry ID (must already be committed)
+        user_id: The ID of the user who owns the entry
+
+    Returns:
+        True if the entry was queued, False if the queue is full
+    """
+    with _status_lock:
+        current = _status.get(entry_id)
+        if current and current['status'] in (STATUS_QUEUED, STATUS_RUNNING):
+            logger.debug(f"Journal entry {entry_id} is already queued for analysis")
+            return True
+
+    if not _pending_slots.acquire(blocking=False):
+        logger.warning(f"Analysis queue full ({ANALYSIS_MAX_PENDING} pending), not queuing entry {entry_id}")
+        return False
+
+    _set_status(entry_id, STATUS_QUEUED)
+    with _status_lock:
+        _live[entry_id] = {'text': [], 'subscribers': []}
+    try:
+        _executor.submit(_analysis_worker, entry_id, user_id)
+    except Exception as e:
+        with _status_lock:
+            _live.pop(entry_id, None)
+        _pending_slots.release()
+        _set_status(entry_id, STATUS_FAILED, error=str(e))
+        logger.error(f"Could not submit journal entry {entry_id} for analysis: {str(e)}")
+        return False
+
+    logger.debug(f"Queued journal entry {entry_id} for background analysis")
+    return True
+
+
+def get_analysis_status(entry) -> Dict[str, Any]:
+    """
+    Get the analysis status for a journal entry.
+    The database is authoritative for completed analyses; the in-process
+    registry adds detail, and recently created entries are reported as
+    pending when another worker process holds the job.
+
+    Args:
+        entry: JournalEntry model instance
+
+    Returns:
+        Dictionary with 'status', 'ready' and optional 'error'
+    """
+    if entry.is_analyzed:
+        return {'status': STATUS_COMPLETE, 'ready': True, 'error': None}
+
+    with _status_lock:
+        current = _status.get(entry.id)
+
+    if current:
+        return {'status': current['status'], 'ready': current['status'] == STATUS_COMPLETE,
+                'error': current.get('error')}
+
+    created_at = entry.created_at or datetime.utcnow()
+    if datetime.utcnow() - created_at < timedelta(seconds=ANALYSIS_TIMEOUT_SECONDS):
+        return {'status': STATUS_PENDING, 'ready': False, 'error': None}
+
+    return {'status': STATUS_NOT_STARTED, 'ready': False, 'error': None}
+
+
+def is_analysis_in_progress(entry) -> bool:
+    """Return True if the entry is queued, running or awaiting another worker."""
+    return get_analysis_status(entry)['status'] in (STATUS_QUEUED, STATUS_RUNNING, STATUS_PENDING)
+
+
+def stream_analysis(entry_id: int, user_id: str, status: str) -> Iterator[Tuple[str, Any]]:
+    """
+    Follow the analysis of an entry as it is generated, queuing it if needed.
+
+    Yields (EVENT_DELTA, text) for each piece of the raw JSON completion
+    (starting with everything generated before the subscription), then ends
+    with (EVENT_DONE, None) once the result is saved or (EVENT_FAILED, error).
+    Yields a single (EVENT_PENDING, None) when another worker process holds the
+    job, whose output can't be followed from here.
+
+    Args:
+        entry_id: The journal entry ID
+        user_id: The ID of the user who owns the entry
+        status: The entry's current status from get_analysis_status
+
+    Returns:
+        Iterator of (event, payload) tuples
+    """
+    if status == STATUS_COMPLETE:
+        yield EVENT_DONE, None
+        return
+
+    subscriber: Queue = Queue()
+    text_so_far = _subscribe(entry_id, subscriber)
+    if text_so_far is None:
+        if status == STATUS_PENDING:
+            yield EVENT_PENDING, None
+            return
+        if not enqueue_analysis(entry_id, user_id):
+            yield EVENT_FAILED, "The analysis queue is full"
+            return
+        text_so_far = _subscribe(entry_id, subscriber)
+        if text_so_far is None:
+            # The job finished between queuing and subscribing
+            with _status_lock:
+                finished = _status.get(entry_id, {}).get('status')
+            yield (EVENT_DONE, None) if finished == STATUS_COMPLETE else (EVENT_FAILED, None)
+            return
+
+    try:
+        if text_so_far:
+            yield EVENT_DELTA, text_so_far
+
+        deadline = time.time() + ANALYSIS_TIMEOUT_SECONDS
+        while True:
+            try:
+                event, payload = subscriber.get(timeout=max(0.0, deadline - time.time()))
+            except Empty:
+                yield EVENT_FAILED, "Timed out waiting for the analysis"
+                return
+            yield event, payload
+            if event in (EVENT_DONE, EVENT_FAILED):
+                return
+    finally:
+        _unsubscribe(entry_id, subscriber)
+
+
+def get_queue_stats() -> Dict[str, Any]:
+    """Get counts of entries by analysis status in this process."""
+    with _status_lock:
+        counts: Dict[str, int] = {}
+        for value in _status.values():
+            counts[value['status']] = counts.get(value['status'], 0) + 1
+
+    return {
+        'max_workers': ANALYSIS_MAX_WORKERS,
+        'max_pending': ANALYSIS_MAX_PENDING,
+        'status_counts': counts
+    }
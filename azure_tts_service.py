@@ -3,11 +3,10 @@ Azure Text-to-Speech service with premium neural voices.
 This module uses Microsoft Azure Cognitive Services for high-quality natural speech synthesis.
 """
 import os
-import uuid
 import logging
 import azure.cognitiveservices.speech as speechsdk
 from flask import Blueprint, request, jsonify, send_file, current_app
-import tempfile
+from tts_cache import get_audio, static_filename
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -91,6 +90,9 @@ VOICE_STYLES = {
     }
 }
 
+class AzureSynthesisError(Exception):
+    """Raised when Azure reports that a synthesis was canceled or failed"""
+
 def ensure_audio_directory():
     """Ensure the audio directory exists"""
     audio_dir = os.path.join('static', 'audio')
@@ -193,21 +195,16 @@ def azure_tts():
             logger.error("Azure Speech credentials not configured")
             return jsonify({"error": "Azure Speech service not configured"}), 500
 
-        # Generate unique filename
-        filename = f"{uuid.uuid4()}.mp3"
-        filepath = os.path.join('static', 'audio', filename)
-        
         # Generate SSML with voice and style
         ssml = generate_ssml(text, voice_name, style_value)
         
-        # Configure speech synthesizer
-        speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
-        speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Audio16Khz32KBitRateMonoMp3)
-        
-        # Create a temporary file to save the audio
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_file:
-            # Configure audio output to file
-            file_config = speechsdk.audio.AudioOutputConfig(filename=temp_file.name)
+        def synthesize(filepath):
+            # Configure speech synthesizer
+            speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
+            speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Audio16Khz32KBitRateMonoMp3)
+            
+            # Configure audio output to the cache's file
+            file_config = speechsdk.audio.AudioOutputConfig(filename=filepath)
             
             # Create the speech synthesizer
             speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=file_config)
@@ -218,25 +215,27 @@ def azure_tts():
             # Check if synthesis was successful
             if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
                 logger.info(f"Speech synthesized for {len(text)} chars using {voice_name}")
-                
-                # Copy from temp file to static directory
-                import shutil
-                shutil.copy(temp_file.name, filepath)
-                
-                # Return the audio URL
-                return jsonify({
-                    "audio_url": f"/static/audio/{filename}",
-                    "voice_type": voice_type,
-                    "style": style
-                })
             elif result.reason == speechsdk.ResultReason.Canceled:
                 cancellation_details = result.cancellation_details
                 logger.error(f"Speech synthesis canceled: {cancellation_details.reason}")
                 logger.error(f"Error details: {cancellation_details.error_details}")
-                return jsonify({"error": f"Azure TTS error: {cancellation_details.error_details}"}), 500
+                raise AzureSynthesisError(f"Azure TTS error: {cancellation_details.error_details}")
             else:
                 logger.error(f"Speech synthesis failed with reason: {result.reason}")
-                return jsonify({"error": "Speech synthesis failed"}), 500
+                raise AzureSynthesisError("Speech synthesis failed")
+        
+        try:
+            # Replays of the same text, voice and style are served from the audio cache
+            filepath = get_audio("azure", voice_name, style_value, ssml, synthesize)
+        except AzureSynthesisError as e:
+            return jsonify({"error": str(e)}), 500
+        
+        # Return the audio URL
+        return jsonify({
+            "audio_url": f"/static/{static_filename(filepath)}",
+            "voice_type": voice_type,
+            "style": style
+        })
             
     except Exception as e:
         logger.error(f"Error in Azure TTS: {str(e)}")
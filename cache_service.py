@@ -3,28 +3,82 @@ Smart Caching Service for Journal Entries
 Provides fast retrieval and intelligent caching mechanisms.
 """
 import logging
+import os
+import sys
 import time
+import heapq
+from collections import OrderedDict
+from threading import RLock
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Set, Tuple
 from functools import wraps
 import hashlib
 import json
+import sqlite3
+
+try:
+    import redis
+except ImportError:
+    redis = None
 
 logger = logging.getLogger(__name__)
 
-class JournalCache:
+# Cache backend: "shared" (node-local SQLite shared by all workers), "memory"
+# (per process) or "redis" (needs the redis package and REDIS_URL)
+JOURNAL_CACHE_BACKEND = os.environ.get("JOURNAL_CACHE_BACKEND", "shared").lower()
+JOURNAL_CACHE_PATH = os.environ.get(
+    "JOURNAL_CACHE_PATH",
+    # /dev/shm is memory-backed, so the shared cache never touches disk
+    "/dev/shm/dearteddy_journal_cache.sqlite3" if os.path.isdir("/dev/shm")
+    else os.path.join("data", "cache", "journal_cache.sqlite3")
+)
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+# Cache budget (per process for "memory", per node for "shared")
+JOURNAL_CACHE_MAX_ENTRIES = int(os.environ.get("JOURNAL_CACHE_MAX_ENTRIES", 2000))
+JOURNAL_CACHE_MAX_BYTES = int(os.environ.get("JOURNAL_CACHE_MAX_BYTES", 32 * 1024 * 1024))  # 32 MB
+
+# Number of recent entries preload_user_data keeps per user
+PRELOAD_ENTRY_LIMIT = 20
+
+
+def _deep_sizeof(obj: Any, seen: Optional[Set[int]] = None) -> int:
+    """Approximate memory used by a cached value, following containers."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        size += _deep_sizeof(vars(obj), seen)
+    return size
+
+
+class _CacheItem:
+    __slots__ = ('data', 'expires_at', 'size', 'user_id', 'hits')
+
+    def __init__(self, data: Any, expires_at: float, size: int, user_id: Optional[str]):
+        self.data = data
+        self.expires_at = expires_at
+        self.size = size
+        self.user_id = user_id
+        self.hits = 0
+
+
+class CacheBackend:
     """
-    Smart caching system for journal entries with automatic expiration
-    and intelligent invalidation strategies.
+    Interface shared by the cache backends. Values stored for a user are
+    tagged with their user_id so invalidate_user_entries can drop them.
     """
-    
-    def __init__(self, default_ttl: int = 300):  # 5 minutes default TTL
-        self.cache: Dict[str, Dict[str, Any]] = {}
-        self.default_ttl = default_ttl
-        self.access_counts: Dict[str, int] = {}
-        self.last_access: Dict[str, float] = {}
-        self.user_caches: Dict[str, Dict[str, Any]] = {}
-        
+
+    default_ttl = 300
+
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
         """Generate a consistent cache key from parameters."""
         key_data = f"{prefix}:{':'.join(map(str, args))}"
@@ -32,77 +86,623 @@ class JournalCache:
             sorted_kwargs = sorted(kwargs.items())
             key_data += f":{':'.join(f'{k}={v}' for k, v in sorted_kwargs)}"
         return hashlib.md5(key_data.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def get_user_version(self, user_id: str) -> int:
+        """
+        Current invalidation version of a user's entries. Read it before
+        loading the data to cache and pass it to set, so a value loaded
+        before an invalidation is not stored after it.
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, data: Any, ttl: Optional[int] = None, user_id: Optional[str] = None,
+            version: Optional[int] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def invalidate_user_entries(self, user_id: str) -> None:
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class JournalCache(CacheBackend):
+    """
+    Smart caching system for journal entries with automatic expiration
+    and intelligent invalidation strategies.
+
+    Entries are kept in least-recently-used order within an entry and byte
+    budget, so eviction is O(1). Expired entries are dropped lazily from a
+    min-heap of expiry times instead of sweeping the whole cache, and keys
+    stored for a user are indexed so invalidating that user is O(user's keys).
+    All operations are guarded by a lock, as gunicorn threads share the cache.
+    """
     
-    def _is_expired(self, cache_entry: Dict[str, Any]) -> bool:
-        """Check if a cache entry has expired."""
-        return time.time() > cache_entry['expires_at']
+    def __init__(self, default_ttl: int = 300, max_entries: int = JOURNAL_CACHE_MAX_ENTRIES,
+                 max_bytes: int = JOURNAL_CACHE_MAX_BYTES):  # 5 minutes default TTL
+        self.cache: "OrderedDict[str, _CacheItem]" = OrderedDict()
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.user_keys: Dict[str, Set[str]] = {}
+        self.user_versions: Dict[str, int] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._lock = RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        
+    def _remove(self, key: str) -> Optional[_CacheItem]:
+        """Drop a key and its accounting. Caller holds the lock."""
+        item = self.cache.pop(key, None)
+        if item is None:
+            return None
+        self.current_bytes -= item.size
+        if item.user_id is not None:
+            keys = self.user_keys.get(item.user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.user_keys[item.user_id]
+        return item
     
-    def _cleanup_expired(self):
-        """Remove expired entries from cache."""
-        current_time = time.time()
-        expired_keys = [
-            key for key, entry in self.cache.items()
-            if current_time > entry['expires_at']
-        ]
-        for key in expired_keys:
-            del self.cache[key]
-            self.access_counts.pop(key, None)
-            self.last_access.pop(key, None)
+    def _expire_due(self, now: float) -> None:
+        """Pop heap entries that are due. Heap entries for replaced or deleted keys are skipped."""
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            item = self.cache.get(key)
+            if item is not None and item.expires_at == expires_at:
+                self._remove(key)
+                self.expirations += 1
+
+        # Overwrites leave stale heap entries behind; rebuild once they dominate
+        if len(heap) > 2 * len(self.cache) + 64:
+            self._expiry_heap = [(item.expires_at, key) for key, item in self.cache.items()]
+            heapq.heapify(self._expiry_heap)
     
     def get(self, key: str) -> Optional[Any]:
         """Get item from cache if not expired."""
-        self._cleanup_expired()
-        
-        if key in self.cache and not self._is_expired(self.cache[key]):
-            self.access_counts[key] = self.access_counts.get(key, 0) + 1
-            self.last_access[key] = time.time()
-            return self.cache[key]['data']
-        
-        return None
+        now = time.time()
+        with self._lock:
+            item = self.cache.get(key)
+            if item is None or item.expires_at <= now:
+                if item is not None:
+                    self._remove(key)
+                    self.expirations += 1
+                self.misses += 1
+                self._expire_due(now)
+                return None
+
+            self.cache.move_to_end(key)
+            item.hits += 1
+            self.hits += 1
+            return item.data
+    
+    def get_user_version(self, user_id: str) -> int:
+        """Current invalidation version of a user's entries."""
+        with self._lock:
+            return self.user_versions.get(str(user_id), 0)
     
-    def set(self, key: str, data: Any, ttl: Optional[int] = None) -> None:
-        """Set item in cache with TTL."""
+    def set(self, key: str, data: Any, ttl: Optional[int] = None, user_id: Optional[str] = None,
+            version: Optional[int] = None) -> None:
+        """
+        Set item in cache with TTL.
+
+        Args:
+            key: Cache key
+            data: Value to cache
+            ttl: Time to live in seconds (defaults to the cache's default TTL)
+            user_id: Owner of the value, so invalidate_user_entries can find it
+            version: The user's version from get_user_version, read before the
+                value was loaded; the value is dropped if the user has been
+                invalidated since
+        """
         if ttl is None:
             ttl = self.default_ttl
         
-        self.cache[key] = {
-            'data': data,
-            'created_at': time.time(),
-            'expires_at': time.time() + ttl,
-            'ttl': ttl
-        }
-        self.access_counts[key] = 0
-        self.last_access[key] = time.time()
+        size = _deep_sizeof(data) + sys.getsizeof(key)
+        now = time.time()
+        owner = str(user_id) if user_id is not None else None
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                logger.debug(f"Not caching {key}: {size} bytes exceeds the cache budget")
+                return
+            if owner is not None and version is not None and version != self.user_versions.get(owner, 0):
+                logger.debug(f"Not caching {key}: user {owner} was invalidated while it was loaded")
+                return
+
+            item = _CacheItem(data, now + ttl, size, owner)
+            self.cache[key] = item
+            self.current_bytes += size
+            if owner is not None:
+                self.user_keys.setdefault(owner, set()).add(key)
+            heapq.heappush(self._expiry_heap, (item.expires_at, key))
+
+            self._expire_due(now)
+            while self.cache and (len(self.cache) > self.max_entries or self.current_bytes > self.max_bytes):
+                oldest_key = next(iter(self.cache))
+                self._remove(oldest_key)
+                self.evictions += 1
     
     def delete(self, key: str) -> None:
         """Remove item from cache."""
-        self.cache.pop(key, None)
-        self.access_counts.pop(key, None)
-        self.last_access.pop(key, None)
+        with self._lock:
+            self._remove(key)
     
     def invalidate_user_entries(self, user_id: str) -> None:
         """Invalidate all cached entries for a specific user."""
-        keys_to_delete = [
-            key for key in self.cache.keys()
-            if f"user:{user_id}" in key
-        ]
-        for key in keys_to_delete:
-            self.delete(key)
+        with self._lock:
+            owner = str(user_id)
+            self.user_versions[owner] = self.user_versions.get(owner, 0) + 1
+            for key in list(self.user_keys.get(owner, ())):
+                self._remove(key)
     
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics."""
-        total_entries = len(self.cache)
-        total_accesses = sum(self.access_counts.values())
-        
-        return {
-            'total_entries': total_entries,
-            'total_accesses': total_accesses,
-            'avg_accesses_per_entry': total_accesses / max(total_entries, 1),
-            'cache_size_mb': len(str(self.cache)) / (1024 * 1024)
-        }
+        with self._lock:
+            total_entries = len(self.cache)
+            total_accesses = sum(item.hits for item in self.cache.values())
+            lookups = self.hits + self.misses
+            
+            return {
+                'backend': 'memory',
+                'total_entries': total_entries,
+                'total_accesses': total_accesses,
+                'avg_accesses_per_entry': total_accesses / max(total_entries, 1),
+                'cache_size_mb': self.current_bytes / (1024 * 1024),
+                'max_entries': self.max_entries,
+                'max_size_mb': self.max_bytes / (1024 * 1024),
+                'users_cached': len(self.user_keys),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+class SharedCache(CacheBackend):
+    """
+    Cache shared by every worker process on the node, stored in a SQLite
+    database (on /dev/shm by default, so it lives in shared memory). The file
+    is created readable and writable by its owner only.
+
+    Each user has a version number; entries remember the version they were
+    written under and are ignored once the user's version moves on, so an
+    invalidation in one worker is seen by all of them immediately. Values
+    must be JSON-serializable.
+
+    The entry count and total size are kept in a one-row meta table by
+    triggers, so writes check the budget without scanning the entries, and
+    eviction deletes the oldest rows through the last_access index.
+    """
+
+    # Reads only refresh an entry's LRU timestamp this often, to keep
+    # cache hits from turning into writes
+    TOUCH_INTERVAL = 30
+
+    # Most rows removed by one eviction statement
+    EVICT_BATCH = 500
+
+    _SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            user_id TEXT,
+            version INTEGER NOT NULL DEFAULT 0,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_versions (
+            user_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            entry_count INTEGER NOT NULL,
+            total_size INTEGER NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_entries_user_id ON entries (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_entries_last_access ON entries (last_access)",
+        "CREATE INDEX IF NOT EXISTS ix_entries_expires_at ON entries (expires_at)",
+        # Seeds the totals for a cache file written before the meta table existed
+        """
+        INSERT OR IGNORE INTO meta (id, entry_count, total_size)
+        SELECT 1, COUNT(*), COALESCE(SUM(size), 0) FROM entries
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS entries_after_insert AFTER INSERT ON entries BEGIN
+            UPDATE meta SET entry_count = entry_count + 1, total_size = total_size + NEW.size WHERE id = 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS entries_after_delete AFTER DELETE ON entries BEGIN
+            UPDATE meta SET entry_count = entry_count - 1, total_size = total_size - OLD.size WHERE id = 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS entries_after_update AFTER UPDATE OF size ON entries BEGIN
+            UPDATE meta SET total_size = total_size + NEW.size - OLD.size WHERE id = 1;
+        END
+        """,
+    )
+
+    def __init__(self, path: str = JOURNAL_CACHE_PATH, default_ttl: int = 300,
+                 max_entries: int = JOURNAL_CACHE_MAX_ENTRIES, max_bytes: int = JOURNAL_CACHE_MAX_BYTES):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+        # Fail here, so create_journal_cache can fall back, if the file can't be made private
+        self._prepare_file()
+
+    def _prepare_file(self) -> None:
+        """
+        Create the database file with 0600 permissions before SQLite opens it
+        (its -wal and -shm files copy them), refusing a file or symlink that
+        another user planted at the path.
+        """
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600)
+        try:
+            if hasattr(os, "getuid") and os.fstat(fd).st_uid != os.getuid():
+                raise PermissionError(f"Shared cache file {self.path} is owned by another user")
+            os.fchmod(fd, 0o600)
+        finally:
+            os.close(fd)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database lazily, and again after a fork."""
+        if self._conn is None or self._pid != os.getpid():
+            self._prepare_file()
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            # Workers starting together must not write entries between the
+            # meta table being seeded and its triggers existing
+            conn.execute("BEGIN IMMEDIATE")
+            for statement in self._SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get item from cache if not expired and not invalidated."""
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT e.value, e.expires_at, e.version, COALESCE(v.version, 0), e.last_access "
+                    "FROM entries e LEFT JOIN user_versions v ON v.user_id = e.user_id "
+                    "WHERE e.key = ?", (key,)
+                ).fetchone()
+
+                if row is None:
+                    self.misses += 1
+                    return None
+
+                value, expires_at, version, current_version, last_access = row
+                if expires_at <= now or version != current_version:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    conn.commit()
+                    self.misses += 1
+                    return None
+
+                if now - last_access > self.TOUCH_INTERVAL:
+                    conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+                    conn.commit()
+                self.hits += 1
+                return json.loads(value)
+            except (sqlite3.Error, OSError, ValueError) as e:
+                logger.error(f"Shared cache read failed: {str(e)}")
+                self.misses += 1
+                return None
+
+    def get_user_version(self, user_id: str) -> int:
+        """Current invalidation version of a user's entries, as seen by every worker."""
+        with self._lock:
+            try:
+                row = self._connect().execute(
+                    "SELECT version FROM user_versions WHERE user_id = ?", (str(user_id),)
+                ).fetchone()
+                return row[0] if row else 0
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"Shared cache version read failed: {str(e)}")
+                return 0
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> int:
+        """Remove expired rows, then the least recently used ones, until within budget."""
+        removed = conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+        while True:
+            count, total_size = conn.execute(
+                "SELECT entry_count, total_size FROM meta WHERE id = 1"
+            ).fetchone()
+            if count <= self.max_entries and total_size <= self.max_bytes:
+                return removed
+            # Enough rows for the count, and for the bytes at the average row size
+            excess = count - self.max_entries
+            if total_size > self.max_bytes and count:
+                average = max(total_size // count, 1)
+                excess = max(excess, -(-(total_size - self.max_bytes) // average))
+            limit = min(max(excess, 1), self.EVICT_BATCH)
+            deleted = conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY last_access ASC LIMIT ?)", (limit,)
+            ).rowcount
+            if deleted == 0:
+                return removed
+            removed += deleted
+
+    def set(self, key: str, data: Any, ttl: Optional[int] = None, user_id: Optional[str] = None,
+            version: Optional[int] = None) -> None:
+        """
+        Set item in cache with TTL, evicting expired then least-recently-used rows if over budget.
+
+        Pass the version read with get_user_version before loading the data;
+        the value is dropped if the user has been invalidated since.
+        """
+        if ttl is None:
+            ttl = self.default_ttl
+        try:
+            value = json.dumps(data)
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Not caching {key}: value is not JSON-serializable ({str(e)})")
+            return
+        if len(value) > self.max_bytes:
+            return
+
+        now = time.time()
+        owner = str(user_id) if user_id is not None else None
+        with self._lock:
+            try:
+                conn = self._connect()
+                current_version = 0
+                if owner is not None:
+                    row = conn.execute(
+                        "SELECT version FROM user_versions WHERE user_id = ?", (owner,)
+                    ).fetchone()
+                    current_version = row[0] if row else 0
+                    if version is not None and version != current_version:
+                        logger.debug(f"Not caching {key}: user {owner} was invalidated while it was loaded")
+                        return
+
+                conn.execute(
+                    "INSERT INTO entries (key, user_id, version, value, size, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET user_id = excluded.user_id, version = excluded.version, "
+                    "value = excluded.value, size = excluded.size, expires_at = excluded.expires_at, "
+                    "last_access = excluded.last_access",
+                    (key, owner, current_version, value, len(value), now + ttl, now)
+                )
+
+                count, total_size = conn.execute(
+                    "SELECT entry_count, total_size FROM meta WHERE id = 1"
+                ).fetchone()
+                if count > self.max_entries or total_size > self.max_bytes:
+                    self.evictions += self._evict(conn, now)
+                conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"Shared cache write failed: {str(e)}")
+
+    def delete(self, key: str) -> None:
+        """Remove item from cache."""
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"Shared cache delete failed: {str(e)}")
+
+    def invalidate_user_entries(self, user_id: str) -> None:
+        """Bump the user's version (seen by every worker) and drop their entries."""
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT INTO user_versions (user_id, version) VALUES (?, 1) "
+                    "ON CONFLICT(user_id) DO UPDATE SET version = version + 1",
+                    (str(user_id),)
+                )
+                conn.execute("DELETE FROM entries WHERE user_id = ?", (str(user_id),))
+                conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"Shared cache invalidation failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics (hit counters are for this process)."""
+        with self._lock:
+            total_entries, total_size, users = 0, 0, 0
+            try:
+                conn = self._connect()
+                total_entries, total_size = conn.execute(
+                    "SELECT entry_count, total_size FROM meta WHERE id = 1"
+                ).fetchone()
+                users = conn.execute(
+                    "SELECT COUNT(DISTINCT user_id) FROM entries"
+                ).fetchone()[0]
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"Shared cache stats failed: {str(e)}")
+
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'shared',
+                'total_entries': total_entries,
+                'cache_size_mb': total_size / (1024 * 1024),
+                'max_entries': self.max_entries,
+                'max_size_mb': self.max_bytes / (1024 * 1024),
+                'users_cached': users,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache stored in Redis, shared across workers and nodes. Memory limits
+    and eviction are left to the server's maxmemory policy.
+
+    Per-user invalidation increments a version counter, which every reader
+    checks, so no key scan is needed. Any client exposing get/set/incr/delete
+    with redis-py semantics can be passed in (e.g. a local stand-in in tests).
+    """
+
+    def __init__(self, client: Any = None, url: str = REDIS_URL, default_ttl: int = 300,
+                 prefix: str = "dearteddy:cache:"):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("The redis package is not installed")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._lock = RLock()
+
+    def _version_key(self, user_id: str) -> str:
+        return f"{self.prefix}user_version:{user_id}"
+
+    def _user_version(self, user_id: str) -> int:
+        version = self.client.get(self._version_key(user_id))
+        return int(version) if version is not None else 0
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get item from cache if present and not invalidated."""
+        try:
+            raw = self.client.get(self.prefix + key)
+            if raw is None:
+                self._count(False)
+                return None
+
+            payload = json.loads(raw)
+            user_id = payload.get('u')
+            if user_id is not None and payload.get('v') != self._user_version(user_id):
+                self.client.delete(self.prefix + key)
+                self._count(False)
+                return None
+
+            self._count(True)
+            return payload.get('d')
+        except Exception as e:
+            logger.error(f"Redis cache read failed: {str(e)}")
+            self._count(False)
+            return None
+
+    def get_user_version(self, user_id: str) -> int:
+        """Current invalidation version of a user's entries, as seen by every worker."""
+        try:
+            return self._user_version(str(user_id))
+        except Exception as e:
+            logger.error(f"Redis cache version read failed: {str(e)}")
+            return 0
+
+    def set(self, key: str, data: Any, ttl: Optional[int] = None, user_id: Optional[str] = None,
+            version: Optional[int] = None) -> None:
+        """
+        Set item in cache with TTL.
+
+        The value is stored under the version passed in (read with
+        get_user_version before loading the data), so a value loaded before
+        an invalidation is a miss afterwards.
+        """
+        if ttl is None:
+            ttl = self.default_ttl
+        try:
+            owner = str(user_id) if user_id is not None else None
+            if owner is not None and version is None:
+                version = self._user_version(owner)
+            payload = {
+                'u': owner,
+                'v': version if owner is not None else 0,
+                'd': data
+            }
+            self.client.set(self.prefix + key, json.dumps(payload), ex=int(ttl))
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Not caching {key}: value is not JSON-serializable ({str(e)})")
+        except Exception as e:
+            logger.error(f"Redis cache write failed: {str(e)}")
+
+    def delete(self, key: str) -> None:
+        """Remove item from cache."""
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception as e:
+            logger.error(f"Redis cache delete failed: {str(e)}")
+
+    def invalidate_user_entries(self, user_id: str) -> None:
+        """Bump the user's version; their existing entries become misses everywhere."""
+        try:
+            self.client.incr(self._version_key(str(user_id)))
+        except Exception as e:
+            logger.error(f"Redis cache invalidation failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics (hit counters are for this process)."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'redis',
+                'total_entries': None,
+                'users_cached': None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+def create_journal_cache(backend: str = JOURNAL_CACHE_BACKEND, default_ttl: int = 600) -> CacheBackend:
+    """
+    Create the configured cache backend, falling back to the per-process
+    cache if the shared one can't be used.
+    """
+    try:
+        if backend == "redis":
+            return RedisCache(default_ttl=default_ttl)
+        if backend == "shared":
+            return SharedCache(default_ttl=default_ttl)
+    except Exception as e:
+        logger.error(f"Could not create {backend} journal cache, using in-process cache: {str(e)}")
+    return JournalCache(default_ttl=default_ttl)
 
 # Global cache instance
-journal_cache = JournalCache(default_ttl=600)  # 10 minutes
+journal_cache = create_journal_cache(default_ttl=600)  # 10 minutes
 
 def cached_query(cache_key_prefix: str, ttl: int = 300):
     """
@@ -135,20 +735,26 @@ def cached_query(cache_key_prefix: str, ttl: int = 300):
         return wrapper
     return decorator
 
-def cache_user_entries(user_id: str, entries: List[Any], ttl: int = 300) -> None:
-    """Cache user's journal entries."""
+def get_user_cache_version(user_id: str) -> int:
+    """Read before loading a user's data, and pass to the cache_* helpers with it."""
+    return journal_cache.get_user_version(user_id)
+
+def cache_user_entries(user_id: str, entries: List[Any], ttl: int = 300,
+                       version: Optional[int] = None) -> None:
+    """Cache user's journal entries (version from get_user_cache_version, read before loading them)."""
     cache_key = journal_cache._generate_key("user_entries", user_id)
-    journal_cache.set(cache_key, entries, ttl)
+    journal_cache.set(cache_key, entries, ttl, user_id=user_id, version=version)
 
 def get_cached_user_entries(user_id: str) -> Optional[List[Any]]:
     """Get cached user journal entries."""
     cache_key = journal_cache._generate_key("user_entries", user_id)
     return journal_cache.get(cache_key)
 
-def cache_entry_details(entry_id: str, entry_data: Dict[str, Any], ttl: int = 600) -> None:
-    """Cache detailed journal entry data."""
+def cache_entry_details(entry_id: str, entry_data: Dict[str, Any], ttl: int = 600,
+                        user_id: Optional[str] = None, version: Optional[int] = None) -> None:
+    """Cache detailed journal entry data (pass user_id so it is dropped with the user's cache)."""
     cache_key = journal_cache._generate_key("entry_details", entry_id)
-    journal_cache.set(cache_key, entry_data, ttl)
+    journal_cache.set(cache_key, entry_data, ttl, user_id=user_id, version=version)
 
 def get_cached_entry_details(entry_id: str) -> Optional[Dict[str, Any]]:
     """Get cached journal entry details."""
@@ -160,10 +766,11 @@ def invalidate_user_cache(user_id: str) -> None:
     journal_cache.invalidate_user_entries(user_id)
     logger.info(f"Invalidated cache for user: {user_id}")
 
-def cache_user_stats(user_id: str, stats: Dict[str, Any], ttl: int = 900) -> None:
+def cache_user_stats(user_id: str, stats: Dict[str, Any], ttl: int = 900,
+                     version: Optional[int] = None) -> None:
     """Cache user statistics (15 minutes TTL)."""
     cache_key = journal_cache._generate_key("user_stats", user_id)
-    journal_cache.set(cache_key, stats, ttl)
+    journal_cache.set(cache_key, stats, ttl, user_id=user_id, version=version)
 
 def get_cached_user_stats(user_id: str) -> Optional[Dict[str, Any]]:
     """Get cached user statistics."""
@@ -178,8 +785,8 @@ def preload_user_data(user_id: str, force_refresh: bool = False) -> None:
         user_id: The user ID to preload data for
         force_refresh: Whether to force refresh cached data
     """
-    from models import JournalEntry, User
-    from sqlalchemy.orm import joinedload
+    from models import JournalEntry
+    from sqlalchemy.orm import load_only
     
     if force_refresh:
         invalidate_user_cache(user_id)
@@ -188,15 +795,25 @@ def preload_user_data(user_id: str, force_refresh: bool = False) -> None:
     if not force_refresh and get_cached_user_entries(user_id) is not None:
         return
     
+    # Captured before the query, so an entry saved while it runs isn't hidden by a stale cache
+    version = get_user_cache_version(user_id)
+    
     try:
         # Preload recent entries with optimized query
         recent_entries = JournalEntry.query.options(
-            joinedload(JournalEntry.author)
+            load_only(
+                JournalEntry.id,
+                JournalEntry.title,
+                JournalEntry.content,
+                JournalEntry.anxiety_level,
+                JournalEntry.created_at,
+                JournalEntry.is_analyzed
+            )
         ).filter(
             JournalEntry.user_id == user_id
         ).order_by(
             JournalEntry.created_at.desc()
-        ).limit(20).all()
+        ).limit(PRELOAD_ENTRY_LIMIT).all()
         
         # Cache the entries
         entry_data = []
@@ -207,15 +824,14 @@ def preload_user_data(user_id: str, force_refresh: bool = False) -> None:
                 'content': entry.content,
                 'anxiety_level': entry.anxiety_level,
                 'created_at': entry.created_at.isoformat() if entry.created_at else None,
-                'is_analyzed': entry.is_analyzed,
-                'coach_response': entry.coach_response
+                'is_analyzed': entry.is_analyzed
             }
             entry_data.append(entry_dict)
             
             # Also cache individual entry details
-            cache_entry_details(str(entry.id), entry_dict)
+            cache_entry_details(str(entry.id), entry_dict, user_id=user_id, version=version)
         
-        cache_user_entries(user_id, entry_data)
+        cache_user_entries(user_id, entry_data, version=version)
         logger.info(f"Preloaded {len(entry_data)} entries for user {user_id}")
         
     except Exception as e:
@@ -223,11 +839,9 @@ def preload_user_data(user_id: str, force_refresh: bool = False) -> None:
 
 def get_cache_status() -> Dict[str, Any]:
     """Get overall cache status and statistics."""
+    stats = journal_cache.get_stats()
     return {
-        'cache_stats': journal_cache.get_stats(),
-        'active_entries': len(journal_cache.cache),
-        'total_users_cached': len(set(
-            key.split(':')[1] for key in journal_cache.cache.keys()
-            if key.startswith('user_entries:')
-        ))
-    }
\ No newline at end of file
+        'cache_stats': stats,
+        'active_entries': stats['total_entries'],
+        'total_users_cached': stats['users_cached']
+    }
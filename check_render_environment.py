@@ -99,7 +99,7 @@ def check_render_specific_config():
     # Check build command and start command hints
     print("\nRender Service Configuration:")
     print("Build Command should be: pip install -r requirements.txt")
-    print("Start Command should be: gunicorn --bind 0.0.0.0:$PORT --reuse-port --reload main:app")
+    print("Start Command should be: gunicorn --bind 0.0.0.0:$PORT --worker-class gthread --threads 8 --reuse-port --reload main:app")
     print("Root Directory should be: / (or empty)")
     print("Environment should be: Python 3")
     
@@ -88,18 +88,15 @@ def check_sent_notifications():
 def check_scheduler_logs():
     """Check recent scheduler logs for notification activities."""
     try:
-        log_file = "data/scheduler_logs.json"
-        
-        if not os.path.exists(log_file):
+        from scheduler_logs import query_scheduler_logs
+
+        # Only the newest entries are read; the log is returned newest first
+        recent_logs = list(reversed(query_scheduler_logs(limit=10)))
+
+        if not recent_logs:
             logger.info("No scheduler logs found.")
             return {"logs_exist": False}
-        
-        with open(log_file, "r") as f:
-            logs = json.load(f)
-        
-        # Get the last 10 logs
-        recent_logs = logs[-10:]
-        
+
         logger.info("Recent scheduler activity:")
         for log in recent_logs:
             timestamp = log.get("timestamp", "Unknown")
@@ -111,8 +108,7 @@ def check_scheduler_logs():
             logger.info(f"  [{timestamp}] {status} {log_type}: {message}")
         
         # Check for any notification logs
-        notification_logs = [log for log in logs if "notification" in log.get("type", "")]
-        recent_notification_logs = notification_logs[-5:] if notification_logs else []
+        recent_notification_logs = list(reversed(query_scheduler_logs(type_contains="notification", limit=5)))
         
         if recent_notification_logs:
             logger.info("\nRecent notification activity:")
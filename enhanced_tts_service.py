@@ -3,12 +3,13 @@ Enhanced Text-to-Speech service with improved naturalness.
 This module provides advanced processing techniques to make gTTS sound less robotic.
 """
 import os
-import uuid
 import logging
 import tempfile
 import re
 from gtts import gTTS
 from flask import Blueprint, request, jsonify, send_file
+from tts_cache import get_audio, static_filename
+from tts_streaming import stream_tts_request
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -257,30 +258,30 @@ def enhanced_tts():
         voice_settings = ENHANCED_VOICES[voice_type]
         style_settings = VOICE_STYLES[style]
 
-        # Generate unique filename
-        filename = f"{uuid.uuid4()}.mp3"
-        filepath = os.path.join('static', 'audio', filename)
-        
         # Process text to make it sound more natural
         processed_text = preprocess_text(text, style)
         
         # Generate speech
         logger.info(f"Generating enhanced TTS for text of length {len(text)} with voice {voice_type} and style {style}")
         
-        # Configure TTS with voice and style settings
-        tts = gTTS(
-            text=processed_text,
-            lang=voice_settings['lang'],
-            tld=voice_settings['tld'],
-            slow=style_settings['slow']
-        )
+        def synthesize(filepath):
+            # Configure TTS with voice and style settings
+            tts = gTTS(
+                text=processed_text,
+                lang=voice_settings['lang'],
+                tld=voice_settings['tld'],
+                slow=style_settings['slow']
+            )
+            
+            # Save to file
+            tts.save(filepath)
         
-        # Save to file
-        tts.save(filepath)
+        # Replays of the same text, voice and style are served from the audio cache
+        filepath = get_audio("enhanced", voice_type, style, processed_text, synthesize)
         
         # Return the audio URL
         return jsonify({
-            "audio_url": f"/static/audio/{filename}",
+            "audio_url": f"/static/{static_filename(filepath)}",
             "voice_type": voice_type,
             "style": style,
             "processed_text": processed_text[:100] + "..." if len(processed_text) > 100 else processed_text
@@ -290,6 +291,33 @@ def enhanced_tts():
         logger.error(f"Error in enhanced TTS: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def _synthesize_stream_chunk(chunk, voice_type, style):
+    """Synthesize one chunk of a streamed response through the audio cache"""
+    # Style preprocessing is applied per chunk, after the sentence split
+    processed_text = preprocess_text(chunk, style)
+    voice_settings = ENHANCED_VOICES[voice_type]
+    style_settings = VOICE_STYLES[style]
+    
+    def synthesize(filepath):
+        tts = gTTS(
+            text=processed_text,
+            lang=voice_settings['lang'],
+            tld=voice_settings['tld'],
+            slow=style_settings['slow']
+        )
+        tts.save(filepath)
+    return get_audio("enhanced", voice_type, style, processed_text, synthesize)
+
+@enhanced_tts_bp.route('/api/enhanced-tts/stream', methods=['POST'])
+def enhanced_tts_stream():
+    """
+    Stream enhanced TTS audio sentence by sentence.
+    
+    Request JSON format is the same as /api/enhanced-tts. The response is an
+    audio/mpeg body sent in chunks as each part of the text is synthesized.
+    """
+    return stream_tts_request("enhanced", ENHANCED_VOICES, VOICE_STYLES, 'uk_female', 'conversational', _synthesize_stream_chunk)
+
 @enhanced_tts_bp.route('/api/enhanced-voices', methods=['GET'])
 def get_enhanced_voices():
     """
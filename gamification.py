@@ -1,24 +1,18 @@
 """
 Gamification system for Calm Journey.
 This module provides badges, achievements, and streak tracking to enhance user engagement.
+Each user's XP, streak and badge state is one row of the user_gamification table.
 """
 import json
 import os
 import logging
 from datetime import datetime, timedelta
-from flask import flash
+from flask import flash, g
+from flask_login import user_logged_in, user_loaded_from_cookie
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Ensure data directory exists
-def ensure_data_directory():
-    """Ensure the data directory exists"""
-    if not os.path.exists('data'):
-        os.makedirs('data')
-    if not os.path.exists('data/badges'):
-        os.makedirs('data/badges')
-
 # XP (Experience Points) Rewards for activities
 XP_REWARDS = {
     'journal_entry': 10,      # Points for creating a journal entry
@@ -215,195 +209,331 @@ STREAK_FACTS = [
     "The physical act of writing by hand activates areas of the brain that help you process emotions more effectively."
 ]
 
-def get_user_xp(user_id):
+
+# Activity events the badge rules react to
+ENTRY_CREATED = 'entry_created'
+ENTRY_ANALYZED = 'entry_analyzed'
+MOOD_LOGGED = 'mood_logged'
+BREATHING_COMPLETED = 'breathing_completed'
+LOGIN = 'login'
+EVENTS = (ENTRY_CREATED, ENTRY_ANALYZED, MOOD_LOGGED, BREATHING_COMPLETED, LOGIN)
+
+# Badge type -> (event that can earn it, UserGamification counter compared
+# against the badge's requirement). Badge types without a rule here
+# (perfect_week, progress) are not awarded automatically.
+BADGE_RULES = {
+    'streak': (ENTRY_CREATED, 'current_streak'),
+    'entries': (ENTRY_CREATED, 'entry_count'),
+    'insight': (ENTRY_ANALYZED, 'analyzed_entry_count'),
+    'mood': (MOOD_LOGGED, 'mood_log_count'),
+    'breathing': (BREATHING_COMPLETED, 'breathing_count'),
+    'login': (LOGIN, 'login_streak'),
+}
+
+# Counter incremented by each event
+EVENT_COUNTERS = {
+    ENTRY_CREATED: 'entry_count',
+    ENTRY_ANALYZED: 'analyzed_entry_count',
+    MOOD_LOGGED: 'mood_log_count',
+    BREATHING_COMPLETED: 'breathing_count',
+}
+
+# Counters that are recounted from database rows when a user's counters are seeded
+SEEDED_COUNTERS = ('entry_count', 'analyzed_entry_count', 'mood_log_count')
+
+def _index_badge_rules():
+    """Group the badge definitions by the event that can earn them"""
+    rules = {}
+    for badge_id, details in BADGE_DEFINITIONS.items():
+        rule = BADGE_RULES.get(details['type'])
+        if rule is None:
+            continue
+        event, counter = rule
+        rules.setdefault(event, []).append((badge_id, details['requirement'], counter))
+    return rules
+
+# Event -> [(badge_id, requirement, counter)]
+RULES_BY_EVENT = _index_badge_rules()
+
+# Number of XP awards kept in a user's XP history
+XP_HISTORY_LIMIT = 50
+
+# Where gamification state lived before the user_gamification table
+LEGACY_BADGE_DIR = os.path.join('data', 'badges')
+
+def _load_json(value, default):
+    """Parse a JSON column, falling back to a default for empty or corrupt values"""
+    if not value:
+        return default
+    try:
+        return json.loads(value)
+    except ValueError:
+        return default
+
+def _import_legacy_state(user_id):
     """
-    Get a user's XP (Experience Points) level data.
-    
+    Build a user's gamification state from their old badge file, if any.
+
+    Args:
+        user_id: The user's ID
+
+    Returns:
+        UserGamification: New (unsaved) state for the user
+    """
+    from models import UserGamification
+
+    state = UserGamification(
+        user_id=user_id,
+        total_xp=0,
+        current_streak=0,
+        longest_streak=0,
+        last_entry_date=None,
+        earned_badges='[]',
+        earned_dates='{}',
+        xp_history='[]'
+    )
+
+    badge_file = os.path.join(LEGACY_BADGE_DIR, f'user_{user_id}_badges.json')
+    if not os.path.exists(badge_file):
+        return state
+
+    try:
+        with open(badge_file, 'r') as f:
+            legacy_data = json.load(f)
+
+        state.total_xp = int(legacy_data.get('total_xp') or 0)
+        state.current_streak = int(legacy_data.get('current_streak') or 0)
+        state.longest_streak = int(legacy_data.get('longest_streak') or 0)
+        state.earned_badges = json.dumps(legacy_data.get('earned_badges') or [])
+        state.earned_dates = json.dumps(legacy_data.get('earned_dates') or {})
+        state.xp_history = json.dumps((legacy_data.get('xp_history') or [])[-XP_HISTORY_LIMIT:])
+        if legacy_data.get('last_entry_date'):
+            state.last_entry_date = datetime.strptime(legacy_data['last_entry_date'], '%Y-%m-%d').date()
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        logger.error(f"Error importing legacy badge data for user {user_id}: {str(e)}")
+
+    return state
+
+def _load_state(user_id, for_update=False):
+    """
+    Load a user's gamification state, once per request.
+
+    Every gamification call in a request shares the row loaded by the first
+    one (kept on flask.g). Writers pass for_update=True, which re-reads the
+    row with SELECT ... FOR UPDATE so concurrent awards for the same user
+    are applied one after another instead of overwriting each other.
+
+    Args:
+        user_id: The user's ID
+        for_update: Lock the row for a read-modify-write
+
+    Returns:
+        UserGamification: The user's state. Users without a row get an
+        unsaved one (imported from their old badge file if they have one),
+        which is only added to the session when it is written.
+    """
+    from extensions import db
+    from models import UserGamification
+
+    states = g.setdefault('gamification_states', {})
+    key = str(user_id)
+    state = states.get(key)
+
+    if state is None or for_update:
+        query = UserGamification.query.filter_by(user_id=key)
+        if for_update:
+            query = query.populate_existing().with_for_update()
+        state = query.first()
+
+        if state is None:
+            state = _import_legacy_state(key)
+            if for_update:
+                db.session.add(state)
+        states[key] = state
+
+    return state
+
+def _update_state(user_id, apply_changes):
+    """
+    Apply a change to a user's state under the row lock, in a savepoint.
+
+    The change is flushed but not committed: it becomes part of the caller's
+    transaction, and the caller commits it along with its own work. A failure
+    rolls back only the savepoint, leaving the caller's changes in place.
+
     Args:
         user_id: The user's ID
-        
+        apply_changes: Callable that receives the locked UserGamification row
+
+    Returns:
+        The value returned by apply_changes
+    """
+    from extensions import db
+    from sqlalchemy.exc import IntegrityError
+
+    for attempt in range(2):
+        try:
+            with db.session.begin_nested():
+                state = _load_state(user_id, for_update=True)
+                result = apply_changes(state)
+            return result
+        except IntegrityError:
+            # Another request created this user's row first; retry against it
+            g.gamification_states.pop(str(user_id), None)
+            if attempt:
+                raise
+
+def _award_badges(state, badge_ids, today):
+    """
+    Record badges as earned on a locked state row.
+
+    Returns:
+        list: The badge ids that were not earned before
+    """
+    earned_badges = _load_json(state.earned_badges, [])
+    new_badges = [badge_id for badge_id in badge_ids if badge_id not in earned_badges]
+
+    if new_badges:
+        earned_dates = _load_json(state.earned_dates, {})
+        for badge_id in new_badges:
+            earned_badges.append(badge_id)
+            earned_dates[badge_id] = today.strftime('%B %d, %Y')
+        state.earned_badges = json.dumps(earned_badges)
+        state.earned_dates = json.dumps(earned_dates)
+
+    return new_badges
+
+def _get_level(total_xp):
+    """Get the level number reached with the given amount of XP"""
+    level = 1
+    for level_def in LEVEL_DEFINITIONS:
+        if total_xp >= level_def['xp_required']:
+            level = level_def['level']
+        else:
+            break
+    return level
+
+def _build_xp_data(total_xp):
+    """
+    Build XP level data for an amount of XP.
+
+    Args:
+        total_xp: The user's total XP
+
     Returns:
         dict: XP data including total XP, current level, and progress
     """
-    # Load or initialize user badge data which contains XP
-    badge_file = f'data/badges/user_{user_id}_badges.json'
-    
+    current_level = _get_level(total_xp)
+    level_def = LEVEL_DEFINITIONS[current_level - 1]
+
     xp_data = {
-        'total_xp': 0,
-        'level': 1,
-        'level_name': LEVEL_DEFINITIONS[0]['name'],
-        'level_color': LEVEL_DEFINITIONS[0]['color'],
-        'next_level': 2,
-        'next_level_name': LEVEL_DEFINITIONS[1]['name'] if len(LEVEL_DEFINITIONS) > 1 else None,
-        'xp_for_next_level': LEVEL_DEFINITIONS[1]['xp_required'] if len(LEVEL_DEFINITIONS) > 1 else None,
-        'xp_needed': LEVEL_DEFINITIONS[1]['xp_required'] if len(LEVEL_DEFINITIONS) > 1 else 0,
-        'progress_percent': 0
+        'total_xp': total_xp,
+        'level': current_level,
+        'level_name': level_def['name'],
+        'level_color': level_def['color'],
     }
-    
-    if os.path.exists(badge_file):
-        try:
-            with open(badge_file, 'r') as f:
-                user_badge_data = json.load(f)
-                
-            # Get total XP (default to 0 if not found)
-            total_xp = user_badge_data.get('total_xp', 0)
-            xp_data['total_xp'] = total_xp
-            
-            # Find current level based on XP
-            current_level = 1
-            for level_def in LEVEL_DEFINITIONS:
-                if total_xp >= level_def['xp_required']:
-                    current_level = level_def['level']
-                    xp_data['level'] = current_level
-                    xp_data['level_name'] = level_def['name']
-                    xp_data['level_color'] = level_def['color']
-                else:
-                    break
-            
-            # Find next level information
-            if current_level < len(LEVEL_DEFINITIONS):
-                next_level_def = LEVEL_DEFINITIONS[current_level]  # Level is 1-based, array is 0-based
-                xp_data['next_level'] = next_level_def['level']
-                xp_data['next_level_name'] = next_level_def['name']
-                xp_data['xp_for_next_level'] = next_level_def['xp_required']
-                
-                # Calculate XP needed for next level
-                xp_data['xp_needed'] = next_level_def['xp_required'] - total_xp
-                
-                # Calculate progress percentage to next level
-                current_level_xp = LEVEL_DEFINITIONS[current_level-1]['xp_required']
-                xp_in_current_level = total_xp - current_level_xp
-                xp_needed_for_level = next_level_def['xp_required'] - current_level_xp
-                xp_data['progress_percent'] = min(100, int((xp_in_current_level / xp_needed_for_level) * 100))
-            else:
-                # Max level reached
-                xp_data['next_level'] = None
-                xp_data['next_level_name'] = "Max Level"
-                xp_data['xp_for_next_level'] = None
-                xp_data['xp_needed'] = 0
-                xp_data['progress_percent'] = 100
-                
-        except (json.JSONDecodeError, FileNotFoundError, KeyError, ZeroDivisionError) as e:
-            logger.error(f"Error loading XP data for user {user_id}: {str(e)}")
-    
+
+    if current_level < len(LEVEL_DEFINITIONS):
+        next_level_def = LEVEL_DEFINITIONS[current_level]  # Level is 1-based, array is 0-based
+        xp_data['next_level'] = next_level_def['level']
+        xp_data['next_level_name'] = next_level_def['name']
+        xp_data['xp_for_next_level'] = next_level_def['xp_required']
+
+        # Calculate XP needed for next level
+        xp_data['xp_needed'] = next_level_def['xp_required'] - total_xp
+
+        # Calculate progress percentage to next level
+        xp_in_current_level = total_xp - level_def['xp_required']
+        xp_needed_for_level = next_level_def['xp_required'] - level_def['xp_required']
+        xp_data['progress_percent'] = min(100, int((xp_in_current_level / xp_needed_for_level) * 100))
+    else:
+        # Max level reached
+        xp_data['next_level'] = None
+        xp_data['next_level_name'] = "Max Level"
+        xp_data['xp_for_next_level'] = None
+        xp_data['xp_needed'] = 0
+        xp_data['progress_percent'] = 100
+
     return xp_data
 
+def get_user_xp(user_id):
+    """
+    Get a user's XP (Experience Points) level data.
+
+    Args:
+        user_id: The user's ID
+
+    Returns:
+        dict: XP data including total XP, current level, and progress
+    """
+    return _build_xp_data(_load_state(user_id).total_xp or 0)
+
 def award_xp(user_id, xp_amount, reason=None):
     """
-    Award XP to a user and update their level if necessary.
-    
+    Award XP to a user and update their level if necessary. The change is
+    flushed in a savepoint; the caller commits it.
+
     Args:
         user_id: The user's ID
         xp_amount: Amount of XP to award
         reason: Optional reason for the XP award (for logging)
-        
+
     Returns:
         dict: Updated XP data including level up information if applicable
     """
-    ensure_data_directory()
-    
-    # Load or initialize user badge data
-    badge_file = f'data/badges/user_{user_id}_badges.json'
-    
-    if os.path.exists(badge_file):
-        try:
-            with open(badge_file, 'r') as f:
-                user_badge_data = json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            user_badge_data = {
-                'earned_badges': [],
-                'earned_dates': {},
-                'current_streak': 0,
-                'longest_streak': 0,
-                'last_entry_date': None,
-                'total_xp': 0,
-                'xp_history': []
-            }
-    else:
-        user_badge_data = {
-            'earned_badges': [],
-            'earned_dates': {},
-            'current_streak': 0,
-            'longest_streak': 0,
-            'last_entry_date': None,
-            'total_xp': 0,
-            'xp_history': []
-        }
-    
-    # Get previous level
-    old_xp = user_badge_data.get('total_xp', 0)
-    old_level = 1
-    for level_def in LEVEL_DEFINITIONS:
-        if old_xp >= level_def['xp_required']:
-            old_level = level_def['level']
-        else:
-            break
-    
-    # Add XP
-    user_badge_data['total_xp'] = old_xp + xp_amount
-    
-    # Record XP history
-    if 'xp_history' not in user_badge_data:
-        user_badge_data['xp_history'] = []
-    
-    # Add XP history entry
-    xp_entry = {
-        'amount': xp_amount,
-        'reason': reason or 'Activity completed',
-        'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    }
-    user_badge_data['xp_history'].append(xp_entry)
-    
-    # Trim history if it gets too long (keep last 50 entries)
-    if len(user_badge_data['xp_history']) > 50:
-        user_badge_data['xp_history'] = user_badge_data['xp_history'][-50:]
-    
-    # Check for level up
-    new_xp = user_badge_data['total_xp']
-    new_level = 1
-    for level_def in LEVEL_DEFINITIONS:
-        if new_xp >= level_def['xp_required']:
-            new_level = level_def['level']
-        else:
-            break
-    
-    # Save updated data
-    with open(badge_file, 'w') as f:
-        json.dump(user_badge_data, f, indent=2)
-    
+    def add_xp(state):
+        old_xp = state.total_xp or 0
+        state.total_xp = old_xp + xp_amount
+
+        # Record XP history, keeping only the latest awards
+        xp_history = _load_json(state.xp_history, [])
+        xp_history.append({
+            'amount': xp_amount,
+            'reason': reason or 'Activity completed',
+            'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        })
+        state.xp_history = json.dumps(xp_history[-XP_HISTORY_LIMIT:])
+        return old_xp
+
+    old_xp = _update_state(user_id, add_xp)
+    new_xp = old_xp + xp_amount
+
     # Get complete XP data
-    xp_data = get_user_xp(user_id)
-    
+    xp_data = _build_xp_data(new_xp)
+
     # Add level up information if applicable
+    old_level = _get_level(old_xp)
+    new_level = _get_level(new_xp)
     xp_data['leveled_up'] = new_level > old_level
     xp_data['levels_gained'] = new_level - old_level
     xp_data['xp_gained'] = xp_amount
-    
+
     return xp_data
 
 def get_user_badges(user_id):
     """
     Get all badge data for a user.
-    
+
     Args:
         user_id: The user's ID
-        
+
     Returns:
         dict: Badge data and streak information
     """
-    ensure_data_directory()
-    
+    state = _load_state(user_id)
+
     # Initialize badge data
     badge_data = {
         'badge_details': {},
-        'earned_badges': [],
-        'current_streak': 0,
-        'longest_streak': 0,
+        'earned_badges': _load_json(state.earned_badges, []),
+        'current_streak': state.current_streak or 0,
+        'longest_streak': state.longest_streak or 0,
         'streak_fact': STREAK_FACTS[0],  # Default streak fact
         'next_streak_badge': None,
-        'xp_data': get_user_xp(user_id)  # Add XP data
+        'xp_data': _build_xp_data(state.total_xp or 0)  # Add XP data
     }
-    
+    earned_dates = _load_json(state.earned_dates, {})
+
     # Create badge details from definitions
     for badge_id, details in BADGE_DEFINITIONS.items():
         badge_data['badge_details'][badge_id] = {
@@ -417,220 +547,184 @@ def get_user_badges(user_id):
             'earned': False,
             'earned_date': None
         }
-    
-    # Load user's badge data if it exists
-    badge_file = f'data/badges/user_{user_id}_badges.json'
-    
-    if os.path.exists(badge_file):
-        try:
-            with open(badge_file, 'r') as f:
-                user_badge_data = json.load(f)
-                
-            # Update earned status from saved data
-            if 'earned_badges' in user_badge_data:
-                badge_data['earned_badges'] = user_badge_data['earned_badges']
-                
-                for badge_id in user_badge_data['earned_badges']:
-                    if badge_id in badge_data['badge_details']:
-                        badge_data['badge_details'][badge_id]['earned'] = True
-                        badge_data['badge_details'][badge_id]['earned_date'] = user_badge_data.get('earned_dates', {}).get(badge_id, 'Unknown date')
-            
-            # Get streak information
-            badge_data['current_streak'] = user_badge_data.get('current_streak', 0)
-            badge_data['longest_streak'] = user_badge_data.get('longest_streak', 0)
-            
-            # Select a streak fact based on the streak length
-            streak_index = min(len(STREAK_FACTS) - 1, badge_data['current_streak'] // 3)
-            badge_data['streak_fact'] = STREAK_FACTS[streak_index]
-            
-            # Find the next streak badge to earn
-            for badge_id, details in badge_data['badge_details'].items():
-                if (details['type'] == 'streak' and 
-                    not details['earned'] and 
-                    details['requirement'] > badge_data['current_streak']):
-                    # Sort badges by requirement to find the next achievable one
-                    if (badge_data['next_streak_badge'] is None or 
-                        details['requirement'] < badge_data['next_streak_badge']['requirement']):
-                        badge_data['next_streak_badge'] = details
-                        
-        except (json.JSONDecodeError, KeyError) as e:
-            logger.error(f"Error loading badge data for user {user_id}: {str(e)}")
-            # Continue with default empty badge data
-    
-    return badge_data
 
-def process_journal_entry(user_id):
+    # Update earned status from saved data
+    for badge_id in badge_data['earned_badges']:
+        if badge_id in badge_data['badge_details']:
+            badge_data['badge_details'][badge_id]['earned'] = True
+            badge_data['badge_details'][badge_id]['earned_date'] = earned_dates.get(badge_id, 'Unknown date')
+
+    # Select a streak fact based on the streak length
+    streak_index = min(len(STREAK_FACTS) - 1, badge_data['current_streak'] // 3)
+    badge_data['streak_fact'] = STREAK_FACTS[streak_index]
+
+    # Find the next streak badge to earn
+    for badge_id, details in badge_data['badge_details'].items():
+        if (details['type'] == 'streak' and
+            not details['earned'] and
+            details['requirement'] > badge_data['current_streak']):
+            # Sort badges by requirement to find the next achievable one
+            if (badge_data['next_streak_badge'] is None or
+                details['requirement'] < badge_data['next_streak_badge']['requirement']):
+                badge_data['next_streak_badge'] = details
+
+    return badge_data
+def _seed_counters(state):
     """
-    Process a new journal entry and award badges as appropriate.
-    
-    Args:
-        user_id: The user's ID
-        
-    Returns:
-        dict: Updated badge data and any newly earned badges
+    Fill a user's activity counters from the database the first time they are needed.
+    Runs once per user; afterwards the counters are only incremented by events.
     """
-    ensure_data_directory()
-    
-    # Load journal entries for the user
-    journal_entries = get_journal_entries(user_id)
-    entry_count = len(journal_entries)
-    
-    # Load or initialize user badge data
-    badge_file = f'data/badges/user_{user_id}_badges.json'
-    
-    if os.path.exists(badge_file):
-        try:
-            with open(badge_file, 'r') as f:
-                user_badge_data = json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            user_badge_data = {
-                'earned_badges': [],
-                'earned_dates': {},
-                'current_streak': 0,
-                'longest_streak': 0,
-                'last_entry_date': None
-            }
-    else:
-        user_badge_data = {
-            'earned_badges': [],
-            'earned_dates': {},
-            'current_streak': 0,
-            'longest_streak': 0,
-            'last_entry_date': None
-        }
-    
-    # Update streak
-    today = datetime.now().date()
-    last_entry_date_str = user_badge_data.get('last_entry_date')
-    
-    if last_entry_date_str:
-        try:
-            last_entry_date = datetime.strptime(last_entry_date_str, '%Y-%m-%d').date()
-            days_diff = (today - last_entry_date).days
-            
-            if days_diff == 1:
-                # Consecutive day, increment streak
-                user_badge_data['current_streak'] += 1
-            elif days_diff == 0:
-                # Same day entry, no streak change
-                pass
-            else:
-                # Streak broken
-                user_badge_data['current_streak'] = 1
-        except ValueError:
-            # Invalid date format, reset streak
-            user_badge_data['current_streak'] = 1
+    from models import JournalEntry, MoodLog
+
+    entries = JournalEntry.query.filter_by(user_id=state.user_id)
+    state.entry_count = entries.count()
+    state.analyzed_entry_count = entries.filter(JournalEntry.is_analyzed.is_(True)).count()
+    state.mood_log_count = MoodLog.query.filter_by(user_id=state.user_id).count()
+    state.breathing_count = state.breathing_count or 0
+    state.login_streak = state.login_streak or 0
+
+def _update_journal_streak(state, today):
+    """Advance the journaling streak for an entry written today"""
+    if state.last_entry_date:
+        days_diff = (today - state.last_entry_date).days
+
+        if days_diff == 1:
+            # Consecutive day, increment streak
+            state.current_streak = (state.current_streak or 0) + 1
+        elif days_diff == 0:
+            # Same day entry, no streak change
+            pass
+        else:
+            # Streak broken
+            state.current_streak = 1
     else:
         # First entry, start streak at 1
-        user_badge_data['current_streak'] = 1
-    
+        state.current_streak = 1
+
     # Update longest streak if needed
-    if user_badge_data['current_streak'] > user_badge_data.get('longest_streak', 0):
-        user_badge_data['longest_streak'] = user_badge_data['current_streak']
-    
+    if state.current_streak > (state.longest_streak or 0):
+        state.longest_streak = state.current_streak
+
     # Update last entry date
-    user_badge_data['last_entry_date'] = today.strftime('%Y-%m-%d')
-    
-    # Check for new badges to award
-    current_streak = user_badge_data['current_streak']
-    newly_earned_badges = []
-    
-    # Check streak badges
-    for badge_id, details in BADGE_DEFINITIONS.items():
-        if details['type'] == 'streak' and details['requirement'] <= current_streak:
-            if badge_id not in user_badge_data['earned_badges']:
-                user_badge_data['earned_badges'].append(badge_id)
-                user_badge_data['earned_dates'][badge_id] = today.strftime('%B %d, %Y')
-                newly_earned_badges.append(badge_id)
-    
-    # Check entry count badges
-    for badge_id, details in BADGE_DEFINITIONS.items():
-        if details['type'] == 'entries' and details['requirement'] <= entry_count:
-            if badge_id not in user_badge_data['earned_badges']:
-                user_badge_data['earned_badges'].append(badge_id)
-                user_badge_data['earned_dates'][badge_id] = today.strftime('%B %d, %Y')
-                newly_earned_badges.append(badge_id)
-    
-    # Check if this is the first analyzed entry (for insight badge)
-    has_analyzed = False
-    for entry in journal_entries:
-        if entry.get('is_analyzed'):
-            has_analyzed = True
-            break
-    
-    if has_analyzed and 'first_cbt_insight' not in user_badge_data['earned_badges']:
-        user_badge_data['earned_badges'].append('first_cbt_insight')
-        user_badge_data['earned_dates']['first_cbt_insight'] = today.strftime('%B %d, %Y')
-        newly_earned_badges.append('first_cbt_insight')
-    
-    # Save updated badge data
-    with open(badge_file, 'w') as f:
-        json.dump(user_badge_data, f, indent=2)
-    
+    state.last_entry_date = today
+
+def _update_login_streak(state, today):
+    """Advance the daily login streak for a login today"""
+    if state.last_login_date == today:
+        return
+
+    if state.last_login_date and (today - state.last_login_date).days == 1:
+        state.login_streak = (state.login_streak or 0) + 1
+    else:
+        state.login_streak = 1
+    state.last_login_date = today
+
+def record_event(user_id, event):
+    """
+    Record a user activity and award the badges it earns.
+
+    Only the rules registered for this event are evaluated, against the
+    user's counters; no journal or mood history is read. The first event for
+    a user seeds their counters from the database and checks every rule once.
+    The change is flushed in a savepoint; the caller commits it.
+
+    Args:
+        user_id: The user's ID
+        event: One of ENTRY_CREATED, ENTRY_ANALYZED, MOOD_LOGGED,
+            BREATHING_COMPLETED or LOGIN
+
+    Returns:
+        list: IDs of the badges newly earned
+    """
+    if event not in EVENTS:
+        raise ValueError(f"Unknown gamification event: {event}")
+
+    def apply_event(state):
+        today = datetime.now().date()
+        rules = RULES_BY_EVENT.get(event, [])
+
+        seeded_now = state.entry_count is None
+        if seeded_now:
+            # The activity behind this event is already in the database, so the
+            # seeded counts include it
+            _seed_counters(state)
+            rules = [rule for event_rules in RULES_BY_EVENT.values() for rule in event_rules]
+
+        counter = EVENT_COUNTERS.get(event)
+        if counter and not (seeded_now and counter in SEEDED_COUNTERS):
+            setattr(state, counter, (getattr(state, counter) or 0) + 1)
+
+        if event == ENTRY_CREATED:
+            _update_journal_streak(state, today)
+        elif event == LOGIN:
+            _update_login_streak(state, today)
+
+        earned = [
+            badge_id for badge_id, requirement, rule_counter in rules
+            if (getattr(state, rule_counter) or 0) >= requirement
+        ]
+        return _award_badges(state, earned, today)
+
+    return _update_state(user_id, apply_event)
+
+def _process_event(user_id, event):
+    """Record an event and return the user's badge data with the newly earned badges"""
+    newly_earned_badges = record_event(user_id, event)
+
     # Get complete badge data to return
     badge_data = get_user_badges(user_id)
     badge_data['new_badges'] = newly_earned_badges
-    
+
     return badge_data
 
-def get_journal_entries(user_id):
+def process_journal_entry(user_id):
     """
-    Get journal entries for a user.
-    
+    Process a new journal entry and award badges as appropriate.
+
     Args:
         user_id: The user's ID
-        
+
     Returns:
-        list: Journal entries for the user
+        dict: Updated badge data and any newly earned badges
     """
-    journal_file = f'data/user_{user_id}_journals.json'
-    
-    if not os.path.exists(journal_file):
-        return []
-    
-    try:
-        with open(journal_file, 'r') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+    return _process_event(user_id, ENTRY_CREATED)
+
+def process_entry_analyzed(user_id):
+    """
+    Process a journal entry that has just been analyzed and award the insight badge if appropriate.
+
+    Args:
+        user_id: The user's ID
+
+    Returns:
+        dict: Updated badge data and any newly earned badges
+    """
+    return _process_event(user_id, ENTRY_ANALYZED)
 
 def check_streak_status(user_id):
     """
     Check if the user's streak is at risk of breaking.
-    
+
     Args:
         user_id: The user's ID
-        
+
     Returns:
         dict: Streak status information
     """
-    badge_file = f'data/badges/user_{user_id}_badges.json'
-    
-    if not os.path.exists(badge_file):
+    last_entry_date = _load_state(user_id).last_entry_date
+
+    if not last_entry_date:
         return {'status': 'none', 'message': 'No streak yet'}
-    
-    try:
-        with open(badge_file, 'r') as f:
-            user_badge_data = json.load(f)
-        
-        last_entry_date_str = user_badge_data.get('last_entry_date')
-        
-        if not last_entry_date_str:
-            return {'status': 'none', 'message': 'No streak yet'}
-        
-        last_entry_date = datetime.strptime(last_entry_date_str, '%Y-%m-%d').date()
-        today = datetime.now().date()
-        days_diff = (today - last_entry_date).days
-        
-        if days_diff == 0:
-            return {'status': 'active', 'message': 'Streak active and secure for today'}
-        elif days_diff == 1:
-            return {'status': 'warning', 'message': 'Journal today to keep your streak!'}
-        else:
-            return {'status': 'broken', 'message': f'Streak broken after {days_diff} days'}
-        
-    except (json.JSONDecodeError, FileNotFoundError, ValueError):
-        return {'status': 'none', 'message': 'No streak information available'}
+
+    today = datetime.now().date()
+    days_diff = (today - last_entry_date).days
+
+    if days_diff == 0:
+        return {'status': 'active', 'message': 'Streak active and secure for today'}
+    elif days_diff == 1:
+        return {'status': 'warning', 'message': 'Journal today to keep your streak!'}
+    else:
+        return {'status': 'broken', 'message': f'Streak broken after {days_diff} days'}
 
 def flash_badge_notifications(badge_result):
     """
@@ -667,127 +761,62 @@ def flash_badge_notifications(badge_result):
 def process_breathing_session(user_id):
     """
     Process a completed breathing session and award the breathing badge if appropriate.
-    
+
     Args:
         user_id: The user's ID
-        
+
     Returns:
         dict: Updated badge data and any newly earned badges
     """
-    ensure_data_directory()
-    
-    # Load or initialize user badge data
-    badge_file = f'data/badges/user_{user_id}_badges.json'
-    
-    if os.path.exists(badge_file):
-        try:
-            with open(badge_file, 'r') as f:
-                user_badge_data = json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            user_badge_data = {
-                'earned_badges': [],
-                'earned_dates': {},
-                'current_streak': 0,
-                'longest_streak': 0,
-                'last_entry_date': None
-            }
-    else:
-        user_badge_data = {
-            'earned_badges': [],
-            'earned_dates': {},
-            'current_streak': 0,
-            'longest_streak': 0,
-            'last_entry_date': None
-        }
-    
-    # Check if breathing badge already earned
-    newly_earned_badges = []
-    today = datetime.now().date()
-    
-    if 'breathing_session' not in user_badge_data['earned_badges']:
-        user_badge_data['earned_badges'].append('breathing_session')
-        user_badge_data['earned_dates']['breathing_session'] = today.strftime('%B %d, %Y')
-        newly_earned_badges.append('breathing_session')
-        
-        # Save updated badge data
-        with open(badge_file, 'w') as f:
-            json.dump(user_badge_data, f, indent=2)
-    
-    # Get complete badge data to return
-    badge_data = get_user_badges(user_id)
-    badge_data['new_badges'] = newly_earned_badges
-    
-    return badge_data
+    return _process_event(user_id, BREATHING_COMPLETED)
 
 def process_mood_log(user_id):
     """
     Process a mood log entry and award the mood tracking badge if appropriate.
-    
+
     Args:
         user_id: The user's ID
-        
+
     Returns:
         dict: Updated badge data and any newly earned badges
     """
-    ensure_data_directory()
-    
-    # Load mood logs for the user - this is a simplification, in reality you'd query the database
-    mood_logs = get_mood_logs(user_id)
-    mood_count = len(mood_logs)
-    
-    # Load or initialize user badge data
-    badge_file = f'data/badges/user_{user_id}_badges.json'
-    
-    if os.path.exists(badge_file):
-        try:
-            with open(badge_file, 'r') as f:
-                user_badge_data = json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            user_badge_data = {
-                'earned_badges': [],
-                'earned_dates': {},
-                'current_streak': 0,
-                'longest_streak': 0,
-                'last_entry_date': None
-            }
-    else:
-        user_badge_data = {
-            'earned_badges': [],
-            'earned_dates': {},
-            'current_streak': 0,
-            'longest_streak': 0,
-            'last_entry_date': None
-        }
-    
-    # Check for mood tracking badge
-    newly_earned_badges = []
-    today = datetime.now().date()
-    
-    if mood_count >= 5 and 'mood_tracker_5' not in user_badge_data['earned_badges']:
-        user_badge_data['earned_badges'].append('mood_tracker_5')
-        user_badge_data['earned_dates']['mood_tracker_5'] = today.strftime('%B %d, %Y')
-        newly_earned_badges.append('mood_tracker_5')
-        
-        # Save updated badge data
-        with open(badge_file, 'w') as f:
-            json.dump(user_badge_data, f, indent=2)
-    
-    # Get complete badge data to return
-    badge_data = get_user_badges(user_id)
-    badge_data['new_badges'] = newly_earned_badges
-    
-    return badge_data
+    return _process_event(user_id, MOOD_LOGGED)
 
-def get_mood_logs(user_id):
+def process_login(user_id):
     """
-    Placeholder function to get mood logs.
-    In a real implementation, this would query the database.
-    
+    Process a user's login and award daily login badges as appropriate.
+
     Args:
         user_id: The user's ID
-        
+
     Returns:
-        list: Mood logs for the user
+        dict: Updated badge data and any newly earned badges
     """
-    # This is a simplified version - in reality you'd query the database
-    return []
\ No newline at end of file
+    # Only the first login of the day changes anything
+    if _load_state(user_id).last_login_date == datetime.now().date():
+        badge_data = get_user_badges(user_id)
+        badge_data['new_badges'] = []
+        return badge_data
+
+    return _process_event(user_id, LOGIN)
+
+@user_logged_in.connect
+@user_loaded_from_cookie.connect
+def _record_login(sender, user=None, **extra):
+    """Count logins (including sessions restored from the remember-me cookie) for the login badges"""
+    from extensions import db
+    from models import User
+
+    # Admin accounts log in through the same signal but have no gamification state
+    if not isinstance(user, User):
+        return
+
+    try:
+        # Runs when the user is loaded, before the view has changed anything,
+        # so the only pending work to commit is the login itself
+        badge_result = process_login(user.id)
+        db.session.commit()
+        flash_badge_notifications(badge_result)
+    except Exception as e:
+        logger.error(f"Error recording login for user {user.id}: {str(e)}")
+        db.session.rollback()
@@ -0,0 +1,20 @@
+"""
+Script to copy the legacy moderation files (data/flagged.json and
+data/admin_messages.json) into the journal_flag and admin_message tables.
+Safe to run more than once: flags and messages already in the database are
+skipped. Run it once after deploying.
+"""
+import logging
+from app import app, db
+from admin_utils import import_legacy_moderation_data
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    logger.info("Importing legacy flagged entries and admin messages...")
+    with app.app_context():
+        db.create_all()
+        flags, messages = import_legacy_moderation_data()
+    logger.info(f"Imported {flags} flags and {messages} admin messages.")
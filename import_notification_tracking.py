@@ -0,0 +1,20 @@
+"""
+Script to copy the legacy per-day notification tracking files
+(data/notifications/{type}_{YYYY-MM-DD}.json) into the notification_delivery
+ledger table. Safe to run more than once: records already in the ledger are
+kept. The files can be archived once the import has run.
+"""
+import logging
+from app import app, db
+from notification_tracking import import_legacy_tracking_files
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    logger.info("Importing legacy notification tracking files...")
+    with app.app_context():
+        db.create_all()
+        imported = import_legacy_tracking_files()
+    logger.info(f"Imported {imported} notification records.")
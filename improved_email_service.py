@@ -140,12 +140,16 @@ def send_test_email(recipient_email):
 def send_immediate_notification_to_all_users():
     """
     Send an immediate notification to all users with notifications enabled.
+    The emails are queued in the notification outbox and sent from there over
+    SMTP, so failed sends are retried with backoff.
     
     Returns:
         dict: Statistics about the notification sending process
     """
+    import uuid
     from app import app, db
     from models import User
+    from notification_outbox import enqueue_many, dispatch_pending, CHANNEL_EMAIL, TRANSPORT_SMTP
     
     with app.app_context():
         # Get all users with notifications enabled
@@ -157,9 +161,6 @@ def send_immediate_notification_to_all_users():
         
         logger.info(f"Sending notifications to {len(users)} users...")
         
-        success_count = 0
-        error_count = 0
-        
         # Get the base URL from the app configuration or use a default replit URL
         if 'BASE_URL' in current_app.config and current_app.config['BASE_URL']:
             base_url = current_app.config['BASE_URL']
@@ -172,12 +173,11 @@ def send_immediate_notification_to_all_users():
             # Use the correct Replit URL
             journal_url = "https://calm-mind-ai-naturalarts.replit.app/journal/new"
         
-        for user in users:
-            subject = 'Special Reminder: Take a Moment to Journal - Calm Journey'
-            html_body = f"""
+        subject = 'Special Reminder: Take a Moment to Journal - Calm Journey'
+        html_body = f"""
             <html>
             <body>
-                <h2>Hello {user.username}!</h2>
+                <h2>Hello -username-!</h2>
                 <p>This is a special reminder to take a moment for yourself today.</p>
                 <p>Writing in your journal can help you process your thoughts and feelings, reduce stress, and gain clarity.</p>
                 <p>We encourage you to spend just 5 minutes today writing about what's on your mind.</p>
@@ -188,8 +188,8 @@ def send_immediate_notification_to_all_users():
             </html>
             """
             
-            text_body = f"""
-            Hello {user.username}!
+        text_body = f"""
+            Hello -username-!
             
             This is a special reminder to take a moment for yourself today.
             
@@ -205,18 +205,29 @@ def send_immediate_notification_to_all_users():
             The Calm Journey Team
             """
             
-            try:
-                result = send_email(user.email, subject, html_body, text_body)
-                
-                if result.get("success"):
-                    success_count += 1
-                    logger.info(f"Sent notification to {user.email}")
-                else:
-                    error_count += 1
-                    logger.error(f"Failed to send notification to {user.email}: {result.get('error', 'Unknown error')}")
-            except Exception as e:
-                error_count += 1
-                logger.error(f"Unexpected error sending to {user.email}: {str(e)}", exc_info=True)
+        # Each broadcast gets its own keys, so a second broadcast isn't deduplicated away
+        broadcast_id = uuid.uuid4().hex
+        enqueue_many([
+            {
+                "idempotency_key": f"immediate:{broadcast_id}:{user.id}",
+                "channel": CHANNEL_EMAIL,
+                "notification_type": "immediate_email",
+                "user_id": user.id,
+                "recipient": user.email,
+                "payload": {
+                    "transport": TRANSPORT_SMTP,
+                    "subject": subject,
+                    "html": html_body,
+                    "text": text_body,
+                    "substitutions": {"-username-": user.username or "there"}
+                }
+            }
+            for user in users if user.email
+        ])
+        
+        results = dispatch_pending(CHANNEL_EMAIL)
+        success_count = results["sent"]
+        error_count = results["retrying"] + results["dead"]
         
         logger.info(f"Notification sending complete. Success: {success_count}, Errors: {error_count}")
         return {"success": success_count, "errors": error_count}
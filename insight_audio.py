@@ -0,0 +1,215 @@
+"""
+Background synthesis of Mira's messages after analysis.
+
+Once an entry's insight (or closing message) is saved, it is synthesized in
+the user's preferred voice on a small worker pool and the static audio URL is
+stored on the entry, so pressing play fetches a file instead of waiting on
+the TTS API. Synthesis goes through the shared audio cache, and a daily
+character budget shared by all workers caps what this stage can spend.
+"""
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from threading import BoundedSemaphore, Lock
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INSIGHT_AUDIO_ENABLED = os.environ.get("INSIGHT_AUDIO_ENABLED", "true").lower() != "false"
+
+# Worker pool sizing - synthesis is slow but must not compete with analysis
+INSIGHT_AUDIO_MAX_WORKERS = int(os.environ.get("INSIGHT_AUDIO_MAX_WORKERS", 2))
+# Maximum number of messages waiting for or undergoing synthesis in this process
+INSIGHT_AUDIO_MAX_PENDING = int(os.environ.get("INSIGHT_AUDIO_MAX_PENDING", 50))
+# Characters this stage may send to the TTS API per UTC day, across all workers
+INSIGHT_AUDIO_DAILY_CHAR_BUDGET = int(os.environ.get("INSIGHT_AUDIO_DAILY_CHAR_BUDGET", 100000))
+
+# Longer messages are left to on-demand streaming (the TTS API input limit)
+MAX_SPEECH_CHARS = 4096
+
+DEFAULT_VOICE = "shimmer"
+
+BUDGET_FILE = os.path.join("data", "insight_audio_budget.json")
+
+# Messages that can be pre-synthesized: kind -> (text column, audio URL column)
+KIND_INSIGHT = "insight"
+KIND_CLOSING = "closing"
+AUDIO_FIELDS = {
+    KIND_INSIGHT: ("initial_insight", "insight_audio_url"),
+    KIND_CLOSING: ("closing_message", "closing_audio_url"),
+}
+
+_executor = ThreadPoolExecutor(max_workers=INSIGHT_AUDIO_MAX_WORKERS, thread_name_prefix="insight-audio")
+_pending_slots = BoundedSemaphore(INSIGHT_AUDIO_MAX_PENDING)
+_budget_lock = Lock()
+
+
+class BudgetExhausted(Exception):
+    """Raised when today's synthesis budget can't cover a message"""
+
+
+@contextmanager
+def _budget_file_lock():
+    """Exclusive lock shared by all processes updating the budget file."""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{BUDGET_FILE}.lock", "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def reserve_budget(characters: int) -> bool:
+    """
+    Reserve characters from today's synthesis budget.
+
+    Args:
+        characters: Number of characters about to be synthesized
+
+    Returns:
+        bool: True if the budget covered them, False if it is exhausted
+    """
+    os.makedirs(os.path.dirname(BUDGET_FILE), exist_ok=True)
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+
+    with _budget_lock, _budget_file_lock():
+        try:
+            with open(BUDGET_FILE, "r") as f:
+                usage = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            usage = {}
+        if usage.get("date") != today:
+            usage = {"date": today, "characters": 0, "syntheses": 0}
+
+        if usage["characters"] + characters > INSIGHT_AUDIO_DAILY_CHAR_BUDGET:
+            return False
+
+        usage["characters"] += characters
+        usage["syntheses"] += 1
+        tmp_file = f"{BUDGET_FILE}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(usage, f)
+        os.replace(tmp_file, BUDGET_FILE)
+        return True
+
+
+def synthesize_entry_audio(entry, kind: str):
+    """
+    Synthesize one of Mira's messages for an entry and store its audio URL.
+    Must be called inside an application context.
+
+    Args:
+        entry: JournalEntry model instance
+        kind: KIND_INSIGHT or KIND_CLOSING
+
+    Returns:
+        The stored audio URL, or None if the message was skipped
+    """
+    from app import db
+    from models import User
+    from tts_service import clean_text_for_tts
+    from tts_cache import get_audio, static_filename
+    from openai_tts_service import OPENAI_VOICES, get_openai_client
+
+    text_field, url_field = AUDIO_FIELDS[kind]
+    text = clean_text_for_tts(getattr(entry, text_field) or "")
+    if not text:
+        return None
+    if len(text) > MAX_SPEECH_CHARS:
+        logger.info(f"Skipping {kind} audio for entry {entry.id}: {len(text)} chars is over the TTS input limit")
+        return None
+
+    user = User.query.get(entry.user_id)
+    voice = user.preferred_voice if user and user.preferred_voice in OPENAI_VOICES else DEFAULT_VOICE
+
+    client = get_openai_client()
+    if not client:
+        logger.warning(f"Skipping {kind} audio for entry {entry.id}: no OpenAI client available")
+        return None
+
+    def synthesize(filepath):
+        # Only cache misses are charged against the budget
+        if not reserve_budget(len(text)):
+            raise BudgetExhausted(f"Daily insight audio budget of {INSIGHT_AUDIO_DAILY_CHAR_BUDGET} chars reached")
+        response = client.audio.speech.create(
+            model="tts-1",
+            voice=voice,
+            input=text
+        )
+        response.stream_to_file(filepath)
+
+    path = get_audio("openai:tts-1", voice, None, text, synthesize)
+
+    # The user may have picked another voice while this was synthesizing
+    if user:
+        db.session.refresh(user)
+        if (user.preferred_voice if user.preferred_voice in OPENAI_VOICES else DEFAULT_VOICE) != voice:
+            logger.info(f"Not storing {kind} audio for entry {entry.id}: voice changed during synthesis")
+            return None
+
+    audio_url = f"/static/{static_filename(path)}"
+    setattr(entry, url_field, audio_url)
+    db.session.commit()
+    return audio_url
+
+
+def _audio_worker(entry_id: int, kind: str) -> None:
+    """Worker-thread entry point: synthesize one message inside an app context."""
+    from app import app, db
+    from models import JournalEntry
+
+    try:
+        with app.app_context():
+            try:
+                entry = JournalEntry.query.get(entry_id)
+                if entry:
+                    audio_url = synthesize_entry_audio(entry, kind)
+                    if audio_url:
+                        logger.info(f"Pre-generated {kind} audio for journal entry {entry_id}")
+            except BudgetExhausted as e:
+                logger.info(f"Not pre-generating {kind} audio for journal entry {entry_id}: {str(e)}")
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Background {kind} audio failed for journal entry {entry_id}: {str(e)}")
+            finally:
+                db.session.remove()
+    finally:
+        _pending_slots.release()
+
+
+def enqueue_entry_audio(entry_id: int, kind: str) -> bool:
+    """
+    Queue pre-synthesis of one of Mira's messages for an entry.
+
+    Args:
+        entry_id: The journal entry ID (the message must already be committed)
+        kind: KIND_INSIGHT or KIND_CLOSING
+
+    Returns:
+        True if the job was queued, False if the stage is disabled or the queue is full
+    """
+    if not INSIGHT_AUDIO_ENABLED:
+        return False
+
+    if not _pending_slots.acquire(blocking=False):
+        logger.warning(f"Insight audio queue full ({INSIGHT_AUDIO_MAX_PENDING} pending), not queuing entry {entry_id}")
+        return False
+
+    try:
+        _executor.submit(_audio_worker, entry_id, kind)
+    except Exception as e:
+        _pending_slots.release()
+        logger.error(f"Could not submit {kind} audio job for entry {entry_id}: {str(e)}")
+        return False
+
+    return True
@@ -7,9 +7,10 @@ import os
 from datetime import datetime, timedelta
 import pytz
 from flask import current_app, url_for
-from models import User, PushSubscription
+from models import User, PushSubscription, reminder_minute_of_day
 from app import db
-from sqlalchemy import text
+from sqlalchemy import text, or_
+from sqlalchemy.orm import load_only
 from push_notification_service import send_notification
 
 # Configure logging
@@ -25,6 +26,10 @@ DEFAULT_MORNING_PROMPTS = [
     "What intention would you like to set for today?"
 ]
 
+# Each scheduler run sends the reminders due in the last REMINDER_WINDOW_MINUTES
+# minutes; this matches the scheduler interval so each reminder goes out once
+REMINDER_WINDOW_MINUTES = 5
+
 DEFAULT_EVENING_PROMPTS = [
     "What's one thought you want to leave here tonight?",
     "What went well today that you'd like to acknowledge?",
@@ -43,12 +48,13 @@ def get_current_time_in_user_timezone(user_timezone=None):
     return datetime.now(user_tz)
 
 
-def should_send_morning_reminder(user):
+def should_send_morning_reminder(user, current_time=None):
     """
     Check if a morning reminder should be sent to this user.
     
     Args:
         user: User object with notification preferences
+        current_time: Time to check against (defaults to now)
         
     Returns:
         bool: True if a morning reminder should be sent
@@ -56,26 +62,18 @@ def should_send_morning_reminder(user):
     # Skip if user has notifications disabled or morning reminders disabled
     if not user.notifications_enabled or not user.morning_reminder_enabled:
         return False
-        
-    # For now, we'll use server time without timezone considerations
-    # In a future update, we can add user timezone preferences
-    current_time = datetime.now().time()
-    target_time = user.morning_reminder_time
     
-    # Check if current time is within 5 minutes of the target time
-    # This is to account for scheduler running at intervals
-    current_minutes = current_time.hour * 60 + current_time.minute
-    target_minutes = target_time.hour * 60 + target_time.minute
-    
-    return abs(current_minutes - target_minutes) <= 5
+    current_time = current_time or datetime.now().time()
+    return reminder_minute_of_day(user.morning_reminder_time) in get_due_minutes(current_time)
 
 
-def should_send_evening_reminder(user):
+def should_send_evening_reminder(user, current_time=None):
     """
     Check if an evening reminder should be sent to this user.
     
     Args:
         user: User object with notification preferences
+        current_time: Time to check against (defaults to now)
         
     Returns:
         bool: True if an evening reminder should be sent
@@ -83,16 +81,9 @@ def should_send_evening_reminder(user):
     # Skip if user has notifications disabled or evening reminders disabled
     if not user.notifications_enabled or not user.evening_reminder_enabled:
         return False
-        
-    # For now, we'll use server time without timezone considerations
-    current_time = datetime.now().time()
-    target_time = user.evening_reminder_time
     
-    # Check if current time is within 5 minutes of the target time
-    current_minutes = current_time.hour * 60 + current_time.minute
-    target_minutes = target_time.hour * 60 + target_time.minute
-    
-    return abs(current_minutes - target_minutes) <= 5
+    current_time = current_time or datetime.now().time()
+    return reminder_minute_of_day(user.evening_reminder_time) in get_due_minutes(current_time)
 
 
 def get_random_prompt(prompt_type="morning"):
@@ -113,10 +104,77 @@ def get_random_prompt(prompt_type="morning"):
         return random.choice(DEFAULT_EVENING_PROMPTS)
 
 
+def get_due_minutes(current_time):
+    """
+    Get the minute-of-day buckets whose reminders are due at current_time:
+    the REMINDER_WINDOW_MINUTES minutes up to and including the current one.
+    
+    Args:
+        current_time: The current server time
+        
+    Returns:
+        list: Minutes of the day (0-1439), wrapping past midnight
+    """
+    current_minutes = reminder_minute_of_day(current_time)
+    return [(current_minutes - offset) % (24 * 60) for offset in range(REMINDER_WINDOW_MINUTES)]
+
+
+def get_due_reminder_subscriptions(current_time):
+    """
+    Load the users with a reminder due at current_time, together with their
+    push subscriptions, in a single query on the indexed reminder buckets.
+    
+    Args:
+        current_time: The current server time
+        
+    Returns:
+        list: (user, [subscriptions]) tuples, one per due user
+    """
+    due_minutes = get_due_minutes(current_time)
+    
+    rows = db.session.query(User, PushSubscription)\
+        .join(PushSubscription, PushSubscription.user_id == User.id)\
+        .options(load_only(
+            User.id,
+            User.morning_reminder_minute,
+            User.evening_reminder_minute
+        ))\
+        .filter(or_(
+            User.morning_reminder_minute.in_(due_minutes),
+            User.evening_reminder_minute.in_(due_minutes)
+        ))\
+        .order_by(User.id)\
+        .all()
+    
+    due = {}
+    for user, subscription in rows:
+        due.setdefault(user.id, (user, []))[1].append(subscription)
+    return list(due.values())
+
+
+def log_journal_reminders(log_rows):
+    """
+    Record sent reminders in notification_log with a single bulk insert.
+    
+    Args:
+        log_rows: List of dicts with user_id, type and sent_at
+    """
+    if not log_rows:
+        return
+    
+    with db.engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO notification_log (user_id, notification_type, sent_at) VALUES (:user_id, :type, :sent_at)"),
+            log_rows
+        )
+
+
 def send_journal_reminder_notifications():
     """
-    Scan for users who should receive journal reminders and send notifications.
+    Find users who should receive journal reminders and send notifications.
     This function is intended to be called periodically by a scheduler.
+    Only users whose reminder bucket is due (and who have a push subscription)
+    are loaded, so each run scales with the number of due users.
     """
     try:
         from app import app
@@ -125,28 +183,36 @@ def send_journal_reminder_notifications():
         with app.app_context():
             logger.info("Checking for users who need journal reminder notifications...")
             
-            # Get all users with notifications enabled
-            users = User.query.filter_by(notifications_enabled=True).all()
+            current_time = datetime.now().time()
+            due_minutes = get_due_minutes(current_time)
+            due_users = get_due_reminder_subscriptions(current_time)
+            
+            try:
+                dashboard_url = url_for('dashboard', _external=True)
+            except Exception as url_error:
+                logger.warning(f"Could not build dashboard URL for reminders: {url_error}")
+                dashboard_url = '/dashboard'
             
             morning_count = 0
             evening_count = 0
+            log_rows = []
             
-            for user in users:
-                # Skip users with no push subscriptions
-                if not user.push_subscriptions.count():
-                    continue
-                    
+            for user, subscriptions in due_users:
                 # Check if we should send a morning reminder
-                if should_send_morning_reminder(user):
+                if user.morning_reminder_minute in due_minutes:
                     prompt = get_random_prompt("morning")
-                    send_journal_reminder(user, prompt, "morning")
-                    morning_count += 1
+                    if deliver_journal_reminder(user.id, prompt, "morning", dashboard_url, subscriptions):
+                        log_rows.append(_reminder_log_row(user.id, "morning"))
+                        morning_count += 1
                     
                 # Check if we should send an evening reminder
-                if should_send_evening_reminder(user):
+                if user.evening_reminder_minute in due_minutes:
                     prompt = get_random_prompt("evening")
-                    send_journal_reminder(user, prompt, "evening")
-                    evening_count += 1
+                    if deliver_journal_reminder(user.id, prompt, "evening", dashboard_url, subscriptions):
+                        log_rows.append(_reminder_log_row(user.id, "evening"))
+                        evening_count += 1
+            
+            log_journal_reminders(log_rows)
             
             logger.info(f"Sent {morning_count} morning reminders and {evening_count} evening reminders")
         
@@ -154,6 +220,42 @@ def send_journal_reminder_notifications():
         logger.error(f"Error sending journal reminder notifications: {e}")
 
 
+def _reminder_log_row(user_id, reminder_type):
+    return {"user_id": user_id, "type": f"journal_reminder_{reminder_type}", "sent_at": datetime.utcnow()}
+
+
+def deliver_journal_reminder(user_id, prompt, reminder_type, url, subscriptions=None):
+    """
+    Push a journal reminder to a user's subscriptions. Does not log it.
+    
+    Args:
+        user_id: The user's ID
+        prompt: The journaling prompt to include
+        reminder_type: 'morning' or 'evening'
+        url: URL to open when the notification is clicked
+        subscriptions: The user's push subscriptions, if already loaded
+        
+    Returns:
+        bool: True if the reminder was handed to the push service
+    """
+    try:
+        send_notification(
+            user_id=user_id,
+            title="Time to journal with Dear Teddy",
+            body=prompt,
+            url=url,
+            tag=f"journal_reminder_{reminder_type}",
+            subscriptions=subscriptions
+        )
+        
+        logger.info(f"Sent {reminder_type} journal reminder to user {user_id}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Error sending journal reminder to user {user_id}: {e}")
+        return False
+
+
 def send_journal_reminder(user, prompt, reminder_type):
     """
     Send a journal reminder notification to a specific user.
@@ -170,31 +272,15 @@ def send_journal_reminder(user, prompt, reminder_type):
         if not subscriptions:
             logger.warning(f"User {user.id} has no push subscriptions")
             return
-            
-        title = "Time to journal with Dear Teddy"
-        body = prompt
         
         # URL to redirect to when notification is clicked
         dashboard_url = url_for('dashboard', _external=True)
         
         # Add this notification to the record
-        with db.engine.begin() as conn:
-            current_time = datetime.utcnow()
-            conn.execute(
-                text("INSERT INTO notification_log (user_id, notification_type, sent_at) VALUES (:user_id, :type, :sent_at)"),
-                {"user_id": user.id, "type": f"journal_reminder_{reminder_type}", "sent_at": current_time}
-            )
+        log_journal_reminders([_reminder_log_row(user.id, reminder_type)])
             
         # Send the notification to the user
-        send_notification(
-            user_id=user.id,
-            title=title,
-            body=body,
-            url=dashboard_url,
-            tag=f"journal_reminder_{reminder_type}"
-        )
-            
-        logger.info(f"Sent {reminder_type} journal reminder to user {user.id}")
+        deliver_journal_reminder(user.id, prompt, reminder_type, dashboard_url, subscriptions)
         
     except Exception as e:
-        logger.error(f"Error sending journal reminder to user {user.id}: {e}")
\ No newline at end of file
+        logger.error(f"Error sending journal reminder to user {user.id}: {e}")
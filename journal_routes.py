@@ -1,14 +1,17 @@
-from flask import render_template, url_for, flash, redirect, request, jsonify, abort, Blueprint
+from flask import render_template, url_for, flash, redirect, request, jsonify, abort, Blueprint, Response, stream_with_context
 from flask_login import current_user
 from app import login_required, db
-from models import JournalEntry, CBTRecommendation
+from models import JournalEntry, CBTRecommendation, JournalEntryFeatures
 from forms import JournalEntryForm
 from journal_service import (
     analyze_journal_with_gpt, save_journal_entry, 
-    get_journal_entries_for_user, count_user_entries,
-    get_recurring_patterns
+    get_journal_entry, count_user_entries,
+    get_recurring_patterns, save_entry_features
 )
 from recommendation_handler import safe_process_pattern
+from analysis_queue import enqueue_analysis, get_analysis_status, is_analysis_in_progress, stream_analysis, EVENT_DELTA
+from json_stream import JsonFieldStream
+from insight_audio import enqueue_entry_audio, KIND_CLOSING
 from datetime import datetime, timedelta
 from sqlalchemy import desc
 from sqlalchemy.orm import load_only, defer, undefer, joinedload
@@ -22,7 +25,8 @@ from flask_wtf.csrf import generate_csrf, validate_csrf
 from cache_service import (
     cached_query, cache_user_entries, get_cached_user_entries,
     cache_entry_details, get_cached_entry_details, invalidate_user_cache,
-    preload_user_data, cache_user_stats, get_cached_user_stats
+    preload_user_data, cache_user_stats, get_cached_user_stats,
+    PRELOAD_ENTRY_LIMIT
 )
 
 # Set up logging with more details
@@ -44,15 +48,10 @@ def get_structured_data_for_entry(entry):
         Dictionary of structured data
     """
     # Try to get from saved journal entries first
-    user_entries = get_journal_entries_for_user(entry.user_id)
-    structured_data = None
-    
-    for json_entry in user_entries:
-        if json_entry.get('id') == entry.id:
-            structured_data = json_entry.get('structured_data')
-            if structured_data:
-                logger.debug(f"Found structured_data in JSON for entry {entry.id}")
-                break
+    json_entry = get_journal_entry(entry.id, entry.user_id)
+    structured_data = json_entry.get('structured_data') if json_entry else None
+    if structured_data:
+        logger.debug(f"Found structured_data in JSON for entry {entry.id}")
     
     # If no structured data found, create default structure
     if not structured_data:
@@ -64,6 +63,18 @@ def get_structured_data_for_entry(entry):
     
     return structured_data
 
+def _delete_recommendations(entry_id):
+    """
+    Delete an entry's CBT recommendations through the session rather than in
+    bulk, so the admin pattern rollups see each delete.
+    
+    Args:
+        entry_id: The journal entry ID
+    """
+    for recommendation in CBTRecommendation.query.filter_by(journal_entry_id=entry_id).all():
+        db.session.delete(recommendation)
+    db.session.flush()
+
 def convert_markdown_to_html(text):
     """
     Convert markdown formatting to HTML for better display.
@@ -174,6 +185,87 @@ def check_followup_insight(entry_id):
         logger.error(f"Error checking followup insight: {str(e)}")
         return jsonify({"error": "Server error", "ready": False}), 500
 
+# API endpoint to check if the background analysis of an entry has finished
+@journal_bp.route('/check-analysis/<int:entry_id>', methods=['GET'])
+@login_required
+def check_analysis_status(entry_id):
+    """Check if the initial insight for a journal entry is ready"""
+    try:
+        entry = JournalEntry.query.options(load_only(
+            JournalEntry.id,
+            JournalEntry.user_id,
+            JournalEntry.is_analyzed,
+            JournalEntry.created_at
+        )).get(entry_id)
+
+        if not entry:
+            logger.error(f"Journal entry not found: ID {entry_id}")
+            return jsonify({"error": "Journal entry not found", "ready": False}), 404
+
+        if entry.user_id != current_user.id:
+            logger.warning(f"Unauthorized access to entry {entry_id} by user {current_user.id}")
+            return jsonify({"error": "Unauthorized access", "ready": False}), 403
+
+        status = get_analysis_status(entry)
+
+        return jsonify({
+            "ready": status['ready'],
+            "status": status['status'],
+            "entry_id": entry_id
+        })
+
+    except Exception as e:
+        logger.error(f"Error checking analysis status: {str(e)}")
+        return jsonify({"error": "Server error", "ready": False}), 500
+
+def _sse_event(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Server-sent events stream of the background analysis of an entry
+@journal_bp.route('/stream-analysis/<int:entry_id>', methods=['GET'])
+@login_required
+def stream_analysis_events(entry_id):
+    """
+    Stream Mira's initial insight for a journal entry while it is generated.
+
+    Sends 'text' events ({field, text}) as string fields such as insight_text
+    are written, 'value' events ({field, value}) when lists such as strategies
+    are complete, and finishes with 'done' once the result is saved, 'failed',
+    or 'pending' when the page should fall back to polling /check-analysis.
+    """
+    entry = JournalEntry.query.options(load_only(
+        JournalEntry.id,
+        JournalEntry.user_id,
+        JournalEntry.is_analyzed,
+        JournalEntry.created_at
+    )).get_or_404(entry_id)
+
+    if entry.user_id != current_user.id:
+        abort(403)
+
+    status = get_analysis_status(entry)['status']
+    user_id = entry.user_id
+
+    # Don't hold a database connection for the life of the stream
+    db.session.close()
+
+    def generate():
+        fields = JsonFieldStream()
+        for event, payload in stream_analysis(entry_id, user_id, status):
+            if event == EVENT_DELTA:
+                for kind, field, value in fields.feed(payload):
+                    key = 'text' if kind == 'text' else 'value'
+                    yield _sse_event(kind, {'field': field, key: value})
+            else:
+                yield _sse_event(event, {'error': payload} if payload else {})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @journal_bp.route('/<int:entry_id>/save-conversation-reflection', methods=['POST'])
 @login_required
 def save_conversation_reflection(entry_id):
@@ -485,7 +577,8 @@ def check_closing_message(entry_id):
 
         return jsonify({
             "ready": closing_ready,
-            "entry_id": entry_id
+            "entry_id": entry_id,
+            "closing_audio_url": entry.closing_audio_url
         })
 
     except Exception as e:
@@ -554,6 +647,8 @@ def save_second_reflection():
             entry.second_reflection = reflection_text
             entry.updated_at = datetime.utcnow()
             entry.conversation_complete = True
+            # Audio of a previous closing message no longer matches
+            entry.closing_audio_url = None
 
             # Log successful update
             logger.debug(f"Successfully updated entry {entry_id} with second reflection")
@@ -600,6 +695,9 @@ def save_second_reflection():
             entry.closing_message = "Thank you for sharing your reflections throughout this conversation. Even though I'm having some technical difficulties generating a personalized response, your willingness to reflect and explore your thoughts shows great self-awareness. Your reflections have been saved.\n\nWarmly,\nCoach Mira"
             db.session.commit()
 
+        # Pre-synthesize the closing message so playback is a static file fetch
+        enqueue_entry_audio(entry_id, KIND_CLOSING)
+
         # Return success response
         return jsonify({
             "success": True,
@@ -667,28 +765,25 @@ def save_reflection():
 
         # Also save to the JSON file if using that for structured data
         try:
-            from journal_service import get_journal_entries_for_user, save_journal_entry
-            entries = get_journal_entries_for_user(current_user.id)
-
-            for json_entry in entries:
-                if json_entry.get('id') == entry_id:
-                    # Update the existing entry with the reflection
-                    save_journal_entry(
-                        entry_id=entry.id,
-                        user_id=current_user.id,
-                        title=entry.title,
-                        content=entry.content, 
-                        anxiety_level=entry.anxiety_level,
-                        created_at=entry.created_at,
-                        updated_at=entry.updated_at,
-                        is_analyzed=entry.is_analyzed,
-                        gpt_response=json_entry.get('gpt_response'),
-                        cbt_patterns=json_entry.get('cbt_patterns'),
-                        structured_data=json_entry.get('structured_data'),
-                        user_reflection=reflection_text
-                    )
-                    logger.debug(f"Updated JSON data for entry {entry_id}")
-                    break
+            json_entry = get_journal_entry(entry_id, current_user.id)
+
+            if json_entry:
+                # Update the existing entry with the reflection
+                save_journal_entry(
+                    entry_id=entry.id,
+                    user_id=current_user.id,
+                    title=entry.title,
+                    content=entry.content, 
+                    anxiety_level=entry.anxiety_level,
+                    created_at=entry.created_at,
+                    updated_at=entry.updated_at,
+                    is_analyzed=entry.is_analyzed,
+                    gpt_response=json_entry.get('gpt_response'),
+                    cbt_patterns=json_entry.get('cbt_patterns'),
+                    structured_data=json_entry.get('structured_data'),
+                    user_reflection=reflection_text
+                )
+                logger.debug(f"Updated JSON data for entry {entry_id}")
         except Exception as json_error:
             # Log but don't fail if JSON update fails
             logger.error(f"Error updating JSON data: {str(json_error)}")
@@ -710,6 +805,54 @@ def save_reflection():
         logger.error(f"Error saving reflection: {str(e)}")
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+class CachedPagination:
+    """
+    Pagination built from cached entries, with the attributes journal.html
+    uses from Flask-SQLAlchemy's Pagination.
+    """
+
+    def __init__(self, items, total, page, per_page):
+        self.items = items
+        self.total = total
+        self.page = page
+        self.per_page = per_page
+        self.pages = (total + per_page - 1) // per_page
+        self.has_prev = page > 1
+        self.has_next = page < self.pages
+        self.prev_num = page - 1 if self.has_prev else None
+        self.next_num = page + 1 if self.has_next else None
+
+    def iter_pages(self, *, left_edge=2, left_current=2, right_current=4, right_edge=2):
+        """Yield page numbers for pagination links, with None for each skipped range."""
+        pages_end = self.pages + 1
+
+        if pages_end == 1:
+            return
+
+        left_end = min(1 + left_edge, pages_end)
+        yield from range(1, left_end)
+
+        if left_end == pages_end:
+            return
+
+        mid_start = max(left_end, self.page - left_current)
+        mid_end = min(self.page + right_current + 1, pages_end)
+
+        if mid_start - left_end > 0:
+            yield None
+
+        yield from range(mid_start, mid_end)
+
+        if mid_end == pages_end:
+            return
+
+        right_start = max(mid_end, pages_end - right_edge)
+
+        if right_start - mid_end > 0:
+            yield None
+
+        yield from range(right_start, pages_end)
+
 # Journal entry list
 @journal_bp.route('/')
 @login_required
@@ -743,21 +886,12 @@ def journal_list():
         
         entries_items = [CachedEntry(entry) for entry in page_entries]
         
-        # Create mock pagination object
-        class MockPagination:
-            def __init__(self, items, total, page, per_page):
-                self.items = items
-                self.total = total
-                self.page = page
-                self.per_page = per_page
-                self.pages = (total + per_page - 1) // per_page
-                self.has_prev = page > 1
-                self.has_next = page < self.pages
-                self.prev_num = page - 1 if self.has_prev else None
-                self.next_num = page + 1 if self.has_next else None
-        
-        entries = MockPagination(entries_items, len(cached_entries), page, per_page)
+        # The cache only holds the newest PRELOAD_ENTRY_LIMIT entries
         total_entries = len(cached_entries)
+        if total_entries >= PRELOAD_ENTRY_LIMIT:
+            total_entries = JournalEntry.query.filter(JournalEntry.user_id == current_user.id).count()
+
+        entries = CachedPagination(entries_items, total_entries, page, per_page)
         
     else:
         # Fall back to database query for non-first pages or when cache miss
@@ -919,152 +1053,15 @@ def new_journal_entry():
                                   structured_data={'insight_text': '', 'reflection_prompt': ''},
                                   view_only=False)
 
-        # Analyze the entry using the improved GPT analysis
-        try:
-            logger.debug(f"Starting GPT analysis for journal entry {entry.id}")
-            analysis_result = analyze_journal_with_gpt(
-                journal_text=form.content.data, 
-                anxiety_level=form.anxiety_level.data,
-                user_id=current_user.id
-            )
-
-            # Safety check to make sure analysis_result is a dictionary
-            if not isinstance(analysis_result, dict):
-                logger.error(f"Invalid analysis result type: {type(analysis_result)}")
-                analysis_result = {
-                    "gpt_response": "Thank you for sharing your journal entry. I've read through your thoughts.\n\nWarmly,\nCoach Mira",
-                    "cbt_patterns": [{
-                        "pattern": "Processing Issue",
-                        "description": "We encountered a technical issue analyzing your entry.",
-                        "recommendation": "Your journal has been saved successfully. The insights will be available soon."
-                    }],
-                    "structured_data": None
-                }
-
-            logger.debug(f"Got analysis result type: {type(analysis_result)}")
-            logger.debug(f"Analysis result keys: {list(analysis_result.keys()) if isinstance(analysis_result, dict) else 'Not a dictionary'}")
-
-            gpt_response = analysis_result.get("gpt_response")
-            cbt_patterns = analysis_result.get("cbt_patterns", [])
-            structured_data = analysis_result.get("structured_data", None)
-
-            # Safety check for gpt_response
-            if not gpt_response:
-                logger.warning("Missing GPT response in analysis result, providing fallback")
-                gpt_response = "Thank you for sharing your journal entry. I've read through your thoughts.\n\nWarmly,\nCoach Mira"
-
-            logger.debug(f"GPT response type: {type(gpt_response)}")
-            logger.debug(f"GPT response length: {len(gpt_response) if gpt_response else 0}")
-            logger.debug(f"GPT response preview: {gpt_response[:100] if gpt_response else 'None'}...")
-
-            # Log structured data status if available
-            if structured_data:
-                logger.debug(f"Structured data available with keys: {list(structured_data.keys())}")
-            else:
-                logger.debug("No structured data available in response")
-
-            # Save the patterns to the database
-            is_api_error = False
-            is_config_error = False
-
-            for pattern in cbt_patterns:
-                try:
-                    # Process pattern safely with our handler
-                    pattern_name, recommendation_text = safe_process_pattern(pattern)
-                    
-                    # Check for different error patterns
-                    if pattern_name == "API Quota Exceeded":
-                        is_api_error = True
-                    elif pattern_name == "API Configuration Issue":
-                        is_config_error = True
-
-                    # Save recommendation to database
-                    recommendation = CBTRecommendation(
-                        thought_pattern=pattern_name,
-                        recommendation=recommendation_text,
-                        journal_entry_id=entry.id
-                    )
-                    db.session.add(recommendation)
-                except Exception as pattern_err:
-                    logger.error(f"Error processing pattern in new entry: {str(pattern_err)}")
-                    # Continue with the next pattern instead of failing completely
-
-            entry.is_analyzed = True
-
-            # Set the conversational fields using structured data if available
-            if structured_data and isinstance(structured_data, dict):
-                logger.debug("Setting conversational fields from structured data")
-                if 'insight_text' in structured_data:
-                    entry.initial_insight = structured_data.get('insight_text')
-                    logger.debug(f"Set initial_insight: {entry.initial_insight[:50]}...")
-                if 'reflection_prompt' in structured_data:
-                    # Include the reflection prompt at the end of the initial insight
-                    if entry.initial_insight:
-                        entry.initial_insight += f"\n\n{structured_data.get('reflection_prompt')}"
-                    else:
-                        entry.initial_insight = structured_data.get('reflection_prompt')
-                    logger.debug(f"Added reflection prompt to initial_insight")
-            else:
-                # Fallback - set the initial_insight to the gpt_response with formatting
-                logger.debug("No structured data available, using gpt_response for initial_insight with improved formatting")
-
-                # Format the insight for better readability
-                if gpt_response:
-                    # Split into paragraphs
-                    paragraphs = gpt_response.split('\n\n')
-                    formatted_paragraphs = []
-
-                    # Format each paragraph with proper HTML
-                    for i, paragraph in enumerate(paragraphs):
-                        if i == 0:
-                            # First paragraph is usually the introduction/validation
-                            formatted_paragraphs.append(f"<div class='validation-section mb-4'>{paragraph}</div>")
-                        elif "pattern" in paragraph.lower() or "distortion" in paragraph.lower():
-                            # Thought patterns section
-                            formatted_paragraphs.append(f"<div class='thought-patterns-section mb-4'><h5 class='mb-3'>Thought Patterns</h5>{paragraph}</div>")
-                        elif "strateg" in paragraph.lower() or "technique" in paragraph.lower() or "exercise" in paragraph.lower():
-                            # Strategies section
-                            formatted_paragraphs.append(f"<div class='strategies-section mb-4'><h5 class='mb-3'>Suggested Strategies</h5>{paragraph}</div>")
-                        elif "reflect" in paragraph.lower() or "consider" in paragraph.lower() or "ask yourself" in paragraph.lower():
-                            # Reflection section
-                            formatted_paragraphs.append(f"<div class='reflection-section mb-4'><h5 class='mb-3'>Reflection Prompts</h5>{paragraph}</div>")
-                        elif i == len(paragraphs) - 1 and "warmly" in paragraph.lower():
-                            # Closing section
-                            formatted_paragraphs.append(f"<div class='closing-section mt-4'>{paragraph}</div>")
-                        else:
-                            # Other paragraphs
-                            formatted_paragraphs.append(f"<div class='paragraph mb-3'>{paragraph}</div>")
-
-                    # Combine the formatted paragraphs
-                    entry.initial_insight = "".join(formatted_paragraphs)
-                else:
-                    entry.initial_insight = gpt_response
-
-            db.session.commit()
-
-            # Save the complete journal entry to JSON file
-            save_journal_entry(
-                entry_id=entry.id,
-                user_id=current_user.id,
-                title=entry.title,
-                content=entry.content,
-                anxiety_level=entry.anxiety_level,
-                created_at=entry.created_at,
-                updated_at=entry.updated_at,
-                is_analyzed=entry.is_analyzed,
-                gpt_response=gpt_response,
-                cbt_patterns=cbt_patterns,
-                structured_data=structured_data
-            )
-
-            # Show appropriate message based on error type
-            if is_api_error:
-                flash('Your journal entry has been saved! AI analysis is currently unavailable due to API usage limits.', 'info')
-            elif is_config_error:
-                flash('Your journal entry has been saved! AI analysis is currently unavailable due to a configuration issue.', 'info')
-            else:
-                flash('Your journal entry has been created with AI analysis!', 'success')
+        # Queue the entry for background analysis so this request returns immediately.
+        # Workers fill in initial_insight, recommendations and is_analyzed; the entry
+        # page polls /journal/check-analysis/<id> until the insight is ready.
+        if enqueue_analysis(entry.id, current_user.id):
+            flash('Your journal entry has been saved! Mira is reflecting on it now.', 'success')
+        else:
+            flash('Your journal entry has been saved! Analysis is busy right now - you can analyze it in a moment.', 'info')
 
+        try:
             # Track the journal entry for community stats (privacy-friendly)
             try:
                 track_journal_entry(user_id=current_user.id, activity_type="journal_created", entry_id=entry.id)
@@ -1075,20 +1072,13 @@ def new_journal_entry():
             # Process gamification elements
             badge_result = gamification.process_journal_entry(current_user.id)
 
-            # Award XP for creating a journal entry
+            # Award XP for creating a journal entry (analysis XP is awarded by the worker)
             xp_data = gamification.award_xp(
                 user_id=current_user.id,
                 xp_amount=gamification.XP_REWARDS['journal_entry'],
                 reason="Created a new journal entry"
             )
-
-            # Award additional XP if entry was analyzed
-            if entry.is_analyzed:
-                gamification.award_xp(
-                    user_id=current_user.id,
-                    xp_amount=gamification.XP_REWARDS['analysis'],
-                    reason="Received insights on journal entry"
-                )
+            db.session.commit()
 
             # Flash notifications for earned badges
             gamification.flash_badge_notifications(badge_result)
@@ -1130,45 +1120,9 @@ def new_journal_entry():
                 session['earned_badge'] = badge
                 session['wellness_fact'] = wellness_fact
 
-        except Exception as e:
-            error_msg = str(e)
-            logger.error(f"Error analyzing journal entry: {error_msg}")
-
-            try:
-                # Update the entry to indicate analysis failed
-                entry.is_analyzed = False
-                db.session.commit()
-
-                # Still save to JSON but with error info
-                save_journal_entry(
-                    entry_id=entry.id,
-                    user_id=current_user.id,
-                    title=entry.title,
-                    content=entry.content,
-                    anxiety_level=entry.anxiety_level,
-                    created_at=entry.created_at,
-                    updated_at=entry.updated_at,
-                    is_analyzed=False,
-                    gpt_response="Error occurred during analysis.",
-                    cbt_patterns=[{
-                        "pattern": "Error analyzing entry",
-                        "description": "We couldn't analyze your journal entry at this time.",
-                        "recommendation": "Please try again later or contact support if the problem persists."
-                    }],
-                    structured_data=None
-                )
-
-                # Show specific error messages based on error type
-                if "API_QUOTA_EXCEEDED" in error_msg:
-                    flash('Your journal entry has been saved! AI analysis is currently unavailable due to API usage limits.', 'info')
-                elif "INVALID_API_KEY" in error_msg:
-                    flash('Your journal entry has been saved! AI analysis is currently unavailable due to a configuration issue.', 'info')
-                else:
-                    flash('Your journal entry has been saved, but analysis could not be completed. You can try analyzing it later.', 'warning')
-            except Exception as inner_e:
-                # Catch any errors in error handling to ensure we still redirect
-                logger.error(f"Error during error handling: {str(inner_e)}")
-                flash('Your journal entry has been saved. There was an issue with the analysis process.', 'warning')
+        except Exception as gamification_error:
+            logger.error(f"Error processing gamification for entry {entry.id}: {str(gamification_error)}")
+            db.session.rollback()
 
         # Wrap the redirect in a try/except to guarantee we don't have a blank page
         try:
@@ -1252,7 +1206,13 @@ def view_journal_entry(entry_id):
 
     # Initialize variables
     coach_response = ""
-    user_entries = get_journal_entries_for_user(current_user.id)
+    # Indexed lookup of this entry's mirrored record (not a scan of every entry)
+    json_entry = get_journal_entry(entry_id, current_user.id)
+    user_entries = [json_entry] if json_entry else []
+
+    # If a background worker is still analyzing this entry, render the pending
+    # state and let the page poll instead of analyzing inline
+    analysis_in_progress = not entry.is_analyzed and is_analysis_in_progress(entry)
 
     # Check conversation state - if initial insight is missing but we have an analyzed entry,
     # populate it from the GPT response
@@ -1326,7 +1286,7 @@ def view_journal_entry(entry_id):
                 break
 
     # If not found, generate a new one
-    if not coach_response:
+    if not coach_response and not analysis_in_progress:
         try:
             analysis_result = analyze_journal_with_gpt(
                 journal_text=entry.content, 
@@ -1381,7 +1341,7 @@ def view_journal_entry(entry_id):
     logger.debug(f"coach_response: {coach_response[:100]}...")
     
     # If the entry is not analyzed yet, trigger automatic analysis
-    if not entry.is_analyzed and (not coach_response or coach_response.strip() == ""):
+    if not entry.is_analyzed and not analysis_in_progress and (not coach_response or coach_response.strip() == ""):
         logger.info(f"Entry {entry_id} not yet analyzed. Automatically triggering analysis...")
         try:
             analysis_result = analyze_journal_with_gpt(
@@ -1511,7 +1471,8 @@ def view_journal_entry(entry_id):
                           recurring_patterns=recurring_patterns,
                           show_call_button=show_call_button,
                           earned_badge=earned_badge,
-                          wellness_fact=wellness_fact)
+                          wellness_fact=wellness_fact,
+                          analysis_in_progress=analysis_in_progress)
 
 # Update journal entry
 @journal_bp.route('/<int:entry_id>/update', methods=['GET', 'POST'])
@@ -1531,15 +1492,25 @@ def update_journal_entry(entry_id):
         entry.content = form.content.data
         entry.anxiety_level = form.anxiety_level.data
         entry.updated_at = datetime.utcnow()
+        # Coping statement is regenerated from the new content on the next dashboard visit
+        entry.coping_statement = None
 
         # Save the changes immediately so they're not lost if analysis fails
         db.session.commit()
+
+        # Recompute the stored NLP features from the new content
+        try:
+            save_entry_features(entry)
+            db.session.commit()
+        except Exception as feature_error:
+            logger.error(f"Error updating NLP features for entry {entry.id}: {str(feature_error)}")
+            db.session.rollback()
         
         # Invalidate user cache after updating entry
         invalidate_user_cache(current_user.id)
 
         # Clear old recommendations
-        CBTRecommendation.query.filter_by(journal_entry_id=entry.id).delete()
+        _delete_recommendations(entry.id)
 
         # Re-analyze the entry with the improved GPT analysis
         try:
@@ -1672,12 +1643,10 @@ def api_journal_coach(entry_id):
     structured_data = None
 
     # Try to get from saved journal entries first
-    user_entries = get_journal_entries_for_user(current_user.id)
-    for json_entry in user_entries:
-        if json_entry.get('id') == entry_id:
-            coach_response = json_entry.get('gpt_response', "")
-            structured_data = json_entry.get('structured_data')
-            break
+    json_entry = get_journal_entry(entry_id, current_user.id)
+    if json_entry:
+        coach_response = json_entry.get('gpt_response', "")
+        structured_data = json_entry.get('structured_data')
 
     # If not found, generate a new one
     if not coach_response:
@@ -1756,7 +1725,7 @@ def api_analyze_entry(entry_id):
 
     try:
         # Clear old recommendations
-        CBTRecommendation.query.filter_by(journal_entry_id=entry.id).delete()
+        _delete_recommendations(entry.id)
 
         # Analyze the entry using the GPT service
         analysis_result = analyze_journal_with_gpt(
@@ -1879,7 +1848,8 @@ def delete_journal_entry(entry_id):
 
     try:
         # Delete recommendations first (cascade doesn't work with SQLAlchemy without setup)
-        CBTRecommendation.query.filter_by(journal_entry_id=entry.id).delete()
+        _delete_recommendations(entry.id)
+        JournalEntryFeatures.query.filter_by(journal_entry_id=entry.id).delete()
 
         # Delete the entry from database
         db.session.delete(entry)
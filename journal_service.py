@@ -3,17 +3,20 @@ import json
 import logging
 import re
 from datetime import datetime
-from openai import OpenAI
 from admin_utils import get_config
-from typing import List, Dict, Any, Optional
+from openai_client import get_shared_client
+from response_cache import cached_chat_completion, is_json_object
+from journal_store import journal_store
+from functools import lru_cache
+from keyword_scanner import KeywordScanner
+from typing import Callable, List, Dict, Any, Optional, Tuple
 
 # Set up logging with more details
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
-# Define data directory and journals file path
+# Define data directory
 DATA_DIR = "data"
-JOURNALS_FILE = os.path.join(DATA_DIR, "journals.json")
 
 # Define helper function for journal content summarization
 def summarize_journal_content(content: str, max_length: int = 100) -> str:
@@ -88,49 +91,38 @@ def get_openai_model():
     return config.get("model", "gpt-4o")
 
 def get_openai_client():
-    return OpenAI(api_key=get_openai_api_key())
+    return get_shared_client(get_openai_api_key())
 
 def ensure_data_directory():
     """Ensure the data directory exists"""
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
-def ensure_journals_file():
-    """Ensure the journals.json file exists with valid JSON"""
-    ensure_data_directory()
-    if not os.path.exists(JOURNALS_FILE):
-        with open(JOURNALS_FILE, 'w') as f:
-            json.dump([], f)
-    else:
-        # Verify that the file contains valid JSON
-        try:
-            with open(JOURNALS_FILE, 'r') as f:
-                json.load(f)
-        except json.JSONDecodeError:
-            # If the file is corrupted, reset it
-            with open(JOURNALS_FILE, 'w') as f:
-                json.dump([], f)
-
-def get_journal_entries_for_user(user_id: int) -> List[Dict[str, Any]]:
+def get_journal_entries_for_user(user_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     Get all journal entries for a specific user.
 
     Args:
         user_id: The ID of the user
+        limit: Optional maximum number of (most recent) entries to return
 
     Returns:
-        A list of journal entries
+        A list of journal entries, newest first
+    """
+    return journal_store.get_entries(user_id, limit=limit)
+
+def get_journal_entry(entry_id: int, user_id: int) -> Optional[Dict[str, Any]]:
     """
-    ensure_journals_file()
-    with open(JOURNALS_FILE, 'r') as f:
-        entries = json.load(f)
+    Get a single journal entry from the user's store.
 
-    # Filter entries for this user
-    user_entries = [entry for entry in entries if entry.get('user_id') == user_id]
-    # Sort by created_at in descending order
-    user_entries.sort(key=lambda entry: entry.get('created_at', ''), reverse=True)
+    Args:
+        entry_id: The ID of the journal entry
+        user_id: The ID of the user
 
-    return user_entries
+    Returns:
+        The journal entry, or None if it isn't stored
+    """
+    return journal_store.get_entry(entry_id, user_id)
 
 def save_journal_entry(
     entry_id: int,
@@ -147,7 +139,7 @@ def save_journal_entry(
     user_reflection: Optional[str] = None
 ) -> None:
     """
-    Save a journal entry to the journals.json file.
+    Save a journal entry to the user's journal store.
 
     Args:
         entry_id: The ID of the journal entry
@@ -165,11 +157,6 @@ def save_journal_entry(
     """
     logger.debug(f"Saving journal entry {entry_id} for user {user_id}")
     try:
-        ensure_journals_file()
-
-        with open(JOURNALS_FILE, 'r') as f:
-            entries = json.load(f)
-
         # Convert datetime objects to ISO format strings
         created_at_str = created_at.isoformat() if isinstance(created_at, datetime) else created_at
         updated_at_str = updated_at.isoformat() if isinstance(updated_at, datetime) else updated_at
@@ -177,52 +164,25 @@ def save_journal_entry(
         # Clean up cbt_patterns to ensure it's a valid list
         clean_patterns = cbt_patterns if cbt_patterns else []
 
-        # Check if we're updating an existing entry
-        entry_found = False
-        for i, entry in enumerate(entries):
-            if entry.get('id') == entry_id and entry.get('user_id') == user_id:
-                logger.debug(f"Updating existing journal entry {entry_id}")
-                entries[i] = {
-                    'id': entry_id,
-                    'user_id': user_id,
-                    'title': title,
-                    'content': content,
-                    'anxiety_level': anxiety_level,
-                    'created_at': created_at_str,
-                    'updated_at': updated_at_str,
-                    'is_analyzed': is_analyzed,
-                    'gpt_response': gpt_response,
-                    'cbt_patterns': clean_patterns,
-                    'structured_data': structured_data,
-                    'user_reflection': user_reflection
-                }
-                entry_found = True
-                break
-
-        if not entry_found:
-            # Entry not found, add a new one
-            logger.debug(f"Adding new journal entry {entry_id}")
-            entries.append({
-                'id': entry_id,
-                'user_id': user_id,
-                'title': title,
-                'content': content,
-                'anxiety_level': anxiety_level,
-                'created_at': created_at_str,
-                'updated_at': updated_at_str,
-                'is_analyzed': is_analyzed,
-                'gpt_response': gpt_response,
-                'cbt_patterns': clean_patterns,
-                'structured_data': structured_data,
-                'user_reflection': user_reflection
-            })
-
-        with open(JOURNALS_FILE, 'w') as f:
-            json.dump(entries, f, indent=2)
+        # Appends a single record to the user's log, replacing any earlier version
+        journal_store.put(user_id, {
+            'id': entry_id,
+            'user_id': user_id,
+            'title': title,
+            'content': content,
+            'anxiety_level': anxiety_level,
+            'created_at': created_at_str,
+            'updated_at': updated_at_str,
+            'is_analyzed': is_analyzed,
+            'gpt_response': gpt_response,
+            'cbt_patterns': clean_patterns,
+            'structured_data': structured_data,
+            'user_reflection': user_reflection
+        })
 
         logger.debug(f"Successfully saved journal entry {entry_id}")
     except Exception as e:
-        logger.error(f"Error saving journal entry to JSON file: {str(e)}")
+        logger.error(f"Error saving journal entry to journal store: {str(e)}")
         # Continue without failing the app - we already have DB record
 
 def count_user_entries(user_id: int) -> int:
@@ -247,8 +207,85 @@ def count_user_entries(user_id: int) -> int:
     except Exception as e:
         # Log the error and fall back to JSON method
         logger.error(f"Error counting user entries from database: {str(e)}")
-        logger.warning("Falling back to JSON-based entry counting")
-        return len(get_journal_entries_for_user(user_id))
+        logger.warning("Falling back to journal store entry counting")
+        return journal_store.count(user_id)
+
+# Keyword lists used by the NLP preprocessing below. They are compiled into a
+# single KeywordScanner so each text is scanned once for every category.
+EMOTION_KEYWORDS = {
+    "anger": ["angry", "furious", "mad", "irritated", "outraged", "annoyed", "frustrated", "enraged"],
+    "sadness": ["sad", "depressed", "grief", "sorrow", "miserable", "heartbroken", "gloomy", "unhappy", "disappointed", "crying"],
+    "fear": ["scared", "afraid", "terrified", "anxious", "worried", "nervous", "panicked", "dread", "frightened"],
+    "hopelessness": ["hopeless", "helpless", "despair", "worthless", "pointless", "lost", "trapped", "giving up"],
+    "stress": ["stressed", "overwhelmed", "pressure", "burden", "exhausted", "burnout", "overloaded"],
+    "joy": ["happy", "excited", "joyful", "delighted", "pleased", "content", "thrilled", "glad", "grateful"]
+}
+
+CRISIS_INDICATORS = {
+    "self_harm": ["kill myself", "suicide", "end my life", "hurt myself", "self harm", "cut myself", 
+                 "don't want to live", "wanting to die", "better off dead"],
+    "violence": ["hurt someone", "kill them", "violent thoughts", "attack", "rage", "revenge", 
+                "make them pay", "want to hurt"],
+    "extreme_distress": ["can't take it anymore", "falling apart", "breaking down", "crisis", 
+                        "emergency", "extreme", "unbearable", "can't cope", "at my limit"],
+    "substance_abuse": ["overdose", "drunk", "drinking too much", "high", "addicted", 
+                       "pills", "drugs", "substance", "relapse"]
+}
+
+LIFE_SITUATIONS = {
+    "parenting": ["my child", "my kid", "my son", "my daughter", "children", "parenting", "mom", "dad", "school"],
+    "relationship": ["my partner", "my husband", "my wife", "my boyfriend", "my girlfriend", "dating", "marriage", "divorce"],
+    "work": ["job", "career", "workplace", "boss", "coworker", "promotion", "fired", "work-life balance", "burnout"],
+    "health": ["illness", "pain", "chronic", "doctor", "diagnosis", "treatment", "medication", "symptom", "recovery"],
+    "grief": ["loss", "died", "passed away", "funeral", "missing someone", "death", "grief", "mourning"]
+}
+
+SENTIMENT_INDICATORS = {
+    "joyful": [
+        "wonderful", "amazing", "blessed", "fantastic", "thrilled",
+        "delighted", "overjoyed", "ecstatic", "blissful", "incredible"
+    ],
+    "positive": [
+        "happy", "grateful", "thankful", "excited", "proud",
+        "peaceful", "calm", "good", "love", "enjoy",
+        "appreciate", "hopeful", "pleased", "content"
+    ],
+    "concern": [
+        "upset", "sad", "confused", "unsure", "bothered",
+        "tired", "annoyed", "difficult", "hard", "struggle"
+    ],
+    "distress": [
+        "anxious", "worried", "scared", "depressed", "hopeless",
+        "overwhelmed", "stressed", "panic", "afraid", "terrified",
+        "lonely", "miserable", "hate", "angry", "frustrated"
+    ]
+}
+
+_keyword_scanner = KeywordScanner(
+    keyword
+    for groups in (EMOTION_KEYWORDS, CRISIS_INDICATORS, LIFE_SITUATIONS, SENTIMENT_INDICATORS)
+    for keywords in groups.values()
+    for keyword in keywords
+)
+
+@lru_cache(maxsize=512)
+def _scan_lowercased(text_lower: str) -> Dict[str, Tuple[int, int]]:
+    return _keyword_scanner.scan(text_lower)
+
+def scan_journal_keywords(text: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Scan a journal text once for every NLP keyword.
+    Results are memoized by text, so the tone, crisis, metadata and sentiment
+    checks on one entry (and history rebuilds over past entries) share a scan.
+    The returned mapping is shared between callers and must not be modified.
+
+    Args:
+        text: The journal entry text
+
+    Returns:
+        Mapping of each keyword found to (occurrences, whole-word occurrences)
+    """
+    return _scan_lowercased((text or "").lower())
 
 def detect_emotional_tone(text: str) -> Dict[str, Any]:
     """
@@ -261,31 +298,11 @@ def detect_emotional_tone(text: str) -> Dict[str, Any]:
     Returns:
         Dictionary with detected emotional tones and confidence levels
     """
-    # Initialize emotion categories with common keywords
-    emotions = {
-        "anger": ["angry", "furious", "mad", "irritated", "outraged", "annoyed", "frustrated", "enraged"],
-        "sadness": ["sad", "depressed", "grief", "sorrow", "miserable", "heartbroken", "gloomy", "unhappy", "disappointed", "crying"],
-        "fear": ["scared", "afraid", "terrified", "anxious", "worried", "nervous", "panicked", "dread", "frightened"],
-        "hopelessness": ["hopeless", "helpless", "despair", "worthless", "pointless", "lost", "trapped", "giving up"],
-        "stress": ["stressed", "overwhelmed", "pressure", "burden", "exhausted", "burnout", "overloaded"],
-        "joy": ["happy", "excited", "joyful", "delighted", "pleased", "content", "thrilled", "glad", "grateful"],
-        "neutral": []  # Default state if no strong emotions detected
-    }
-
-    # Convert text to lowercase for case-insensitive matching
-    text_lower = text.lower()
-
-    # Count occurrences of emotion keywords
+    # Count whole-word occurrences of emotion keywords from a single scan
+    hits = scan_journal_keywords(text)
     emotion_counts = {}
-    for emotion, keywords in emotions.items():
-        if emotion == "neutral":
-            continue  # Skip neutral category in counting
-
-        count = 0
-        for keyword in keywords:
-            # Count whole word matches
-            count += sum(1 for match in re.finditer(r'\b' + keyword + r'\b', text_lower))
-
+    for emotion, keywords in EMOTION_KEYWORDS.items():
+        count = sum(hits[keyword][1] for keyword in keywords if keyword in hits)
         if count > 0:
             emotion_counts[emotion] = count
 
@@ -313,29 +330,11 @@ def detect_crisis_indicators(text: str) -> Dict[str, Any]:
     Returns:
         Dictionary with detected crisis indicators and risk level
     """
-    # Define crisis keywords by category
-    crisis_indicators = {
-        "self_harm": ["kill myself", "suicide", "end my life", "hurt myself", "self harm", "cut myself", 
-                     "don't want to live", "wanting to die", "better off dead"],
-        "violence": ["hurt someone", "kill them", "violent thoughts", "attack", "rage", "revenge", 
-                    "make them pay", "want to hurt"],
-        "extreme_distress": ["can't take it anymore", "falling apart", "breaking down", "crisis", 
-                            "emergency", "extreme", "unbearable", "can't cope", "at my limit"],
-        "substance_abuse": ["overdose", "drunk", "drinking too much", "high", "addicted", 
-                           "pills", "drugs", "substance", "relapse"]
-    }
-
-    # Convert text to lowercase for case-insensitive matching
-    text_lower = text.lower()
-
     # Check for indicators
+    hits = scan_journal_keywords(text)
     detected_indicators = {}
-    for category, phrases in crisis_indicators.items():
-        matches = []
-        for phrase in phrases:
-            if phrase in text_lower:
-                matches.append(phrase)
-
+    for category, phrases in CRISIS_INDICATORS.items():
+        matches = [phrase for phrase in phrases if phrase in hits]
         if matches:
             detected_indicators[category] = matches
 
@@ -365,24 +364,13 @@ def extract_metadata(text: str) -> Dict[str, Any]:
     Returns:
         Dictionary with potential metadata
     """
-    # Define patterns for common life situations
-    life_situations = {
-        "parenting": ["my child", "my kid", "my son", "my daughter", "children", "parenting", "mom", "dad", "school"],
-        "relationship": ["my partner", "my husband", "my wife", "my boyfriend", "my girlfriend", "dating", "marriage", "divorce"],
-        "work": ["job", "career", "workplace", "boss", "coworker", "promotion", "fired", "work-life balance", "burnout"],
-        "health": ["illness", "pain", "chronic", "doctor", "diagnosis", "treatment", "medication", "symptom", "recovery"],
-        "grief": ["loss", "died", "passed away", "funeral", "missing someone", "death", "grief", "mourning"]
-    }
-
-    # Convert to lowercase for matching
-    text_lower = text.lower()
-
     # Detect life situations
+    hits = scan_journal_keywords(text)
     detected_situations = {}
-    for situation, keywords in life_situations.items():
-        for keyword in keywords:
-            if keyword in text_lower:
-                detected_situations[situation] = detected_situations.get(situation, 0) + 1
+    for situation, keywords in LIFE_SITUATIONS.items():
+        count = sum(1 for keyword in keywords if keyword in hits)
+        if count > 0:
+            detected_situations[situation] = count
 
     # Extract the top situations
     top_situations = [k for k, v in sorted(detected_situations.items(), key=lambda item: item[1], reverse=True)]
@@ -392,121 +380,260 @@ def extract_metadata(text: str) -> Dict[str, Any]:
         "word_count": len(text.split())
     }
 
-def get_user_history_context(user_id: int) -> str:
+# Placeholder patterns stored when an analysis fails; never real history
+ANALYSIS_ERROR_PATTERNS = ["Error analyzing entry", "API Quota Exceeded", "API Configuration Issue"]
+
+def compute_entry_features(text: str) -> Dict[str, Any]:
     """
-    Generate detailed context about the user's history from previous entries.
-    Includes recent journal summaries, emotional trends, and identified patterns.
+    Compute the compact NLP feature record for a journal entry.
 
     Args:
-        user_id: The user's ID
+        text: The journal entry text
 
     Returns:
-        String with user history context
+        Dictionary with primary emotion, confidence, risk level, life situations,
+        word count and summary
     """
-    try:
-        entries = get_journal_entries_for_user(user_id)
-
-        if not entries or len(entries) < 2:
-            return ""
-
-        # Analyze emotional trends
-        anxiety_levels = []
-        emotional_tones = []
-        recurring_situations = {}
-        recent_entries_data = []
-
-        # Process the last 5 entries (excluding the most recent one)
-        # We skip the most recent entry because it's likely the current one
-        recent_entries = entries[1:6] if len(entries) > 1 else []
-
-        for entry in recent_entries:
-            # Get detailed data for each entry
-            entry_data = {
-                "date": entry.get("created_at", ""),
-                "title": entry.get("title", "Untitled Entry"),
-                "summary": summarize_journal_content(entry.get("content", "")),
-                "anxiety": entry.get("anxiety_level", 5),
-                "patterns": []
-            }
+    tone = detect_emotional_tone(text)
+    primary_emotion = tone["primary_emotion"]
+    metadata = extract_metadata(text)
 
-            # Get patterns if available
-            patterns = entry.get('cbt_patterns', [])
-            if patterns:
-                for pattern in patterns:
-                    pattern_name = pattern.get('pattern')
-                    if pattern_name and pattern_name not in ["Error analyzing entry", "API Quota Exceeded", "API Configuration Issue"]:
-                        entry_data["patterns"].append(pattern_name)
+    return {
+        "primary_emotion": primary_emotion,
+        "emotion_confidence": tone["emotion_confidence"].get(primary_emotion),
+        "risk_level": detect_crisis_indicators(text)["risk_level"],
+        "life_situations": metadata["life_situations"],
+        "word_count": metadata["word_count"],
+        "summary": summarize_journal_content(text)
+    }
 
-            # Add to list of recent entries
-            recent_entries_data.append(entry_data)
+def save_entry_features(entry) -> Any:
+    """
+    Compute and store the NLP features for a journal entry, replacing any
+    earlier record. The caller is responsible for committing the session.
 
-            # Get anxiety levels
-            if "anxiety_level" in entry:
-                anxiety_levels.append(entry["anxiety_level"])
+    Args:
+        entry: JournalEntry model instance (needs id, user_id and content)
 
-            # Get emotional tones
-            if "content" in entry:
-                tone = detect_emotional_tone(entry["content"])
-                emotional_tones.append(tone["primary_emotion"])
+    Returns:
+        The JournalEntryFeatures record
+    """
+    from app import db
+    from models import JournalEntryFeatures
+
+    features = compute_entry_features((entry.content or "").strip())
+
+    record = JournalEntryFeatures.query.get(entry.id)
+    if record is None:
+        record = JournalEntryFeatures(journal_entry_id=entry.id)
+        db.session.add(record)
+
+    record.user_id = entry.user_id
+    record.primary_emotion = features["primary_emotion"]
+    record.emotion_confidence = features["emotion_confidence"]
+    record.risk_level = features["risk_level"]
+    record.life_situations = ",".join(features["life_situations"])
+    record.word_count = features["word_count"]
+    record.summary = features["summary"]
+    record.computed_at = datetime.utcnow()
+    return record
+
+def _format_history_context(recent_entries_data: List[Dict[str, Any]], anxiety_levels: List[int],
+                            emotional_tones: List[str], recurring_situations: Dict[str, int]) -> str:
+    """Render the history section of the analysis prompt from per-entry data."""
+    # Create context string with historical trends
+    context = []
+
+    # Add anxiety trend
+    if anxiety_levels:
+        avg_anxiety = sum(anxiety_levels) / len(anxiety_levels)
+        if avg_anxiety >= 7:
+            context.append("User has consistently reported high anxiety levels")
+        elif avg_anxiety <= 3:
+            context.append("User has maintained relatively low anxiety levels")
+        elif max(anxiety_levels) - min(anxiety_levels) >= 4:
+            context.append("User has experienced significant fluctuations in anxiety levels")
+
+    # Add emotional tone trends
+    if emotional_tones:
+        # Get most common emotion
+        emotion_counts = {}
+        for emotion in emotional_tones:
+            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+
+        most_common = max(emotion_counts, key=emotion_counts.get)
+        if emotion_counts[most_common] >= 2:
+            context.append(f"User has frequently expressed {most_common}")
+
+    # Add recurring life situations
+    if recurring_situations:
+        top_situation = max(recurring_situations, key=recurring_situations.get)
+        if recurring_situations[top_situation] >= 2:
+            context.append(f"User has been dealing with {top_situation}-related challenges")
+
+    trends_context = ". ".join(context) if context else "No clear trends in recent journals."
+
+    # Now build a detailed history section with recent journal summaries
+    history_section = "RECENT JOURNAL HISTORY:\n"
+    history_section += f"Trends: {trends_context}\n\n"
+
+    # Add summaries of recent entries
+    if recent_entries_data:
+        history_section += "Recent entries (from newest to oldest):\n"
+        for idx, entry in enumerate(recent_entries_data):
+            patterns_text = ", ".join(entry["patterns"]) if entry["patterns"] else "No patterns identified"
+            history_section += f"{idx+1}. {entry['title']} (Anxiety: {entry['anxiety']}/10, Patterns: {patterns_text})\n"
+            history_section += f"   Summary: {entry['summary']}\n\n"
+
+    return history_section
+
+def _get_history_from_features(user_id: int) -> str:
+    """
+    Build the history context from stored feature records. Reads the user's six
+    newest entries through indexed queries; entries written before features
+    existed are backfilled once.
+    """
+    from app import db
+    from models import JournalEntry, JournalEntryFeatures, CBTRecommendation
+    from sqlalchemy import desc
+    from sqlalchemy.orm import load_only
+
+    rows = db.session.query(
+        JournalEntry.id,
+        JournalEntry.title,
+        JournalEntry.anxiety_level,
+        JournalEntryFeatures
+    ).outerjoin(
+        JournalEntryFeatures,
+        JournalEntryFeatures.journal_entry_id == JournalEntry.id
+    ).filter(
+        JournalEntry.user_id == user_id
+    ).order_by(
+        desc(JournalEntry.created_at)
+    ).limit(6).all()
+
+    if len(rows) < 2:
+        return ""
 
-                # Extract situations
-                metadata = extract_metadata(entry["content"])
-                for situation in metadata.get("life_situations", []):
+    # Skip the most recent entry because it's likely the current one
+    recent_rows = rows[1:]
+    entry_ids = [row.id for row in recent_rows]
+    features = {row.id: row.JournalEntryFeatures for row in recent_rows if row.JournalEntryFeatures is not None}
+
+    missing_ids = [entry_id for entry_id in entry_ids if entry_id not in features]
+    if missing_ids:
+        logger.debug(f"Backfilling NLP features for entries {missing_ids}")
+        missing_entries = JournalEntry.query.options(
+            load_only(JournalEntry.id, JournalEntry.user_id, JournalEntry.content)
+        ).filter(JournalEntry.id.in_(missing_ids)).all()
+        for entry in missing_entries:
+            features[entry.id] = save_entry_features(entry)
+        db.session.commit()
+
+    patterns_by_entry = {}
+    pattern_rows = db.session.query(
+        CBTRecommendation.journal_entry_id,
+        CBTRecommendation.thought_pattern
+    ).filter(
+        CBTRecommendation.journal_entry_id.in_(entry_ids),
+        ~CBTRecommendation.thought_pattern.in_(ANALYSIS_ERROR_PATTERNS)
+    ).order_by(CBTRecommendation.id).all()
+    for entry_id, pattern_name in pattern_rows:
+        patterns_by_entry.setdefault(entry_id, []).append(pattern_name)
+
+    anxiety_levels = []
+    emotional_tones = []
+    recurring_situations = {}
+    recent_entries_data = []
+
+    for row in recent_rows:
+        feature = features.get(row.id)
+        recent_entries_data.append({
+            "title": row.title or "Untitled Entry",
+            "summary": feature.summary if feature else "",
+            "anxiety": row.anxiety_level if row.anxiety_level is not None else 5,
+            "patterns": patterns_by_entry.get(row.id, [])
+        })
+
+        if row.anxiety_level is not None:
+            anxiety_levels.append(row.anxiety_level)
+
+        if feature:
+            emotional_tones.append(feature.primary_emotion)
+            for situation in (feature.life_situations or "").split(","):
+                if situation:
                     recurring_situations[situation] = recurring_situations.get(situation, 0) + 1
 
-        # Create context string with historical trends
-        context = []
-
-        # Add anxiety trend
-        if anxiety_levels:
-            avg_anxiety = sum(anxiety_levels) / len(anxiety_levels)
-            if avg_anxiety >= 7:
-                context.append("User has consistently reported high anxiety levels")
-            elif avg_anxiety <= 3:
-                context.append("User has maintained relatively low anxiety levels")
-            elif max(anxiety_levels) - min(anxiety_levels) >= 4:
-                context.append("User has experienced significant fluctuations in anxiety levels")
-
-        # Add emotional tone trends
-        if emotional_tones:
-            # Get most common emotion
-            emotion_counts = {}
-            for emotion in emotional_tones:
-                emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-
-            most_common = max(emotion_counts, key=emotion_counts.get)
-            if emotion_counts[most_common] >= 2:
-                context.append(f"User has frequently expressed {most_common}")
-
-        # Add recurring life situations
-        if recurring_situations:
-            top_situation = max(recurring_situations, key=recurring_situations.get)
-            if recurring_situations[top_situation] >= 2:
-                context.append(f"User has been dealing with {top_situation}-related challenges")
-
-        trends_context = ". ".join(context) if context else "No clear trends in recent journals."
-
-        # Now build a detailed history section with recent journal summaries
-        history_section = "RECENT JOURNAL HISTORY:\n"
-        history_section += f"Trends: {trends_context}\n\n"
-
-        # Add summaries of recent entries
-        if recent_entries_data:
-            history_section += "Recent entries (from newest to oldest):\n"
-            for idx, entry in enumerate(recent_entries_data):
-                patterns_text = ", ".join(entry["patterns"]) if entry["patterns"] else "No patterns identified"
-                history_section += f"{idx+1}. {entry['title']} (Anxiety: {entry['anxiety']}/10, Patterns: {patterns_text})\n"
-                history_section += f"   Summary: {entry['summary']}\n\n"
-
-        return history_section
+    return _format_history_context(recent_entries_data, anxiety_levels, emotional_tones, recurring_situations)
+
+def _get_history_from_store(user_id: int) -> str:
+    """Build the history context from the journal store (fallback when the database is unavailable)."""
+    # Only the latest six entries are used (the newest is the current one)
+    entries = get_journal_entries_for_user(user_id, limit=6)
+
+    if not entries or len(entries) < 2:
+        return ""
+
+    anxiety_levels = []
+    emotional_tones = []
+    recurring_situations = {}
+    recent_entries_data = []
+
+    for entry in entries[1:6]:
+        content = entry.get("content") or ""
+        recent_entries_data.append({
+            "title": entry.get("title", "Untitled Entry"),
+            "summary": summarize_journal_content(content),
+            "anxiety": entry.get("anxiety_level", 5),
+            "patterns": [
+                pattern.get('pattern') for pattern in entry.get('cbt_patterns') or []
+                if pattern.get('pattern') and pattern.get('pattern') not in ANALYSIS_ERROR_PATTERNS
+            ]
+        })
+
+        if entry.get("anxiety_level") is not None:
+            anxiety_levels.append(entry["anxiety_level"])
+
+        if content:
+            features = compute_entry_features(content)
+            emotional_tones.append(features["primary_emotion"])
+            for situation in features["life_situations"]:
+                recurring_situations[situation] = recurring_situations.get(situation, 0) + 1
+
+    return _format_history_context(recent_entries_data, anxiety_levels, emotional_tones, recurring_situations)
+
+def get_user_history_context(user_id: int) -> str:
+    """
+    Generate detailed context about the user's history from previous entries.
+    Includes recent journal summaries, emotional trends, and identified patterns.
+    Uses the per-entry feature records, so no past journal text is re-analyzed.
+
+    Args:
+        user_id: The user's ID
+
+    Returns:
+        String with user history context
+    """
+    try:
+        return _get_history_from_features(user_id)
+    except Exception as e:
+        logger.error(f"Error generating user history context from features: {str(e)}")
+        logger.warning("Falling back to journal store history context")
+        try:
+            from app import db
+            db.session.rollback()
+        except Exception:
+            pass
 
+    try:
+        return _get_history_from_store(user_id)
     except Exception as e:
         logger.error(f"Error generating user history context: {str(e)}")
         return ""
 
 def delete_journal_entry(entry_id: int, user_id: int) -> bool:
     """
-    Delete a journal entry from the journals.json file.
+    Delete a journal entry from the user's journal store.
 
     Args:
         entry_id: The ID of the journal entry to delete
@@ -515,29 +642,17 @@ def delete_journal_entry(entry_id: int, user_id: int) -> bool:
     Returns:
         True if entry was found and deleted, False otherwise
     """
-    logger.debug(f"Deleting journal entry {entry_id} for user {user_id} from JSON file")
+    logger.debug(f"Deleting journal entry {entry_id} for user {user_id} from journal store")
     try:
-        ensure_journals_file()
-
-        with open(JOURNALS_FILE, 'r') as f:
-            entries = json.load(f)
-
-        # Filter out the entry to be deleted
-        original_length = len(entries)
-        entries = [entry for entry in entries if not (entry.get('id') == entry_id and entry.get('user_id') == user_id)]
-
-        # Check if an entry was removed
-        if len(entries) < original_length:
-            logger.debug(f"Journal entry {entry_id} found and removed from JSON file")
-            with open(JOURNALS_FILE, 'w') as f:
-                json.dump(entries, f, indent=2)
-            return True
+        deleted = journal_store.delete(entry_id, user_id)
+        if deleted:
+            logger.debug(f"Journal entry {entry_id} found and removed from journal store")
         else:
-            logger.debug(f"Journal entry {entry_id} not found in JSON file")
-            return False
+            logger.debug(f"Journal entry {entry_id} not found in journal store")
+        return deleted
 
     except Exception as e:
-        logger.error(f"Error deleting journal entry from JSON file: {str(e)}")
+        logger.error(f"Error deleting journal entry from journal store: {str(e)}")
         return False
 
 def get_recurring_patterns(user_id: int, min_entries: int = 3) -> List[Dict[str, int]]:
@@ -639,35 +754,11 @@ def classify_journal_sentiment(text: str, anxiety_level: Optional[int] = None) -
     elif anxiety_level and anxiety_level <= 2:
         return "Joyful"
 
-    # Analyze text content
-    joyful_indicators = [
-        "wonderful", "amazing", "blessed", "fantastic", "thrilled",
-        "delighted", "overjoyed", "ecstatic", "blissful", "incredible"
-    ]
-    
-    positive_indicators = [
-        "happy", "grateful", "thankful", "excited", "proud",
-        "peaceful", "calm", "good", "love", "enjoy",
-        "appreciate", "hopeful", "pleased", "content"
-    ]
-
-    concern_indicators = [
-        "upset", "sad", "confused", "unsure", "bothered",
-        "tired", "annoyed", "difficult", "hard", "struggle"
-    ]
-
-    distress_indicators = [
-        "anxious", "worried", "scared", "depressed", "hopeless",
-        "overwhelmed", "stressed", "panic", "afraid", "terrified",
-        "lonely", "miserable", "hate", "angry", "frustrated"
-    ]
-
-    text_lower = text.lower()
-
     # Count indicators
-    distress_count = sum(1 for word in distress_indicators if word in text_lower)
-    concern_count = sum(1 for word in concern_indicators if word in text_lower)
-    positive_count = sum(1 for word in positive_indicators if word in text_lower)
+    hits = scan_journal_keywords(text)
+    distress_count = sum(1 for word in SENTIMENT_INDICATORS["distress"] if word in hits)
+    concern_count = sum(1 for word in SENTIMENT_INDICATORS["concern"] if word in hits)
+    positive_count = sum(1 for word in SENTIMENT_INDICATORS["positive"] if word in hits)
 
     # Classify based on strongest signal
     if distress_count > 0 and distress_count >= positive_count:
@@ -679,7 +770,8 @@ def classify_journal_sentiment(text: str, anxiety_level: Optional[int] = None) -
     else:
         return "Neutral"
 
-def analyze_journal_with_gpt(journal_text: Optional[str] = None, anxiety_level: Optional[int] = None, user_id: int = 0, mode: str = "initial") -> Dict[str, Any]:
+def analyze_journal_with_gpt(journal_text: Optional[str] = None, anxiety_level: Optional[int] = None, user_id: int = 0, mode: str = "initial",
+                             on_delta: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
     """
     Generate an improved AI analysis of a journal entry that's concise and focused,
     with NLP preprocessing and structured metadata for more personalized responses.
@@ -696,6 +788,9 @@ def analyze_journal_with_gpt(journal_text: Optional[str] = None, anxiety_level:
         journal_text: The journal entry text
         anxiety_level: Anxiety level (1-10)
         user_id: User ID for pattern analysis
+        mode: "initial" for a new entry, "followup" for a reply to the user's reflection
+        on_delta: Optional callback that streams the raw JSON completion text as it
+            is generated; the parsed result is still returned once it is complete
 
     Returns:
         Dictionary with response and identified patterns
@@ -1074,9 +1169,6 @@ def analyze_journal_with_gpt(journal_text: Optional[str] = None, anxiety_level:
 
         # Attempt to make the API call with error handling
         try:
-            # Get a fresh client with the current API key
-            client = get_openai_client()
-
             # Log the API parameters for debugging
             logger.debug(f"Making OpenAI API call with model: {model}, API key (sanitized): {'*****' + api_key[-4:] if api_key else 'None'}")
 
@@ -1088,9 +1180,13 @@ def analyze_journal_with_gpt(journal_text: Optional[str] = None, anxiety_level:
             if is_followup_mode:
                 # For followup mode, use an emotionally intelligent system message that mentions JSON
                 logger.info("Using response_format=json_object for followup mode")
-                # Ensure there's no conflict with variable names
-                api_response = client.chat.completions.create(
+                # Identical prompts are served from the response cache
+                content = cached_chat_completion(
+                    get_openai_client,
+                    mode="journal_followup",
                     model=model,
+                    on_delta=on_delta,
+                    validate=is_json_object,
                     messages=[
                         {"role": "system", "content": """You are Mira, a warm, emotionally intelligent CBT-based coach in Dear Teddy. Provide a thoughtful followup response in JSON format.
 
@@ -1118,8 +1214,12 @@ Be warm, insightful, and genuinely curious in your response."""},
                 )
             else:
                 # For initial mode, use the standard system message
-                api_response = client.chat.completions.create(
+                content = cached_chat_completion(
+                    get_openai_client,
+                    mode="journal_initial",
                     model=model,
+                    on_delta=on_delta,
+                    validate=is_json_object,
                     messages=[
                         {"role": "system", "content": """
 You are Mira, an emotionally intelligent CBT-based journaling coach inside Dear Teddy (formerly Calm Journey). Your goal is to help the user reflect on their emotional experiences in a compassionate, supportive, and directive way.
@@ -1197,8 +1297,9 @@ Omit any fields that are not relevant or not supported by the journal.
 
             # Parse the response with improved error handling
             try:
-                # Get the raw response content 
-                content = api_response.choices[0].message.content
+                # The raw response content comes back from cached_chat_completion
+                if content is None:
+                    content = ""
                 logger.debug(f"Raw OpenAI response content: {content}")  # Log the full content for debugging
                 # Also log the exact format to see any issues
                 logger.debug(f"Response type: {type(content)}, length: {len(content)}")
@@ -1233,7 +1334,6 @@ Omit any fields that are not relevant or not supported by the journal.
 
                     # Sometimes the API returns content with non-JSON text before or after the JSON
                     # Try to extract just the JSON part using regex
-                    import re
                     json_match = re.search(r'(\{.*\})', content, re.DOTALL)
 
                     if json_match:
@@ -0,0 +1,247 @@
+"""
+Per-user, append-only store for the journal JSON mirror.
+Each user's entries live in their own log file (data/journals/user_{id}.jsonl)
+with one JSON record per line. An in-memory index maps entry id to its latest
+record, so a save appends a single line and a lookup never touches other
+users' entries.
+"""
+import os
+import re
+import copy
+import json
+import logging
+from contextlib import contextmanager
+from threading import RLock
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Store settings
+STORE_DIR = os.path.join("data", "journals")
+LEGACY_FILE = os.path.join("data", "journals.json")
+
+# A partition is rewritten once it holds more superseded records than live
+# entries (and at least this many), which keeps each log proportional to the
+# user's entry count.
+COMPACT_MIN_DEAD_RECORDS = 64
+
+_SAFE_ID_RE = re.compile(r"[^A-Za-z0-9_-]")
+
+
+class _Partition:
+    """In-memory index of one user's log file."""
+
+    __slots__ = ("entries", "records", "offset", "inode", "ordered")
+
+    def __init__(self):
+        self.entries: Dict[Any, Dict[str, Any]] = {}
+        self.records = 0
+        self.offset = 0
+        self.inode = None
+        self.ordered: Optional[List[Dict[str, Any]]] = None
+
+
+class JournalStore:
+    """
+    Append-only journal mirror partitioned by user.
+
+    Writes append a "put" or "delete" record to the user's log under an
+    exclusive file lock, so several gunicorn workers can share the store.
+    Each process replays only the bytes it has not seen yet when a log grows,
+    and reloads a partition if another process compacted it.
+    """
+
+    def __init__(self, directory: str = STORE_DIR, legacy_file: Optional[str] = LEGACY_FILE):
+        self.directory = directory
+        self.legacy_file = legacy_file
+        self._partitions: Dict[str, _Partition] = {}
+        self._lock = RLock()
+        self._legacy_checked = False
+
+    def _path(self, user_id: Any) -> str:
+        safe_id = _SAFE_ID_RE.sub("_", str(user_id))
+        return os.path.join(self.directory, f"user_{safe_id}.jsonl")
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared by all processes writing to the store."""
+        os.makedirs(self.directory, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def _apply(partition: _Partition, record: Dict[str, Any]) -> None:
+        partition.records += 1
+        if record.get("op") == "delete":
+            partition.entries.pop(record.get("id"), None)
+        else:
+            entry = record.get("entry") or {}
+            partition.entries[entry.get("id")] = entry
+        partition.ordered = None
+
+    def _refresh(self, user_id: Any) -> _Partition:
+        """Bring the in-memory index for a user up to date with their log file."""
+        key = str(user_id)
+        path = self._path(user_id)
+        partition = self._partitions.get(key)
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            partition = _Partition()
+            self._partitions[key] = partition
+            return partition
+
+        if partition is None or partition.inode != stat.st_ino or stat.st_size < partition.offset:
+            # First load, or the log was compacted by another process
+            partition = _Partition()
+            partition.inode = stat.st_ino
+            self._partitions[key] = partition
+
+        if stat.st_size > partition.offset:
+            with open(path, "rb") as f:
+                f.seek(partition.offset)
+                data = f.read()
+
+            # Only consume complete lines; a partially written record is
+            # picked up on the next refresh
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    self._apply(partition, json.loads(line))
+                except ValueError:
+                    logger.error(f"Skipping corrupt record in {path}")
+            partition.offset += end
+
+        return partition
+
+    def _append(self, user_id: Any, record: Dict[str, Any]) -> None:
+        """Append one record to a user's log and compact it if needed. Caller holds the locks."""
+        path = self._path(user_id)
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+        partition = self._refresh(user_id)
+        dead = partition.records - len(partition.entries)
+        if dead >= COMPACT_MIN_DEAD_RECORDS and dead > len(partition.entries):
+            self._compact(user_id, partition)
+
+    def _compact(self, user_id: Any, partition: _Partition) -> None:
+        """Rewrite a user's log with only their live entries. Caller holds the locks."""
+        path = self._path(user_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            for entry in partition.entries.values():
+                f.write(json.dumps({"op": "put", "entry": entry}, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, path)
+
+        stat = os.stat(path)
+        partition.inode = stat.st_ino
+        partition.offset = stat.st_size
+        partition.records = len(partition.entries)
+        logger.debug(f"Compacted journal log for user {user_id} to {partition.records} records")
+
+    def _migrate_legacy(self) -> None:
+        """
+        Split the old single journals.json file into per-user logs. Runs once per
+        store; entries already present in a user's log are kept as-is.
+        """
+        if self._legacy_checked:
+            return
+        self._legacy_checked = True
+
+        marker = os.path.join(self.directory, ".migrated")
+        if not self.legacy_file or os.path.exists(marker) or not os.path.exists(self.legacy_file):
+            return
+
+        with self._file_lock():
+            if os.path.exists(marker):
+                return
+            try:
+                with open(self.legacy_file, "r") as f:
+                    legacy_entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not read legacy journal file {self.legacy_file}: {str(e)}")
+                legacy_entries = []
+
+            migrated = 0
+            for entry in legacy_entries if isinstance(legacy_entries, list) else []:
+                user_id = entry.get("user_id")
+                if user_id is None or entry.get("id") in self._refresh(user_id).entries:
+                    continue
+                self._append(user_id, {"op": "put", "entry": entry})
+                migrated += 1
+
+            with open(marker, "w") as f:
+                f.write(str(migrated))
+            logger.info(f"Migrated {migrated} journal entries from {self.legacy_file} to per-user logs")
+
+    def get_entries(self, user_id: Any, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Get a user's entries, newest first, optionally only the first `limit`.
+        The entries are copies, so callers can modify them without touching the index.
+        """
+        with self._lock:
+            self._migrate_legacy()
+            partition = self._refresh(user_id)
+            if partition.ordered is None:
+                partition.ordered = sorted(
+                    partition.entries.values(),
+                    key=lambda entry: entry.get("created_at") or "",
+                    reverse=True
+                )
+            entries = partition.ordered[:limit] if limit is not None else partition.ordered
+            return [copy.deepcopy(entry) for entry in entries]
+
+    def get_entry(self, entry_id: Any, user_id: Any) -> Optional[Dict[str, Any]]:
+        """Get a copy of a single entry by id, or None if the user has no such entry."""
+        with self._lock:
+            self._migrate_legacy()
+            entry = self._refresh(user_id).entries.get(entry_id)
+            return copy.deepcopy(entry) if entry is not None else None
+
+    def put(self, user_id: Any, entry: Dict[str, Any]) -> None:
+        """Insert or replace an entry."""
+        with self._lock:
+            self._migrate_legacy()
+            with self._file_lock():
+                self._append(user_id, {"op": "put", "entry": entry})
+
+    def delete(self, entry_id: Any, user_id: Any) -> bool:
+        """Delete an entry. Returns True if it existed."""
+        with self._lock:
+            self._migrate_legacy()
+            with self._file_lock():
+                if entry_id not in self._refresh(user_id).entries:
+                    return False
+                self._append(user_id, {"op": "delete", "id": entry_id})
+                return True
+
+    def count(self, user_id: Any) -> int:
+        """Count a user's entries."""
+        with self._lock:
+            self._migrate_legacy()
+            return len(self._refresh(user_id).entries)
+
+
+# Global store instance
+journal_store = JournalStore()
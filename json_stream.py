@@ -0,0 +1,179 @@
+"""
+Incremental field extraction for Mira's streamed JSON responses.
+Completions arrive a few characters at a time; this parser picks fields out
+of the partial document so the page can show insight_text while the rest of
+the JSON (thought patterns, strategies, ...) is still being generated.
+"""
+import json
+import logging
+from typing import Any, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# String fields whose text is forwarded as it is generated
+STREAMED_TEXT_FIELDS = (
+    "insight_text",
+    "reflection_prompt",
+    "followup_text",
+    "narrative_response",
+    "response",
+)
+
+# List/object fields forwarded once their whole value has arrived
+COMPLETE_VALUE_FIELDS = (
+    "thought_patterns",
+    "distortions",
+    "strategies",
+    "templates",
+    "relationship_questions",
+    "patterns",
+)
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+# Events returned by JsonFieldStream.feed
+TEXT_EVENT = "text"
+VALUE_EVENT = "value"
+
+
+class JsonFieldStream:
+    """
+    Streaming scanner for a JSON object that is still being generated.
+
+    feed() takes the next piece of the document and returns the events it
+    completes: ("text", field, fragment) for new characters of a watched
+    string field, and ("value", field, value) when a watched list or object
+    field has been closed. Fields are matched by key at any nesting depth, so
+    both the flat and the structured_response formats are handled.
+    """
+
+    def __init__(self, text_fields: Iterable[str] = STREAMED_TEXT_FIELDS,
+                 value_fields: Iterable[str] = COMPLETE_VALUE_FIELDS):
+        self.text_fields = set(text_fields)
+        self.value_fields = set(value_fields)
+
+        self._stack: List[str] = []  # open containers, '{' or '['
+        self._key: Optional[str] = None  # key of the value being read in the innermost object
+        self._expect_key = False
+
+        self._in_string = False
+        self._string_role = None  # 'key', 'text' or None for strings we skip
+        self._key_chars: List[str] = []
+        self._escape: Optional[str] = None
+        self._high_surrogate: Optional[int] = None
+
+        self._capture_field: Optional[str] = None
+        self._capture_depth = 0
+        self._capture_chars: List[str] = []
+
+    def feed(self, text: str) -> List[Tuple[str, str, Any]]:
+        """
+        Consume the next piece of the document.
+
+        Args:
+            text: Characters following those already fed
+
+        Returns:
+            List of (event, field, payload) tuples, in document order
+        """
+        events: List[Tuple[str, str, Any]] = []
+        for char in text:
+            self._feed_char(char, events)
+        return events
+
+    def _feed_char(self, char: str, events: List[Tuple[str, str, Any]]) -> None:
+        if self._capture_field is not None:
+            self._capture_chars.append(char)
+
+        if self._in_string:
+            self._string_char(char, events)
+            return
+
+        in_object = bool(self._stack) and self._stack[-1] == '{'
+
+        if char == '"':
+            self._in_string = True
+            if in_object and self._expect_key:
+                self._string_role = 'key'
+                self._key_chars = []
+            elif in_object and self._key in self.text_fields and self._capture_field is None:
+                self._string_role = 'text'
+            else:
+                self._string_role = None
+        elif char in '{[':
+            if in_object and self._key in self.value_fields and self._capture_field is None:
+                self._capture_field = self._key
+                self._capture_depth = len(self._stack)
+                self._capture_chars = [char]
+            self._stack.append(char)
+            self._key = None
+            self._expect_key = char == '{'
+        elif char in '}]':
+            if self._stack:
+                self._stack.pop()
+            if self._capture_field is not None and len(self._stack) == self._capture_depth:
+                self._finish_capture(events)
+            self._key = None
+            self._expect_key = False
+        elif char == ',':
+            self._key = None
+            self._expect_key = bool(self._stack) and self._stack[-1] == '{'
+
+    def _string_char(self, char: str, events: List[Tuple[str, str, Any]]) -> None:
+        if self._escape is not None:
+            self._escape += char
+            if self._escape[0] == 'u':
+                if len(self._escape) < 5:
+                    return
+                decoded = self._decode_unicode(self._escape[1:])
+            else:
+                decoded = _ESCAPES.get(char, char)
+            self._escape = None
+            self._emit_string_text(decoded, events)
+        elif char == '\\':
+            self._escape = ""
+        elif char == '"':
+            self._in_string = False
+            if self._string_role == 'key':
+                self._key = "".join(self._key_chars)
+                self._expect_key = False
+            self._string_role = None
+        else:
+            self._emit_string_text(char, events)
+
+    def _decode_unicode(self, hex_digits: str) -> str:
+        """Decode a \\uXXXX escape, joining UTF-16 surrogate pairs."""
+        try:
+            code = int(hex_digits, 16)
+        except ValueError:
+            return ""
+
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return ""
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        return chr(code)
+
+    def _emit_string_text(self, text: str, events: List[Tuple[str, str, Any]]) -> None:
+        if not text:
+            return
+        if self._string_role == 'key':
+            self._key_chars.append(text)
+        elif self._string_role == 'text':
+            # Merge consecutive characters of the same field into one event
+            if events and events[-1][0] == TEXT_EVENT and events[-1][1] == self._key:
+                events[-1] = (TEXT_EVENT, self._key, events[-1][2] + text)
+            else:
+                events.append((TEXT_EVENT, self._key, text))
+
+    def _finish_capture(self, events: List[Tuple[str, str, Any]]) -> None:
+        field = self._capture_field
+        raw = "".join(self._capture_chars)
+        self._capture_field = None
+        self._capture_chars = []
+        try:
+            events.append((VALUE_EVENT, field, json.loads(raw)))
+        except ValueError as e:
+            logger.debug(f"Could not parse streamed value for {field}: {str(e)}")
@@ -0,0 +1,82 @@
+"""
+Single-pass keyword matcher for the journal NLP preprocessing.
+All keyword lists are folded into one trie-shaped regular expression, so a
+text is scanned once no matter how many keywords or categories there are.
+"""
+import re
+from typing import Dict, Iterable, List, Tuple
+
+
+def _trie_pattern(node: Dict[str, dict]) -> str:
+    """Render a character trie as a regex that prefers the longest keyword."""
+    terminal = "" in node
+    branches = [re.escape(char) + _trie_pattern(child)
+                for char, child in sorted(node.items()) if char != ""]
+
+    if not branches:
+        return ""
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+
+    body = "(?:" + "|".join(branches) + ")"
+    return body + "?" if terminal else body
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+class KeywordScanner:
+    """
+    Finds every occurrence of a fixed set of keywords in one pass.
+
+    Matches may overlap ("my children" contains both "my child" and
+    "children"); each keyword reports how often it occurs as a substring and
+    how often as a whole word (the equivalent of r'\\bkeyword\\b').
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = sorted(set(k for k in keywords if k))
+
+        trie: Dict[str, dict] = {}
+        for keyword in self.keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = {}
+
+        # A zero-width lookahead reports a match at every start position, so
+        # overlapping keywords are all found during the same scan
+        self._pattern = re.compile("(?=(" + _trie_pattern(trie) + "))")
+
+        # The regex returns the longest keyword at each position; shorter
+        # keywords that are prefixes of it matched there as well
+        keyword_set = set(self.keywords)
+        self._prefixes: Dict[str, List[str]] = {
+            keyword: [keyword[:i] for i in range(len(keyword), 0, -1) if keyword[:i] in keyword_set]
+            for keyword in self.keywords
+        }
+
+    def scan(self, text: str) -> Dict[str, Tuple[int, int]]:
+        """
+        Scan text (already lowercased) for all keywords.
+
+        Returns:
+            Mapping of each keyword found to (occurrences, whole-word occurrences)
+        """
+        hits: Dict[str, Tuple[int, int]] = {}
+        if not self.keywords:
+            return hits
+        text_length = len(text)
+
+        for match in self._pattern.finditer(text):
+            start = match.start()
+            starts_word = start == 0 or not _is_word_char(text[start - 1])
+
+            for keyword in self._prefixes[match.group(1)]:
+                end = start + len(keyword)
+                whole_word = starts_word and (end == text_length or not _is_word_char(text[end]))
+                count, word_count = hits.get(keyword, (0, 0))
+                hits[keyword] = (count + 1, word_count + (1 if whole_word else 0))
+
+        return hits
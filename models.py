@@ -1,10 +1,10 @@
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.orm import deferred, load_only
 from flask_dance.consumer.storage.sqla import OAuthConsumerMixin
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, event, inspect
 
 # Import shared database instance
 from extensions import db
@@ -36,6 +36,11 @@ class User(UserMixin, db.Model):
     evening_reminder_enabled = db.Column(db.Boolean, default=True)
     evening_reminder_time = db.Column(db.Time, default=datetime.strptime('20:00', '%H:%M').time())
     
+    # Minute-of-day buckets the reminder scheduler reads (NULL when that reminder is off).
+    # Kept in sync with the preferences above by refresh_reminder_buckets().
+    morning_reminder_minute = db.Column(db.Integer, nullable=True, index=True)
+    evening_reminder_minute = db.Column(db.Integer, nullable=True, index=True)
+    
     # SMS notification settings
     phone_number = db.Column(db.String(20), nullable=True)
     sms_notifications_enabled = db.Column(db.Boolean, default=False)
@@ -50,6 +55,9 @@ class User(UserMixin, db.Model):
     location = db.Column(db.String(100), nullable=True)
     mental_health_concerns = db.Column(db.Text, nullable=True)  # Store as comma-separated values
     
+    # OpenAI voice chosen in the voice settings; used for pre-generated insight audio
+    preferred_voice = db.Column(db.String(16), nullable=True)
+    
     # Relationships
     journal_entries = db.relationship('JournalEntry', backref='author', lazy='dynamic')
     mood_logs = db.relationship('MoodLog', backref='user', lazy='dynamic')
@@ -91,9 +99,46 @@ class User(UserMixin, db.Model):
             'lowest_mood': min(log.mood_score for log in weekly_moods)
         }
     
+    def refresh_reminder_buckets(self):
+        """Recompute the reminder scheduler buckets from the reminder preferences"""
+        # Unset values fall back to the column defaults, which are only applied on INSERT
+        notifications_on = self.notifications_enabled is not False
+        
+        if notifications_on and self.morning_reminder_enabled is not False:
+            self.morning_reminder_minute = reminder_minute_of_day(self.morning_reminder_time or time(8, 0))
+        else:
+            self.morning_reminder_minute = None
+        
+        if notifications_on and self.evening_reminder_enabled is not False:
+            self.evening_reminder_minute = reminder_minute_of_day(self.evening_reminder_time or time(20, 0))
+        else:
+            self.evening_reminder_minute = None
+    
     def __repr__(self):
         return f'<User {self.username}>'
 
+def reminder_minute_of_day(reminder_time):
+    """Bucket a reminder time (server time) into its minute of the day, 0-1439"""
+    return reminder_time.hour * 60 + reminder_time.minute
+
+REMINDER_PREFERENCE_FIELDS = (
+    'notifications_enabled',
+    'morning_reminder_enabled', 'morning_reminder_time',
+    'evening_reminder_enabled', 'evening_reminder_time'
+)
+
+@event.listens_for(User, 'before_insert')
+def _set_reminder_buckets_on_insert(mapper, connection, target):
+    target.refresh_reminder_buckets()
+
+@event.listens_for(User, 'before_update')
+def _set_reminder_buckets_on_update(mapper, connection, target):
+    # Every code path that changes reminder preferences (account settings,
+    # reminder settings, admin scripts) goes through here
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in REMINDER_PREFERENCE_FIELDS):
+        target.refresh_reminder_buckets()
+
 class JournalEntry(db.Model):
     __tablename__ = "journal_entry"
     id = db.Column(db.Integer, primary_key=True)
@@ -112,12 +157,24 @@ class JournalEntry(db.Model):
     closing_message = db.Column(db.Text, nullable=True)  # Mira's closing statement
     conversation_complete = db.Column(db.Boolean, default=False)  # Track if conversation is done
     
+    # Precomputed dashboard coping statement for this entry (regenerated when content changes)
+    coping_statement = db.Column(db.Text, nullable=True)
+    
+    # Static URLs of Mira's insight and closing message, pre-synthesized after analysis
+    insight_audio_url = db.Column(db.String(255), nullable=True)
+    closing_audio_url = db.Column(db.String(255), nullable=True)
+    
     # Foreign key
     user_id = db.Column(db.String, db.ForeignKey('user.id'), nullable=False)
     
     # Relationships
     recommendations = db.relationship('CBTRecommendation', backref='journal_entry', lazy=True)
     
+    # Index for "latest entries for a user" reads (history context, dashboard)
+    __table_args__ = (
+        db.Index('ix_journal_entry_user_created', 'user_id', 'created_at'),
+    )
+    
     def __repr__(self):
         return f'<JournalEntry {self.title}>'
 
@@ -134,6 +191,48 @@ class CBTRecommendation(db.Model):
     def __repr__(self):
         return f'<CBTRecommendation {self.id}>'
 
+class JournalEntryFeatures(db.Model):
+    """NLP features computed once per journal entry and reused to build history context."""
+    __tablename__ = "journal_entry_features"
+    journal_entry_id = db.Column(db.Integer, db.ForeignKey('journal_entry.id'), primary_key=True)
+    user_id = db.Column(db.String, db.ForeignKey('user.id'), nullable=False, index=True)
+    primary_emotion = db.Column(db.String(32), nullable=False, default="neutral")
+    emotion_confidence = db.Column(db.Float, nullable=True)
+    risk_level = db.Column(db.String(16), nullable=False, default="none")
+    life_situations = db.Column(db.String(255), nullable=True)  # Comma-separated, most frequent first
+    word_count = db.Column(db.Integer, default=0)
+    summary = db.Column(db.String(255), nullable=True)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<JournalEntryFeatures {self.journal_entry_id}>'
+
+class UserGamification(db.Model):
+    """XP, streak and badge state for one user (see gamification.py)."""
+    __tablename__ = "user_gamification"
+    user_id = db.Column(db.String, db.ForeignKey('user.id'), primary_key=True)
+    total_xp = db.Column(db.Integer, nullable=False, default=0)
+    current_streak = db.Column(db.Integer, nullable=False, default=0)
+    longest_streak = db.Column(db.Integer, nullable=False, default=0)
+    last_entry_date = db.Column(db.Date, nullable=True)
+    earned_badges = db.Column(db.Text, nullable=False, default='[]')  # JSON list of badge ids, in award order
+    earned_dates = db.Column(db.Text, nullable=False, default='{}')  # JSON map of badge id to display date
+    xp_history = db.Column(db.Text, nullable=False, default='[]')  # JSON list of the latest XP awards
+
+    # Activity counters the badge rules are evaluated against, kept up to date
+    # by gamification.record_event(). NULL until first seeded from the database.
+    entry_count = db.Column(db.Integer, nullable=True)
+    analyzed_entry_count = db.Column(db.Integer, nullable=True)
+    mood_log_count = db.Column(db.Integer, nullable=True)
+    breathing_count = db.Column(db.Integer, nullable=True)
+    login_streak = db.Column(db.Integer, nullable=True)
+    last_login_date = db.Column(db.Date, nullable=True)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<UserGamification {self.user_id}>'
+
 class MoodLog(db.Model):
     __tablename__ = "mood_log"
     id = db.Column(db.Integer, primary_key=True)
@@ -181,3 +280,55 @@ class PushSubscription(db.Model):
     
     def __repr__(self):
         return f'<PushSubscription {self.id}>'
+
+
+class NotificationOutbox(db.Model):
+    """Outbound email, SMS or push message, kept until it is sent or given up on."""
+    __tablename__ = "notification_outbox"
+    id = db.Column(db.Integer, primary_key=True)
+    # Caller-chosen key; queuing the same key twice is a no-op, which is how
+    # daily sends avoid messaging a user twice
+    idempotency_key = db.Column(db.String(255), unique=True, nullable=False)
+    channel = db.Column(db.String(20), nullable=False)  # email, sms or push
+    notification_type = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(db.String, nullable=True, index=True)
+    recipient = db.Column(db.String(255), nullable=True)  # email address or phone number
+    payload = db.Column(db.Text, nullable=False)  # JSON message content for the channel
+
+    # Delivery state: pending, sending, sent or dead (out of retries)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime, nullable=True)  # claim expiry while sending
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # Workers claim due messages by status and retry time
+        db.Index('ix_notification_outbox_status_next', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<NotificationOutbox {self.id} {self.channel} {self.status}>'
+
+
+class NotificationDelivery(db.Model):
+    """Ledger of notifications sent: at most one row per user, notification type and day."""
+    __tablename__ = "notification_delivery"
+    # Not a foreign key: notification jobs also track users from data/users.json
+    user_id = db.Column(db.String, primary_key=True)
+    notification_type = db.Column(db.String(50), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    recipient = db.Column(db.String(255), nullable=True)
+    success = db.Column(db.Boolean, nullable=False, default=True)
+    sent_at = db.Column(db.DateTime, default=datetime.utcnow)
+    details = db.Column(db.Text, nullable=True)  # JSON object with extra details
+
+    __table_args__ = (
+        # Statistics and sweeps select by day and type
+        db.Index('ix_notification_delivery_date_type', 'date', 'notification_type'),
+    )
+
+    def __repr__(self):
+        return f'<NotificationDelivery {self.notification_type} {self.user_id} {self.date}>'
@@ -7,7 +7,7 @@ import os
 import json
 from datetime import datetime
 from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Email, To, Content, Personalization
+from sendgrid.helpers.mail import Mail, Email, To, Content, Personalization, Substitution
 
 # Import fallback email functionality
 try:
@@ -133,6 +133,81 @@ def send_email(to_email, subject, html_content, text_content=None, template_id=N
                 
         return {"success": False, "error": str(e)}
 
+# SendGrid accepts at most this many personalizations in one mail send request
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+
+def apply_substitutions(text, substitutions):
+    """Replace each substitution tag (e.g. "-username-") in text with its value"""
+    if not text or not substitutions:
+        return text
+    for tag, value in substitutions.items():
+        text = text.replace(tag, str(value))
+    return text
+
+def send_batch_email(to_emails, subject, html_content, text_content=None, categories=None, from_email=None,
+                     substitutions=None):
+    """
+    Send the same email to many recipients with one SendGrid request per
+    SENDGRID_MAX_PERSONALIZATIONS recipients. Every recipient gets their own
+    personalization, so nobody sees the other addresses.
+    
+    Args:
+        to_emails (list): Recipients' email addresses
+        subject (str): Email subject
+        html_content (str): HTML content
+        text_content (str, optional): Plain text content
+        categories (list, optional): List of categories for tracking
+        from_email (str, optional): Override sender email
+        substitutions (list, optional): One dict per recipient mapping tags in
+            the subject and content (e.g. "-username-") to that recipient's values
+        
+    Returns:
+        list: One result dict per recipient, in order, as returned by send_email
+    """
+    if not to_emails:
+        return []
+    substitutions = substitutions or [{} for _ in to_emails]
+    
+    if not is_sendgrid_configured():
+        # The fallback system stores emails one by one
+        return [
+            send_email(to_email, apply_substitutions(subject, values), apply_substitutions(html_content, values),
+                       apply_substitutions(text_content, values), categories=categories, from_email=from_email)
+            for to_email, values in zip(to_emails, substitutions)
+        ]
+    
+    results = []
+    sg = get_sendgrid_client()
+    for start in range(0, len(to_emails), SENDGRID_MAX_PERSONALIZATIONS):
+        chunk = to_emails[start:start + SENDGRID_MAX_PERSONALIZATIONS]
+        chunk_substitutions = substitutions[start:start + SENDGRID_MAX_PERSONALIZATIONS]
+        try:
+            message = Mail(from_email=from_email or SENDER_EMAIL)
+            message.subject = subject
+            message.add_content(Content("text/html", html_content))
+            if text_content:
+                message.add_content(Content("text/plain", text_content))
+            
+            for to_email, values in zip(chunk, chunk_substitutions):
+                personalization = Personalization()
+                personalization.add_to(To(to_email))
+                for tag, value in values.items():
+                    personalization.add_substitution(Substitution(tag, str(value)))
+                message.add_personalization(personalization)
+            
+            if categories:
+                for category in categories:
+                    message.add_category(category)
+            
+            response = sg.send(message)
+            logger.info(f"Batch email sent to {len(chunk)} recipients with status code {response.status_code}")
+            results.extend({"success": True, "status_code": response.status_code} for _ in chunk)
+        except Exception as e:
+            logger.error(f"Failed to send batch email to {len(chunk)} recipients: {str(e)}")
+            results.extend({"success": False, "error": str(e)} for _ in chunk)
+    
+    return results
+
 def send_password_reset_email(to_email, reset_token, reset_url=None):
     """
     Send a password reset email with token.
@@ -0,0 +1,447 @@
+"""
+Durable outbox for outbound email, SMS and push notifications.
+
+Senders queue messages in the notification_outbox table under an idempotency
+key and return; dispatch_pending() then claims due messages in batches, sends
+them through a per-channel token bucket, and reschedules failures with
+exponential backoff. Because the key is unique, queuing the same daily
+message twice is a no-op, which replaces the per-day JSON dedupe files.
+
+All functions must be called inside an application context.
+"""
+import os
+import json
+import time
+import random
+import logging
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import or_
+
+logger = logging.getLogger(__name__)
+
+# Channels
+CHANNEL_EMAIL = "email"
+CHANNEL_SMS = "sms"
+CHANNEL_PUSH = "push"
+CHANNELS = (CHANNEL_EMAIL, CHANNEL_SMS, CHANNEL_PUSH)
+
+# Message states
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_DEAD = "dead"
+
+# Email transports: SendGrid (batched) or the SMTP server from the app config
+TRANSPORT_SENDGRID = "sendgrid"
+TRANSPORT_SMTP = "smtp"
+
+# Messages claimed per dispatch batch
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 200))
+# Attempts before a message is marked dead
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 5))
+# Retry delay is OUTBOX_RETRY_BASE_SECONDS * 2^(attempts - 1), capped
+OUTBOX_RETRY_BASE_SECONDS = int(os.environ.get("OUTBOX_RETRY_BASE_SECONDS", 60))
+OUTBOX_RETRY_MAX_SECONDS = int(os.environ.get("OUTBOX_RETRY_MAX_SECONDS", 6 * 3600))
+# A claimed message whose worker died is reclaimed after this long
+OUTBOX_CLAIM_SECONDS = int(os.environ.get("OUTBOX_CLAIM_SECONDS", 600))
+
+# Provider requests per second and burst size, per channel. A batched
+# SendGrid request counts as one request however many recipients it has.
+RATE_LIMITS = {
+    CHANNEL_EMAIL: (float(os.environ.get("OUTBOX_EMAIL_RATE", 10)), int(os.environ.get("OUTBOX_EMAIL_BURST", 20))),
+    CHANNEL_SMS: (float(os.environ.get("OUTBOX_SMS_RATE", 1)), int(os.environ.get("OUTBOX_SMS_BURST", 5))),
+    CHANNEL_PUSH: (float(os.environ.get("OUTBOX_PUSH_RATE", 50)), int(os.environ.get("OUTBOX_PUSH_BURST", 100))),
+}
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter. Tokens refill continuously at `rate` per
+    second up to `capacity`; acquire() waits until enough are available.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self, tokens: int = 1) -> None:
+        """Take tokens from the bucket, sleeping until they are available."""
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# One bucket per channel, shared by every dispatcher in this process
+rate_limiters = {channel: TokenBucket(rate, burst) for channel, (rate, burst) in RATE_LIMITS.items()}
+
+
+def daily_key(notification_type: str, user_id: Any, date: Optional[str] = None) -> str:
+    """
+    Idempotency key for a notification sent to a user at most once a day.
+
+    Args:
+        notification_type: Type of notification (email, sms, ...)
+        user_id: The user's ID
+        date: Date string in YYYY-MM-DD format, defaults to today
+
+    Returns:
+        str: The key
+    """
+    if date is None:
+        date = datetime.now().strftime("%Y-%m-%d")
+    return f"{notification_type}:{user_id}:{date}"
+
+
+def _outbox_insert(connection, table):
+    """Dialect insert construct supporting ON CONFLICT, or None if the database has none."""
+    if connection.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif connection.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
+
+
+def queued_keys(keys: Iterable[str]) -> Set[str]:
+    """
+    Find which idempotency keys are already in the outbox, whatever their status.
+
+    Args:
+        keys: Idempotency keys to look up
+
+    Returns:
+        set: The keys that are already queued or sent
+    """
+    from models import NotificationOutbox
+
+    keys = list(keys)
+    found = set()
+    for start in range(0, len(keys), 500):
+        rows = NotificationOutbox.query.with_entities(NotificationOutbox.idempotency_key).filter(
+            NotificationOutbox.idempotency_key.in_(keys[start:start + 500])
+        ).all()
+        found.update(row.idempotency_key for row in rows)
+    return found
+
+
+def enqueue_many(messages: List[Dict[str, Any]]) -> int:
+    """
+    Queue messages, skipping any whose idempotency key is already in the outbox.
+    Commits the session.
+
+    Args:
+        messages: Dicts with idempotency_key, channel, notification_type,
+            payload (dict) and optional user_id and recipient
+
+    Returns:
+        int: Number of messages newly queued
+    """
+    from app import db
+    from models import NotificationOutbox
+
+    existing = queued_keys(message["idempotency_key"] for message in messages)
+    now = datetime.utcnow()
+    rows = []
+    seen = set(existing)
+    for message in messages:
+        key = message["idempotency_key"]
+        if key in seen:
+            continue
+        if message["channel"] not in CHANNELS:
+            raise ValueError(f"Unknown notification channel: {message['channel']}")
+        seen.add(key)
+        rows.append({
+            "idempotency_key": key,
+            "channel": message["channel"],
+            "notification_type": message["notification_type"],
+            "user_id": str(message["user_id"]) if message.get("user_id") is not None else None,
+            "recipient": message.get("recipient"),
+            "payload": json.dumps(message["payload"]),
+            "status": STATUS_PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        })
+
+    if not rows:
+        return 0
+
+    table = NotificationOutbox.__table__
+    connection = db.session.connection()
+    insert = _outbox_insert(connection, table)
+    if insert is not None:
+        # Another process may queue the same key between the lookup and here
+        connection.execute(insert.on_conflict_do_nothing(index_elements=["idempotency_key"]), rows)
+    else:
+        connection.execute(table.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def enqueue(channel: str, notification_type: str, payload: Dict[str, Any], idempotency_key: str,
+            user_id: Any = None, recipient: Optional[str] = None) -> bool:
+    """
+    Queue one message. See enqueue_many.
+
+    Returns:
+        bool: True if the message was queued, False if its key was already in the outbox
+    """
+    return enqueue_many([{
+        "idempotency_key": idempotency_key,
+        "channel": channel,
+        "notification_type": notification_type,
+        "payload": payload,
+        "user_id": user_id,
+        "recipient": recipient,
+    }]) > 0
+
+
+def _claim_batch(channel: Optional[str], batch_size: int) -> List[Dict[str, Any]]:
+    """
+    Mark a batch of due messages as sending and return their contents.
+    Rows locked by another dispatcher are skipped on databases that support it.
+    """
+    from app import db
+    from models import NotificationOutbox
+
+    now = datetime.utcnow()
+    query = NotificationOutbox.query.filter(or_(
+        (NotificationOutbox.status == STATUS_PENDING) & (NotificationOutbox.next_attempt_at <= now),
+        (NotificationOutbox.status == STATUS_SENDING) & (NotificationOutbox.locked_until < now)
+    ))
+    if channel:
+        query = query.filter(NotificationOutbox.channel == channel)
+
+    rows = query.order_by(NotificationOutbox.next_attempt_at).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    claimed = []
+    for row in rows:
+        row.status = STATUS_SENDING
+        row.locked_until = now + timedelta(seconds=OUTBOX_CLAIM_SECONDS)
+        claimed.append({
+            "id": row.id,
+            "channel": row.channel,
+            "notification_type": row.notification_type,
+            "user_id": row.user_id,
+            "recipient": row.recipient,
+            "payload": json.loads(row.payload),
+            "attempts": row.attempts,
+        })
+    db.session.commit()
+    return claimed
+
+
+def _send_email_batch(messages: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """
+    Send email messages, batching those with identical content into one
+    SendGrid request. Per-recipient values go in the payload's "substitutions"
+    so personalized messages can still share a batch.
+    """
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for message in messages:
+        payload = message["payload"]
+        group_key = (payload.get("transport", TRANSPORT_SENDGRID), payload.get("subject"),
+                     payload.get("html"), payload.get("text"))
+        groups.setdefault(group_key, []).append(message)
+
+    results = {}
+    for (transport, subject, html, text), group in groups.items():
+        if transport == TRANSPORT_SMTP:
+            from improved_email_service import send_email as send_smtp_email
+            from new_email_service import apply_substitutions
+            for message in group:
+                values = message["payload"].get("substitutions")
+                rate_limiters[CHANNEL_EMAIL].acquire()
+                results[message["id"]] = send_smtp_email(
+                    message["recipient"], apply_substitutions(subject, values),
+                    apply_substitutions(html, values), apply_substitutions(text, values)
+                )
+        else:
+            from new_email_service import send_batch_email, SENDGRID_MAX_PERSONALIZATIONS
+            for start in range(0, len(group), SENDGRID_MAX_PERSONALIZATIONS):
+                chunk = group[start:start + SENDGRID_MAX_PERSONALIZATIONS]
+                rate_limiters[CHANNEL_EMAIL].acquire()
+                sent = send_batch_email([message["recipient"] for message in chunk], subject, html, text,
+                                        categories=chunk[0]["payload"].get("categories"),
+                                        substitutions=[message["payload"].get("substitutions") or {} for message in chunk])
+                results.update((message["id"], result) for message, result in zip(chunk, sent))
+    return results
+
+
+def _send_sms_batch(messages: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """Send SMS messages one by one; the SMS provider has no batch API."""
+    from sms_notification_service import send_sms_notification
+
+    results = {}
+    for message in messages:
+        rate_limiters[CHANNEL_SMS].acquire()
+        results[message["id"]] = send_sms_notification(message["recipient"], message["payload"]["body"],
+                                                        user_id=message["user_id"])
+    return results
+
+
+def _send_push_batch(messages: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """Send push messages, fanning out each distinct payload to all its users' subscriptions at once."""
+    from models import PushSubscription
+    from push_notification_service import fan_out, build_payload, SEND_OK
+
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for message in messages:
+        payload = message["payload"]
+        body = build_payload(payload.get("title"), payload.get("body"), payload.get("url"), payload.get("tag"))
+        groups.setdefault(body, []).append(message)
+
+    results = {}
+    for body, group in groups.items():
+        user_ids = {message["user_id"] for message in group}
+        subscriptions = PushSubscription.query.with_entities(
+            PushSubscription.id, PushSubscription.user_id, PushSubscription.subscription_json
+        ).filter(PushSubscription.user_id.in_(user_ids)).all()
+        owner = {subscription.id: subscription.user_id for subscription in subscriptions}
+
+        rate_limiters[CHANNEL_PUSH].acquire(len(subscriptions) or 1)
+        outcomes = fan_out([(subscription.id, subscription.subscription_json) for subscription in subscriptions], body)
+        delivered = {owner[subscription_id] for subscription_id, outcome in outcomes if outcome == SEND_OK}
+
+        for message in group:
+            if message["user_id"] in delivered:
+                results[message["id"]] = {"success": True}
+            else:
+                results[message["id"]] = {"success": False, "error": "No push subscription accepted the notification"}
+    return results
+
+
+CHANNEL_SENDERS = {
+    CHANNEL_EMAIL: _send_email_batch,
+    CHANNEL_SMS: _send_sms_batch,
+    CHANNEL_PUSH: _send_push_batch,
+}
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds to wait before the next attempt, with +/-10% jitter so retries spread out."""
+    delay = min(OUTBOX_RETRY_MAX_SECONDS, OUTBOX_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.9, 1.1)
+
+
+def _record_results(claimed: List[Dict[str, Any]], results: Dict[int, Dict[str, Any]]) -> Dict[str, int]:
+    """Store a batch's outcomes in one transaction and return counts by outcome."""
+    from app import db
+    from models import NotificationOutbox
+    from notification_tracking import record_notifications_sent
+
+    now = datetime.utcnow()
+    updates = []
+    counts = {"sent": 0, "retrying": 0, "dead": 0}
+    for message in claimed:
+        result = results.get(message["id"]) or {"success": False, "error": "No result from sender"}
+        attempts = message["attempts"] + 1
+        update = {"id": message["id"], "attempts": attempts, "locked_until": None}
+
+        if result.get("success"):
+            update.update(status=STATUS_SENT, sent_at=now, last_error=None)
+            counts["sent"] += 1
+        elif attempts >= OUTBOX_MAX_ATTEMPTS:
+            update.update(status=STATUS_DEAD, last_error=str(result.get("error")))
+            counts["dead"] += 1
+            logger.error(f"Giving up on {message['channel']} message {message['id']} after {attempts} attempts: {result.get('error')}")
+        else:
+            update.update(status=STATUS_PENDING, last_error=str(result.get("error")),
+                          next_attempt_at=now + timedelta(seconds=retry_delay(attempts)))
+            counts["retrying"] += 1
+        updates.append(update)
+
+    db.session.bulk_update_mappings(NotificationOutbox, updates)
+    db.session.commit()
+
+    # Keep the delivery ledger up to date
+    record_notifications_sent([
+        {
+            "user_id": message["user_id"],
+            "notification_type": message["notification_type"],
+            "recipient": message["recipient"] or ""
+        }
+        for message in claimed
+        if message["user_id"] and (results.get(message["id"]) or {}).get("success")
+    ])
+
+    return counts
+
+
+def dispatch_pending(channel: Optional[str] = None, batch_size: int = OUTBOX_BATCH_SIZE,
+                     max_batches: Optional[int] = None) -> Dict[str, int]:
+    """
+    Send due messages until none are left (or max_batches have been processed).
+
+    Args:
+        channel: Only dispatch this channel, or None for all channels
+        batch_size: Messages claimed per batch
+        max_batches: Optional limit on the number of batches
+
+    Returns:
+        dict: Counts of messages sent, rescheduled for retry, and given up on
+    """
+    from app import db
+
+    totals = {"sent": 0, "retrying": 0, "dead": 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        claimed = _claim_batch(channel, batch_size)
+        if not claimed:
+            break
+        batches += 1
+
+        by_channel: Dict[str, List[Dict[str, Any]]] = {}
+        for message in claimed:
+            by_channel.setdefault(message["channel"], []).append(message)
+
+        results: Dict[int, Dict[str, Any]] = {}
+        for message_channel, messages in by_channel.items():
+            try:
+                results.update(CHANNEL_SENDERS[message_channel](messages))
+            except Exception as e:
+                # Leave these for a retry rather than losing them
+                logger.error(f"Error sending {message_channel} batch: {str(e)}")
+                db.session.rollback()
+                results.update((message["id"], {"success": False, "error": str(e)}) for message in messages)
+
+        for outcome, count in _record_results(claimed, results).items():
+            totals[outcome] += count
+
+    if batches:
+        logger.info(f"Outbox dispatch finished: {totals}")
+    return totals
+
+
+def get_outbox_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Count outbox messages by channel and status.
+
+    Returns:
+        dict: {channel: {status: count}}
+    """
+    from app import db
+    from models import NotificationOutbox
+
+    stats: Dict[str, Dict[str, int]] = {channel: {} for channel in CHANNELS}
+    rows = db.session.query(
+        NotificationOutbox.channel, NotificationOutbox.status, db.func.count(NotificationOutbox.id)
+    ).group_by(NotificationOutbox.channel, NotificationOutbox.status).all()
+    for channel, status, count in rows:
+        stats.setdefault(channel, {})[status] = count
+    return stats
@@ -2,106 +2,144 @@
 Enhanced notification tracking system.
 This module provides functions for tracking which notifications have been sent
 and when, with detailed logging and reporting.
+
+Deliveries are stored in the notification_delivery table, one row per user,
+notification type and day, so dedupe checks are indexed lookups and the
+statistics are SQL aggregates. Tracking functions must be called inside an
+application context.
 """
-import os
 import json
 import logging
 import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, Iterable, List, Optional, Any, Set, Union
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Notification types reported by get_notification_stats
+NOTIFICATION_TYPES = ["email", "sms", "weekly_summary"]
+
+# Where tracking was stored before the ledger table (one JSON file per type and day)
+LEGACY_TRACKING_DIR = "data/notifications"
+
+# Maximum number of user IDs per IN (...) lookup
+_LOOKUP_BATCH_SIZE = 500
+
 def ensure_data_directory():
     """Ensure the data directories exist"""
     Path("data").mkdir(exist_ok=True)
-    Path("data/notifications").mkdir(exist_ok=True)
     Path("data/logs").mkdir(exist_ok=True)
     Path("data/logs/notifications").mkdir(exist_ok=True)
 
-def get_notification_tracking_file(notification_type: str, date: Optional[str] = None) -> str:
-    """
-    Get the path to the notification tracking file for a specific type and date.
-    
-    Args:
-        notification_type: Type of notification (email, sms, weekly_summary)
-        date: Date string in YYYY-MM-DD format, defaults to today
-        
-    Returns:
-        Path to the tracking file
-    """
+def _parse_date(date: Optional[str] = None) -> datetime.date:
+    """Convert a YYYY-MM-DD string (default today) to a date"""
     if date is None:
-        date = datetime.datetime.now().strftime("%Y-%m-%d")
-        
-    return f"data/notifications/{notification_type}_{date}.json"
+        return datetime.datetime.now().date()
+    return datetime.datetime.strptime(date, "%Y-%m-%d").date()
 
-def load_notification_tracking(notification_type: str, date: Optional[str] = None) -> Dict[str, Any]:
-    """
-    Load notification tracking data for a specific type and date.
-    
-    Args:
-        notification_type: Type of notification (email, sms, weekly_summary)
-        date: Date string in YYYY-MM-DD format, defaults to today
-        
-    Returns:
-        Dictionary mapping user IDs to notification data
-    """
-    ensure_data_directory()
-    tracking_file = get_notification_tracking_file(notification_type, date)
-    
-    if os.path.exists(tracking_file):
+def _delivery_to_dict(delivery) -> Dict[str, Any]:
+    """Convert a NotificationDelivery row to the tracking entry format"""
+    entry = {
+        "timestamp": delivery.sent_at.isoformat() if delivery.sent_at else None,
+        "recipient": delivery.recipient,
+        "success": delivery.success
+    }
+    if delivery.details:
         try:
-            with open(tracking_file, "r") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            logger.error(f"Invalid JSON in tracking file {tracking_file}")
-            return {}
-        except Exception as e:
-            logger.error(f"Error loading notification tracking from {tracking_file}: {str(e)}")
-            return {}
+            entry.update(json.loads(delivery.details))
+        except ValueError:
+            logger.error(f"Invalid details JSON for {delivery!r}")
+    return entry
+
+def _delivery_insert(connection, table):
+    """Dialect insert construct supporting ON CONFLICT, or None if the database has none."""
+    if connection.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif connection.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
     else:
-        return {}
+        return None
+    return insert(table)
 
-def save_notification_tracking(
-    notification_type: str, 
-    tracking_data: Dict[str, Any], 
-    date: Optional[str] = None
-) -> bool:
+def record_notifications_sent(records: List[Dict[str, Any]]) -> bool:
     """
-    Save notification tracking data for a specific type and date.
-    
+    Record many sent notifications in one statement. A later record for the
+    same user, type and day replaces the earlier one.
+
     Args:
-        notification_type: Type of notification (email, sms, weekly_summary)
-        tracking_data: Dictionary mapping user IDs to notification data
-        date: Date string in YYYY-MM-DD format, defaults to today
-        
+        records: Dicts with user_id, notification_type, recipient and optional
+            success (default True), details and date (YYYY-MM-DD, default today)
+
     Returns:
         True if successful, False otherwise
     """
-    ensure_data_directory()
-    tracking_file = get_notification_tracking_file(notification_type, date)
-    
-    try:
-        with open(tracking_file, "w") as f:
-            json.dump(tracking_data, f, indent=2)
+    from app import db
+    from models import NotificationDelivery
+
+    if not records:
         return True
+
+    now = datetime.datetime.utcnow()
+    rows = {}
+    for record in records:
+        key = (str(record["user_id"]), record["notification_type"], _parse_date(record.get("date")))
+        # Last record wins when a batch repeats a key
+        rows[key] = {
+            "user_id": key[0],
+            "notification_type": key[1],
+            "date": key[2],
+            "recipient": record.get("recipient"),
+            "success": record.get("success", True),
+            "sent_at": now,
+            "details": json.dumps(record["details"]) if record.get("details") else None
+        }
+    rows = list(rows.values())
+
+    try:
+        table = NotificationDelivery.__table__
+        connection = db.session.connection()
+        insert = _delivery_insert(connection, table)
+        if insert is not None:
+            statement = insert.on_conflict_do_update(
+                index_elements=["user_id", "notification_type", "date"],
+                set_={name: insert.excluded[name] for name in ("recipient", "success", "sent_at", "details")}
+            )
+            connection.execute(statement, rows)
+        else:
+            for row in rows:
+                db.session.merge(NotificationDelivery(**row))
+        db.session.commit()
     except Exception as e:
-        logger.error(f"Error saving notification tracking to {tracking_file}: {str(e)}")
+        db.session.rollback()
+        logger.error(f"Error recording notifications: {str(e)}")
         return False
 
+    _append_activity([
+        {
+            "timestamp": now.isoformat(),
+            "user_id": row["user_id"],
+            "notification_type": row["notification_type"],
+            "recipient": row["recipient"],
+            "success": row["success"],
+            **({"details": json.loads(row["details"])} if row["details"] else {})
+        }
+        for row in rows
+    ])
+    return True
+
 def record_notification_sent(
-    user_id: Union[str, int], 
-    notification_type: str, 
-    recipient: str, 
-    success: bool = True, 
+    user_id: Union[str, int],
+    notification_type: str,
+    recipient: str,
+    success: bool = True,
     details: Optional[Dict[str, Any]] = None,
     date: Optional[str] = None
 ) -> bool:
     """
     Record that a notification was sent to a user.
-    
+
     Args:
         user_id: User ID
         notification_type: Type of notification (email, sms, weekly_summary)
@@ -109,142 +147,164 @@ def record_notification_sent(
         success: Whether the notification was successfully sent
         details: Additional details about the notification
         date: Date string in YYYY-MM-DD format, defaults to today
-        
+
     Returns:
         True if successful, False otherwise
     """
-    # Convert user_id to string for consistency
-    user_id = str(user_id)
-    
-    # Set default date to today
-    if date is None:
-        date = datetime.datetime.now().strftime("%Y-%m-%d")
-    
-    # Load existing tracking data
-    tracking_data = load_notification_tracking(notification_type, date)
-    
-    # Create entry for this notification
-    timestamp = datetime.datetime.now().isoformat()
-    entry = {
-        "timestamp": timestamp,
+    return record_notifications_sent([{
+        "user_id": user_id,
+        "notification_type": notification_type,
         "recipient": recipient,
-        "success": success
-    }
-    
-    # Add additional details if provided
-    if details:
-        entry.update(details)
-    
-    # Add to tracking data
-    tracking_data[user_id] = entry
-    
-    # Save updated tracking data
-    if save_notification_tracking(notification_type, tracking_data, date):
-        # Also log this notification in the detailed log
-        log_notification_activity(user_id, notification_type, recipient, success, details)
-        return True
-    else:
-        return False
+        "success": success,
+        "details": details,
+        "date": date
+    }])
+
+def users_received_notification(
+    user_ids: Iterable[Union[str, int]],
+    notification_type: str,
+    date: Optional[str] = None
+) -> Set[str]:
+    """
+    Find which of the given users successfully received a notification of a
+    specific type on a specific date.
+
+    Args:
+        user_ids: User IDs to check
+        notification_type: Type of notification (email, sms, weekly_summary)
+        date: Date string in YYYY-MM-DD format, defaults to today
+
+    Returns:
+        Set of the user IDs (as strings) that received the notification
+    """
+    from models import NotificationDelivery
+
+    user_ids = list({str(user_id) for user_id in user_ids})
+    day = _parse_date(date)
+    received = set()
+    for start in range(0, len(user_ids), _LOOKUP_BATCH_SIZE):
+        rows = NotificationDelivery.query.with_entities(NotificationDelivery.user_id).filter(
+            NotificationDelivery.notification_type == notification_type,
+            NotificationDelivery.date == day,
+            NotificationDelivery.success.is_(True),
+            NotificationDelivery.user_id.in_(user_ids[start:start + _LOOKUP_BATCH_SIZE])
+        ).all()
+        received.update(row.user_id for row in rows)
+    return received
 
 def user_received_notification(
-    user_id: Union[str, int], 
-    notification_type: str, 
+    user_id: Union[str, int],
+    notification_type: str,
     date: Optional[str] = None
 ) -> bool:
     """
     Check if a user has received a notification of a specific type on a specific date.
-    
+
     Args:
         user_id: User ID
         notification_type: Type of notification (email, sms, weekly_summary)
         date: Date string in YYYY-MM-DD format, defaults to today
-        
+
     Returns:
         True if the user received the notification, False otherwise
     """
-    # Convert user_id to string for consistency
-    user_id = str(user_id)
-    
-    # Load tracking data
-    tracking_data = load_notification_tracking(notification_type, date)
-    
-    # Check if user is in tracking data and notification was successful
-    if user_id in tracking_data and tracking_data[user_id].get("success", False):
-        return True
-    else:
-        return False
+    return bool(users_received_notification([user_id], notification_type, date))
+
+def load_notification_tracking(notification_type: str, date: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load notification tracking data for a specific type and date.
+
+    Args:
+        notification_type: Type of notification (email, sms, weekly_summary)
+        date: Date string in YYYY-MM-DD format, defaults to today
+
+    Returns:
+        Dictionary mapping user IDs to notification data
+    """
+    from models import NotificationDelivery
+
+    deliveries = NotificationDelivery.query.filter_by(
+        notification_type=notification_type,
+        date=_parse_date(date)
+    ).all()
+    return {delivery.user_id: _delivery_to_dict(delivery) for delivery in deliveries}
 
 def get_notification_status(
-    user_id: Union[str, int], 
-    notification_type: str, 
+    user_id: Union[str, int],
+    notification_type: str,
     date: Optional[str] = None
 ) -> Optional[Dict[str, Any]]:
     """
     Get the status of a notification for a specific user.
-    
+
     Args:
         user_id: User ID
         notification_type: Type of notification (email, sms, weekly_summary)
         date: Date string in YYYY-MM-DD format, defaults to today
-        
+
     Returns:
         Notification status dictionary or None if not found
     """
-    # Convert user_id to string for consistency
-    user_id = str(user_id)
-    
-    # Load tracking data
-    tracking_data = load_notification_tracking(notification_type, date)
-    
-    # Return user's status if found
-    if user_id in tracking_data:
-        return tracking_data[user_id]
-    else:
-        return None
+    from models import NotificationDelivery
+
+    delivery = NotificationDelivery.query.get((str(user_id), notification_type, _parse_date(date)))
+    return _delivery_to_dict(delivery) if delivery else None
 
 def count_notifications_sent(notification_type: str, date: Optional[str] = None) -> int:
     """
     Count how many notifications of a specific type were successfully sent on a specific date.
-    
+
     Args:
         notification_type: Type of notification (email, sms, weekly_summary)
         date: Date string in YYYY-MM-DD format, defaults to today
-        
+
     Returns:
         Count of successful notifications
     """
-    # Load tracking data
-    tracking_data = load_notification_tracking(notification_type, date)
-    
-    # Count successful notifications
-    return sum(1 for entry in tracking_data.values() if entry.get("success", False))
+    from models import NotificationDelivery
+
+    return NotificationDelivery.query.filter(
+        NotificationDelivery.notification_type == notification_type,
+        NotificationDelivery.date == _parse_date(date),
+        NotificationDelivery.success.is_(True)
+    ).count()
+
+def _append_activity(entries: List[Dict[str, Any]]) -> bool:
+    """Append entries to today's activity log, one JSON object per line"""
+    ensure_data_directory()
+
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d")
+    log_file = f"data/logs/notifications/activity_{timestamp}.jsonl"
+
+    try:
+        with open(log_file, "a") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        return True
+    except Exception as e:
+        logger.error(f"Error saving notification log: {str(e)}")
+        return False
 
 def log_notification_activity(
-    user_id: Union[str, int], 
-    notification_type: str, 
-    recipient: str, 
-    success: bool, 
+    user_id: Union[str, int],
+    notification_type: str,
+    recipient: str,
+    success: bool,
     details: Optional[Dict[str, Any]] = None
 ) -> bool:
     """
     Log notification activity to a detailed log file.
-    
+
     Args:
         user_id: User ID
         notification_type: Type of notification (email, sms, weekly_summary)
         recipient: Recipient address (email or phone)
         success: Whether the notification was successfully sent
         details: Additional details about the notification
-        
+
     Returns:
         True if successful, False otherwise
     """
-    ensure_data_directory()
-    
-    # Generate log file name with timestamp
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d")
-    log_file = f"data/logs/notifications/activity_{timestamp}.json"
-    
     # Create log entry
     entry = {
         "timestamp": datetime.datetime.now().isoformat(),
@@ -253,167 +313,128 @@ def log_notification_activity(
         "recipient": recipient,
         "success": success
     }
-    
+
     # Add additional details if provided
     if details:
         entry["details"] = details
-    
-    # Load existing log
-    log_entries = []
-    if os.path.exists(log_file):
-        try:
-            with open(log_file, "r") as f:
-                log_entries = json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading notification log: {str(e)}")
-            # Continue with empty log if there was an error
-    
-    # Append new entry
-    log_entries.append(entry)
-    
-    # Save updated log
-    try:
-        with open(log_file, "w") as f:
-            json.dump(log_entries, f, indent=2)
-        return True
-    except Exception as e:
-        logger.error(f"Error saving notification log: {str(e)}")
-        return False
+
+    return _append_activity([entry])
 
 def get_notification_statistics(
-    notification_type: Optional[str] = None, 
-    start_date: Optional[str] = None, 
+    notification_type: Optional[str] = None,
+    start_date: Optional[str] = None,
     end_date: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Get statistics about notifications sent over a date range.
-    
+
     Args:
         notification_type: Type of notification (email, sms, weekly_summary), or None for all types
         start_date: Start date string in YYYY-MM-DD format, defaults to 7 days ago
         end_date: End date string in YYYY-MM-DD format, defaults to today
-        
+
     Returns:
         Dictionary containing notification statistics
     """
+    from app import db
+    from models import NotificationDelivery
+
     # Set default dates
-    if end_date is None:
-        end_date_obj = datetime.datetime.now()
-        end_date = end_date_obj.strftime("%Y-%m-%d")
-    else:
-        end_date_obj = datetime.datetime.strptime(end_date, "%Y-%m-%d")
-    
-    if start_date is None:
-        start_date_obj = end_date_obj - datetime.timedelta(days=7)
-        start_date = start_date_obj.strftime("%Y-%m-%d")
-    else:
-        start_date_obj = datetime.datetime.strptime(start_date, "%Y-%m-%d")
-    
+    end_day = _parse_date(end_date)
+    start_day = _parse_date(start_date) if start_date else end_day - datetime.timedelta(days=7)
+
+    notification_types = [notification_type] if notification_type else NOTIFICATION_TYPES
+
     # Initialize statistics
     stats = {
-        "start_date": start_date,
-        "end_date": end_date,
+        "start_date": start_day.strftime("%Y-%m-%d"),
+        "end_date": end_day.strftime("%Y-%m-%d"),
         "total_sent": 0,
         "total_failed": 0,
         "by_date": {},
-        "by_type": {}
+        "by_type": {ntype: {"sent": 0, "failed": 0} for ntype in notification_types}
     }
-    
-    # Generate list of dates in range
-    current_date_obj = start_date_obj
-    while current_date_obj <= end_date_obj:
-        current_date = current_date_obj.strftime("%Y-%m-%d")
-        stats["by_date"][current_date] = {"sent": 0, "failed": 0}
-        
-        # Check notifications for this date
-        notification_types = ["email", "sms", "weekly_summary"]
-        if notification_type:
-            notification_types = [notification_type]
-        
-        for ntype in notification_types:
-            if ntype not in stats["by_type"]:
-                stats["by_type"][ntype] = {"sent": 0, "failed": 0}
-            
-            tracking_data = load_notification_tracking(ntype, current_date)
-            sent = sum(1 for entry in tracking_data.values() if entry.get("success", False))
-            failed = len(tracking_data) - sent
-            
-            # Update statistics
-            stats["by_date"][current_date]["sent"] += sent
-            stats["by_date"][current_date]["failed"] += failed
-            stats["by_type"][ntype]["sent"] += sent
-            stats["by_type"][ntype]["failed"] += failed
-            stats["total_sent"] += sent
-            stats["total_failed"] += failed
-        
-        # Move to next date
-        current_date_obj += datetime.timedelta(days=1)
-    
+
+    day = start_day
+    while day <= end_day:
+        stats["by_date"][day.strftime("%Y-%m-%d")] = {"sent": 0, "failed": 0}
+        day += datetime.timedelta(days=1)
+
+    rows = db.session.query(
+        NotificationDelivery.date,
+        NotificationDelivery.notification_type,
+        NotificationDelivery.success,
+        db.func.count()
+    ).filter(
+        NotificationDelivery.date.between(start_day, end_day),
+        NotificationDelivery.notification_type.in_(notification_types)
+    ).group_by(
+        NotificationDelivery.date,
+        NotificationDelivery.notification_type,
+        NotificationDelivery.success
+    ).all()
+
+    for day, ntype, success, count in rows:
+        outcome = "sent" if success else "failed"
+        stats["by_date"][day.strftime("%Y-%m-%d")][outcome] += count
+        stats["by_type"][ntype][outcome] += count
+        stats["total_" + outcome] += count
+
     return stats
 
 def clear_tracking_data(notification_type: str, date: Optional[str] = None) -> bool:
     """
     Clear tracking data for a specific notification type and date.
     This is useful for testing or resetting notifications.
-    
+
     Args:
         notification_type: Type of notification (email, sms, weekly_summary)
         date: Date string in YYYY-MM-DD format, defaults to today
-        
+
     Returns:
         True if successful, False otherwise
     """
-    tracking_file = get_notification_tracking_file(notification_type, date)
-    
-    if os.path.exists(tracking_file):
-        try:
-            # Backup the file before removing
-            backup_file = f"{tracking_file}.bak"
-            with open(tracking_file, "r") as src:
-                with open(backup_file, "w") as dst:
-                    dst.write(src.read())
-            
-            # Remove the file
-            os.remove(tracking_file)
-            logger.info(f"Cleared tracking data for {notification_type} on {date or 'today'}")
-            return True
-        except Exception as e:
-            logger.error(f"Error clearing tracking data: {str(e)}")
-            return False
-    else:
-        # File doesn't exist, nothing to clear
+    from app import db
+    from models import NotificationDelivery
+
+    try:
+        NotificationDelivery.query.filter_by(
+            notification_type=notification_type,
+            date=_parse_date(date)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        logger.info(f"Cleared tracking data for {notification_type} on {date or 'today'}")
         return True
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error clearing tracking data: {str(e)}")
+        return False
 
 def get_users_without_notification(notification_type: str, users: List[Dict[str, Any]], date: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Get a list of users who haven't received a notification of a specific type on a specific date.
-    
+
     Args:
         notification_type: Type of notification (email, sms, weekly_summary)
         users: List of user dictionaries
         date: Date string in YYYY-MM-DD format, defaults to today
-        
+
     Returns:
         List of users who haven't received the notification
     """
-    tracking_data = load_notification_tracking(notification_type, date)
-    
-    # Filter users who haven't received notification
-    users_without_notification = []
-    for user in users:
-        user_id = str(user.get("id", ""))
-        if not user_id:
-            continue
-            
-        if user_id not in tracking_data or not tracking_data[user_id].get("success", False):
-            users_without_notification.append(user)
-    
-    return users_without_notification
+    users = [user for user in users if str(user.get("id", ""))]
+    received = users_received_notification((user["id"] for user in users), notification_type, date)
+
+    return [user for user in users if str(user["id"]) not in received]
 
-def get_notification_stats() -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+def get_notification_stats(start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
     """
-    Get comprehensive notification stats for all types and dates.
-    
+    Get notification records for all types, organized by type and date.
+
+    Args:
+        start_date: Optional first date (YYYY-MM-DD) to include
+        end_date: Optional last date (YYYY-MM-DD) to include
+
     Returns:
         Dictionary organized by notification type and then date, containing all notification records
         Example: {
@@ -425,47 +446,82 @@ def get_notification_stats() -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
             }
         }
     """
-    ensure_data_directory()
-    stats = {
-        "email": {},
-        "sms": {},
-        "weekly_summary": {}
-    }
-    
-    # Scan the notifications directory for tracking files
-    notifications_dir = Path("data/notifications")
-    if not notifications_dir.exists():
-        return stats
-        
-    for file_path in notifications_dir.glob("*.json"):
+    from models import NotificationDelivery
+
+    stats = {ntype: {} for ntype in NOTIFICATION_TYPES}
+
+    query = NotificationDelivery.query.filter(NotificationDelivery.notification_type.in_(NOTIFICATION_TYPES))
+    if start_date:
+        query = query.filter(NotificationDelivery.date >= _parse_date(start_date))
+    if end_date:
+        query = query.filter(NotificationDelivery.date <= _parse_date(end_date))
+
+    for delivery in query.order_by(NotificationDelivery.date, NotificationDelivery.sent_at):
+        entry = {"user_id": delivery.user_id}
+        entry.update(_delivery_to_dict(delivery))
+        stats[delivery.notification_type].setdefault(delivery.date.strftime("%Y-%m-%d"), []).append(entry)
+
+    return stats
+
+def import_legacy_tracking_files(directory: str = LEGACY_TRACKING_DIR) -> int:
+    """
+    Copy the per-day tracking files ({type}_{YYYY-MM-DD}.json) into the
+    ledger. Existing ledger rows for the same user, type and day are kept.
+
+    Args:
+        directory: Directory holding the legacy tracking files
+
+    Returns:
+        Number of records imported
+    """
+    from app import db
+    from models import NotificationDelivery
+
+    tracking_dir = Path(directory)
+    if not tracking_dir.exists():
+        return 0
+
+    imported = 0
+    for file_path in sorted(tracking_dir.glob("*.json")):
         # Extract type and date from filename (type_YYYY-MM-DD.json)
-        filename = file_path.name
-        parts = filename.split("_", 1)
-        if len(parts) != 2 or not parts[1].endswith(".json"):
-            continue
-            
-        notification_type = parts[0]
-        date = parts[1].replace(".json", "")
-        
-        # Skip if not a recognized notification type
-        if notification_type not in stats:
-            continue
-        
-        # Load tracking data
+        notification_type, _, date = file_path.stem.rpartition("_")
         try:
+            day = _parse_date(date)
             with open(file_path, "r") as f:
                 data = json.load(f)
-                
-            # Convert to list format for easier processing
-            processed_data = []
-            for user_id, details in data.items():
-                entry = {"user_id": user_id}
-                entry.update(details)
-                processed_data.append(entry)
-                
-            # Store in stats dictionary
-            stats[notification_type][date] = processed_data
-        except Exception as e:
-            logger.error(f"Error loading notification stats from {file_path}: {str(e)}")
-    
-    return stats
\ No newline at end of file
+        except (ValueError, OSError) as e:
+            logger.error(f"Skipping tracking file {file_path}: {str(e)}")
+            continue
+        if not notification_type or not isinstance(data, dict):
+            continue
+
+        existing = {
+            row.user_id for row in NotificationDelivery.query.with_entities(NotificationDelivery.user_id)
+            .filter_by(notification_type=notification_type, date=day)
+        }
+        rows = []
+        for user_id, entry in data.items():
+            if str(user_id) in existing or not isinstance(entry, dict):
+                continue
+            extra = {k: v for k, v in entry.items() if k not in ("timestamp", "recipient", "success")}
+            try:
+                sent_at = datetime.datetime.fromisoformat(entry["timestamp"]) if entry.get("timestamp") else None
+            except ValueError:
+                sent_at = None
+            rows.append({
+                "user_id": str(user_id),
+                "notification_type": notification_type,
+                "date": day,
+                "recipient": entry.get("recipient"),
+                "success": bool(entry.get("success", False)),
+                "sent_at": sent_at,
+                "details": json.dumps(extra) if extra else None
+            })
+
+        if rows:
+            db.session.bulk_insert_mappings(NotificationDelivery, rows)
+            db.session.commit()
+            imported += len(rows)
+
+    logger.info(f"Imported {imported} notification records from {directory}")
+    return imported
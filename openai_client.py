@@ -0,0 +1,36 @@
+"""
+Shared OpenAI client for the AI services.
+Creating an OpenAI client sets up a new HTTP connection pool, so every
+service reuses one client per API key instead of building one per request.
+"""
+import logging
+from threading import Lock
+from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+_client_lock = Lock()
+_client = None
+_client_api_key = None
+
+def get_shared_client(api_key):
+    """
+    Get the shared OpenAI client for an API key.
+    The client is rebuilt only when the key changes (e.g. after the admin
+    settings are updated).
+
+    Args:
+        api_key: The OpenAI API key
+
+    Returns:
+        OpenAI: The shared client
+    """
+    global _client, _client_api_key
+
+    with _client_lock:
+        if _client is None or api_key != _client_api_key:
+            if _client is not None:
+                logger.info("OpenAI API key changed, creating a new OpenAI client")
+            _client = OpenAI(api_key=api_key)
+            _client_api_key = api_key
+        return _client
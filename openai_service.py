@@ -1,8 +1,9 @@
 import os
 import json
 import logging
-from openai import OpenAI
 from admin_utils import get_config
+from openai_client import get_shared_client
+from response_cache import cached_chat_completion
 from datetime import datetime
 
 # Set up logging
@@ -33,7 +34,7 @@ def get_max_tokens():
 
 # Initialize client with function that will be called each time
 def get_openai_client():
-    return OpenAI(api_key=get_openai_api_key())
+    return get_shared_client(get_openai_api_key())
 
 def analyze_journal_entry(journal_text, anxiety_level):
     """
@@ -437,10 +438,10 @@ def generate_insightful_message(mood):
         
         # Attempt to make the API call with error handling
         try:
-            # Get a fresh client with the current API key
-            client = get_openai_client()
-            
-            response = client.chat.completions.create(
+            # Identical prompts are served from the response cache
+            message = cached_chat_completion(
+                get_openai_client,
+                mode="insightful_message",
                 model=model,
                 messages=[
                     {"role": "system", "content": "You create brief, insightful CBT messages for people beginning their mental wellness journey."},
@@ -452,11 +453,6 @@ def generate_insightful_message(mood):
             
             # Get the response content with error handling
             try:
-                if not response.choices or not hasattr(response.choices[0], 'message'):
-                    logger.error("Unexpected response format from OpenAI API")
-                    return fallback_message
-                
-                message = response.choices[0].message.content
                 if not message:
                     logger.error("Empty response content from OpenAI API")
                     return fallback_message
@@ -536,10 +532,10 @@ def generate_onboarding_feedback(journal_content, mood):
         
         # Attempt to make the API call with error handling
         try:
-            # Get a fresh client with the current API key
-            client = get_openai_client()
-            
-            response = client.chat.completions.create(
+            # Identical prompts are served from the response cache
+            feedback = cached_chat_completion(
+                get_openai_client,
+                mode="onboarding_feedback",
                 model=model,
                 messages=[
                     {"role": "system", "content": "You are a warm, supportive CBT therapist specializing in beginner-friendly mental wellness guidance."},
@@ -551,11 +547,6 @@ def generate_onboarding_feedback(journal_content, mood):
             
             # Get the response content with error handling
             try:
-                if not response.choices or not hasattr(response.choices[0], 'message'):
-                    logger.error("Unexpected response format from OpenAI API")
-                    return fallback_feedback
-                
-                feedback = response.choices[0].message.content
                 if not feedback:
                     logger.error("Empty response content from OpenAI API")
                     return fallback_feedback
@@ -615,11 +606,11 @@ Example: "Mira suggests: I sense you're feeling overwhelmed about this situation
         
         # Attempt to make the API call with error handling
         try:
-            # Get a fresh client with the current API key
-            client = get_openai_client()
-            
-            # Specifically NOT requesting JSON format for this plain text response
-            response = client.chat.completions.create(
+            # Specifically NOT requesting JSON format for this plain text response.
+            # Identical prompts are served from the response cache.
+            raw_content = cached_chat_completion(
+                get_openai_client,
+                mode="coping_statement",
                 model=model,
                 messages=[
                     {"role": "system", "content": "You are Mira, a CBT therapist. Generate brief coping statements."},
@@ -631,24 +622,13 @@ Example: "Mira suggests: I sense you're feeling overwhelmed about this situation
             
             # Get the response content with improved error handling
             try:
-                # Check if we have a valid response
-                if not response.choices or len(response.choices) == 0:
-                    logger.error("No choices in OpenAI API response")
-                    return fallback_statement
-                
-                # Check if choices[0] has a message attribute
-                choice = response.choices[0]
-                if not hasattr(choice, 'message') or choice.message is None:
-                    logger.error("No message in OpenAI API response choice")
-                    return fallback_statement
-                
-                # Check if message has content attribute
-                if not hasattr(choice.message, 'content') or choice.message.content is None:
+                # Check if message has content
+                if raw_content is None:
                     logger.error("No content in OpenAI API response message")
                     return fallback_statement
                 
                 # Get and clean the content
-                content = choice.message.content.strip()
+                content = raw_content.strip()
                 if not content:
                     logger.error("Empty content in OpenAI API response")
                     return fallback_statement
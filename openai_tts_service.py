@@ -3,12 +3,15 @@ OpenAI Text-to-Speech service with high-quality neural voices.
 This module uses OpenAI's TTS API for extremely natural-sounding speech.
 """
 import os
-import uuid
 import logging
 import requests
 import json
-from flask import Blueprint, request, jsonify, send_file, current_app
-from openai import OpenAI
+from flask import Blueprint, request, jsonify, send_file, current_app, Response, stream_with_context
+from flask_login import current_user
+from app import login_required
+from openai_client import get_shared_client
+from tts_cache import get_audio, static_filename
+from tts_streaming import split_into_chunks, stream_audio
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -77,8 +80,7 @@ def get_openai_client():
         return None
     
     try:
-        client = OpenAI(api_key=api_key)
-        return client
+        return get_shared_client(api_key)
     except Exception as e:
         logger.error(f"Error creating OpenAI client: {str(e)}")
         return None
@@ -120,10 +122,6 @@ def openai_tts():
             logger.warning(f"Unknown voice: {voice}, using default")
             voice = 'shimmer'
         
-        # Generate unique filename
-        filename = f"{uuid.uuid4()}.mp3"
-        filepath = os.path.join('static', 'audio', filename)
-        
         # Get OpenAI client
         client = get_openai_client()
         if not client:
@@ -155,20 +153,24 @@ def openai_tts():
         logger.info(f"Generating OpenAI TTS for text of length {len(text)} with voice {voice}")
         
         try:
-            # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-            # do not change this unless explicitly requested by the user
-            response = client.audio.speech.create(
-                model="tts-1",
-                voice=voice,
-                input=text
-            )
+            def synthesize(filepath):
+                # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+                # do not change this unless explicitly requested by the user
+                response = client.audio.speech.create(
+                    model="tts-1",
+                    voice=voice,
+                    input=text
+                )
+                
+                # Save the audio to a file
+                response.stream_to_file(filepath)
             
-            # Save the audio to a file
-            response.stream_to_file(filepath)
+            # Replays of the same text and voice are served from the audio cache
+            filepath = get_audio("openai:tts-1", voice, None, text, synthesize)
             
             # Return the audio URL
             return jsonify({
-                "audio_url": f"/static/audio/{filename}",
+                "audio_url": f"/static/{static_filename(filepath)}",
                 "voice": voice,
                 "description": OPENAI_VOICES[voice]['description']
             })
@@ -210,6 +212,105 @@ def openai_tts():
             "details": str(e)
         }), 500
 
+@openai_tts_bp.route('/api/openai-tts/stream', methods=['POST'])
+@login_required
+def openai_tts_stream():
+    """
+    Stream TTS audio using OpenAI's neural voices, sentence by sentence.
+    
+    Request JSON format is the same as /api/openai-tts. The response is an
+    audio/mpeg body sent in chunks as each part of the text is synthesized,
+    so playback can start after the first sentence.
+    """
+    try:
+        # Get request data
+        data = request.get_json()
+        if not data:
+            logger.error("No JSON data in request")
+            return jsonify({"error": "No data provided"}), 400
+        
+        text = data.get('text', '')
+        chunks = split_into_chunks(text)
+        if not chunks:
+            logger.error("No text provided in request")
+            return jsonify({"error": "No text provided"}), 400
+        
+        # Get voice type (default to shimmer as per user preference)
+        voice = data.get('voice', 'shimmer')
+        if voice not in OPENAI_VOICES:
+            logger.warning(f"Unknown voice: {voice}, using default")
+            voice = 'shimmer'
+        
+        client = get_openai_client()
+        if not client:
+            logger.error("Failed to initialize OpenAI client - API key may be missing or invalid")
+            return jsonify({
+                "error": "OpenAI API key not configured properly. Please contact the administrator.",
+                "details": "The system could not authenticate with OpenAI."
+            }), 500
+        
+        def synthesize_chunk(chunk):
+            def synthesize(filepath):
+                response = client.audio.speech.create(
+                    model="tts-1",
+                    voice=voice,
+                    input=chunk
+                )
+                response.stream_to_file(filepath)
+            return get_audio("openai:tts-1", voice, None, chunk, synthesize)
+        
+        logger.info(f"Streaming OpenAI TTS for text of length {len(text)} in {len(chunks)} chunks with voice {voice}")
+        audio = stream_audio(chunks, synthesize_chunk)
+        
+        return Response(
+            stream_with_context(audio),
+            mimetype='audio/mpeg',
+            headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'}
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in streamed OpenAI TTS: {str(e)}")
+        return jsonify({
+            "error": "Voice generation failed",
+            "message": "An error occurred when generating speech. Please try again or contact support if the issue persists."
+        }), 500
+
+@openai_tts_bp.route('/api/voice-preference', methods=['POST'])
+@login_required
+def save_voice_preference():
+    """
+    Store the user's preferred voice so Mira's insights can be pre-synthesized in it.
+    
+    Request JSON format:
+    {
+        "voice": "shimmer"
+    }
+    """
+    from app import db
+    from models import JournalEntry
+    
+    try:
+        data = request.get_json() or {}
+        voice = data.get('voice')
+        if voice not in OPENAI_VOICES:
+            return jsonify({"error": "Unknown voice"}), 400
+        
+        if current_user.preferred_voice != voice:
+            # Audio pre-generated in the old voice is dropped; those messages
+            # are streamed in the new voice when played
+            JournalEntry.query.filter(JournalEntry.user_id == current_user.id).update(
+                {JournalEntry.insight_audio_url: None, JournalEntry.closing_audio_url: None},
+                synchronize_session=False
+            )
+        current_user.preferred_voice = voice
+        db.session.commit()
+        return jsonify({"success": True, "voice": voice})
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error saving voice preference: {str(e)}")
+        return jsonify({"error": "Could not save voice preference"}), 500
+
 @openai_tts_bp.route('/tts/openai', methods=['GET'])
 def openai_neural_voices():
     """
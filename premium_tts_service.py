@@ -3,10 +3,11 @@ Premium Text-to-Speech service with advanced voice features.
 This module provides high-quality TTS with natural sounding voices.
 """
 import os
-import uuid
 import logging
 from gtts import gTTS
 from flask import Blueprint, request, jsonify, current_app, send_file
+from tts_cache import get_audio, static_filename
+from tts_streaming import stream_tts_request
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -180,30 +181,30 @@ def premium_tts():
         voice_settings = PREMIUM_VOICES[voice_type]
         style_settings = VOICE_STYLES[style]
         
-        # Generate unique filename
-        filename = f"{uuid.uuid4()}.mp3"
-        filepath = os.path.join('static', 'audio', filename)
-        
         # Process text based on style
         processed_text = preprocess_text(text, style)
         
         # Apply style settings to voice
         slow_setting = style_settings['slow']
         
-        # Generate TTS with these settings
-        tts = gTTS(
-            text=processed_text,
-            lang=voice_settings['lang'],
-            tld=voice_settings['tld'],
-            slow=slow_setting
-        )
+        def synthesize(filepath):
+            # Generate TTS with these settings
+            tts = gTTS(
+                text=processed_text,
+                lang=voice_settings['lang'],
+                tld=voice_settings['tld'],
+                slow=slow_setting
+            )
+            
+            # Save to file
+            tts.save(filepath)
         
-        # Save to file
-        tts.save(filepath)
+        # Replays of the same text, voice and style are served from the audio cache
+        filepath = get_audio("premium", voice_type, style, processed_text, synthesize)
         
         # Return the audio URL
         return jsonify({
-            "audio_url": f"/static/audio/{filename}",
+            "audio_url": f"/static/{static_filename(filepath)}",
             "voice_type": voice_type,
             "style": style
         })
@@ -212,6 +213,33 @@ def premium_tts():
         logger.error(f"Error in premium TTS: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def _synthesize_stream_chunk(chunk, voice_type, style):
+    """Synthesize one chunk of a streamed response through the audio cache"""
+    # Style preprocessing is applied per chunk, after the sentence split
+    processed_text = preprocess_text(chunk, style)
+    voice_settings = PREMIUM_VOICES[voice_type]
+    style_settings = VOICE_STYLES[style]
+    
+    def synthesize(filepath):
+        tts = gTTS(
+            text=processed_text,
+            lang=voice_settings['lang'],
+            tld=voice_settings['tld'],
+            slow=style_settings['slow']
+        )
+        tts.save(filepath)
+    return get_audio("premium", voice_type, style, processed_text, synthesize)
+
+@premium_tts_bp.route('/api/premium-tts/stream', methods=['POST'])
+def premium_tts_stream():
+    """
+    Stream premium TTS audio sentence by sentence.
+    
+    Request JSON format is the same as /api/premium-tts. The response is an
+    audio/mpeg body sent in chunks as each part of the text is synthesized.
+    """
+    return stream_tts_request("premium", PREMIUM_VOICES, VOICE_STYLES, 'us_female', 'calm', _synthesize_stream_chunk)
+
 @premium_tts_bp.route('/api/premium-voices', methods=['GET'])
 def get_premium_voices():
     """
@@ -4,12 +4,23 @@ Push Notification Service for Dear Teddy
 This module provides the backend functionality for Web Push notifications.
 It allows the application to send push notifications to users who have
 granted notification permissions and subscribed through their browser.
+
+Sends are fanned out over a bounded thread pool with a per-push-service
+concurrency limit and pooled HTTP connections; the database is only touched
+afterwards, in one transaction that stamps delivered subscriptions and
+removes expired ones.
 """
 
 import json
 import os
 import base64
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
 from flask import current_app
 from pywebpush import webpush, WebPushException
 from app import db
@@ -34,6 +45,29 @@ VAPID_CLAIMS = {
     "ttl": 86400  # 24 hours in seconds
 }
 
+# Fan-out sizing: total concurrent sends, and concurrent sends to any one push
+# service host (FCM, Mozilla autopush, Apple, ...)
+PUSH_MAX_WORKERS = int(os.environ.get('PUSH_MAX_WORKERS', 16))
+PUSH_MAX_PER_HOST = int(os.environ.get('PUSH_MAX_PER_HOST', 8))
+# Seconds to wait for a push service to answer
+PUSH_TIMEOUT = int(os.environ.get('PUSH_TIMEOUT', 10))
+# Maximum number of IDs per bulk UPDATE/DELETE statement
+PUSH_RESULT_BATCH_SIZE = 500
+
+# Outcomes of a single send
+SEND_OK = "sent"
+SEND_EXPIRED = "expired"
+SEND_FAILED = "failed"
+
+_executor = ThreadPoolExecutor(max_workers=PUSH_MAX_WORKERS, thread_name_prefix="push-fanout")
+
+# Per-host semaphores limiting concurrent sends to each push service
+_host_limits = {}
+_host_limits_lock = threading.Lock()
+
+# One HTTP session per worker thread, so connections to each push service are reused
+_thread_local = threading.local()
+
 def get_public_key():
     """
     Get the VAPID public key for clients to use when subscribing.
@@ -106,7 +140,162 @@ def delete_subscription(subscription_id):
         logger.error(f"Error deleting push subscription: {e}")
         return False
 
-def send_notification(user_id, title, body, url=None, tag=None):
+def _get_http_session():
+    """Get this thread's pooled HTTP session for push service requests"""
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=PUSH_MAX_PER_HOST)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _thread_local.session = session
+    return session
+
+def _get_host_limit(host):
+    """Get the semaphore limiting concurrent sends to one push service host"""
+    with _host_limits_lock:
+        limit = _host_limits.get(host)
+        if limit is None:
+            limit = _host_limits[host] = threading.BoundedSemaphore(PUSH_MAX_PER_HOST)
+        return limit
+
+def build_payload(title, body, url=None, tag=None):
+    """Build the JSON notification payload shown by the service worker"""
+    data = {
+        "title": title,
+        "body": body
+    }
+    
+    if url:
+        data["url"] = url
+    if tag:
+        data["tag"] = tag
+    
+    return json.dumps(data)
+
+def _send_one(subscription_id, subscription_json, payload):
+    """
+    Deliver one notification. Runs on a fan-out worker thread without
+    touching the database.
+    
+    Returns:
+        tuple: (subscription_id, SEND_OK, SEND_EXPIRED or SEND_FAILED)
+    """
+    try:
+        subscription_data = json.loads(subscription_json)
+        endpoint = urlparse(subscription_data["endpoint"])
+    except Exception as e:
+        logger.error(f"Invalid push subscription {subscription_id}: {e}")
+        return subscription_id, SEND_FAILED
+    
+    # The VAPID audience must be the push service's origin. webpush() fills in
+    # missing claims on the dict it is given, so every send gets its own copy.
+    claims = dict(VAPID_CLAIMS, aud=f"{endpoint.scheme}://{endpoint.netloc}")
+    
+    try:
+        with _get_host_limit(endpoint.netloc):
+            webpush(
+                subscription_info=subscription_data,
+                data=payload,
+                vapid_private_key=VAPID_PRIVATE_KEY,
+                vapid_claims=claims,
+                timeout=PUSH_TIMEOUT,
+                requests_session=_get_http_session()
+            )
+        logger.debug(f"Successfully sent push notification to subscription {subscription_id}")
+        return subscription_id, SEND_OK
+        
+    except WebPushException as e:
+        # If the subscription is expired or invalid
+        if e.response is not None and e.response.status_code in [404, 410]:
+            logger.warning(f"Subscription {subscription_id} is no longer valid, removing it")
+            return subscription_id, SEND_EXPIRED
+        
+        logger.error(f"WebPush failed for subscription {subscription_id}: {e}")
+        return subscription_id, SEND_FAILED
+        
+    except Exception as e:
+        logger.error(f"Error sending push notification to subscription {subscription_id}: {e}")
+        return subscription_id, SEND_FAILED
+
+def _interleave_by_host(targets):
+    """
+    Order (subscription_id, subscription_json) pairs round-robin across push
+    service hosts, so workers aren't all queued on one host's limit while
+    other hosts sit idle.
+    """
+    by_host = OrderedDict()
+    for target in targets:
+        try:
+            host = urlparse(json.loads(target[1]).get("endpoint", "")).netloc
+        except Exception:
+            host = ""
+        by_host.setdefault(host, []).append(target)
+    
+    ordered = []
+    queues = list(by_host.values())
+    for i in range(max((len(queue) for queue in queues), default=0)):
+        ordered.extend(queue[i] for queue in queues if i < len(queue))
+    return ordered
+
+def _apply_results(results):
+    """
+    Record a fan-out's results in one transaction: stamp delivered
+    subscriptions and delete expired ones.
+    
+    Args:
+        results (list): (subscription_id, outcome) tuples
+    """
+    sent_ids = [subscription_id for subscription_id, outcome in results if outcome == SEND_OK]
+    expired_ids = [subscription_id for subscription_id, outcome in results if outcome == SEND_EXPIRED]
+    if not sent_ids and not expired_ids:
+        return
+    
+    try:
+        for start in range(0, len(sent_ids), PUSH_RESULT_BATCH_SIZE):
+            PushSubscription.query.filter(
+                PushSubscription.id.in_(sent_ids[start:start + PUSH_RESULT_BATCH_SIZE])
+            ).update({PushSubscription.last_notification_at: db.func.now()}, synchronize_session=False)
+        
+        for start in range(0, len(expired_ids), PUSH_RESULT_BATCH_SIZE):
+            PushSubscription.query.filter(
+                PushSubscription.id.in_(expired_ids[start:start + PUSH_RESULT_BATCH_SIZE])
+            ).delete(synchronize_session=False)
+        
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error recording push notification results: {e}")
+
+def fan_out(targets, payload):
+    """
+    Send one payload to many subscriptions concurrently and record the results.
+    
+    Args:
+        targets (list): (subscription_id, subscription_json) pairs
+        payload (str): The JSON notification payload
+        
+    Returns:
+        list: (subscription_id, outcome) tuples, outcome being SEND_OK,
+            SEND_EXPIRED or SEND_FAILED
+    """
+    if not targets:
+        return []
+    
+    ordered = _interleave_by_host(targets)
+    results = list(_executor.map(lambda target: _send_one(target[0], target[1], payload), ordered))
+    
+    _apply_results(results)
+    return results
+
+def _summarize(results):
+    sent = sum(1 for _, outcome in results if outcome == SEND_OK)
+    return {
+        "success": sent,
+        "failed": len(results) - sent
+    }
+
+def send_notification(user_id, title, body, url=None, tag=None, subscriptions=None):
     """
     Send a push notification to all subscriptions for a specific user.
     
@@ -116,6 +305,8 @@ def send_notification(user_id, title, body, url=None, tag=None):
         body (str): The notification body text
         url (str, optional): URL to open when notification is clicked
         tag (str, optional): Tag to group notifications
+        subscriptions (list, optional): The user's PushSubscription rows, if
+            the caller already loaded them
         
     Returns:
         dict: Results with success and failure counts
@@ -124,60 +315,17 @@ def send_notification(user_id, title, body, url=None, tag=None):
         logger.error("VAPID keys not configured. Push notification not sent.")
         return {"success": 0, "failed": 0}
     
-    subscriptions = PushSubscription.query.filter_by(user_id=user_id).all()
+    if subscriptions is None:
+        subscriptions = PushSubscription.query.filter_by(user_id=user_id).all()
     if not subscriptions:
         logger.info(f"No push subscriptions found for user {user_id}")
         return {"success": 0, "failed": 0}
     
-    success_count = 0
-    failed_count = 0
-    
-    # Prepare notification data
-    data = {
-        "title": title,
-        "body": body
-    }
+    targets = [(subscription.id, subscription.subscription_json) for subscription in subscriptions]
+    results = fan_out(targets, build_payload(title, body, url, tag))
     
-    if url:
-        data["url"] = url
-    if tag:
-        data["tag"] = tag
-    
-    for subscription in subscriptions:
-        try:
-            subscription_data = json.loads(subscription.subscription_json)
-            webpush(
-                subscription_info=subscription_data,
-                data=json.dumps(data),
-                vapid_private_key=VAPID_PRIVATE_KEY,
-                vapid_claims=VAPID_CLAIMS
-            )
-            
-            # Update last notification timestamp
-            subscription.last_notification_at = db.func.now()
-            db.session.commit()
-            
-            success_count += 1
-            logger.info(f"Successfully sent push notification to subscription {subscription.id}")
-            
-        except WebPushException as e:
-            # If the subscription is expired or invalid
-            if e.response and e.response.status_code in [404, 410]:
-                logger.warning(f"Subscription {subscription.id} is no longer valid, removing it")
-                db.session.delete(subscription)
-                db.session.commit()
-            
-            failed_count += 1
-            logger.error(f"WebPush failed for subscription {subscription.id}: {e}")
-            
-        except Exception as e:
-            failed_count += 1
-            logger.error(f"Error sending push notification: {e}")
-    
-    return {
-        "success": success_count,
-        "failed": failed_count
-    }
+    logger.info(f"Sent push notification to {len(results)} subscriptions for user {user_id}")
+    return _summarize(results)
 
 def send_notification_to_all_users(title, body, url=None, tag=None):
     """
@@ -192,21 +340,23 @@ def send_notification_to_all_users(title, body, url=None, tag=None):
     Returns:
         dict: Results with success and failure counts
     """
-    users = User.query.join(PushSubscription).distinct().all()
+    if not VAPID_PRIVATE_KEY or not VAPID_PUBLIC_KEY:
+        logger.error("VAPID keys not configured. Push notification not sent.")
+        return {"success": 0, "failed": 0, "users_notified": 0}
     
-    total_success = 0
-    total_failed = 0
+    # Every subscription of every user goes into a single fan-out
+    rows = db.session.query(
+        PushSubscription.id,
+        PushSubscription.user_id,
+        PushSubscription.subscription_json
+    ).join(User, User.id == PushSubscription.user_id).all()
     
-    for user in users:
-        result = send_notification(user.id, title, body, url, tag)
-        total_success += result["success"]
-        total_failed += result["failed"]
+    results = fan_out([(row.id, row.subscription_json) for row in rows], build_payload(title, body, url, tag))
     
-    return {
-        "success": total_success,
-        "failed": total_failed,
-        "users_notified": len(users)
-    }
+    summary = _summarize(results)
+    summary["users_notified"] = len({row.user_id for row in rows})
+    logger.info(f"Broadcast push notification: {summary}")
+    return summary
 
 def send_test_notification(user_id):
     """
@@ -0,0 +1,21 @@
+"""
+Script to rebuild the admin statistics rollups (admin_daily_stats,
+admin_daily_active_user, admin_pattern_stats) from the journal tables.
+Inserts and deletes keep the rollups current on their own; this runs nightly
+as a cron job (see render.yaml) to correct any drift, and can be run by hand
+after bulk imports.
+"""
+import sys
+import logging
+from scheduler_service import refresh_admin_rollups_direct
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    logger.info("Rebuilding admin statistics rollups...")
+    result = refresh_admin_rollups_direct()
+    if not result["success"]:
+        sys.exit(1)
+    logger.info("Admin statistics rollups rebuilt.")
@@ -0,0 +1,341 @@
+"""
+Persistent response cache for Mira's OpenAI calls.
+Completions are stored in a local SQLite file keyed on a hash of the model,
+mode and normalized prompt, so repeated submissions of the same text
+(double-submits, retries, re-analysis) are served without an API call.
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cache settings
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() != "false"
+RESPONSE_CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH", os.path.join("data", "cache", "openai_responses.sqlite3"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 5000))
+RESPONSE_CACHE_DEFAULT_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 7 * 24 * 3600))  # 7 days
+
+# Per-mode TTLs in seconds. Prompts that only depend on a handful of inputs
+# (e.g. the onboarding mood message) expire quickly so users still see variety.
+MODE_TTLS = {
+    "journal_initial": RESPONSE_CACHE_DEFAULT_TTL,
+    "journal_followup": RESPONSE_CACHE_DEFAULT_TTL,
+    "coping_statement": RESPONSE_CACHE_DEFAULT_TTL,
+    "onboarding_feedback": RESPONSE_CACHE_DEFAULT_TTL,
+    "insightful_message": 3600,
+}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """Collapse whitespace so formatting-only edits map to the same key."""
+    if not text:
+        return ""
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def make_cache_key(model: str, mode: str, messages: List[Dict[str, str]], params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build a content-addressed key for a chat completion request.
+
+    Args:
+        model: The OpenAI model name
+        mode: Logical call type (e.g. "journal_initial", "coping_statement")
+        messages: Chat messages sent to the API
+        params: Other request parameters that change the output (temperature, max_tokens, ...)
+
+    Returns:
+        SHA-256 hex digest
+    """
+    payload = {
+        "model": model,
+        "mode": mode,
+        "messages": [
+            {"role": m.get("role"), "content": normalize_prompt(m.get("content", ""))}
+            for m in messages
+        ],
+        "params": params or {},
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of completion texts with TTL expiry and
+    least-recently-used eviction once the entry budget is exceeded.
+
+    The entry count is kept in a one-row meta table by triggers, so writes
+    check the budget without counting the table, and hits only write back
+    their access time when it is more than TOUCH_INTERVAL old.
+    """
+
+    # Hits refresh an entry's LRU timestamp at most this often (seconds)
+    TOUCH_INTERVAL = 300
+
+    _SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            mode TEXT NOT NULL,
+            value TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            entry_count INTEGER NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_responses_last_access ON responses (last_access)",
+        "CREATE INDEX IF NOT EXISTS ix_responses_expires_at ON responses (expires_at)",
+        # Seeds the count for a cache file written before the meta table existed
+        "INSERT OR IGNORE INTO meta (id, entry_count) SELECT 1, COUNT(*) FROM responses",
+        """
+        CREATE TRIGGER IF NOT EXISTS responses_after_insert AFTER INSERT ON responses BEGIN
+            UPDATE meta SET entry_count = entry_count + 1 WHERE id = 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS responses_after_delete AFTER DELETE ON responses BEGIN
+            UPDATE meta SET entry_count = entry_count - 1 WHERE id = 1;
+        END
+        """,
+    )
+
+    def __init__(self, path: str, max_entries: int = 5000, default_ttl: int = RESPONSE_CACHE_DEFAULT_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open the database lazily so importing this module never touches disk,
+        and again after a fork, as a connection can't be shared with the parent.
+        """
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Workers starting together must not write rows between the meta
+            # table being seeded and its triggers existing
+            conn.execute("BEGIN IMMEDIATE")
+            for statement in self._SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for a key, or None on a miss or expiry."""
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT value, expires_at, last_access FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+
+                if row is None:
+                    self.misses += 1
+                    return None
+
+                value, expires_at, last_access = row
+                if expires_at <= now:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    conn.commit()
+                    self.misses += 1
+                    return None
+
+                if now - last_access > self.TOUCH_INTERVAL:
+                    conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                    conn.commit()
+                self.hits += 1
+                return value
+            except sqlite3.Error as e:
+                logger.error(f"Response cache read failed: {str(e)}")
+                self.misses += 1
+                return None
+
+    def set(self, key: str, value: str, mode: str, ttl: Optional[int] = None) -> None:
+        """Store a value, evicting expired and least-recently-used rows if over budget."""
+        now = time.time()
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT INTO responses (key, mode, value, created_at, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET mode = excluded.mode, value = excluded.value, "
+                    "created_at = excluded.created_at, expires_at = excluded.expires_at, "
+                    "last_access = excluded.last_access",
+                    (key, mode, value, now, now + ttl, now)
+                )
+                self.stores += 1
+
+                count = conn.execute("SELECT entry_count FROM meta WHERE id = 1").fetchone()[0]
+                if count > self.max_entries:
+                    removed = conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,)).rowcount
+                    overflow = count - removed - self.max_entries
+                    if overflow > 0:
+                        removed += conn.execute(
+                            "DELETE FROM responses WHERE key IN "
+                            "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                            (overflow,)
+                        ).rowcount
+                    self.evictions += removed
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Response cache write failed: {str(e)}")
+
+    def clear(self) -> None:
+        """Remove every cached response."""
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute("DELETE FROM responses")
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Response cache clear failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters for this process and the current entry count."""
+        with self._lock:
+            entries = 0
+            try:
+                entries = self._connect().execute("SELECT entry_count FROM meta WHERE id = 1").fetchone()[0]
+            except sqlite3.Error as e:
+                logger.error(f"Response cache stats failed: {str(e)}")
+
+            lookups = self.hits + self.misses
+            return {
+                'enabled': RESPONSE_CACHE_ENABLED,
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+# Global cache instance
+response_cache = ResponseCache(RESPONSE_CACHE_PATH, max_entries=RESPONSE_CACHE_MAX_ENTRIES)
+
+
+def is_json_object(content: str) -> bool:
+    """Validator for JSON-mode completions: True if the content parses to a JSON object."""
+    try:
+        return isinstance(json.loads(content), dict)
+    except ValueError:
+        return False
+
+
+def _stream_completion(client: Any, model: str, messages: List[Dict[str, str]],
+                       on_delta: Callable[[str], None], **params) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Run a streaming chat completion, passing each text delta to on_delta.
+
+    Returns:
+        The full text and the finish reason reported by the final chunk
+    """
+    parts = []
+    finish_reason = None
+    for chunk in client.chat.completions.create(model=model, messages=messages, stream=True, **params):
+        if not chunk.choices:
+            continue
+        finish_reason = getattr(chunk.choices[0], 'finish_reason', None) or finish_reason
+        delta = getattr(chunk.choices[0].delta, 'content', None)
+        if delta:
+            parts.append(delta)
+            on_delta(delta)
+    return "".join(parts) or None, finish_reason
+
+
+def cached_chat_completion(get_client: Callable[[], Any], mode: str, model: str,
+                           messages: List[Dict[str, str]],
+                           on_delta: Optional[Callable[[str], None]] = None,
+                           validate: Optional[Callable[[str], bool]] = None, **params) -> Optional[str]:
+    """
+    Return the message content of a chat completion, serving repeats from the cache.
+    API errors are raised unchanged so callers keep their existing error handling.
+
+    Args:
+        get_client: Callable returning an OpenAI client (only called on a cache miss)
+        mode: Logical call type used in the key and to pick the TTL
+        model: The OpenAI model name
+        messages: Chat messages to send
+        on_delta: Optional callback; when given the completion is streamed and the
+            callback receives each piece of text as it arrives (a cache hit is
+            delivered as a single piece)
+        validate: Optional callable; content it rejects is returned but not cached
+        **params: Additional chat.completions.create parameters
+
+    Returns:
+        The completion text, or None if the API returned no content
+    """
+    key = make_cache_key(model, mode, messages, params)
+
+    if RESPONSE_CACHE_ENABLED:
+        cached = response_cache.get(key)
+        if cached is not None:
+            logger.debug(f"Response cache hit for {mode} ({key[:12]})")
+            if on_delta:
+                on_delta(cached)
+            return cached
+
+    client = get_client()
+    if on_delta:
+        content, finish_reason = _stream_completion(client, model, messages, on_delta, **params)
+    else:
+        response = client.chat.completions.create(model=model, messages=messages, **params)
+
+        if not response.choices or not getattr(response.choices[0], 'message', None):
+            logger.error("Unexpected response format from OpenAI API")
+            return None
+
+        content = response.choices[0].message.content
+        finish_reason = getattr(response.choices[0], 'finish_reason', None)
+
+    if not content or not RESPONSE_CACHE_ENABLED:
+        return content
+
+    # A completion cut off at max_tokens, or one the caller can't use, would
+    # otherwise be replayed for every identical prompt until it expired
+    if finish_reason == "length":
+        logger.warning(f"Not caching truncated {mode} completion ({key[:12]})")
+    elif validate is not None and not validate(content):
+        logger.warning(f"Not caching {mode} completion that failed validation ({key[:12]})")
+    else:
+        response_cache.set(key, content, mode, ttl=MODE_TTLS.get(mode))
+
+    return content
+
+
+def get_response_cache_stats() -> Dict[str, Any]:
+    """Get statistics for the OpenAI response cache."""
+    return response_cache.get_stats()
@@ -3,7 +3,8 @@ from flask_login import login_user, current_user, logout_user
 from app import app, db, login_required
 from models import User, JournalEntry, CBTRecommendation, MoodLog
 from forms import RegistrationForm, LoginForm, JournalEntryForm, MoodLogForm, AccountUpdateForm
-from openai_service import analyze_journal_entry, generate_coping_statement
+from openai_service import analyze_journal_entry
+from analysis_queue import enqueue_coping_statement
 from werkzeug.security import check_password_hash
 from sqlalchemy import desc
 from sqlalchemy.orm import load_only, defer, undefer
@@ -252,12 +253,9 @@ def dashboard():
     latest_entry = JournalEntry.query\
         .options(load_only(
             JournalEntry.id,
-            JournalEntry.title,
-            JournalEntry.content,
             JournalEntry.created_at,
-            JournalEntry.is_analyzed,
-            JournalEntry.anxiety_level,
-            JournalEntry.user_id
+            JournalEntry.user_id,
+            JournalEntry.coping_statement
         ))\
         .filter(JournalEntry.user_id == current_user.id)\
         .order_by(desc(JournalEntry.created_at))\
@@ -266,31 +264,18 @@ def dashboard():
     # Default coping statement that doesn't require API
     coping_statement = "Mira suggests: Take a moment to breathe deeply. Remember that your thoughts don't define you, and this moment will pass."
 
-    # Only try to get a personalized one if we have a journal entry
+    # Coping statements are precomputed per entry when it is analyzed, so the
+    # dashboard never calls OpenAI. Entries without one (older entries, edited
+    # entries, failed generations) are backfilled in the background; failed
+    # generations are retried only after a cool-down (COPING_RETRY_SECONDS).
     if latest_entry:
-        try:
-            # Use the full journal content for the coping statement if available
-            # Fall back to title if no content, and default to "anxiety management" if neither exists
-            if latest_entry.content and len(latest_entry.content.strip()) > 10:
-                context = latest_entry.content
-            else:
-                context = latest_entry.title or "anxiety management"
-
+        if latest_entry.coping_statement:
+            coping_statement = latest_entry.coping_statement
+        else:
             try:
-                # Generate coping statement with improved error handling
-                api_statement = generate_coping_statement(context)
-
-                # Only use API statement if it's valid
-                if api_statement and len(api_statement.strip()) > 10:
-                    coping_statement = api_statement
-
-            except Exception as api_error:
-                # Log the specific API error, but continue with default statement
-                logging.error(f"OpenAI API error in dashboard: {str(api_error)}")
-
-        except Exception as e:
-            # Log any other errors but don't crash 
-            logging.error(f"General error generating coping statement: {str(e)}")
+                enqueue_coping_statement(latest_entry.id)
+            except Exception as e:
+                logging.error(f"Error queuing coping statement for entry {latest_entry.id}: {str(e)}")
 
     # Get user's achievements and streaks - NEW FEATURE
     badge_data = None
@@ -420,6 +405,7 @@ def breathing_complete():
 
         # Process breathing session badge
         badge_result = gamification.process_breathing_session(current_user.id)
+        db.session.commit()
 
         # Flash notifications for badges
         gamification.flash_badge_notifications(badge_result)
@@ -445,6 +431,7 @@ def breathing_complete():
         return jsonify(response_data)
     except Exception as e:
         app.logger.error(f"Error in breathing_complete route: {str(e)}")
+        db.session.rollback()
         return jsonify({
             'success': False,
             'message': 'Error recording breathing exercise completion.'
@@ -651,6 +638,7 @@ def log_mood():
 
             # Process gamification for mood tracking badge
             badge_result = gamification.process_mood_log(current_user.id)
+            db.session.commit()
 
             # Flash badge notifications if any
             gamification.flash_badge_notifications(badge_result)
@@ -1,13 +1,26 @@
 """
 Scheduler logging service for tracking notification system activity.
 This helps diagnose notification issues by providing a detailed log of scheduler activity.
+
+Entries are appended as JSON lines to data/scheduler_logs/scheduler_logs.jsonl.
+When that file grows past SEGMENT_MAX_BYTES it is sealed into a numbered
+segment and summarised in a small index (time range, per-type counts, error
+count), so queries read the active file backwards and open only the sealed
+segments that can hold matching entries.
 """
 
 import json
 import os
 import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,80 +28,322 @@ logger = logging.getLogger(__name__)
 
 # Constants
 DATA_DIR = "data"
-SCHEDULER_LOGS_FILE = os.path.join(DATA_DIR, "scheduler_logs.json")
+SCHEDULER_LOGS_DIR = os.path.join(DATA_DIR, "scheduler_logs")
+ACTIVE_LOG_FILE = os.path.join(SCHEDULER_LOGS_DIR, "scheduler_logs.jsonl")
+INDEX_FILE = os.path.join(SCHEDULER_LOGS_DIR, "index.json")
+LOCK_FILE = os.path.join(SCHEDULER_LOGS_DIR, ".lock")
+
+# Single-file log written before segments were introduced; imported once
+LEGACY_LOGS_FILE = os.path.join(DATA_DIR, "scheduler_logs.json")
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# The active file is sealed into a segment once it reaches this size (bytes)
+SEGMENT_MAX_BYTES = int(os.environ.get("SCHEDULER_LOG_SEGMENT_BYTES", 256 * 1024))
+
+# Number of sealed segments kept; older ones are deleted on rotation
+MAX_SEGMENTS = int(os.environ.get("SCHEDULER_LOG_MAX_SEGMENTS", 8))
+
+# Block size used when reading a segment from the end
+_READ_BLOCK_SIZE = 8192
+
+# Serialises writers within a process; the file lock covers other processes
+_write_lock = threading.Lock()
+
 
 def ensure_data_directory():
-    """Ensure the data directory exists"""
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-        logger.info(f"Created data directory: {DATA_DIR}")
+    """Ensure the scheduler log directory exists, importing the legacy log file once"""
+    if not os.path.exists(SCHEDULER_LOGS_DIR):
+        os.makedirs(SCHEDULER_LOGS_DIR, exist_ok=True)
+        logger.info(f"Created scheduler log directory: {SCHEDULER_LOGS_DIR}")
+        with _file_lock():
+            _import_legacy_logs()
+
+
+@contextmanager
+def _file_lock():
+    """Exclusive lock shared by all processes writing the scheduler log."""
+    if fcntl is None:
+        yield
+        return
+    with open(LOCK_FILE, "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _load_index() -> Dict[str, Any]:
+    """Load the segment index (oldest segment first)."""
+    try:
+        with open(INDEX_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+    except (json.JSONDecodeError, IOError) as e:
+        logger.error(f"Could not read {INDEX_FILE}, rebuilding from segments: {str(e)}")
+        return _rebuild_index()
+    return {"next_segment": 1, "segments": []}
+
+
+def _save_index(index: Dict[str, Any]):
+    """Write the segment index atomically."""
+    tmp_file = f"{INDEX_FILE}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_file, INDEX_FILE)
+
+
+def _summarize_segment(file_name: str) -> Dict[str, Any]:
+    """Build the index entry for a sealed segment with one pass over its lines."""
+    summary = {"file": file_name, "first": None, "last": None, "count": 0, "errors": 0, "types": {}}
+    with open(os.path.join(SCHEDULER_LOGS_DIR, file_name), "rb") as f:
+        for line in f:
+            entry = _parse_line(line)
+            if entry is None:
+                continue
+            timestamp = entry.get("timestamp", "")
+            if summary["first"] is None or timestamp < summary["first"]:
+                summary["first"] = timestamp
+            if summary["last"] is None or timestamp > summary["last"]:
+                summary["last"] = timestamp
+            summary["count"] += 1
+            if not entry.get("success", True):
+                summary["errors"] += 1
+            log_type = entry.get("type", "unknown")
+            summary["types"][log_type] = summary["types"].get(log_type, 0) + 1
+    return summary
+
+
+def _rebuild_index() -> Dict[str, Any]:
+    """Recreate the index by scanning the sealed segments on disk."""
+    files = sorted(
+        name for name in os.listdir(SCHEDULER_LOGS_DIR)
+        if name.startswith("segment-") and name.endswith(".jsonl")
+    )
+    segments = [_summarize_segment(name) for name in files]
+    next_segment = int(files[-1][len("segment-"):-len(".jsonl")]) + 1 if files else 1
+    index = {"next_segment": next_segment, "segments": segments}
+    _save_index(index)
+    return index
+
+
+def _seal_segment(source_path: str, index: Dict[str, Any]):
+    """
+    Move a log file into the next numbered segment and record it in the index.
+    Caller holds the file lock.
+    """
+    file_name = f"segment-{index['next_segment']:06d}.jsonl"
+    os.replace(source_path, os.path.join(SCHEDULER_LOGS_DIR, file_name))
+    index["next_segment"] += 1
+    index["segments"].append(_summarize_segment(file_name))
+
+    # Drop the oldest segments beyond the retention limit
+    while len(index["segments"]) > MAX_SEGMENTS:
+        expired = index["segments"].pop(0)
+        try:
+            os.remove(os.path.join(SCHEDULER_LOGS_DIR, expired["file"]))
+        except FileNotFoundError:
+            pass
+
+    _save_index(index)
+
+
+def _rotate_if_needed():
+    """Seal the active file if it has grown past SEGMENT_MAX_BYTES. Caller holds the file lock."""
+    try:
+        size = os.path.getsize(ACTIVE_LOG_FILE)
+    except FileNotFoundError:
+        return
+    if size >= SEGMENT_MAX_BYTES:
+        _seal_segment(ACTIVE_LOG_FILE, _load_index())
+
+
+def _import_legacy_logs():
+    """Convert the old single-file JSON log into a sealed segment. Caller holds the file lock."""
+    if not os.path.exists(LEGACY_LOGS_FILE):
+        return
+    try:
+        with open(LEGACY_LOGS_FILE, "r") as f:
+            logs = json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        logger.error(f"Could not import {LEGACY_LOGS_FILE}: {str(e)}")
+        return
+
+    if logs:
+        staging_path = os.path.join(SCHEDULER_LOGS_DIR, "legacy.jsonl")
+        with open(staging_path, "w") as f:
+            for log in sorted(logs, key=lambda x: x.get("timestamp", "")):
+                f.write(json.dumps(log) + "\n")
+        _seal_segment(staging_path, _load_index())
+
+    os.replace(LEGACY_LOGS_FILE, f"{LEGACY_LOGS_FILE}.imported")
+    logger.info(f"Imported {len(logs)} entries from {LEGACY_LOGS_FILE}")
+
 
 def log_scheduler_activity(activity_type: str, message: str, success: bool = True):
     """
     Log scheduler activity to help diagnose issues.
-    
+
     Args:
         activity_type: Type of activity (startup, health_check, daily_notification, etc.)
         message: Description of the activity
         success: Whether the activity was successful
     """
-    ensure_data_directory()
-    
     # Create the log entry
     log_entry = {
-        "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        "timestamp": datetime.utcnow().strftime(TIMESTAMP_FORMAT),
         "type": activity_type,
         "message": message,
         "success": success
     }
-    
+
     try:
-        # Load existing logs
-        logs = []
-        if os.path.exists(SCHEDULER_LOGS_FILE):
-            with open(SCHEDULER_LOGS_FILE, 'r') as f:
-                try:
-                    logs = json.load(f)
-                except json.JSONDecodeError:
-                    logger.error(f"Could not parse {SCHEDULER_LOGS_FILE}, creating new log file")
-                    logs = []
-        
-        # Add new log entry
-        logs.append(log_entry)
-        
-        # Truncate logs if they get too large (keep last 1000 entries)
-        if len(logs) > 1000:
-            logs = logs[-1000:]
-        
-        # Save updated logs
-        with open(SCHEDULER_LOGS_FILE, 'w') as f:
-            json.dump(logs, f, indent=2)
-        
+        ensure_data_directory()
+        line = json.dumps(log_entry) + "\n"
+
+        with _write_lock, _file_lock():
+            with open(ACTIVE_LOG_FILE, "a") as f:
+                f.write(line)
+            _rotate_if_needed()
+
         logger.info(f"Logged scheduler activity: {activity_type} - {message} (success: {success})")
     except Exception as e:
         logger.error(f"Failed to log scheduler activity: {str(e)}")
 
+
+def _parse_line(line: bytes) -> Optional[Dict[str, Any]]:
+    """Decode one JSON line, skipping blank or partially written lines."""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def _read_reversed(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the entries of a log file from the last line to the first."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        position = f.seek(0, os.SEEK_END)
+        remainder = b""
+        while position > 0:
+            read_size = min(_READ_BLOCK_SIZE, position)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + remainder).split(b"\n")
+            # The first piece may be the tail of a line that starts in an earlier block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                entry = _parse_line(line)
+                if entry is not None:
+                    yield entry
+        entry = _parse_line(remainder)
+        if entry is not None:
+            yield entry
+
+
+def _as_timestamp(value: Optional[Union[datetime, str]]) -> Optional[str]:
+    """Normalise a datetime or timestamp string to the stored format."""
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value
+
+
+def _segment_may_match(segment: Dict[str, Any], types: Optional[set], type_contains: Optional[str],
+                       since: Optional[str], until: Optional[str], success: Optional[bool]) -> bool:
+    """Use a segment's index entry to decide whether it needs to be read."""
+    if since and segment["last"] and segment["last"] < since:
+        return False
+    if until and segment["first"] and segment["first"] > until:
+        return False
+    if success is False and not segment["errors"]:
+        return False
+    if success is True and segment["errors"] >= segment["count"]:
+        return False
+    if types is not None and not types.intersection(segment["types"]):
+        return False
+    if type_contains and not any(type_contains in t for t in segment["types"]):
+        return False
+    return True
+
+
+def query_scheduler_logs(activity_type: Optional[Union[str, Iterable[str]]] = None,
+                         type_contains: Optional[str] = None,
+                         since: Optional[Union[datetime, str]] = None,
+                         until: Optional[Union[datetime, str]] = None,
+                         success: Optional[bool] = None,
+                         limit: Optional[int] = 50) -> List[Dict[str, Any]]:
+    """
+    Find scheduler log entries, newest first, reading only as much of the log as needed.
+
+    Args:
+        activity_type: Exact activity type, or several types, to include
+        type_contains: Substring the activity type must contain (e.g. "notification")
+        since: Earliest timestamp to include (UTC datetime or "YYYY-MM-DD HH:MM:SS")
+        until: Latest timestamp to include (UTC datetime or "YYYY-MM-DD HH:MM:SS")
+        success: True for successful entries only, False for failures only
+        limit: Maximum number of entries to return (None for no limit)
+
+    Returns:
+        List of matching log entries sorted by timestamp (newest first)
+    """
+    ensure_data_directory()
+
+    if isinstance(activity_type, str):
+        types = {activity_type}
+    else:
+        types = set(activity_type) if activity_type is not None else None
+    since = _as_timestamp(since)
+    until = _as_timestamp(until)
+
+    # The active file is newest; sealed segments follow, newest first
+    paths = [ACTIVE_LOG_FILE]
+    for segment in reversed(_load_index()["segments"]):
+        if since and segment["last"] and segment["last"] < since:
+            break  # Every older segment ends earlier still
+        if _segment_may_match(segment, types, type_contains, since, until, success):
+            paths.append(os.path.join(SCHEDULER_LOGS_DIR, segment["file"]))
+
+    results = []
+    for path in paths:
+        for entry in _read_reversed(path):
+            timestamp = entry.get("timestamp", "")
+            if until and timestamp > until:
+                continue
+            if since and timestamp < since:
+                break  # Entries within a file are in time order
+            log_type = entry.get("type", "unknown")
+            if types is not None and log_type not in types:
+                continue
+            if type_contains and type_contains not in log_type:
+                continue
+            if success is not None and bool(entry.get("success", True)) != success:
+                continue
+            results.append(entry)
+            if limit is not None and len(results) >= limit:
+                return results
+    return results
+
+
 def get_latest_scheduler_logs(count: int = 50) -> List[Dict[str, Any]]:
     """
     Get the most recent scheduler activity logs.
-    
+
     Args:
         count: Maximum number of logs to return
-        
+
     Returns:
         List of log entries sorted by timestamp (newest first)
     """
-    ensure_data_directory()
-    
-    logs = []
-    if os.path.exists(SCHEDULER_LOGS_FILE):
-        try:
-            with open(SCHEDULER_LOGS_FILE, 'r') as f:
-                logs = json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            logger.error(f"Error reading scheduler logs: {str(e)}")
-            return []
-    
-    # Sort logs by timestamp (newest first) and limit to count
-    sorted_logs = sorted(logs, key=lambda x: x.get('timestamp', ''), reverse=True)
-    return sorted_logs[:count]
\ No newline at end of file
+    try:
+        return query_scheduler_logs(limit=count)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error reading scheduler logs: {str(e)}")
+        return []
@@ -1,14 +1,19 @@
 """
 Simplified service functions for the scheduler that don't create circular imports.
 This module contains lightweight wrappers around notification functions.
+
+Daily reminders are queued in the notification outbox, which dedupes them
+per user and day and sends them with rate limiting and retries.
 """
 import os
 import logging
 import json
 import datetime
-import time
 from notification_service import ensure_data_directory
-from notification_tracking import user_received_notification, record_notification_sent, get_notification_statistics
+from notification_outbox import (
+    enqueue_many, queued_keys, daily_key, dispatch_pending,
+    CHANNEL_EMAIL, CHANNEL_SMS
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -31,156 +36,181 @@ def load_users():
         logger.error(f"Error loading users: {str(e)}")
         return []
 
-def send_daily_sms_reminder_direct():
-    """
-    Send daily SMS reminders to users without direct User model dependency.
-    This function works directly with the users.json data file.
+def _queue_daily_reminders(channel, build_message):
     """
-    from sms_notification_service import send_sms_notification  # Import here to avoid circular import
+    Queue today's reminder on one channel for every eligible user, then send
+    everything that is due on that channel.
     
-    # Stats tracking
-    total_users = 0
-    sent_count = 0
-    skipped_count = 0
+    Args:
+        channel: CHANNEL_EMAIL or CHANNEL_SMS
+        build_message: Callable taking a user dict and returning the outbox
+            message for them, or None (with a reason logged) to skip them
+        
+    Returns:
+        dict: Statistics about the run
+    """
+    from app import app  # Import here to avoid circular import
     
     # Load all users
     users = load_users()
     total_users = len(users)
+    skipped_count = 0
     
-    # Get current date
-    current_date = datetime.datetime.now().strftime("%Y-%m-%d")
+    messages = []
+    for user in users:
+        message = build_message(user)
+        if message is None:
+            skipped_count += 1
+        else:
+            messages.append(message)
     
-    # We're now using the notification_tracking module to handle tracking
-    # No need to manually manage tracking files anymore
+    with app.app_context():
+        # Users who already have today's reminder queued or sent are skipped
+        already_queued = queued_keys(message["idempotency_key"] for message in messages)
+        for message in messages:
+            if message["idempotency_key"] in already_queued:
+                logger.info(f"Skipping user {message['user_id']}: Already received {channel} today")
+        skipped_count += len(already_queued)
+        
+        queued_count = enqueue_many(messages)
+        results = dispatch_pending(channel)
     
-    # Send SMS to each eligible user
-    for user in users:
+    return {
+        "total_users": total_users,
+        "queued_count": queued_count,
+        "sent_count": results["sent"],
+        "retrying_count": results["retrying"],
+        "failed_count": results["dead"],
+        "skipped_count": skipped_count,
+        "timestamp": datetime.datetime.now().isoformat()
+    }
+
+def send_daily_sms_reminder_direct():
+    """
+    Send daily SMS reminders to users without direct User model dependency.
+    This function works directly with the users.json data file.
+    """
+    def build_message(user):
         # Skip users who have disabled SMS notifications
         if not user.get('sms_notifications_enabled', False):
             logger.info(f"Skipping user {user.get('id')}: SMS notifications disabled")
-            skipped_count += 1
-            continue
+            return None
         
         # Skip users without phone numbers
         phone_number = user.get('phone_number')
         if not phone_number:
             logger.info(f"Skipping user {user.get('id')}: No phone number")
-            skipped_count += 1
-            continue
-        
-        # Skip users who have already received an SMS today
-        user_id = user.get('id')
-        if user_received_notification(user_id, 'sms'):
-            logger.info(f"Skipping user {user_id}: Already received SMS today")
-            skipped_count += 1
-            continue
+            return None
         
         # Get username for personalization
         username = user.get('username', 'there')
         
         # Send a simple daily journaling reminder
-        try:
-            message = f"Hi {username}! 📔 This is your daily reminder to journal in Calm Journey. A few minutes of reflection can make a big difference in your day."
-            result = send_sms_notification(phone_number, message)
-            
-            if result.get('success'):
-                # Track successful notification using the new tracking system
-                record_notification_sent(user_id, 'sms', phone_number)
-                sent_count += 1
-                logger.info(f"SMS sent to user {user_id} at {phone_number}")
-            else:
-                logger.error(f"Failed to send SMS to user {user_id}: {result.get('error')}")
-        except Exception as e:
-            logger.error(f"Error sending SMS to user {user_id}: {str(e)}")
-        
-        # Brief pause to avoid rate limiting
-        time.sleep(1)
+        return {
+            "idempotency_key": daily_key('sms', user.get('id')),
+            "channel": CHANNEL_SMS,
+            "notification_type": 'sms',
+            "user_id": user.get('id'),
+            "recipient": phone_number,
+            "payload": {
+                "body": f"Hi {username}! 📔 This is your daily reminder to journal in Calm Journey. A few minutes of reflection can make a big difference in your day."
+            }
+        }
     
-    # No need to manually save tracking data anymore
-    # The notification_tracking module handles this automatically
-    
-    # Return stats
-    return {
-        "total_users": total_users,
-        "sent_count": sent_count,
-        "skipped_count": skipped_count,
-        "timestamp": datetime.datetime.now().isoformat()
-    }
+    return _queue_daily_reminders(CHANNEL_SMS, build_message)
 
-def send_daily_reminder_direct():
+def _daily_reminder_email():
     """
-    Send daily email reminders to users without direct User model dependency.
-    This function works directly with the users.json data file.
+    Build the subject, HTML and text of the daily journaling reminder email.
+    The content is the same for everyone so the reminders can be sent in
+    batches; "-username-" is filled in per recipient.
     """
-    from notification_service import send_daily_reminder  # Import here to avoid circular import
+    journal_url = "https://calm-mind-ai-naturalarts.replit.app/journal/new"
+    subject = "Your Daily Journaling Reminder - Calm Journey"
+    html = f"""
+    <html>
+    <body>
+        <h2>Hello -username-!</h2>
+        <p>This is your daily reminder to take a few minutes for yourself and journal.</p>
+        <p>A few minutes of reflection can make a big difference in your day.</p>
+        <p><a href="{journal_url}" style="background-color: #4CAF50; color: white; padding: 10px 15px; text-decoration: none; border-radius: 4px; display: inline-block; margin-top: 10px;">Start Writing Now</a></p>
+        <p>Wishing you a peaceful day,<br>The Calm Journey Team</p>
+    </body>
+    </html>
+    """
+    text = f"""
+    Hello -username-!
     
-    # Stats tracking
-    total_users = 0
-    sent_count = 0
-    skipped_count = 0
+    This is your daily reminder to take a few minutes for yourself and journal.
     
-    # Load all users
-    users = load_users()
-    total_users = len(users)
+    A few minutes of reflection can make a big difference in your day.
     
-    # Get current date
-    current_date = datetime.datetime.now().strftime("%Y-%m-%d")
+    Visit {journal_url} to start writing now.
     
-    # We're now using the notification_tracking module to handle tracking
-    # No need to manually manage tracking files anymore
+    Wishing you a peaceful day,
+    The Calm Journey Team
+    """
+    return subject, html, text
+
+def send_daily_reminder_direct():
+    """
+    Send daily email reminders to users without direct User model dependency.
+    This function works directly with the users.json data file.
+    """
+    subject, html, text = _daily_reminder_email()
     
-    # Send email to each eligible user
-    for user in users:
+    def build_message(user):
         # Skip users who have disabled email notifications
         if not user.get('notifications_enabled', False):
             logger.info(f"Skipping user {user.get('id')}: Email notifications disabled")
-            skipped_count += 1
-            continue
+            return None
         
         # Skip users without email addresses
         email = user.get('email')
         if not email:
             logger.info(f"Skipping user {user.get('id')}: No email address")
-            skipped_count += 1
-            continue
-        
-        # Skip users who have already received an email today
-        user_id = user.get('id')
-        if user_received_notification(user_id, 'email'):
-            logger.info(f"Skipping user {user_id}: Already received email today")
-            skipped_count += 1
-            continue
+            return None
         
         # Get username for personalization
-        username = user.get('username', 'there')
-        
-        # Send a simple daily journaling reminder
-        try:
-            # Use the enhanced daily reminder function
-            result = send_daily_reminder(user)
-            
-            # The result can be True, False, or a dict with 'success' key
-            if (isinstance(result, bool) and result) or (isinstance(result, dict) and result.get('success')):
-                # Track successful notification using the new tracking system
-                record_notification_sent(user_id, 'email', email)
-                sent_count += 1
-                logger.info(f"Email sent to user {user_id} at {email}")
-            else:
-                error_msg = result.get('error') if isinstance(result, dict) else str(result)
-                logger.error(f"Failed to send email to user {user_id}: {error_msg}")
-        except Exception as e:
-            logger.error(f"Error sending email to user {user_id}: {str(e)}")
-        
-        # Brief pause to avoid rate limiting
-        time.sleep(1)
+        return {
+            "idempotency_key": daily_key('email', user.get('id')),
+            "channel": CHANNEL_EMAIL,
+            "notification_type": 'email',
+            "user_id": user.get('id'),
+            "recipient": email,
+            "payload": {
+                "subject": subject,
+                "html": html,
+                "text": text,
+                "substitutions": {"-username-": user.get('username') or 'there'}
+            }
+        }
     
-    # No need to manually save tracking data anymore
-    # The notification_tracking module handles this automatically
+    return _queue_daily_reminders(CHANNEL_EMAIL, build_message)
+
+def refresh_admin_rollups_direct():
+    """
+    Rebuild the admin statistics rollups from the journal tables.
+    Scheduled nightly to correct any drift from the incremental updates.
+    
+    Returns:
+        dict: Statistics about the run
+    """
+    from app import app  # Import here to avoid circular import
+    from admin_utils import refresh_admin_rollups
+    from scheduler_logs import log_scheduler_activity
+    
+    try:
+        with app.app_context():
+            refresh_admin_rollups()
+        log_scheduler_activity("admin_rollups", "Rebuilt admin statistics rollups")
+        success = True
+    except Exception as e:
+        logger.error(f"Error rebuilding admin statistics rollups: {str(e)}")
+        log_scheduler_activity("admin_rollups", f"Failed to rebuild admin statistics rollups: {str(e)}", False)
+        success = False
     
-    # Return stats
     return {
-        "total_users": total_users,
-        "sent_count": sent_count,
-        "skipped_count": skipped_count,
+        "success": success,
         "timestamp": datetime.datetime.now().isoformat()
-    }
\ No newline at end of file
+    }
@@ -28,6 +28,26 @@ const VoicePreferences = {
         
         localStorage.setItem(this.storageKey, JSON.stringify(settings));
         console.log('Voice preferences saved:', settings);
+        
+        this.syncPreferredVoice(settings.voice);
+    },
+    
+    /**
+     * Store the preferred voice on the server, where Mira's insights are
+     * pre-synthesized after analysis
+     * @param {string} voice - Voice identifier
+     */
+    syncPreferredVoice: function(voice) {
+        const csrfMeta = document.querySelector('meta[name="csrf-token"]');
+        
+        fetch('/api/voice-preference', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfMeta ? csrfMeta.getAttribute('content') : ''
+            },
+            body: JSON.stringify({ voice: voice })
+        }).catch(error => console.error('Error syncing voice preference:', error));
     },
     
     /**
@@ -0,0 +1,154 @@
+"""
+Tests for the journal cache backends.
+Run with: python -m pytest test_cache_service.py
+"""
+import os
+import stat
+
+# Keep the module-level cache in this process instead of /dev/shm
+os.environ.setdefault("JOURNAL_CACHE_BACKEND", "memory")
+
+from cache_service import JournalCache, SharedCache, RedisCache
+
+
+class FakeRedis:
+    """Local stand-in for the redis-py client methods RedisCache uses."""
+
+    def __init__(self):
+        self.store = {}
+        self.expiry = {}
+
+    def get(self, key):
+        value = self.store.get(key)
+        return value.encode() if isinstance(value, str) else value
+
+    def set(self, key, value, ex=None):
+        self.store[key] = value
+        self.expiry[key] = ex
+
+    def incr(self, key):
+        self.store[key] = str(int(self.store.get(key, 0)) + 1)
+        return int(self.store[key])
+
+    def delete(self, key):
+        self.store.pop(key, None)
+
+
+def _totals(cache):
+    return cache._connect().execute("SELECT entry_count, total_size FROM meta").fetchone()
+
+
+def _scanned_totals(cache):
+    return cache._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+
+
+def test_shared_cache_file_is_private(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    cache = SharedCache(path=str(path))
+    cache.set("key", {"a": 1})
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_shared_cache_keeps_running_totals(tmp_path):
+    cache = SharedCache(path=str(tmp_path / "cache.sqlite3"))
+    cache.set("a", "x" * 10)
+    cache.set("b", "y" * 20, user_id="u1")
+    cache.set("a", "z" * 30)
+    cache.delete("b")
+    assert _totals(cache) == _scanned_totals(cache)
+    cache.invalidate_user_entries("u1")
+    assert _totals(cache) == _scanned_totals(cache) == (1, len('"' + "z" * 30 + '"'))
+
+
+def test_shared_cache_seeds_totals_for_existing_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SharedCache(path=path)
+    cache.set("a", "value")
+    conn = cache._connect()
+    conn.execute("DROP TABLE meta")
+    conn.commit()
+    reopened = SharedCache(path=path)
+    assert _totals(reopened) == (1, len('"value"'))
+
+
+def test_shared_cache_evicts_least_recently_used(tmp_path):
+    cache = SharedCache(path=str(tmp_path / "cache.sqlite3"), max_entries=3)
+    for i in range(5):
+        cache.set(f"k{i}", i)
+        cache._connect().execute("UPDATE entries SET last_access = ? WHERE key = ?", (i, f"k{i}"))
+    cache.set("k5", 5)
+    assert [cache.get(f"k{i}") for i in range(6)] == [None, None, None, 3, 4, 5]
+    assert _totals(cache) == _scanned_totals(cache)
+
+
+def test_shared_cache_evicts_to_byte_budget(tmp_path):
+    cache = SharedCache(path=str(tmp_path / "cache.sqlite3"), max_bytes=100)
+    for i in range(10):
+        cache.set(f"k{i}", "x" * 20)
+    count, total_size = _totals(cache)
+    assert total_size <= 100
+    assert (count, total_size) == _scanned_totals(cache)
+
+
+def test_shared_cache_drops_value_loaded_before_invalidation(tmp_path):
+    cache = SharedCache(path=str(tmp_path / "cache.sqlite3"))
+    version = cache.get_user_version("u1")
+    cache.invalidate_user_entries("u1")
+    cache.set("entries", ["stale"], user_id="u1", version=version)
+    assert cache.get("entries") is None
+
+    cache.set("entries", ["fresh"], user_id="u1", version=cache.get_user_version("u1"))
+    assert cache.get("entries") == ["fresh"]
+
+
+def test_shared_cache_invalidation_seen_by_other_workers(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer, other = SharedCache(path=path), SharedCache(path=path)
+    writer.set("entries", [1, 2], user_id="u1")
+    assert other.get("entries") == [1, 2]
+    other.invalidate_user_entries("u1")
+    assert writer.get("entries") is None
+
+
+def test_memory_cache_drops_value_loaded_before_invalidation():
+    cache = JournalCache()
+    version = cache.get_user_version("u1")
+    cache.invalidate_user_entries("u1")
+    cache.set("entries", ["stale"], user_id="u1", version=version)
+    assert cache.get("entries") is None
+
+
+def test_redis_cache_round_trip():
+    client = FakeRedis()
+    cache = RedisCache(client=client, default_ttl=60)
+    cache.set("key", {"a": [1, 2]}, user_id="u1")
+    assert cache.get("key") == {"a": [1, 2]}
+    assert client.expiry["dearteddy:cache:key"] == 60
+    assert cache.get("missing") is None
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 1
+
+
+def test_redis_cache_invalidation_and_version():
+    cache = RedisCache(client=FakeRedis())
+    cache.set("entries", ["old"], user_id="u1")
+    cache.set("global", ["shared"])
+    version = cache.get_user_version("u1")
+    cache.invalidate_user_entries("u1")
+    assert cache.get("entries") is None
+    assert cache.get("global") == ["shared"]
+
+    cache.set("entries", ["stale"], user_id="u1", version=version)
+    assert cache.get("entries") is None
+    cache.set("entries", ["fresh"], user_id="u1", version=cache.get_user_version("u1"))
+    assert cache.get("entries") == ["fresh"]
+
+
+def test_redis_cache_survives_client_errors():
+    class BrokenRedis(FakeRedis):
+        def get(self, key):
+            raise ConnectionError("down")
+
+    cache = RedisCache(client=BrokenRedis())
+    assert cache.get("key") is None
+    assert cache.get_user_version("u1") == 0
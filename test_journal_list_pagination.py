@@ -0,0 +1,74 @@
+"""
+Tests for the journal list served from the entry cache.
+Run with: python -m pytest test_journal_list_pagination.py
+"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+# Point the app at a throwaway database before it is imported
+os.environ.setdefault("DATABASE_URL", "sqlite:///test_journal_list_pagination.db")
+
+from app import app, db
+from models import User, JournalEntry
+import cache_service
+from cache_service import JournalCache, get_cached_user_entries, preload_user_data
+from journal_routes import CachedPagination
+
+
+def _pages(total, page, **kwargs):
+    return list(CachedPagination([], total, page, 10).iter_pages(**kwargs))
+
+
+def test_iter_pages_matches_flask_sqlalchemy():
+    assert _pages(0, 1) == []
+    assert _pages(30, 1) == [1, 2, 3]
+    assert _pages(200, 1) == [1, 2, 3, 4, 5, None, 19, 20]
+    assert _pages(200, 10) == [1, 2, None, 8, 9, 10, 11, 12, 13, 14, None, 19, 20]
+    assert _pages(200, 20) == [1, 2, None, 18, 19, 20]
+    assert _pages(200, 10, left_edge=1, right_edge=1, left_current=2, right_current=2) == [
+        1, None, 8, 9, 10, 11, 12, None, 20]
+
+
+@pytest.fixture
+def user_with_entries(monkeypatch):
+    monkeypatch.setattr(cache_service, "journal_cache", JournalCache())
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+
+    with app.app_context():
+        db.create_all()
+        user = User(username="pagination_test", email="pagination_test@example.com")
+        db.session.add(user)
+        db.session.flush()
+        start = datetime.utcnow() - timedelta(days=30)
+        for i in range(25):
+            db.session.add(JournalEntry(user_id=user.id, title=f"Entry {i}", content=f"Content {i}",
+                                        anxiety_level=5, created_at=start + timedelta(days=i)))
+        db.session.commit()
+        user_id = user.id
+
+    yield user_id
+
+    with app.app_context():
+        JournalEntry.query.filter_by(user_id=user_id).delete()
+        User.query.filter_by(id=user_id).delete()
+        db.session.commit()
+
+
+def test_journal_list_with_warm_cache_renders_page_links(user_with_entries):
+    with app.app_context():
+        preload_user_data(user_with_entries)
+        assert get_cached_user_entries(user_with_entries) is not None
+
+    with app.test_client() as client:
+        with client.session_transaction() as session:
+            session["_user_id"] = user_with_entries
+            session["_fresh"] = True
+
+        response = client.get("/journal/")
+
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert "Entry 24" in body
+    assert "/journal?page=3" in body
@@ -0,0 +1,110 @@
+"""
+Tests for the per-user, append-only journal store.
+Run with: python -m pytest test_journal_store.py
+"""
+import json
+import os
+
+import journal_store
+from journal_store import JournalStore
+
+
+def _entry(entry_id, created_at, **fields):
+    return dict({"id": entry_id, "title": f"Entry {entry_id}", "created_at": created_at}, **fields)
+
+
+def _store(tmp_path, legacy_file=None):
+    return JournalStore(directory=str(tmp_path / "journals"), legacy_file=legacy_file)
+
+
+def _records(store, user_id):
+    with open(store._path(user_id)) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_put_get_and_delete(tmp_path):
+    store = _store(tmp_path)
+    store.put("u1", _entry(1, "2025-01-01"))
+    store.put("u1", _entry(2, "2025-01-03"))
+    store.put("u1", _entry(3, "2025-01-02"))
+    store.put("u2", _entry(4, "2025-01-04"))
+
+    assert [e["id"] for e in store.get_entries("u1")] == [2, 3, 1]
+    assert [e["id"] for e in store.get_entries("u1", limit=2)] == [2, 3]
+    assert store.get_entry(4, "u1") is None
+    assert store.count("u2") == 1
+
+    assert store.delete(3, "u1") is True
+    assert store.delete(3, "u1") is False
+    assert [e["id"] for e in store.get_entries("u1")] == [2, 1]
+
+
+def test_returned_entries_are_copies(tmp_path):
+    store = _store(tmp_path)
+    store.put("u1", _entry(1, "2025-01-01", cbt_patterns=[{"pattern": "p"}]))
+
+    store.get_entries("u1")[0]["cbt_patterns"].append({"pattern": "added"})
+    store.get_entry(1, "u1")["title"] = "changed"
+
+    entry = store.get_entry(1, "u1")
+    assert entry["title"] == "Entry 1"
+    assert entry["cbt_patterns"] == [{"pattern": "p"}]
+
+
+def test_replay_picks_up_writes_from_another_process(tmp_path):
+    writer, reader = _store(tmp_path), _store(tmp_path)
+    writer.put("u1", _entry(1, "2025-01-01"))
+    assert reader.count("u1") == 1
+
+    writer.put("u1", _entry(1, "2025-01-01", title="edited"))
+    writer.put("u1", _entry(2, "2025-01-02"))
+    writer.delete(1, "u1")
+    assert [e["id"] for e in reader.get_entries("u1")] == [2]
+
+
+def test_partial_record_is_read_once_complete(tmp_path):
+    store = _store(tmp_path)
+    store.put("u1", _entry(1, "2025-01-01"))
+    line = json.dumps({"op": "put", "entry": _entry(2, "2025-01-02")})
+
+    with open(store._path("u1"), "a") as f:
+        f.write(line[:10])
+    assert store.count("u1") == 1
+
+    with open(store._path("u1"), "a") as f:
+        f.write(line[10:] + "\n")
+    assert store.count("u1") == 2
+
+
+def test_compaction_keeps_live_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal_store, "COMPACT_MIN_DEAD_RECORDS", 4)
+    store, other = _store(tmp_path), _store(tmp_path)
+    store.put("u1", _entry(1, "2025-01-01"))
+    assert other.count("u1") == 1
+
+    for i in range(10):
+        store.put("u1", _entry(2, "2025-01-02", title=f"edit {i}"))
+
+    records = _records(store, "u1")
+    assert len(records) < 11
+    assert store.get_entry(2, "u1")["title"] == "edit 9"
+
+    # A process that indexed the log before it was compacted reloads it
+    assert [e["title"] for e in other.get_entries("u1")] == ["edit 9", "Entry 1"]
+
+
+def test_legacy_file_is_migrated_once(tmp_path):
+    legacy_file = tmp_path / "journals.json"
+    legacy_file.write_text(json.dumps([
+        dict(_entry(1, "2025-01-01"), user_id="u1"),
+        dict(_entry(2, "2025-01-02"), user_id="u2"),
+        _entry(3, "2025-01-03"),
+    ]))
+
+    store = _store(tmp_path, legacy_file=str(legacy_file))
+    assert store.count("u1") == 1
+    assert store.count("u2") == 1
+    assert os.path.exists(tmp_path / "journals" / ".migrated")
+
+    store.delete(1, "u1")
+    assert _store(tmp_path, legacy_file=str(legacy_file)).count("u1") == 0
@@ -0,0 +1,94 @@
+"""
+Tests for incremental field extraction from streamed JSON.
+Run with: python -m pytest test_json_stream.py
+"""
+import json
+import random
+
+from json_stream import JsonFieldStream, TEXT_EVENT, VALUE_EVENT
+
+DOCUMENT = {
+    "insight_text": "It sounds like work has been \"a lot\" lately.\nYou're not alone — \U0001F331",
+    "reflection_prompt": "What would help?",
+    "thought_patterns": [
+        {"pattern": "Catastrophizing", "description": "Expecting the worst {even} [here]"},
+        {"pattern": "Mind reading", "description": "Assuming what others think"},
+    ],
+    "strategies": [],
+    "ignored": {"insight_text_like": "no", "nested": ["a", "b"]},
+}
+
+
+def _collect(pieces):
+    """Feed pieces and gather the streamed text and completed values per field."""
+    stream = JsonFieldStream()
+    texts, values = {}, {}
+    for piece in pieces:
+        for event, field, payload in stream.feed(piece):
+            if event == TEXT_EVENT:
+                texts[field] = texts.get(field, "") + payload
+            elif event == VALUE_EVENT:
+                values[field] = payload
+    return texts, values
+
+
+def _split(text, rng):
+    pieces, position = [], 0
+    while position < len(text):
+        size = rng.randint(1, 8)
+        pieces.append(text[position:position + size])
+        position += size
+    return pieces
+
+
+def test_fields_extracted_in_one_piece():
+    texts, values = _collect([json.dumps(DOCUMENT)])
+    assert texts == {
+        "insight_text": DOCUMENT["insight_text"],
+        "reflection_prompt": DOCUMENT["reflection_prompt"],
+    }
+    assert values == {
+        "thought_patterns": DOCUMENT["thought_patterns"],
+        "strategies": [],
+    }
+
+
+def test_any_split_gives_the_same_result():
+    rng = random.Random(42)
+    for raw in (json.dumps(DOCUMENT), json.dumps(DOCUMENT, indent=2, ensure_ascii=False)):
+        expected = _collect([raw])
+        for _ in range(200):
+            assert _collect(_split(raw, rng)) == expected
+
+
+def test_escapes_split_across_pieces():
+    raw = json.dumps({"insight_text": "a\"b\\c é \U0001F600"})
+    texts, _ = _collect(list(raw))
+    assert texts["insight_text"] == "a\"b\\c é \U0001F600"
+
+
+def test_text_arrives_before_the_document_is_complete():
+    stream = JsonFieldStream()
+    events = stream.feed('{"insight_text": "Hello wor')
+    assert events == [(TEXT_EVENT, "insight_text", "Hello wor")]
+    assert stream.feed('ld", "thought_patterns": [1, ') == [(TEXT_EVENT, "insight_text", "ld")]
+    assert stream.feed('2]}') == [(VALUE_EVENT, "thought_patterns", [1, 2])]
+
+
+def test_nested_structured_response():
+    raw = json.dumps({"structured_response": {"insight_text": "nested", "patterns": [{"a": 1}]}})
+    texts, values = _collect([raw])
+    assert texts == {"insight_text": "nested"}
+    assert values == {"patterns": [{"a": 1}]}
+
+
+def test_watched_keys_inside_a_captured_value_are_not_streamed():
+    raw = json.dumps({"strategies": [{"insight_text": "inside", "templates": [1]}]})
+    texts, values = _collect([raw])
+    assert texts == {}
+    assert values == {"strategies": [{"insight_text": "inside", "templates": [1]}]}
+
+
+def test_string_values_are_not_mistaken_for_keys():
+    raw = json.dumps({"ignored": "insight_text", "other": ["insight_text", "x"]})
+    assert _collect([raw]) == ({}, {})
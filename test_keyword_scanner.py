@@ -0,0 +1,67 @@
+"""
+Tests for the single-pass keyword scanner.
+Run with: python -m pytest test_keyword_scanner.py
+"""
+import random
+import re
+
+from keyword_scanner import KeywordScanner
+
+# A mix of the journal keyword lists' awkward cases: keywords that are
+# prefixes of other keywords, multi-word phrases, punctuation and short words
+KEYWORDS = [
+    "mad", "sad", "sadness", "lost", "giving up", "burnout", "burn", "high",
+    "my child", "my kid", "children", "child", "mom", "dad", "hurt myself",
+    "hurt someone", "hurt", "don't want to live", "can't cope", "work-life balance",
+    "work", "pain", "happy", "unhappy", "rage", "a", "aa",
+]
+
+VOCABULARY = KEYWORDS + [
+    "made", "nomad", "sadly", "highway", "my", "children's", "kid", "mommy", "i", "am",
+    "today", "very", "and", "the", "work-life", "balance", "painful", "outrage", "aaa",
+]
+
+
+def regex_scan(text, keywords):
+    """The per-keyword scan the scanner replaced: substring and \\b...\\b counts."""
+    hits = {}
+    for keyword in keywords:
+        count = sum(1 for i in range(len(text)) if text.startswith(keyword, i))
+        if count:
+            word_count = len(re.findall(r'\b' + re.escape(keyword) + r'\b', text))
+            hits[keyword] = (count, word_count)
+    return hits
+
+
+def random_text(rng, words):
+    separators = [" ", " ", " ", ", ", ". ", "-", "_", "\n", "'"]
+    return "".join(rng.choice(words) + rng.choice(separators) for _ in range(rng.randint(0, 40))).strip()
+
+
+def test_matches_regex_scan_on_random_texts():
+    scanner = KeywordScanner(KEYWORDS)
+    rng = random.Random(1234)
+    for _ in range(2000):
+        text = random_text(rng, VOCABULARY)
+        assert scanner.scan(text) == regex_scan(text, KEYWORDS), text
+
+
+def test_overlapping_keywords_are_all_found():
+    scanner = KeywordScanner(["my child", "children", "child"])
+    assert scanner.scan("my children") == {
+        "my child": (1, 0),
+        "children": (1, 1),
+        "child": (1, 0),
+    }
+
+
+def test_whole_word_counts():
+    scanner = KeywordScanner(["mad"])
+    assert scanner.scan("mad, made, nomad, mad") == {"mad": (4, 2)}
+    assert scanner.scan("mad_dog") == {"mad": (1, 0)}
+
+
+def test_empty_inputs():
+    assert KeywordScanner([]).scan("anything") == {}
+    assert KeywordScanner(["", "sad"]).scan("") == {}
+    assert KeywordScanner(["sad", "sad"]).keywords == ["sad"]
@@ -0,0 +1,100 @@
+"""
+Tests for the notification outbox's per-channel token bucket.
+Run with: python -m pytest test_notification_outbox.py
+"""
+import time
+import threading
+
+import pytest
+
+import notification_outbox
+from notification_outbox import TokenBucket
+
+
+class FakeClock:
+    """
+    Stands in for the time module so the bucket can be tested without waiting.
+    Rates in these tests are powers of two, so the simulated times are exact.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Replaces the module's reference to time, not the time module itself
+    fake = FakeClock()
+    monkeypatch.setattr(notification_outbox, "time", fake)
+    return fake
+
+
+def test_burst_is_served_without_waiting(clock):
+    bucket = TokenBucket(rate=1, capacity=5)
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+
+def test_waits_for_refill_once_empty(clock):
+    bucket = TokenBucket(rate=2, capacity=2)
+    bucket.acquire(2)
+    bucket.acquire()
+    assert clock.sleeps == [0.5]
+
+
+def test_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(rate=8, capacity=3)
+    bucket.acquire(3)
+    clock.now += 60
+    bucket.acquire(3)
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert clock.sleeps == [0.125]
+
+
+def test_request_larger_than_capacity_is_clamped(clock):
+    bucket = TokenBucket(rate=1, capacity=2)
+    bucket.acquire(10)
+    assert clock.sleeps == []
+
+
+def test_sustained_rate(clock):
+    bucket = TokenBucket(rate=4, capacity=4)
+    for _ in range(44):
+        bucket.acquire()
+    # 4 from the initial burst, then 40 at 4 per second
+    assert clock.now == 10.0
+
+
+def test_threads_share_the_budget():
+    # Real clock: 10 acquisitions from a burst of 4 at 200/s take at least 30 ms
+    bucket = TokenBucket(rate=200, capacity=4)
+    acquired = []
+
+    def worker():
+        for _ in range(5):
+            bucket.acquire()
+            acquired.append(time.monotonic())
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(acquired) == 10
+    assert max(acquired) - start >= 6 / 200 * 0.9
+
+
+def test_every_channel_has_a_limiter():
+    assert set(notification_outbox.rate_limiters) == set(notification_outbox.CHANNELS)
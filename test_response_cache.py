@@ -0,0 +1,83 @@
+"""
+Tests for the persistent OpenAI response cache.
+Run with: python -m pytest test_response_cache.py
+"""
+from types import SimpleNamespace
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, cached_chat_completion, is_json_object
+
+MESSAGES = [{"role": "user", "content": "I had a long day at work."}]
+
+
+class FakeClient:
+    """Returns the queued (content, finish_reason) completions in order."""
+
+    def __init__(self, *completions):
+        self.completions = list(completions)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, stream=False, **params):
+        self.calls += 1
+        content, finish_reason = self.completions.pop(0)
+        if stream:
+            return iter([
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content), finish_reason=None)]),
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason=finish_reason)]),
+            ])
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)])
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    fresh = ResponseCache(str(tmp_path / "responses.sqlite3"))
+    monkeypatch.setattr(response_cache, "response_cache", fresh)
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_ENABLED", True)
+    return fresh
+
+
+def _complete(client, **kwargs):
+    return cached_chat_completion(lambda: client, mode="journal_initial", model="gpt-4o",
+                                  messages=MESSAGES, **kwargs)
+
+
+def test_repeat_is_served_from_the_cache():
+    client = FakeClient(('{"a": 1}', "stop"))
+    assert _complete(client) == '{"a": 1}'
+    assert _complete(client) == '{"a": 1}'
+    assert client.calls == 1
+
+
+def test_truncated_completion_is_not_cached():
+    client = FakeClient(('{"a": ', "length"), ('{"a": 1}', "stop"))
+    assert _complete(client) == '{"a": '
+    assert _complete(client) == '{"a": 1}'
+    assert client.calls == 2
+
+
+def test_truncated_stream_is_not_cached():
+    client = FakeClient(('{"a": ', "length"), ('{"a": 1}', "stop"))
+    deltas = []
+    assert _complete(client, on_delta=deltas.append) == '{"a": '
+    assert _complete(client, on_delta=deltas.append) == '{"a": 1}'
+    assert _complete(client, on_delta=deltas.append) == '{"a": 1}'
+    assert client.calls == 2
+    assert deltas == ['{"a": ', '{"a": 1}', '{"a": 1}']
+
+
+def test_content_failing_validation_is_not_cached():
+    client = FakeClient(("not json", "stop"), ('{"a": 1}', "stop"))
+    assert _complete(client, validate=is_json_object) == "not json"
+    assert _complete(client, validate=is_json_object) == '{"a": 1}'
+    assert _complete(client, validate=is_json_object) == '{"a": 1}'
+    assert client.calls == 2
+
+
+def test_is_json_object():
+    assert is_json_object('{"narrative_response": "hi"}')
+    assert not is_json_object('["a"]')
+    assert not is_json_object('{"narrative_response": "cut o')
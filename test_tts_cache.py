@@ -0,0 +1,123 @@
+"""
+Tests for the shared text-to-speech audio cache.
+Run with: python -m pytest test_tts_cache.py
+"""
+import os
+import threading
+import time
+
+import pytest
+
+import tts_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "static" / "audio" / "cache"
+    monkeypatch.setattr(tts_cache, "CACHE_DIR", str(directory))
+    monkeypatch.setattr(tts_cache, "_approx_size", None)
+    return directory
+
+
+def _writer(data=b"audio", calls=None, delay=0.0):
+    def synthesize(path):
+        if calls is not None:
+            calls.append(path)
+        if delay:
+            time.sleep(delay)
+        with open(path, "wb") as f:
+            f.write(data)
+    return synthesize
+
+
+def test_cache_key_depends_on_every_input():
+    base = tts_cache.cache_key("openai:tts-1", "shimmer", None, "Hello")
+    assert base == tts_cache.cache_key("openai:tts-1", "shimmer", None, "Hello")
+    assert len({
+        base,
+        tts_cache.cache_key("openai:tts-1", "alloy", None, "Hello"),
+        tts_cache.cache_key("openai:tts-1", "shimmer", "calm", "Hello"),
+        tts_cache.cache_key("premium", "shimmer", None, "Hello"),
+        tts_cache.cache_key("openai:tts-1", "shimmer", None, "Hello."),
+    }) == 5
+
+
+def test_miss_then_hit(cache_dir):
+    calls = []
+    path = tts_cache.get_audio("premium", "us_female", "calm", "Hello", _writer(calls=calls))
+    again = tts_cache.get_audio("premium", "us_female", "calm", "Hello", _writer(calls=calls))
+
+    assert path == again
+    assert len(calls) == 1
+    with open(path, "rb") as f:
+        assert f.read() == b"audio"
+    assert tts_cache.static_filename(path).endswith(os.path.basename(path))
+
+
+def test_concurrent_requests_synthesize_once(cache_dir):
+    calls = []
+    results = []
+
+    def request():
+        results.append(tts_cache.get_audio("enhanced", "uk_female", None, "Same text",
+                                           _writer(calls=calls, delay=0.1)))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(set(results)) == 1
+
+
+def test_failed_synthesis_is_not_cached(cache_dir):
+    def fail(path):
+        raise RuntimeError("TTS API down")
+
+    with pytest.raises(RuntimeError):
+        tts_cache.get_audio("premium", "us_female", None, "Hello", fail)
+    with pytest.raises(RuntimeError, match="no audio"):
+        tts_cache.get_audio("premium", "us_female", None, "Hello", _writer(data=b""))
+
+    assert not [name for name in os.listdir(cache_dir) if not name.endswith(".lock")]
+    calls = []
+    tts_cache.get_audio("premium", "us_female", None, "Hello", _writer(calls=calls))
+    assert len(calls) == 1
+
+
+def test_gc_removes_least_recently_used(cache_dir):
+    paths = []
+    for i in range(5):
+        path = tts_cache.get_audio("premium", "us_female", None, f"Text {i}", _writer(data=b"x" * 100))
+        os.utime(path, (1000 + i, 1000 + i))
+        paths.append(path)
+
+    stats = tts_cache.gc(max_bytes=300)
+
+    # Trimmed to 90% of the budget, oldest first
+    assert stats == {"removed": 3, "freed": 300, "remaining": 200}
+    assert [os.path.exists(path) for path in paths] == [False, False, False, True, True]
+
+
+def test_gc_removes_stale_lock_and_partial_files(cache_dir):
+    tts_cache.ensure_cache_directory()
+    stale = cache_dir / ".abc.lock"
+    fresh = cache_dir / ".def.lock"
+    stale.write_text("")
+    fresh.write_text("")
+    old = time.time() - tts_cache.STALE_SECONDS - 10
+    os.utime(stale, (old, old))
+
+    tts_cache.gc()
+
+    assert not stale.exists()
+    assert fresh.exists()
+
+
+def test_over_budget_write_triggers_gc(cache_dir, monkeypatch):
+    monkeypatch.setattr(tts_cache, "CACHE_MAX_BYTES", 250)
+    for i in range(4):
+        tts_cache.get_audio("premium", "us_female", None, f"Text {i}", _writer(data=b"x" * 100))
+    assert tts_cache._cache_size() <= 250
@@ -0,0 +1,281 @@
+"""
+Shared audio cache for the text-to-speech backends.
+
+Audio is stored under static/audio/cache, named by a hash of the backend,
+voice, style and the exact text sent to the synthesizer, so replaying the
+same insight serves the existing file instead of paying for another
+synthesis. Concurrent requests for the same audio wait for a single
+synthesis, and the least recently used files are removed once the cache
+grows past its size budget.
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get("TTS_CACHE_DIR", os.path.join("static", "audio", "cache"))
+
+# Total size the cache may reach before the least recently used files are removed (bytes)
+CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+
+# Garbage collection trims the cache down to this fraction of the budget
+CACHE_TARGET_RATIO = 0.9
+
+# Hits refresh a file's mtime (its LRU position) at most this often (seconds)
+TOUCH_INTERVAL = 3600
+
+# Lock files and interrupted partial files older than this are removed by gc (seconds)
+STALE_SECONDS = 3600
+
+AUDIO_EXTENSION = ".mp3"
+
+# In-process single-flight registry: key -> _Flight for syntheses in progress
+_flights: Dict[str, "_Flight"] = {}
+_flights_lock = threading.Lock()
+
+# Bytes this process believes the cache holds; recounted by every gc pass
+_approx_size: Optional[int] = None
+_size_lock = threading.Lock()
+
+
+class _Flight:
+    """One synthesis that other threads asking for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.path: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+def ensure_cache_directory():
+    """Ensure the cache directory exists"""
+    if not os.path.exists(CACHE_DIR):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+
+
+def cache_key(backend: str, voice: Optional[str], style: Optional[str], text: str) -> str:
+    """
+    Hash the inputs that determine the synthesized audio.
+
+    Args:
+        backend: Name of the TTS backend (and model, where it has several)
+        voice: Voice identifier as understood by the backend
+        style: Style or speed setting, if any
+        text: Text exactly as it is sent to the synthesizer
+
+    Returns:
+        str: Hex digest used as the cache file name
+    """
+    material = json.dumps([backend, voice, style, text], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def cache_path(key: str) -> str:
+    """Path of the cached audio file for a key"""
+    return os.path.join(CACHE_DIR, key + AUDIO_EXTENSION)
+
+
+def static_filename(path: str) -> str:
+    """
+    Convert a cache file path to a filename relative to the static folder.
+
+    Args:
+        path: Path returned by get_audio
+
+    Returns:
+        str: Filename for url_for('static', ...) or a /static/ URL
+    """
+    return os.path.relpath(path, "static").replace(os.sep, "/")
+
+
+@contextmanager
+def _key_lock(key: str):
+    """Exclusive lock on one key, shared by all processes using the cache."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(CACHE_DIR, f".{key}.lock"), "a") as lock_file:
+        # Mark the lock file as in use so gc leaves it alone
+        os.utime(lock_file.fileno())
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _lookup(path: str) -> bool:
+    """Check for a cached file, refreshing its LRU position on a hit."""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return False
+    if time.time() - mtime >= TOUCH_INTERVAL:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+    return True
+
+
+def _synthesize_locked(key: str, synthesize: Callable[[str], None]) -> str:
+    """Create the cached file for a key unless another process already has."""
+    path = cache_path(key)
+    with _key_lock(key):
+        if _lookup(path):
+            return path
+
+        partial_path = os.path.join(CACHE_DIR, f".{key}.{uuid.uuid4().hex}.part")
+        try:
+            synthesize(partial_path)
+            if not os.path.exists(partial_path) or os.path.getsize(partial_path) == 0:
+                raise RuntimeError("Synthesizer produced no audio")
+            # Readers only ever see complete files
+            os.replace(partial_path, path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    _account(os.path.getsize(path))
+    return path
+
+
+def get_audio(backend: str, voice: Optional[str], style: Optional[str], text: str,
+              synthesize: Callable[[str], None]) -> str:
+    """
+    Return cached audio for the given inputs, synthesizing it on a miss.
+
+    Only one synthesis runs per key: other threads wait for it in-process and
+    other workers wait on the key's lock file, then find the finished file.
+
+    Args:
+        backend: Name of the TTS backend
+        voice: Voice identifier
+        style: Style or speed setting, if any
+        text: Text exactly as it is sent to the synthesizer
+        synthesize: Called with a file path to write the audio to on a miss
+
+    Returns:
+        str: Path to the cached audio file
+    """
+    ensure_cache_directory()
+    key = cache_key(backend, voice, style, text)
+    path = cache_path(key)
+
+    if _lookup(path):
+        logger.debug(f"TTS cache hit for {backend} ({key[:12]})")
+        return path
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.path
+
+    try:
+        logger.info(f"TTS cache miss for {backend}, synthesizing {len(text)} chars ({key[:12]})")
+        flight.path = _synthesize_locked(key, synthesize)
+        return flight.path
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+def _account(added_bytes: int):
+    """Track newly cached bytes and collect garbage once the budget is exceeded."""
+    global _approx_size
+    with _size_lock:
+        if _approx_size is None:
+            _approx_size = _cache_size()
+        else:
+            _approx_size += added_bytes
+        over_budget = _approx_size > CACHE_MAX_BYTES
+    if over_budget:
+        gc()
+
+
+def _cache_size() -> int:
+    """Total size of the cached audio files"""
+    total = 0
+    with os.scandir(CACHE_DIR) as entries:
+        for entry in entries:
+            if entry.name.endswith(AUDIO_EXTENSION) and entry.is_file():
+                total += entry.stat().st_size
+    return total
+
+
+def gc(max_bytes: Optional[int] = None) -> Dict[str, int]:
+    """
+    Remove the least recently used audio files until the cache fits its budget.
+
+    Args:
+        max_bytes: Budget to enforce (defaults to CACHE_MAX_BYTES)
+
+    Returns:
+        dict: Number of files removed, bytes freed and bytes remaining
+    """
+    global _approx_size
+    ensure_cache_directory()
+    if max_bytes is None:
+        max_bytes = CACHE_MAX_BYTES
+    target = int(max_bytes * CACHE_TARGET_RATIO)
+    now = time.time()
+
+    files = []
+    total = 0
+    with os.scandir(CACHE_DIR) as entries:
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if entry.name.endswith(AUDIO_EXTENSION):
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            elif entry.name.startswith(".") and now - stat.st_mtime > STALE_SECONDS:
+                # Lock files of finished syntheses and partial files of interrupted ones
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    removed = freed = 0
+    if total > max_bytes:
+        for _, size, path in sorted(files):
+            if total - freed <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            freed += size
+
+    with _size_lock:
+        _approx_size = total - freed
+
+    if removed:
+        logger.info(f"TTS cache gc removed {removed} files ({freed} bytes), {total - freed} bytes remain")
+    return {"removed": removed, "freed": freed, "remaining": total - freed}
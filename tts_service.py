@@ -3,10 +3,10 @@ Text-to-speech service using gTTS (Google Text-to-Speech).
 This service provides better quality speech synthesis than browser-based solutions.
 """
 import os
-import uuid
 import re
 from gtts import gTTS
 from flask import url_for, current_app
+from tts_cache import get_audio, static_filename
 
 # Create static audio directory if it doesn't exist
 def ensure_audio_directory():
@@ -48,18 +48,17 @@ def text_to_speech(text, language='en', slow=False):
     # Clean text for better TTS
     text = clean_text_for_tts(text)
     
-    # Generate a unique filename
-    audio_dir = ensure_audio_directory()
-    filename = f"tts_{uuid.uuid4()}.mp3"
-    filepath = os.path.join(audio_dir, filename)
-    
-    try:
+    def synthesize(filepath):
         # Generate TTS audio file
         tts = gTTS(text=text, lang=language, slow=slow)
         tts.save(filepath)
+    
+    try:
+        # Replays of the same text are served from the audio cache
+        filepath = get_audio("gtts", language, "slow" if slow else "normal", text, synthesize)
         
         # Return URL to the audio file
-        return url_for('static', filename=f'audio/{filename}')
+        return url_for('static', filename=static_filename(filepath))
         
     except Exception as e:
         current_app.logger.error(f"Error generating TTS: {str(e)}")
@@ -0,0 +1,218 @@
+"""
+Chunked, streamed speech synthesis for long Mira responses.
+
+Text is split at sentence boundaries and the chunks are synthesized in
+parallel through the shared audio cache. The audio is streamed back in
+order as soon as each chunk is ready, so playback starts after the first
+sentence instead of after the whole response.
+"""
+import os
+import re
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List
+
+from flask import request, jsonify, Response, stream_with_context
+from tts_service import clean_text_for_tts
+
+logger = logging.getLogger(__name__)
+
+# Sentences are grouped into chunks of up to this many characters (the first chunk is one sentence)
+STREAM_CHUNK_CHARS = int(os.environ.get("TTS_STREAM_CHUNK_CHARS", 300))
+
+# Chunks synthesized at once across all streams in this process
+STREAM_MAX_WORKERS = int(os.environ.get("TTS_STREAM_MAX_WORKERS", 8))
+
+# Chunks a single stream synthesizes ahead of the one being sent
+STREAM_PREFETCH = int(os.environ.get("TTS_STREAM_PREFETCH", 3))
+
+# Size of the blocks audio files are streamed in (bytes)
+STREAM_BLOCK_SIZE = 64 * 1024
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_CLAUSE_END = re.compile(r'(?<=[,;:])\s+')
+
+_executor = ThreadPoolExecutor(max_workers=STREAM_MAX_WORKERS, thread_name_prefix="tts-stream")
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """Break a sentence longer than max_chars at clause boundaries, then at spaces."""
+    pieces = []
+    current = ""
+    for part in _CLAUSE_END.split(sentence):
+        while len(part) > max_chars:
+            cut = part.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(part[:cut].strip())
+            part = part[cut:].strip()
+        if current and len(current) + 1 + len(part) > max_chars:
+            pieces.append(current)
+            current = part
+        else:
+            current = f"{current} {part}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(text: str, max_chars: int = STREAM_CHUNK_CHARS) -> List[str]:
+    """
+    Split text into chunks for streamed synthesis.
+
+    The first chunk is the first sentence on its own so audio can start as
+    early as possible; later sentences are grouped up to max_chars.
+
+    Args:
+        text: Text to speak (HTML is stripped and whitespace normalised)
+        max_chars: Maximum length of a chunk
+
+    Returns:
+        List of chunk strings in speaking order
+    """
+    sentences = []
+    for sentence in _SENTENCE_END.split(clean_text_for_tts(text)):
+        if sentence:
+            sentences.extend(_split_long(sentence, max_chars))
+
+    if not sentences:
+        return []
+
+    chunks = [sentences[0]]
+    current = ""
+    for sentence in sentences[1:]:
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _read_blocks(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(STREAM_BLOCK_SIZE)
+            if not block:
+                return
+            yield block
+
+
+def stream_audio(chunks: List[str], synthesize_chunk: Callable[[str], str],
+                 prefetch: int = STREAM_PREFETCH) -> Iterator[bytes]:
+    """
+    Synthesize chunks in parallel and return a generator of their audio in order.
+
+    The first chunk is waited for before returning, so a failure to produce
+    any audio raises here and can still be reported with an error status.
+    Later failures end the stream early.
+
+    Args:
+        chunks: Text chunks from split_into_chunks
+        synthesize_chunk: Returns the path of the audio file for one chunk
+            (normally through tts_cache.get_audio)
+        prefetch: Number of chunks synthesized ahead of the one being sent
+
+    Returns:
+        Iterator of audio bytes
+    """
+    pending = deque()
+    upcoming = iter(chunks)
+
+    def submit_next():
+        for chunk in upcoming:
+            pending.append(_executor.submit(synthesize_chunk, chunk))
+            return
+
+    for _ in range(max(1, prefetch)):
+        submit_next()
+
+    if not pending:
+        return iter(())
+
+    try:
+        first_path = pending[0].result()
+    except Exception:
+        for future in pending:
+            future.cancel()
+        raise
+
+    def generate():
+        path = first_path
+        try:
+            while pending:
+                pending.popleft()
+                submit_next()
+                yield from _read_blocks(path)
+                if not pending:
+                    break
+                path = pending[0].result()
+        except Exception as e:
+            logger.error(f"Streamed TTS stopped after a chunk failed: {str(e)}")
+        finally:
+            # Also runs when the client disconnects; chunks already being
+            # synthesized still finish and land in the cache
+            for future in pending:
+                future.cancel()
+
+    return generate()
+
+
+def stream_tts_request(label: str, voices: Dict[str, Any], styles: Dict[str, Any],
+                       default_voice: str, default_style: str,
+                       synthesize_chunk: Callable[[str, str, str], str]):
+    """
+    Handle a streamed TTS request for a backend that takes a voice type and style.
+
+    The JSON body has "text", and optionally "voice_type" and "style";
+    unknown voices and styles fall back to the defaults.
+
+    Args:
+        label: Backend name used in log messages
+        voices: Voice types the backend supports
+        styles: Styles the backend supports
+        default_voice: Voice type used when none or an unknown one is given
+        default_style: Style used when none or an unknown one is given
+        synthesize_chunk: Called with (chunk, voice_type, style); returns the
+            path of the chunk's audio file
+
+    Returns:
+        Streamed audio/mpeg response, or a JSON error response
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            logger.error("No JSON data in request")
+            return jsonify({"error": "No data provided"}), 400
+        
+        text = data.get('text', '')
+        chunks = split_into_chunks(text)
+        if not chunks:
+            logger.error("No text provided in request")
+            return jsonify({"error": "No text provided"}), 400
+        
+        voice_type = data.get('voice_type', default_voice)
+        if voice_type not in voices:
+            logger.warning(f"Unknown voice type: {voice_type}, using default")
+            voice_type = default_voice
+        
+        style = data.get('style', default_style)
+        if style not in styles:
+            logger.warning(f"Unknown style: {style}, using default")
+            style = default_style
+        
+        logger.info(f"Streaming {label} TTS for text of length {len(text)} in {len(chunks)} chunks")
+        audio = stream_audio(chunks, lambda chunk: synthesize_chunk(chunk, voice_type, style))
+        
+        return Response(
+            stream_with_context(audio),
+            mimetype='audio/mpeg',
+            headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'}
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in streamed {label} TTS: {str(e)}")
+        return jsonify({"error": str(e)}), 500
@@ -1,73 +1,101 @@
 """
 Activity tracking utilities for Calm Journey.
 Tracks journal entries and provides statistics while respecting user privacy.
+
+Journal activity is counted in memory and flushed to data/activity_data.json
+in batches; the database totals are rolled up on a schedule. The dashboard
+reads a precomputed snapshot, so rendering the community message costs no
+file or database access.
 """
 import time
 import json
 import os
 import random
+import atexit
+import logging
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from threading import Lock
 from sqlalchemy import func
 from app import db
 from models import JournalEntry
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
 # Thread-safe lock for data access
 activity_lock = Lock()
 
 # Constants
 ACTIVITY_DATA_FILE = "data/activity_data.json"
 
+# Pending journal counts are written to the activity file at most this often (seconds)
+FLUSH_INTERVAL = 30
+
+# Each worker re-reads the shared activity file at most this often (seconds)
+SNAPSHOT_INTERVAL = 60
+
+# Database rollups (total entries, recent insights) are recomputed this often (seconds)
+ROLLUP_INTERVAL = 600
+
+# A worker's claim on the rollup refresh lapses after this long, so another can retry (seconds)
+ROLLUP_CLAIM_TIMEOUT = 120
+
 def ensure_data_directory():
     """Ensure the data directory exists"""
     if not os.path.exists('data'):
         os.makedirs('data')
 
+def new_activity_data():
+    """Create a fresh activity data structure"""
+    now = int(time.time())
+    return {
+        "daily_stats": {
+            "last_reset": now,
+            "journal_count": 0,
+            "display_offset": random.randint(5, 15)  # Base offset for display purposes
+        },
+        "weekly_stats": {
+            "last_reset": now,
+            "journal_count": 0,
+            "display_offset": random.randint(12, 30)  # Base offset for display purposes
+        },
+        "rollups": {
+            "refreshed_at": 0,
+            "total_journal_count": 0,
+            "recent_insights_count": 0
+        }
+    }
+
 def load_activity_data():
     """Load activity data from file or create new data structure"""
     ensure_data_directory()
     try:
         if os.path.exists(ACTIVITY_DATA_FILE):
             with open(ACTIVITY_DATA_FILE, 'r') as f:
-                return json.load(f)
-        else:
-            # Create default data structure
-            return {
-                "daily_stats": {
-                    "last_reset": int(time.time()),
-                    "journal_count": 0,
-                    "display_offset": random.randint(5, 15)  # Base offset for display purposes
-                },
-                "weekly_stats": {
-                    "last_reset": int(time.time()),
-                    "journal_count": 0,
-                    "display_offset": random.randint(12, 30)  # Base offset for display purposes
-                }
-            }
+                data = json.load(f)
+            # Files written before rollups were stored don't have them yet
+            data.setdefault("rollups", new_activity_data()["rollups"])
+            return data
     except Exception as e:
-        print(f"Error loading activity data: {str(e)}")
-        # Return fresh data structure
-        return {
-            "daily_stats": {
-                "last_reset": int(time.time()),
-                "journal_count": 0,
-                "display_offset": random.randint(5, 15)
-            },
-            "weekly_stats": {
-                "last_reset": int(time.time()),
-                "journal_count": 0,
-                "display_offset": random.randint(12, 30)
-            }
-        }
+        logger.error(f"Error loading activity data: {str(e)}")
+    return new_activity_data()
 
 def save_activity_data(data):
     """Save activity data to file"""
     ensure_data_directory()
     try:
-        with open(ACTIVITY_DATA_FILE, 'w') as f:
+        # Write to a temporary file first so readers never see a partial file
+        tmp_file = f"{ACTIVITY_DATA_FILE}.tmp"
+        with open(tmp_file, 'w') as f:
             json.dump(data, f)
+        os.replace(tmp_file, ACTIVITY_DATA_FILE)
     except Exception as e:
-        print(f"Error saving activity data: {str(e)}")
+        logger.error(f"Error saving activity data: {str(e)}")
 
 def reset_daily_stats_if_needed(data):
     """Reset daily stats if more than 24 hours have passed since last reset"""
@@ -75,7 +103,7 @@ def reset_daily_stats_if_needed(data):
     if now - data["daily_stats"]["last_reset"] > 86400:  # 24 hours
         # Keep the display offset to maintain continuity
         display_offset = data["daily_stats"]["display_offset"]
-        
+
         # Reset stats
         data["daily_stats"] = {
             "last_reset": now,
@@ -91,7 +119,7 @@ def reset_weekly_stats_if_needed(data):
     if now - data["weekly_stats"]["last_reset"] > 604800:  # 7 days
         # Keep the display offset to maintain continuity
         display_offset = data["weekly_stats"]["display_offset"]
-        
+
         # Reset stats
         data["weekly_stats"] = {
             "last_reset": now,
@@ -101,132 +129,254 @@ def reset_weekly_stats_if_needed(data):
         return True
     return False
 
+def compute_rollups():
+    """
+    Count total journal entries and entries with insights from the past week.
+
+    Returns:
+        dict: The rollup values, or None if the database could not be queried
+    """
+    try:
+        week_ago = datetime.now() - timedelta(days=7)
+        total_count, recent_count = db.session.query(
+            func.count(JournalEntry.id),
+            func.count(JournalEntry.id).filter(
+                JournalEntry.created_at >= week_ago,
+                JournalEntry.is_analyzed == True  # Has an analysis
+            )
+        ).one()
+        return {
+            "refreshed_at": int(time.time()),
+            "total_journal_count": total_count or 0,
+            "recent_insights_count": recent_count or 0
+        }
+    except Exception as e:
+        logger.error(f"Error computing community rollups: {str(e)}")
+        db.session.rollback()
+        return None
+
+class CommunityStats:
+    """
+    Community activity counters shared by all workers through the activity file.
+
+    New journal entries are counted in memory and merged into the file in one
+    locked write at most every FLUSH_INTERVAL seconds. Each worker keeps a
+    snapshot of the file that reads are served from, and reloads it every
+    SNAPSHOT_INTERVAL seconds; whichever worker reloads once the rollups are
+    ROLLUP_INTERVAL seconds old claims them and recomputes them without
+    holding either lock, so other requests keep reading the old snapshot.
+    """
+
+    def __init__(self):
+        self._pending = 0
+        self._last_flush = time.time()
+        self._snapshot = None
+        self._snapshot_at = 0
+        self._refreshing = False
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared by all processes updating the activity file."""
+        ensure_data_directory()
+        if fcntl is None:
+            yield
+            return
+        with open(f"{ACTIVITY_DATA_FILE}.lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _sync(self, claim_rollups=True):
+        """
+        Merge pending counts into the activity file and reload the snapshot.
+        Caller holds activity_lock.
+
+        Args:
+            claim_rollups: Whether to claim the rollup refresh if it is due
+
+        Returns:
+            tuple: Whether the daily or weekly stats were reset, and whether
+                this worker claimed the rollup refresh (the caller then runs
+                _refresh_rollups after releasing activity_lock)
+        """
+        with self._file_lock():
+            data = load_activity_data()
+
+            # Reset stats if needed, then add what this worker counted since its last flush
+            daily_reset = reset_daily_stats_if_needed(data)
+            weekly_reset = reset_weekly_stats_if_needed(data)
+            data["daily_stats"]["journal_count"] += self._pending
+            data["weekly_stats"]["journal_count"] += self._pending
+
+            # The claim is stored in the file so only one worker runs the
+            # query; it lapses after ROLLUP_CLAIM_TIMEOUT if that worker fails
+            now = time.time()
+            rollups = data["rollups"]
+            claimed = (claim_rollups and not self._refreshing
+                       and now - rollups["refreshed_at"] >= ROLLUP_INTERVAL
+                       and now - rollups.get("claimed_at", 0) >= ROLLUP_CLAIM_TIMEOUT)
+            if claimed:
+                rollups["claimed_at"] = int(now)
+                self._refreshing = True
+
+            if self._pending or daily_reset or weekly_reset or claimed:
+                save_activity_data(data)
+
+        self._pending = 0
+        self._last_flush = self._snapshot_at = time.time()
+        self._snapshot = data
+        return daily_reset or weekly_reset, claimed
+
+    def _refresh_rollups(self):
+        """
+        Recompute the database rollups and store them in the activity file.
+        Called without activity_lock, after claiming the refresh.
+        """
+        try:
+            rollups = compute_rollups()
+            if rollups is None:
+                return
+            with activity_lock:
+                with self._file_lock():
+                    data = load_activity_data()
+                    data["rollups"] = rollups
+                    save_activity_data(data)
+                self._snapshot = data
+                self._snapshot_at = time.time()
+        finally:
+            with activity_lock:
+                self._refreshing = False
+
+    def record_journal_entry(self):
+        """
+        Count a new journal entry.
+
+        Returns:
+            bool: Whether stats were reset during a flush
+        """
+        with activity_lock:
+            self._pending += 1
+            if time.time() - self._last_flush < FLUSH_INTERVAL:
+                return False
+            reset, claimed = self._sync()
+        if claimed:
+            self._refresh_rollups()
+        return reset
+
+    def flush(self):
+        """Write any pending counts to the activity file now."""
+        with activity_lock:
+            if self._pending:
+                # May run at interpreter exit, outside an app context
+                self._sync(claim_rollups=False)
+
+    def refresh_rollups(self):
+        """Recompute the database rollups now (for a scheduled job or admin action)."""
+        with activity_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        self._refresh_rollups()
+
+    def snapshot(self):
+        """
+        Get the current activity data, reloading it if the snapshot is stale.
+
+        Returns:
+            dict: Activity data (daily_stats, weekly_stats, rollups)
+        """
+        with activity_lock:
+            claimed = False
+            if self._snapshot is None or time.time() - self._snapshot_at >= SNAPSHOT_INTERVAL:
+                _, claimed = self._sync()
+        if claimed:
+            self._refresh_rollups()
+        return self._snapshot
+
+# Global counter service
+community_stats = CommunityStats()
+
+# Don't lose the last batch of counts when a worker shuts down
+atexit.register(community_stats.flush)
+
 def track_journal_entry(user_id=None, activity_type=None, entry_id=None):
     """
     Track a new journal entry and update stats.
-    
+
     Args:
         user_id: Optional user ID for more detailed tracking
         activity_type: Optional type of activity (e.g., "journal_created", "reflection_added")
         entry_id: Optional journal entry ID
-        
+
     Returns:
         bool: Whether stats were reset
     """
-    with activity_lock:
-        data = load_activity_data()
-        
-        # Update daily stats
-        data["daily_stats"]["journal_count"] += 1
-        
-        # Update weekly stats
-        data["weekly_stats"]["journal_count"] += 1
-        
-        # Reset stats if needed
-        daily_reset = reset_daily_stats_if_needed(data)
-        weekly_reset = reset_weekly_stats_if_needed(data)
-        
-        # Save updated data
-        save_activity_data(data)
-        
-        return daily_reset or weekly_reset
+    return community_stats.record_journal_entry()
 
 def get_daily_journal_count():
     """
     Get the number of journal entries today with display enhancement.
-    
+
     Returns:
         int: Number of journal entries today
     """
-    with activity_lock:
-        data = load_activity_data()
-        stats = data["daily_stats"]
-        
-        # Reset if needed
-        reset_daily_stats_if_needed(data)
-        save_activity_data(data)
-        
-        # Apply display offset for more encouraging numbers
-        journal_count = stats["journal_count"] + stats["display_offset"]
-        
-        return max(3, journal_count)  # Ensure at least 3 entries shown
+    stats = community_stats.snapshot()["daily_stats"]
+
+    # Apply display offset for more encouraging numbers
+    journal_count = stats["journal_count"] + stats["display_offset"]
+
+    return max(3, journal_count)  # Ensure at least 3 entries shown
 
 def get_weekly_journal_count():
     """
     Get the number of journal entries this week with display enhancement.
-    
+
     Returns:
         int: Number of journal entries this week
     """
-    with activity_lock:
-        data = load_activity_data()
-        stats = data["weekly_stats"]
-        
-        # Reset if needed
-        reset_weekly_stats_if_needed(data)
-        save_activity_data(data)
-        
-        # Apply display offset for more encouraging numbers
-        journal_count = stats["journal_count"] + stats["display_offset"]
-        
-        return max(12, journal_count)  # Ensure at least 12 entries shown
+    stats = community_stats.snapshot()["weekly_stats"]
+
+    # Apply display offset for more encouraging numbers
+    journal_count = stats["journal_count"] + stats["display_offset"]
+
+    return max(12, journal_count)  # Ensure at least 12 entries shown
 
 def get_total_journal_count():
     """
     Get the total number of journal entries in the database with display enhancement.
-    
+
     Returns:
         int: Total number of journal entries
     """
-    try:
-        # Query database for actual count
-        journal_count = db.session.query(func.count(JournalEntry.id)).scalar() or 0
-        
-        # Load activity data for the display offset
-        with activity_lock:
-            data = load_activity_data()
-            display_offset = data["weekly_stats"]["display_offset"] * 5  # Larger offset for total
-        
-        # Apply offset to make the number more encouraging
-        enhanced_count = journal_count + display_offset
-        
-        return max(25, enhanced_count)  # Ensure at least 25 entries shown
-    except Exception as e:
-        print(f"Error getting total journal count: {str(e)}")
-        return 25  # Fallback value
+    data = community_stats.snapshot()
+    display_offset = data["weekly_stats"]["display_offset"] * 5  # Larger offset for total
+
+    # Apply offset to make the number more encouraging
+    enhanced_count = data["rollups"]["total_journal_count"] + display_offset
+
+    return max(25, enhanced_count)  # Ensure at least 25 entries shown
 
 def get_recent_insights_count():
     """
     Get count of journal entries with insights in the past week.
-    
+
     Returns:
         int: Number of recent journal entries with insights
     """
-    try:
-        # Query database for actual count
-        week_ago = datetime.now() - timedelta(days=7)
-        recent_count = db.session.query(func.count(JournalEntry.id)).filter(
-            JournalEntry.created_at >= week_ago,
-            JournalEntry.is_analyzed == True  # Has an analysis
-        ).scalar() or 0
-        
-        # Load activity data for the display offset
-        with activity_lock:
-            data = load_activity_data()
-            display_offset = data["daily_stats"]["display_offset"] * 2  # Moderate offset
-        
-        # Apply offset to make the number more encouraging
-        enhanced_count = recent_count + display_offset
-        
-        return max(7, enhanced_count)  # Ensure at least 7 insights shown
-    except Exception as e:
-        print(f"Error getting recent insights count: {str(e)}")
-        return 7  # Fallback value
+    data = community_stats.snapshot()
+    display_offset = data["daily_stats"]["display_offset"] * 2  # Moderate offset
+
+    # Apply offset to make the number more encouraging
+    enhanced_count = data["rollups"]["recent_insights_count"] + display_offset
+
+    return max(7, enhanced_count)  # Ensure at least 7 insights shown
 
 def get_community_message():
     """
     Get an encouraging community message focused on journal entries.
-    
+
     Returns:
         str: Community activity message
     """
@@ -235,7 +385,7 @@ def get_community_message():
     weekly_count = get_weekly_journal_count()
     total_count = get_total_journal_count()
     insights_count = get_recent_insights_count()
-    
+
     # Generate different message types
     messages = [
         f"{daily_count} journal entries were created today, each one a step toward greater self-awareness.",
@@ -243,6 +393,6 @@ def get_community_message():
         f"Our community has documented over {total_count} thoughts and feelings, creating a legacy of mindfulness.",
         f"In the past week, {insights_count} valuable insights have been discovered through journaling."
     ]
-    
+
     # Randomly select a message
-    return random.choice(messages)
\ No newline at end of file
+    return random.choice(messages)